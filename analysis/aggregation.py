@@ -0,0 +1,258 @@
+"""Aggregation of simulation results.
+
+As each sequence finishes simulating its per sequence values (for each
+network: cost, wait time, bytes and requests summed over its page views,
+and the weighted cost and bytes of each network category) are written
+into that sequence's column of a result_matrix.ResultMatrix. Per page
+view values are added to mergeable distributions, one MethodAggregate
+per method, which the worker processes send back to the parent to be
+merged. Totals are computed once all sequences are done: counts from the
+matrix, and the total cost and wait time by adding up the page views one
+at a time in sequence order. Float addition isn't associative, so this
+keeps them identical to summing every page view in a single pass
+regardless of how the sequences were split between workers.
+
+The kind of distribution used for each per page view metric can be
+selected with a dict of metric name => distribution.for_name() name,
+entries not given default to DEFAULT_DISTRIBUTIONS.
+"""
+
+from array import array
+import functools
+import itertools
+import math
+import operator
+
+from analysis import distribution
+from analysis import result_matrix
+from analysis import result_pb2
+
+# Per page view metrics, named after their NetworkResultProto fields.
+REQUEST_BYTES_PER_PAGE_VIEW = "request_bytes_per_page_view"
+RESPONSE_BYTES_PER_PAGE_VIEW = "response_bytes_per_page_view"
+WAIT_PER_PAGE_VIEW_MS = "wait_per_page_view_ms"
+COST_PER_PAGE_VIEW = "cost_per_page_view"
+METRICS = [
+    REQUEST_BYTES_PER_PAGE_VIEW,
+    RESPONSE_BYTES_PER_PAGE_VIEW,
+    WAIT_PER_PAGE_VIEW_MS,
+    COST_PER_PAGE_VIEW,
+]
+
+DEFAULT_DISTRIBUTIONS = {metric: "linear-5" for metric in METRICS}
+
+
+def parse_distributions(specs):
+  """Parses a list of "<metric>=<distribution name>" strings into a dict.
+
+  Raises ValueError if a metric or distribution name is invalid.
+  """
+  result = dict()
+  for spec in specs:
+    metric, _, name = spec.partition("=")
+    if metric not in METRICS:
+      raise ValueError("Unknown metric: %s" % metric)
+    distribution.for_name(name)
+    result[metric] = name
+  return result
+
+
+class NetworkAggregate:
+  """Distributions over the page views simulated with one network model.
+
+  The wait time and cost of each page view are also kept, by sequence index,
+  so that totals can be summed one page view at a time in sequence order.
+  """
+
+  def __init__(self, distributions=None):
+    """distributions is a dict of metric name => distribution name."""
+    names = dict(DEFAULT_DISTRIBUTIONS)
+    names.update(distributions or {})
+    self.request_bytes_per_page_view = distribution.for_name(
+        names[REQUEST_BYTES_PER_PAGE_VIEW])
+    self.response_bytes_per_page_view = distribution.for_name(
+        names[RESPONSE_BYTES_PER_PAGE_VIEW])
+    self.wait_per_page_view_ms = distribution.for_name(
+        names[WAIT_PER_PAGE_VIEW_MS])
+    self.cost_per_page_view = distribution.for_name(names[COST_PER_PAGE_VIEW])
+    self.times_by_sequence = dict()
+    self.costs_by_sequence = dict()
+
+  def add_page_views(self, sequence_index, request_bytes, response_bytes, times,
+                     costs):
+    """Adds the page views of one sequence, as parallel lists of their values."""
+    self.request_bytes_per_page_view.add_values(request_bytes)
+    self.response_bytes_per_page_view.add_values(response_bytes)
+    self.wait_per_page_view_ms.add_values(times)
+    self.cost_per_page_view.add_values(costs)
+    self.times_by_sequence[sequence_index] = array("d", times)
+    self.costs_by_sequence[sequence_index] = array("d", costs)
+
+  def merge(self, other):
+    """Adds everything in other to this aggregate."""
+    self.request_bytes_per_page_view.merge(other.request_bytes_per_page_view)
+    self.response_bytes_per_page_view.merge(other.response_bytes_per_page_view)
+    self.wait_per_page_view_ms.merge(other.wait_per_page_view_ms)
+    self.cost_per_page_view.merge(other.cost_per_page_view)
+    self.times_by_sequence.update(other.times_by_sequence)
+    self.costs_by_sequence.update(other.costs_by_sequence)
+
+
+class MethodAggregate:
+  """Aggregated results of all sequences simulated with one PFE method."""
+
+  def __init__(self, distributions=None):
+    self.distributions = distributions
+    self.networks = dict()
+
+  def add_sequence(self, column, totals_by_network, network_models,
+                   cost_function):
+    """Adds the results of one sequence.
+
+    totals_by_network is a dict of network model name => list of
+    GraphTotal's, one per page view of the sequence. cost_function maps a
+    list of wait times to a list of costs (see cost.costs). Per sequence
+    values are written to column, a result_matrix.SequenceColumn.
+    """
+    category_costs = dict()
+    category_bytes = dict()
+    for network_model in network_models:
+      costs, page_view_bytes = self.add_network(
+          column, network_model, totals_by_network[network_model.name],
+          cost_function)
+
+      weight = network_model.weight
+      category = network_model.category
+      category_costs[category] = sequential_sum(
+          [weight * the_cost for the_cost in costs],
+          category_costs.get(category, 0.0))
+      category_bytes[category] = sequential_sum(
+          [weight * the_bytes for the_bytes in page_view_bytes],
+          category_bytes.get(category, 0.0))
+
+    for category, the_cost in category_costs.items():
+      column.set_category_value(result_matrix.CATEGORY_COST, category, the_cost)
+      column.set_category_value(result_matrix.CATEGORY_BYTES, category,
+                                category_bytes[category])
+
+  def add_network(self, column, network_model, graph_totals, cost_function):
+    """Adds the page views of one sequence simulated with network_model.
+
+    Returns the cost and the total bytes of each page view.
+    """
+    network = self.networks.get(network_model.name)
+    if network is None:
+      network = self.networks[network_model.name] = NetworkAggregate(
+          self.distributions)
+    times = [graph_total.total_time for graph_total in graph_totals]
+    request_bytes = [graph_total.request_bytes for graph_total in graph_totals]
+    response_bytes = [
+        graph_total.response_bytes for graph_total in graph_totals
+    ]
+    costs = cost_function(times)
+    network.add_page_views(column.sequence_index, request_bytes, response_bytes,
+                           times, costs)
+
+    # In result_matrix.NETWORK_FIELDS order.
+    column.set_network_values(network_model.name, [
+        sequential_sum(costs),
+        sequential_sum(times),
+        sum(request_bytes),
+        sum(response_bytes),
+        sum(graph_total.num_requests for graph_total in graph_totals),
+    ])
+    return costs, [
+        request + response
+        for request, response in zip(request_bytes, response_bytes)
+    ]
+
+  def merge(self, other):
+    """Adds the page views aggregated by other to this aggregate."""
+    for name, network in other.networks.items():
+      if name not in self.networks:
+        self.networks[name] = NetworkAggregate(other.distributions)
+      self.networks[name].merge(network)
+
+  def to_proto(self, method_name, matrix, sequence_indices, sequence_ids):
+    """Convert this aggregate into a MethodResultProto.
+
+    sequence_indices are the matrix columns of the sequences to include,
+    in order, and sequence_ids the corresponding sequence ids.
+    """
+    method_result_proto = result_pb2.MethodResultProto()
+    method_result_proto.method_name = method_name
+
+    for category in matrix.categories:
+      category_proto = method_result_proto.results_by_network_category.add()
+      category_proto.network_category = category
+      category_proto.cost_per_sequence.extend(
+          select(
+              matrix.category_values(result_matrix.CATEGORY_COST, method_name,
+                                     category), sequence_indices))
+      category_proto.bytes_per_sequence.extend(
+          select(
+              matrix.category_values(result_matrix.CATEGORY_BYTES, method_name,
+                                     category), sequence_indices))
+      category_proto.sequence_ids.extend(sequence_ids)
+
+    for name, network in sorted(self.networks.items()):
+      method_result_proto.results_by_network.append(
+          network_result_proto(name, network, method_name, matrix,
+                               sequence_indices))
+    return method_result_proto
+
+
+def network_result_proto(network_model_name, network, method_name, matrix,
+                         sequence_indices):
+  """Builds the NetworkResultProto of one network for one method.
+
+  Byte and request counts are summed from the sequence totals in matrix.
+  The float totals are summed one page view at a time in the order of
+  sequence_indices, the same order the page views are listed in.
+  """
+
+  def total(field):
+    return math.fsum(
+        select(matrix.network_values(field, method_name, network_model_name),
+               sequence_indices))
+
+  def page_view_total(values_by_sequence):
+    return sequential_sum(
+        itertools.chain.from_iterable(
+            values_by_sequence[idx] for idx in sequence_indices))
+
+  proto = result_pb2.NetworkResultProto()
+  proto.network_model_name = network_model_name
+  proto.request_bytes_per_page_view.CopyFrom(
+      network.request_bytes_per_page_view.to_proto())
+  proto.response_bytes_per_page_view.CopyFrom(
+      network.response_bytes_per_page_view.to_proto())
+  proto.wait_per_page_view_ms.CopyFrom(network.wait_per_page_view_ms.to_proto())
+  proto.cost_per_page_view.CopyFrom(network.cost_per_page_view.to_proto())
+  proto.total_cost = page_view_total(network.costs_by_sequence)
+  proto.total_wait_time_ms = page_view_total(network.times_by_sequence)
+  proto.total_request_bytes = int(total(result_matrix.REQUEST_BYTES))
+  proto.total_response_bytes = int(total(result_matrix.RESPONSE_BYTES))
+  proto.total_request_count = int(total(result_matrix.NUM_REQUESTS))
+  return proto
+
+
+def sequential_sum(values, start=0):
+  """Sums values strictly left to right.
+
+  Unlike sum() the result is the same on every Python version, it's
+  relied on to keep results identical to adding values one at a time.
+  """
+  return functools.reduce(operator.add, values, start)
+
+
+def select(values, indices):
+  """Returns the list of values at indices."""
+  return [values[idx] for idx in indices]
+
+
+def merge_all(aggregates_by_method, dest):
+  """Merges a dict of method name => MethodAggregate into dest."""
+  for method_name, aggregate in aggregates_by_method.items():
+    dest.setdefault(method_name,
+                    MethodAggregate(aggregate.distributions)).merge(aggregate)
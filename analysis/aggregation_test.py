@@ -0,0 +1,382 @@
+"""Unit tests for the aggregation module."""
+
+import math
+import random
+import unittest
+from google.protobuf import text_format
+from analysis import aggregation
+from analysis import cost
+from analysis import network_models
+from analysis import result_matrix
+from analysis import result_pb2
+from analysis import simulation
+
+# Output of the single pass aggregation the analyzer used before aggregates
+# were merged from the workers, for the sequences of baseline_page_views().
+# Page view distributions aren't included.
+BASELINE_GOLDEN_FILE = "analysis/sample/aggregation_baseline.result.textproto"
+
+
+def mock_cost(times_ms):
+  return [time_ms / 10 for time_ms in times_ms]
+
+
+def g(time, request, response, num_requests=0):  # pylint: disable=invalid-name
+  return simulation.GraphTotal(time, request, response, num_requests)
+
+
+def aggregate(sequences,
+              models,
+              cost_function,
+              matrix,
+              first_index=0,
+              distributions=None):
+  """Aggregates a list of (sequence id, dict of network name => totals)."""
+  result = aggregation.MethodAggregate(distributions)
+  for idx, (_, totals_by_network) in enumerate(sequences):
+    result.add_sequence(matrix.column("Fake_PFE", first_index + idx),
+                        totals_by_network, models, cost_function)
+  return result
+
+
+def desktop(sequence_id, *graph_totals):
+  """A list holding one sequence simulated on just desktop_median."""
+  return [(sequence_id, {"desktop_median": list(graph_totals)})]
+
+
+def to_proto(sequences, models, cost_function):
+  """Aggregates sequences and converts the result to a MethodResultProto."""
+  matrix = result_matrix.ResultMatrix(["Fake_PFE"], models, len(sequences))
+  return aggregate(sequences, models, cost_function, matrix).to_proto(
+      "Fake_PFE", matrix, range(len(sequences)),
+      [sequence_id for sequence_id, _ in sequences])
+
+
+def baseline_page_views(network_names):
+  """Returns the page views of 60 sequences simulated on each network.
+
+  A list of (sequence id, dict of network name => list of (time, request
+  bytes, response bytes, number of requests)), one per page view.
+  """
+  rand = random.Random(39)
+  sequences = []
+  for sequence_id in range(100, 160):
+    sizes = [(rand.randint(0, 3000), rand.randint(0,
+                                                  300000), rand.randint(1, 6))
+             for _ in range(rand.randint(1, 5))]
+    sequences.append((sequence_id, {
+        name: [(rand.uniform(10,
+                             6000), request_bytes, response_bytes, num_requests)
+               for request_bytes, response_bytes, num_requests in sizes
+              ] for name in network_names
+    }))
+  return sequences
+
+
+class AggregationTest(unittest.TestCase):
+
+  def test_network_categories(self):
+    cost_function = lambda times: [time * 2 for time in times]
+    models = [
+        network_models.DESKTOP_SLOWEST,
+        network_models.DESKTOP_MEDIAN,
+        network_models.MOBILE_WIFI_SLOWEST,
+    ]
+    sequences = [
+        (42, {
+            "desktop_slowest": [
+                g(100, 200, 300),
+                g(200, 300, 400),
+                g(300, 400, 500),
+            ],
+            "desktop_median": [
+                g(10, 20, 30),
+                g(20, 30, 40),
+            ],
+            "mobile_wifi_slowest": [g(1, 2, 3)],
+        }),
+        (43, {
+            "desktop_slowest": [
+                g(200, 300, 400),
+                g(300, 400, 500),
+            ],
+            "desktop_median": [g(30, 40, 50)],
+            "mobile_wifi_slowest": [g(4, 5, 6)],
+        }),
+    ]
+
+    result = to_proto(sequences, models,
+                      cost_function).results_by_network_category
+
+    self.assertEqual(len(result), 2)
+    self.assertEqual(result[0].network_category, "desktop")
+    self.assertEqual(result[0].sequence_ids, [42, 43])
+    self.assertEqual(result[1].network_category, "wifi")
+    self.assertEqual(result[1].sequence_ids, [42, 43])
+
+    # s0:
+    #  cost =   0.05 * 2 * (100 + 200 + 300)
+    #         + 0.50 * 2 * (10 + 20)
+    #  bytes =  0.05 * (200 + 300 + 300 + 400 + 400 + 500)
+    #         + 0.50 * (20 + 30 + 30 + 40)
+    # s1:
+    #  cost =   0.05 * 2 * (200 + 300)
+    #         + 0.50 * 2 * (30)
+    #  bytes =  0.05 * (300 + 400 + 400 + 500)
+    #         + 0.50 * (40 + 50)
+    self.assertEqual(result[0].cost_per_sequence, [90, 80])
+    self.assertEqual(result[0].bytes_per_sequence, [165, 125])
+
+    self.assertEqual(len(result[1].cost_per_sequence), 2)
+    self.assertEqual(len(result[1].bytes_per_sequence), 2)
+
+  def test_to_proto(self):
+    self.maxDiff = None  # pylint: disable=invalid-name
+    method_proto = result_pb2.MethodResultProto()
+    method_proto.method_name = "Fake_PFE"
+
+    network_category_proto = result_pb2.NetworkCategoryResultProto()
+    network_category_proto.network_category = "2G"
+    network_category_proto.cost_per_sequence.extend([210.0, 105.0])
+    network_category_proto.bytes_per_sequence.extend([3000.0, 1500.0])
+    network_category_proto.sequence_ids.extend([42, 43])
+    method_proto.results_by_network_category.append(network_category_proto)
+
+    network_category_proto = result_pb2.NetworkCategoryResultProto()
+    network_category_proto.network_category = "desktop"
+    network_category_proto.cost_per_sequence.extend([10.0, 10.0])
+    network_category_proto.bytes_per_sequence.extend([1500.0, 1500.0])
+    network_category_proto.sequence_ids.extend([42, 43])
+    method_proto.results_by_network_category.append(network_category_proto)
+
+    network_proto = result_pb2.NetworkResultProto()
+    network_proto.network_model_name = "desktop_median"
+    network_proto.total_cost = 40
+    network_proto.total_wait_time_ms = 400
+    network_proto.wait_per_page_view_ms.buckets.add(end=200)
+    network_proto.wait_per_page_view_ms.buckets.add(end=205, count=2)
+    network_proto.cost_per_page_view.buckets.add(end=20)
+    network_proto.cost_per_page_view.buckets.add(end=25, count=2)
+    network_proto.request_bytes_per_page_view.buckets.add(end=1000)
+    network_proto.request_bytes_per_page_view.buckets.add(end=1005, count=2)
+    network_proto.response_bytes_per_page_view.buckets.add(end=2000)
+    network_proto.response_bytes_per_page_view.buckets.add(end=2005, count=2)
+    network_proto.total_request_bytes = 2000
+    network_proto.total_response_bytes = 4000
+    network_proto.total_request_count = 12
+    method_proto.results_by_network.append(network_proto)
+
+    network_proto = result_pb2.NetworkResultProto()
+    network_proto.network_model_name = "mobile_2g_median"
+    network_proto.total_cost = 630
+    network_proto.total_wait_time_ms = 6300
+    network_proto.wait_per_page_view_ms.buckets.add(end=2100)
+    network_proto.wait_per_page_view_ms.buckets.add(end=2105, count=3)
+    network_proto.cost_per_page_view.buckets.add(end=210)
+    network_proto.cost_per_page_view.buckets.add(end=215, count=3)
+    network_proto.request_bytes_per_page_view.buckets.add(end=1000)
+    network_proto.request_bytes_per_page_view.buckets.add(end=1005, count=3)
+    network_proto.response_bytes_per_page_view.buckets.add(end=2000)
+    network_proto.response_bytes_per_page_view.buckets.add(end=2005, count=3)
+    network_proto.total_request_bytes = 3000
+    network_proto.total_response_bytes = 6000
+    network_proto.total_request_count = 15
+    method_proto.results_by_network.append(network_proto)
+
+    sequences = [
+        (42, {
+            "mobile_2g_median": [
+                g(2100, 1000, 2000, 5),
+                g(2100, 1000, 2000, 7),
+            ],
+            "desktop_median": [g(200, 1000, 2000, 5)],
+        }),
+        (43, {
+            "mobile_2g_median": [g(2100, 1000, 2000, 3)],
+            "desktop_median": [g(200, 1000, 2000, 7)],
+        }),
+    ]
+    self.assertEqual(
+        to_proto(
+            sequences,
+            [network_models.MOBILE_2G_MEDIAN, network_models.DESKTOP_MEDIAN],
+            mock_cost), method_proto)
+
+  def test_merge(self):
+    models = [network_models.MOBILE_2G_MEDIAN, network_models.DESKTOP_MEDIAN]
+    sequences = [(sequence_id, {
+        "mobile_2g_median": [g(sequence_id * 100, 10, 20 * sequence_id, 1)],
+        "desktop_median": [
+            g(sequence_id * 10, 10, 20, 1),
+            g(sequence_id, 10 * sequence_id, 20, 2),
+        ],
+    }) for sequence_id in range(1, 6)]
+
+    matrix = result_matrix.ResultMatrix(["Fake_PFE"], models, len(sequences))
+    merged = aggregate(sequences[:2], models, mock_cost, matrix)
+    merged.merge(aggregate(sequences[2:3], models, mock_cost, matrix, 2))
+    merged.merge(aggregation.MethodAggregate())
+    merged.merge(aggregate(sequences[3:], models, mock_cost, matrix, 3))
+
+    self.assertEqual(merged.to_proto("Fake_PFE", matrix, range(5), range(1, 6)),
+                     to_proto(sequences, models, mock_cost))
+
+  def test_to_proto_skips_sequences(self):
+    models = [network_models.DESKTOP_MEDIAN]
+    sequences = [(sequence_id, {
+        "desktop_median": [g(10 * sequence_id, 20, 30, sequence_id)]
+    }) for sequence_id in range(4)]
+    matrix = result_matrix.ResultMatrix(["Fake_PFE"], models, len(sequences))
+
+    proto = aggregate(sequences, models, mock_cost,
+                      matrix).to_proto("Fake_PFE", matrix, [1, 3], [11, 13])
+
+    category_proto = proto.results_by_network_category[0]
+    self.assertEqual(category_proto.sequence_ids, [11, 13])
+    self.assertEqual(category_proto.cost_per_sequence, [0.5, 1.5])
+    self.assertEqual(category_proto.bytes_per_sequence, [25, 25])
+    self.assertEqual(proto.results_by_network[0].total_wait_time_ms, 40)
+    self.assertEqual(proto.results_by_network[0].total_request_count, 4)
+
+  def test_totals_in_page_view_order(self):
+    models = [network_models.DESKTOP_MEDIAN]
+    rand = random.Random(7)
+    sequences = []
+    for sequence_id in range(60):
+      sequences.extend(
+          desktop(sequence_id,
+                  *[g(rand.uniform(100, 5000), 10, 20) for _ in range(3)]))
+    times = [
+        graph_total.total_time
+        for _, totals_by_network in sequences
+        for graph_total in totals_by_network["desktop_median"]
+    ]
+    # Running sums over every page view, in sequence order. Summing the
+    # totals of each sequence instead rounds differently.
+    expected_wait_time_ms = 0
+    expected_cost = 0
+    for time in times:
+      expected_wait_time_ms += time
+      expected_cost += cost.cost(time)
+    self.assertNotEqual(
+        expected_cost,
+        math.fsum(
+            aggregation.sequential_sum(cost.costs(times[i:i + 3]))
+            for i in range(0, len(times), 3)))
+
+    # Aggregated in segments, merged out of order.
+    matrix = result_matrix.ResultMatrix(["Fake_PFE"], models, len(sequences))
+    merged = aggregate(sequences[40:], models, cost.costs, matrix, 40)
+    merged.merge(aggregate(sequences[:17], models, cost.costs, matrix))
+    merged.merge(aggregate(sequences[17:40], models, cost.costs, matrix, 17))
+    proto = merged.to_proto("Fake_PFE", matrix, range(len(sequences)),
+                            range(len(sequences))).results_by_network[0]
+
+    self.assertEqual(proto.total_wait_time_ms, expected_wait_time_ms)
+    self.assertEqual(proto.total_cost, expected_cost)
+
+  def test_matches_baseline_output(self):
+    models = network_models.ALL_MODELS
+    sequences = [(sequence_id, {
+        name: [g(*page_view)
+               for page_view in page_views]
+        for name, page_views in page_views_by_network.items()
+    })
+                 for sequence_id, page_views_by_network in baseline_page_views(
+                     [model.name for model in models])]
+    matrix = result_matrix.ResultMatrix(["Fake_PFE"], models, len(sequences))
+    merged = aggregation.MethodAggregate()
+    for start in range(0, len(sequences), 7):
+      merged.merge(
+          aggregate(sequences[start:start + 7], models, cost.costs, matrix,
+                    start))
+
+    results_proto = result_pb2.AnalysisResultProto()
+    results_proto.results.append(
+        merged.to_proto("Fake_PFE", matrix, range(len(sequences)),
+                        [sequence_id for sequence_id, _ in sequences]))
+    for network_proto in results_proto.results[0].results_by_network:
+      for field in [
+          "request_bytes_per_page_view", "response_bytes_per_page_view",
+          "wait_per_page_view_ms", "cost_per_page_view"
+      ]:
+        network_proto.ClearField(field)
+
+    with open(BASELINE_GOLDEN_FILE, "r") as golden:
+      self.assertEqual(text_format.MessageToString(results_proto),
+                       golden.read())
+
+  def test_merge_all(self):
+    models = [network_models.DESKTOP_MEDIAN]
+    matrix = result_matrix.ResultMatrix(["Fake_PFE"], models, 2)
+    one = aggregate(desktop(1, g(10, 20, 30)), models, mock_cost, matrix)
+    two = aggregate(desktop(2, g(20, 30, 40)), models, mock_cost, matrix, 1)
+
+    merged = dict()
+    aggregation.merge_all({"abc": one}, merged)
+    aggregation.merge_all({"abc": two, "def": two}, merged)
+
+    self.assertEqual(sorted(merged), ["abc", "def"])
+    wait = merged["abc"].networks["desktop_median"].wait_per_page_view_ms
+    self.assertEqual(wait.buckets, {15: 1, 25: 1})
+    self.assertEqual(
+        merged["def"].networks["desktop_median"].wait_per_page_view_ms.buckets,
+        {25: 1})
+
+  def test_distributions(self):
+    models = [network_models.DESKTOP_MEDIAN]
+    distributions = {
+        "request_bytes_per_page_view": "exponential-4",
+        "response_bytes_per_page_view": "ddsketch-0.01",
+    }
+    matrix = result_matrix.ResultMatrix(["Fake_PFE"], models, 1)
+    result = aggregate(desktop(1, g(10, 20, 3000000), g(12, 21, 3000000)),
+                       models, mock_cost, matrix, 0, distributions)
+    proto = result.to_proto("Fake_PFE", matrix, [0], [1]).results_by_network[0]
+
+    self.assertEqual([(bucket.end, bucket.count)
+                      for bucket in proto.request_bytes_per_page_view.buckets],
+                     [(20, 0), (24, 2)])
+    self.assertEqual(proto.response_bytes_per_page_view.sketch.bin_counts, [2])
+    self.assertEqual([(bucket.end, bucket.count)
+                      for bucket in proto.wait_per_page_view_ms.buckets],
+                     [(10, 0), (15, 2)])
+    self.assertFalse(proto.wait_per_page_view_ms.HasField("sketch"))
+
+  def test_merge_all_keeps_distributions(self):
+    models = [network_models.DESKTOP_MEDIAN]
+    distributions = {"cost_per_page_view": "ddsketch-0.01"}
+    matrix = result_matrix.ResultMatrix(["Fake_PFE"], models, 2)
+    one = aggregate(desktop(1, g(10, 20, 30)), models, mock_cost, matrix, 0,
+                    distributions)
+    two = aggregate(desktop(2, g(20, 30, 40)), models, mock_cost, matrix, 1,
+                    distributions)
+
+    merged = dict()
+    aggregation.merge_all({"abc": one}, merged)
+    aggregation.merge_all({"abc": two}, merged)
+
+    self.assertEqual(
+        merged["abc"].networks["desktop_median"].cost_per_page_view.count(), 2)
+    with self.assertRaises(ValueError):
+      merged["abc"].merge(
+          aggregate(desktop(3, g(1, 2, 3)), models, mock_cost, matrix))
+
+  def test_parse_distributions(self):
+    self.assertEqual(aggregation.parse_distributions([]), {})
+    self.assertEqual(
+        aggregation.parse_distributions([
+            "cost_per_page_view=ddsketch-0.02",
+            "wait_per_page_view_ms=exponential-32"
+        ]), {
+            "cost_per_page_view": "ddsketch-0.02",
+            "wait_per_page_view_ms": "exponential-32",
+        })
+    with self.assertRaises(ValueError):
+      aggregation.parse_distributions(["total_cost=linear-5"])
+    with self.assertRaises(ValueError):
+      aggregation.parse_distributions(["cost_per_page_view=linear"])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -13,23 +13,39 @@ analysis/page_view_sequence.proto
 """
 
 import collections
+import contextlib
 import logging
 from multiprocessing import Pool
 import os
+import random
 import sys
 import json
+import time
 
 from google.protobuf import text_format
 from absl import app
 from absl import flags
+from analysis import aggregation
+from analysis import batch_analysis
+from analysis import batch_manifest
 from analysis import cost
-from analysis import distribution
+from analysis import font_loader
+from analysis import font_manifest
+from analysis import font_pack
+from analysis import graph_signatures_pb2
 from analysis import languages
 from analysis import network_models
+from analysis import method_override
 from analysis import page_view_sequence_pb2
+from analysis import preflight_plan
+from analysis import progressive_sampling
+from analysis import result_append
+from analysis import result_cache
+from analysis import result_matrix
 from analysis import result_pb2
 from analysis import simulation
 from analysis.pfe_methods import combined_patch_subset_method
+from analysis.pfe_methods import compression
 from analysis.pfe_methods import logged_pfe_method
 from analysis.pfe_methods import optimal_one_font_method
 from analysis.pfe_methods import optimal_pfe_method
@@ -42,15 +58,12 @@ LOG = logging.getLogger("analyzer")
 FLAGS = flags.FLAGS
 flags.DEFINE_string("input_data", None,
                     "Path to input data for the analysis, or - for stdin.")
-flags.mark_flag_as_required("input_data")
 
 flags.DEFINE_string(
     "font_directory", None,
     "Directory which contains all fonts to be used in the analysis.")
-flags.mark_flag_as_required("font_directory")
 
 flags.DEFINE_string("input_form", None, "Can either be text, binary, or json.")
-flags.mark_flag_as_required("input_form")
 
 flags.DEFINE_bool("output_binary", False,
                   "If true outputs the results in binary proto format.")
@@ -76,168 +89,266 @@ flags.DEFINE_bool(
     "If set, only simulate patch subset requests. If not set then all non "
     "range requests methods are simulated.")
 
+flags.DEFINE_string(
+    "font_manifest", None,
+    "Optional path to a font manifest for font_directory (produced by "
+    "tools:build_font_manifest). If set precomputed per font data is used "
+    "instead of being recomputed in each worker process.")
+
+flags.DEFINE_string(
+    "font_pack", None,
+    "Optional path to a font pack of font_directory (produced by "
+    "tools:build_font_pack). If set fonts are memory mapped from the pack "
+    "and shared by all worker processes.")
+
+flags.DEFINE_bool(
+    "range_request_estimate_sizes", False,
+    "If set the RangeRequest method estimates compressed response sizes from "
+    "per glyph compressed sizes instead of compressing each response.")
+
+flags.DEFINE_list(
+    "range_request_compression", ["zlib"],
+    "Compression models to simulate the RangeRequest method with, each is "
+    "simulated as a separate method. One of: none, zlib[-level], "
+    "gzip[-level] or brotli[-level]. Models other than zlib are included in "
+    "the method name, for example RangeRequest[brotli-11].")
+
+flags.DEFINE_bool(
+    "range_request_multipart", False,
+    "If set a multipart variant of RangeRequest, which fetches all glyph "
+    "ranges of a page view using multipart/byteranges requests, is simulated "
+    "alongside the regular RangeRequest method.")
+
+flags.DEFINE_integer(
+    "range_request_max_ranges_per_request", 0,
+    "Maximum number of ranges in each multipart RangeRequest request. 0 means "
+    "no limit.")
+
+flags.DEFINE_bool(
+    "preflight", True,
+    "If set every font referenced by the input data is validated before the "
+    "simulation starts, and sequences which use an unusable font are dropped "
+    "up front.")
+
+flags.DEFINE_list(
+    "distributions", [],
+    "Distributions to record per page view metrics with, as a list of "
+    "<metric>=<distribution>. Metrics are request_bytes_per_page_view, "
+    "response_bytes_per_page_view, wait_per_page_view_ms and "
+    "cost_per_page_view. Distributions are linear-<width>, "
+    "exponential-<sub buckets> or ddsketch-<relative accuracy>, for example "
+    "response_bytes_per_page_view=ddsketch-0.01. Metrics not listed use "
+    "linear-5.")
+
+flags.DEFINE_string(
+    "graph_signatures_out", None,
+    "If set the signature of every request graph (bytes sent and received "
+    "at each level of the graph) is written to the specified path as a "
+    "binary GraphSignaturesProto. analysis:recost can then recompute the "
+    "results under different cost functions and network models without "
+    "simulating again.")
+
+flags.DEFINE_string(
+    "network_models_config", None,
+    "Optional path to a textproto NetworkModelsProto. If set the network "
+    "models it describes (for example grids of network conditions) are "
+    "simulated instead of the built in ones.")
+
+flags.DEFINE_string(
+    "result_cache", None,
+    "Optional path to a directory to cache simulation results in. Results "
+    "of a method on a sequence are keyed by the method's configuration and "
+    "the sequence's contents, only results missing from the cache are "
+    "simulated.")
+
+flags.DEFINE_string(
+    "result_cache_salt", "",
+    "Added to every result cache key. The code and font library are already "
+    "part of the keys, this can be changed to invalidate the cache for any "
+    "other reason.")
+
+flags.DEFINE_string(
+    "append_to", None,
+    "Optional path to existing results (in --output_binary format). Only "
+    "sequences of the input data whose ids aren't already in the results "
+    "are simulated, and the output is the existing results with those "
+    "appended. The existing results must have been produced with the same "
+    "methods, network models and --distributions.")
+
+flags.DEFINE_bool(
+    "progressive_sampling", False,
+    "If set sequences are simulated in a random order, in batches of "
+    "--sampling_batch_size, until the confidence interval of every method's "
+    "total cost relative to --sampling_baseline is at most "
+    "--sampling_target_width wide in every network category, or "
+    "--sampling_time_budget_s runs out. The results only cover the simulated "
+    "sequences, the achieved precision is recorded in their sampling field.")
+
+flags.DEFINE_string(
+    "sampling_baseline", "WholeFont",
+    "Method that the cost of the other methods is estimated relative to "
+    "for --progressive_sampling.")
+
+flags.DEFINE_float(
+    "sampling_target_width", 0.02,
+    "Width of the confidence intervals of relative cost at which "
+    "--progressive_sampling stops, 0.02 is +/- 1% of the baseline's cost.")
+
+flags.DEFINE_float("sampling_confidence", 0.95,
+                   "Confidence level of the --progressive_sampling intervals.")
+
+flags.DEFINE_enum(
+    "sampling_interval", progressive_sampling.CLT,
+    progressive_sampling.INTERVALS,
+    "How the --progressive_sampling intervals are computed, from the "
+    "central limit theorem or by bootstrapping.")
+
+flags.DEFINE_integer(
+    "sampling_batch_size", 1000,
+    "Number of sequences simulated between checks of the "
+    "--progressive_sampling intervals.")
+
+flags.DEFINE_float(
+    "sampling_time_budget_s", 0,
+    "If set --progressive_sampling doesn't start a batch which would end "
+    "more than this many seconds after the simulation started.")
+
+flags.DEFINE_integer("sampling_seed", 0,
+                     "Seed of the order --progressive_sampling uses.")
+
+flags.DEFINE_string(
+    "manifest", None, "Optional path to a textproto BatchManifestProto (see "
+    "batch_manifest.proto) of analysis jobs. Every job is run in this "
+    "invocation, on one shared worker pool, and the results of each are "
+    "written to the job's output. The data set, fonts, script category and "
+    "methods are then given per job instead of by flags.")
+
+flags.DEFINE_bool(
+    "simulate_all_methods", False,
+    "If set simulate every method, including range request, in one run. "
+    "Use --method_font_directory and --method_input_data to give "
+    "RangeRequest the glyph order optimized fonts and data set.")
+
+flags.DEFINE_list(
+    "method_font_directory", [],
+    "Font directories of methods which don't use --font_directory, as a list "
+    "of <method>=<directory>. A method also matches its variants, for "
+    "example RangeRequest=fonts.optimized/ applies to "
+    "RangeRequest[brotli-11] too.")
+
+flags.DEFINE_list(
+    "method_font_manifest", [],
+    "Font manifests of the --method_font_directory's, as a list of "
+    "<method>=<path>.")
+
+flags.DEFINE_list(
+    "method_font_pack", [],
+    "Font packs of the --method_font_directory's, as a list of "
+    "<method>=<path>.")
+
+flags.DEFINE_list(
+    "method_input_data", [],
+    "Data sets (in --input_form) of methods which don't simulate "
+    "--input_data, as a list of <method>=<path>. Each must have a version "
+    "of every sequence of --input_data with the same id, sequences which "
+    "are missing are dropped for all methods.")
+
+flags.register_multi_flags_validator(
+    ["input_data", "font_directory", "input_form", "manifest"],
+    lambda values: values["manifest"] is not None or all(
+        values[name] is not None
+        for name in ["input_data", "font_directory", "input_form"]),
+    message="--input_data, --font_directory and --input_form are required "
+    "unless --manifest is set.")
+
 FONT_DIRECTORY = ""
 DEFAULT_FONT_ID = ""
+FONT_MANIFEST = None
+FONT_PACK = None
+DISTRIBUTIONS = dict()
+RECORD_SIGNATURES = False
+RESULT_CACHE = None
 
 PFE_METHODS = []  # Populated by 'main' method since it depends on flags.
 
-NETWORK_MODELS = [
-    network_models.MOBILE_2G_SLOWEST,
-    network_models.MOBILE_2G_SLOW,
-    network_models.MOBILE_2G_MEDIAN,
-    network_models.MOBILE_2G_FAST,
-    network_models.MOBILE_2G_FASTEST,
-    network_models.MOBILE_3G_SLOWEST,
-    network_models.MOBILE_3G_SLOW,
-    network_models.MOBILE_3G_MEDIAN,
-    network_models.MOBILE_3G_FAST,
-    network_models.MOBILE_3G_FASTEST,
-    network_models.MOBILE_4G_SLOWEST,
-    network_models.MOBILE_4G_SLOW,
-    network_models.MOBILE_4G_MEDIAN,
-    network_models.MOBILE_4G_FAST,
-    network_models.MOBILE_4G_FASTEST,
-    network_models.MOBILE_WIFI_SLOWEST,
-    network_models.MOBILE_WIFI_SLOW,
-    network_models.MOBILE_WIFI_MEDIAN,
-    network_models.MOBILE_WIFI_FAST,
-    network_models.MOBILE_WIFI_FASTEST,
-    network_models.DESKTOP_SLOWEST,
-    network_models.DESKTOP_SLOW,
-    network_models.DESKTOP_MEDIAN,
-    network_models.DESKTOP_FAST,
-    network_models.DESKTOP_FASTEST,
-]
-
-
-def to_protos(simulation_results, cost_function):
-  """Converts results from the simulation (a dict from key to totals array) into proto.
-
-  Converts to a list of method result protos."""
-  results = []
-  for key, network_totals in sorted(simulation_results.items()):
-    results.append(to_method_result_proto(key, network_totals, cost_function))
-
-  return results
-
-
-def to_method_result_proto(method_name, network_totals, cost_function):
-  """Converts a set of totals for a method into the corresponding proto."""
-  method_result_proto = result_pb2.MethodResultProto()
-  method_result_proto.method_name = method_name
-
-  # TODO(garretrieger): produce aggregate network results
-
-  for category_proto in to_network_category_protos(network_totals,
-                                                   cost_function):
-    method_result_proto.results_by_network_category.append(category_proto)
-
-  for key, totals in sorted(network_totals.items()):
-    method_result_proto.results_by_network.append(
-        to_network_result_proto(key, totals, cost_function))
-  return method_result_proto
-
-
-def get_network_model(name):
-  for net_model in NETWORK_MODELS:
-    if net_model.name == name:
-      return net_model
-  return None
-
-
-def to_network_category_protos(network_totals, cost_function):  # pylint: disable=too-many-locals
-  """Convert network totals to per category totals.
-
-  For each network category combine the totals using a weighted average
-  to produce a total cost and total bytes transferred per sequence.
-  """
-  categories = collections.defaultdict(list)
-  num_totals = 0
-  for network_name, totals in network_totals.items():
-    net_model = get_network_model(network_name)
-    categories[net_model.category].append((net_model.weight, totals))
-    num_totals = max(num_totals, len(totals))
-
-  result = []
-  for category in sorted(categories):
-    category_costs = [0.0] * num_totals
-    category_bytes = [0.0] * num_totals
-    category_sequence_ids = [
-        seq_total.sequence_id for seq_total in categories[category][0][1]
-    ]
-    for category_totals in categories[category]:
-      weight = category_totals[0]
-      for i in range(len(category_totals[1])):
-        seq_total = category_totals[1][i]
-        for graph_total in seq_total.totals:
-          category_costs[i] += weight * (cost_function(graph_total.total_time))
-          category_bytes[i] += weight * (graph_total.request_bytes +
-                                         graph_total.response_bytes)
-
-    category_proto = result_pb2.NetworkCategoryResultProto()
-    category_proto.network_category = category
-    category_proto.cost_per_sequence.extend(category_costs)
-    category_proto.bytes_per_sequence.extend(category_bytes)
-    category_proto.sequence_ids.extend(category_sequence_ids)
-    result.append(category_proto)
+# The method_override.MethodOverride's of the analysis, populated by
+# 'start_analysis' before the worker pool is forked.
+METHOD_OVERRIDES = []
 
-  return result
+# Per sequence results, allocated in shared memory by 'start_analysis'
+# before the worker pool is forked.
+RESULT_MATRIX = None
+
+NETWORK_MODELS = list(network_models.ALL_MODELS)
+
+# The sequences of an analysis which were simulated: column idx of the result
+# matrix holds the results of kept_sequences[sequence_indices[idx]], the first
+# num_simulated columns were simulated. failures is a dict of kept sequence
+# index => reason code for the sequences dropped before simulating.
+SimulatedSequences = collections.namedtuple(
+    "SimulatedSequences",
+    ["kept_sequences", "sequence_indices", "failures", "num_simulated"])
+
+# Where to write the failed indices and graph signatures of an analysis, each
+# is skipped if it isn't set.
+OutputPaths = collections.namedtuple(
+    "OutputPaths", ["failed_indices_out", "graph_signatures_out"])
+
+
+def to_protos(aggregates_by_method, matrix, sequence_indices, sequence_ids):
+  """Converts aggregated results (a dict from method name to MethodAggregate) into protos.
+
+  Per sequence results are read from the sequence_indices columns of
+  matrix. Converts to a list of method result protos."""
+  return [
+      aggregate.to_proto(method_name, matrix, sequence_indices, sequence_ids)
+      for method_name, aggregate in sorted(aggregates_by_method.items())
+  ]
+
+
+def read_results(results_path):
+  """Reads an AnalysisResultProto written by a previous analysis."""
+  results_proto = result_pb2.AnalysisResultProto()
+  if FLAGS.output_binary:
+    with open(results_path, 'rb') as results_file:
+      results_proto.ParseFromString(results_file.read())
+  else:
+    with open(results_path, 'r') as results_file:
+      text_format.Merge(results_file.read(), results_proto)
+  return results_proto
+
+
+def write_results(results_proto, output_path):
+  """Writes an AnalysisResultProto in the format selected by --output_binary."""
+  if FLAGS.output_binary:
+    with open(output_path, 'wb') as out:
+      out.write(results_proto.SerializeToString())
+  else:
+    with open(output_path, 'w') as out:
+      out.write(text_format.MessageToString(results_proto))
 
 
-def to_network_result_proto(network_model_name, totals, cost_function):  # pylint: disable=too-many-locals
-  """Convert totals from the simulation into a NetworkResultProto."""
-  network_result_proto = result_pb2.NetworkResultProto()
-  network_result_proto.network_model_name = network_model_name
-
-  request_bytes_per_page_view = distribution.Distribution(
-      distribution.LinearBucketer(5))
-  response_bytes_per_page_view = distribution.Distribution(
-      distribution.LinearBucketer(5))
-  latency_distribution = distribution.Distribution(
-      distribution.LinearBucketer(5))
-  cost_per_page_view = distribution.Distribution(distribution.LinearBucketer(5))
-
-  total_request_count = 0
-  total_request_bytes = 0
-  total_response_bytes = 0
-  total_wait_time_ms = 0
-  total_cost = 0
-  for seq_totals in totals:
-    for total in seq_totals.totals:
-      the_cost = cost_function(total.total_time)
-      request_bytes_per_page_view.add_value(total.request_bytes)
-      response_bytes_per_page_view.add_value(total.response_bytes)
-      latency_distribution.add_value(total.total_time)
-      cost_per_page_view.add_value(the_cost)
-      total_request_count += total.num_requests
-      total_request_bytes += total.request_bytes
-      total_response_bytes += total.response_bytes
-      total_wait_time_ms += total.total_time
-      total_cost += the_cost
-
-  network_result_proto.request_bytes_per_page_view.CopyFrom(
-      request_bytes_per_page_view.to_proto())
-  network_result_proto.response_bytes_per_page_view.CopyFrom(
-      response_bytes_per_page_view.to_proto())
-  network_result_proto.wait_per_page_view_ms.CopyFrom(
-      latency_distribution.to_proto())
-  network_result_proto.cost_per_page_view.CopyFrom(
-      cost_per_page_view.to_proto())
-  network_result_proto.total_cost = total_cost
-  network_result_proto.total_wait_time_ms = total_wait_time_ms
-  network_result_proto.total_request_bytes = total_request_bytes
-  network_result_proto.total_response_bytes = total_response_bytes
-  network_result_proto.total_request_count = total_request_count
-
-  return network_result_proto
-
-
-def write_failed_indices(failed_indices):
-  with open(FLAGS.failed_indices_out, 'w') as out:
+def write_failed_indices(failed_indices, failed_indices_out):
+  with open(failed_indices_out, 'w') as out:
     for idx in failed_indices:
       out.write(str(idx) + os.linesep)
 
 
+def read_input_data(input_data_path, input_form):
+  """Reads the DataSetProto at input_data_path, in input_form."""
+  LOG.info("Reading input data ...")
+  if input_form == "binary":
+    data_set = read_binary_input(input_data_path)
+  elif input_form == "text":
+    data_set = read_text_input(input_data_path)
+  elif input_form == "json":
+    data_set = read_json_input(input_data_path)
+  else:
+    LOG.error("Unknown input_form. Needs to be 'binary', 'text', or 'json'.")
+  LOG.info('Read %s sequences', len(data_set.sequences))
+  return data_set
+
+
 def read_binary_input(input_data_path):
   """Reads binary proto data."""
   if input_data_path == '-':
@@ -295,92 +406,408 @@ def segment_sequences(sequences, segments):
   ], segment_size)
 
 
-def do_analysis(serialized_sequences):
-  """Given a list of sequences (serialized to binary) run the simulation on them.
+def do_analysis(segment):
+  """Given a segment of sequences (serialized to binary) run the simulation on them.
 
-  Takes the sequences serialized, so that they may be passed down to another process."""
-  sequences = [
-      page_view_sequence_pb2.PageViewSequenceProto.FromString(s)
-      for s in serialized_sequences
-  ]
-  return simulation.simulate_all(sequences, PFE_METHODS, NETWORK_MODELS,
-                                 FONT_DIRECTORY, DEFAULT_FONT_ID)
+  segment is a tuple of the index of the first sequence and the list of
+  sequences. Takes the sequences serialized, so that they may be passed
+  down to another process. Per sequence results are written to
+  RESULT_MATRIX."""
+  return simulation.simulate_segment(
+      segment, PFE_METHODS, NETWORK_MODELS, FONT_DIRECTORY,
+      simulation.SimulationOptions(
+          DEFAULT_FONT_ID, FONT_MANIFEST, FONT_PACK, cost.costs, RESULT_MATRIX,
+          0, DISTRIBUTIONS, RECORD_SIGNATURES, RESULT_CACHE,
+          method_override.method_inputs(METHOD_OVERRIDES, DEFAULT_FONT_ID)))
 
 
 def merge_results(segmented_results, segment_size):
   """Merge a set of results, one per segment of sequences, into a single result dict."""
 
   failed_indices = []
-  merged = collections.defaultdict(lambda: collections.defaultdict(list))
+  merged = dict()
+  signatures_by_method = None
 
   segment_no = 0
   for segment in segmented_results:
     failed_indices.extend(
         [idx + segment_no * segment_size for idx in segment.failed_indices])
-    simulation.merge_results_by_method(segment.totals_by_method, merged)
+    aggregation.merge_all(segment.totals_by_method, merged)
+    if segment.signatures_by_method is not None:
+      if signatures_by_method is None:
+        signatures_by_method = dict()
+      for method_name, signatures in segment.signatures_by_method.items():
+        signatures_by_method.setdefault(method_name, []).extend(signatures)
     segment_no += 1
 
-  return simulation.SimulationResults(merged, failed_indices)
+  return simulation.SimulationResults(merged, failed_indices,
+                                      signatures_by_method)
 
 
-def start_analysis():
-  """Read input data and start up the analysis."""
-  input_data_path = FLAGS.input_data
+def write_graph_signatures(signatures_by_method, pfe_methods,
+                           graph_signatures_out):
+  """Writes the signatures of each of pfe_methods as a GraphSignaturesProto."""
+  network_sensitive = {
+      method.name(): simulation.is_network_sensitive(method)
+      for method in pfe_methods
+  }
+  signatures_proto = graph_signatures_pb2.GraphSignaturesProto()
+  for method_name, signatures in sorted(signatures_by_method.items()):
+    method_proto = signatures_proto.methods.add()
+    method_proto.method_name = method_name
+    method_proto.network_sensitive = network_sensitive[method_name]
+    method_proto.sequences.extend(signatures)
+  with open(graph_signatures_out, "wb") as out:
+    out.write(signatures_proto.SerializeToString())
 
-  LOG.info("Reading input data ...")
-  if FLAGS.input_form == "binary":
-    data_set = read_binary_input(input_data_path)
-  elif FLAGS.input_form == "text":
-    data_set = read_text_input(input_data_path)
-  elif FLAGS.input_form == "json":
-    data_set = read_json_input(input_data_path)
+
+def check_font_task(task):
+  """Runs preflight_plan.check_font on the analysis' fonts for a task."""
+  return preflight_plan.check_font(
+      PFE_METHODS,
+      font_loader.FontLoader(FONT_DIRECTORY, DEFAULT_FONT_ID, FONT_MANIFEST,
+                             FONT_PACK), METHOD_OVERRIDES, task)
+
+
+def run_preflight(sequences):
+  """Checks all fonts used by sequences.
+
+  Returns a dict of sequence index => reason code for each sequence that
+  can't be simulated.
+  """
+  tasks = preflight_plan.preflight_tasks(METHOD_OVERRIDES, sequences)
+  LOG.info("Preflight checking %s fonts.", len(tasks))
+  with worker_pool() as pool:
+    reasons = map_tasks(pool, check_font_task, tasks)
+  return preflight_plan.preflight_failures(METHOD_OVERRIDES, sequences, tasks,
+                                           reasons)
+
+
+def flag_method_overrides():
+  """Returns the MethodOverrideProto's given by the --method_* flags."""
+  return batch_manifest.overrides_from_flags(FLAGS.method_font_directory,
+                                             FLAGS.method_font_manifest,
+                                             FLAGS.method_font_pack,
+                                             FLAGS.method_input_data)
+
+
+def combine_failed_indices(failures, sequence_indices, failed_indices):
+  """Combines preflight failures with simulation failures.
+
+  failed_indices are relative to the sequences that were simulated, which
+  are given by sequence_indices. Returns indices relative to the full list
+  of sequences, in order.
+  """
+  return sorted(
+      set(failures) | {sequence_indices[idx] for idx in failed_indices})
+
+
+@contextlib.contextmanager
+def worker_pool(initializer=None, initargs=()):
+  """Yields a Pool of --parallelism workers, or None if running serially.
+
+  Each worker runs initializer(*initargs) when it starts, when running
+  serially it's run in this process instead. The pool is terminated when
+  the context exits.
+  """
+  if FLAGS.parallelism > 1:
+    with Pool(FLAGS.parallelism, initializer, initargs) as pool:
+      yield pool
   else:
-    LOG.error("Unknown input_form. Needs to be 'binary', 'text', or 'json'.")
-  LOG.info('Read %s sequences', len(data_set.sequences))
+    if initializer is not None:
+      initializer(*initargs)
+    yield None
+
+
+def map_tasks(pool, function, tasks):
+  """Returns the list of function applied to each task.
+
+  The tasks run on pool, or serially if pool is None.
+  """
+  if pool is None:
+    return [function(task) for task in tasks]
+  return pool.map(function, tasks)
+
+
+def simulate(sequences, first_index=0, pool=None):
+  """Simulates a list of serialized sequences.
+
+  Returns the merged SimulationResults, failed indices are relative to
+  sequences. Per sequence results are written to RESULT_MATRIX, starting
+  at column first_index. If pool is set the simulations run on it.
+  """
+  segmented_sequences, segment_size = segment_sequences(sequences,
+                                                        FLAGS.parallelism * 2)
+  segments = [(first_index + segment_no * segment_size, segment)
+              for segment_no, segment in enumerate(segmented_sequences)]
+
+  LOG.info("Running simulations on %s sequences.", len(sequences))
+  if pool is None:
+    with worker_pool() as new_pool:
+      return merge_results(map_tasks(new_pool, do_analysis, segments),
+                           segment_size)
+  return merge_results(map_tasks(pool, do_analysis, segments), segment_size)
+
+
+def simulate_progressively(sequences):
+  """Simulates batches of sequences until the relative costs are precise enough.
+
+  sequences should be in a random order, the first sequences_simulated of
+  them are simulated. Returns a tuple of the merged SimulationResults
+  (failed indices are relative to sequences), sequences_simulated and a
+  SamplingProto with the estimates of relative cost.
+  """
+  method_names = [method.name() for method in PFE_METHODS]
+  if FLAGS.sampling_baseline not in method_names:
+    raise app.UsageError("--sampling_baseline %s isn't simulated." %
+                         FLAGS.sampling_baseline)
+  options = progressive_sampling.SamplingOptions(FLAGS.sampling_baseline,
+                                                 FLAGS.sampling_confidence,
+                                                 FLAGS.sampling_interval,
+                                                 FLAGS.sampling_seed)
+
+  start_time = time.monotonic()
+  batch_results = []
+  failed = set()
+  estimates = []
+  sequences_simulated = 0
+  stop_reason = progressive_sampling.STOP_EXHAUSTED
+  with worker_pool() as pool:
+    while sequences_simulated < len(sequences):
+      batch_start_time = time.monotonic()
+      batch = sequences[sequences_simulated:sequences_simulated +
+                        FLAGS.sampling_batch_size]
+      results = simulate(batch, sequences_simulated, pool)
+      batch_results.append(results)
+      failed.update(sequences_simulated + idx for idx in results.failed_indices)
+      sequences_simulated += len(batch)
+
+      estimates = progressive_sampling.relative_costs(
+          RESULT_MATRIX, method_names,
+          [idx for idx in range(sequences_simulated) if idx not in failed],
+          options)
+      LOG.info("Sampled %s of %s sequences, widest interval is %.4f.",
+               sequences_simulated, len(sequences),
+               progressive_sampling.widest_interval(estimates))
+      if progressive_sampling.converged(estimates, FLAGS.sampling_target_width):
+        stop_reason = progressive_sampling.STOP_CONVERGED
+        break
+
+      now = time.monotonic()
+      if (FLAGS.sampling_time_budget_s and
+          sequences_simulated < len(sequences) and
+          now - start_time + now - batch_start_time
+          > FLAGS.sampling_time_budget_s):
+        stop_reason = progressive_sampling.STOP_TIME_BUDGET
+        break
+
+  LOG.info("Progressive sampling stopped (%s) after %s of %s sequences.",
+           stop_reason, sequences_simulated, len(sequences))
+  sampling_proto = progressive_sampling.to_proto(estimates, options,
+                                                 sequences_simulated,
+                                                 len(sequences), stop_reason)
+  return (merge_results(batch_results, FLAGS.sampling_batch_size),
+          sequences_simulated, sampling_proto)
+
+
+def start_analysis(skip_sequence_ids=None):
+  """Read input data and start up the analysis.
+
+  Sequences whose id is in skip_sequence_ids aren't simulated.
+  """
+  global RESULT_MATRIX  # pylint: disable=global-statement
+  data_set = read_input_data(FLAGS.input_data, FLAGS.input_form)
 
   if data_set.logged_method_name:
     PFE_METHODS.append(logged_pfe_method.for_name(data_set.logged_method_name))
+  METHOD_OVERRIDES[:] = method_override.create_method_overrides(
+      flag_method_overrides(), PFE_METHODS,
+      (FONT_DIRECTORY, FONT_MANIFEST, FONT_PACK),
+      lambda path: read_input_data(path, FLAGS.input_form),
+      method_override.FontFiles())
 
   LOG.info("Preparing input data.")
+  kept_sequences = [
+      sequence for sequence in data_set.sequences
+      if languages.should_keep(sequence.language)
+  ]
+  if skip_sequence_ids:
+    new_sequences = [
+        sequence for sequence in kept_sequences
+        if sequence.id not in skip_sequence_ids
+    ]
+    LOG.info("Skipping %s sequences which already have results.",
+             len(kept_sequences) - len(new_sequences))
+    kept_sequences = new_sequences
+  failures = method_override.missing_sequences(METHOD_OVERRIDES, kept_sequences)
+  if FLAGS.preflight:
+    for idx, reason in run_preflight(kept_sequences).items():
+      failures.setdefault(idx, reason)
+  sequence_indices = [
+      idx for idx in range(len(kept_sequences)) if idx not in failures
+  ]
+  if FLAGS.progressive_sampling:
+    random.Random(FLAGS.sampling_seed).shuffle(sequence_indices)
+
   # the sequence proto's need to be serialized since they are being
   # sent to another process.
   sequences = [
-      sequence.SerializeToString()
-      for sequence in data_set.sequences
-      if languages.should_keep(sequence.language)
+      kept_sequences[idx].SerializeToString() for idx in sequence_indices
   ]
-  segmented_sequences, segment_size = segment_sequences(sequences,
-                                                        FLAGS.parallelism * 2)
+  RESULT_MATRIX = result_matrix.ResultMatrix.shared(
+      [method.name() for method in PFE_METHODS], NETWORK_MODELS, len(sequences))
+  sampling_proto = None
+  try:
+    if FLAGS.progressive_sampling:
+      results, sequences_simulated, sampling_proto = simulate_progressively(
+          sequences)
+    else:
+      results = simulate(sequences)
+      sequences_simulated = len(sequences)
+
+    results_proto = to_results_proto(
+        results, PFE_METHODS, RESULT_MATRIX,
+        SimulatedSequences(kept_sequences, sequence_indices, failures,
+                           sequences_simulated),
+        OutputPaths(FLAGS.failed_indices_out, FLAGS.graph_signatures_out))
+  finally:
+    RESULT_MATRIX.close()
+    RESULT_MATRIX = None
+
+  if sampling_proto is not None:
+    results_proto.sampling.CopyFrom(sampling_proto)
+  return results_proto
 
-  LOG.info("Running simulations on %s sequences.", len(sequences))
-  if FLAGS.parallelism > 1:
-    with Pool(FLAGS.parallelism) as pool:
-      results = merge_results(pool.map(do_analysis, segmented_sequences),
-                              segment_size)
-  else:
-    results = merge_results([do_analysis(s) for s in segmented_sequences],
-                            segment_size)
 
-  if results.failed_indices:
-    LOG.info("%s sequences dropped due to errors in simulation.",
-             len(results.failed_indices))
-    if FLAGS.failed_indices_out:
-      write_failed_indices(results.failed_indices)
+def to_results_proto(results, pfe_methods, matrix, sequences, outputs):
+  """Builds the AnalysisResultProto of an analysis from its SimulationResults.
 
-  LOG.info("Formatting output.")
-  results = to_protos(results.totals_by_method, cost.cost)
+  sequences are the SimulatedSequences whose results are in matrix, as
+  simulated with pfe_methods. Failed indices and graph signatures are also
+  written to outputs, an OutputPaths.
+  """
+  # Columns of matrix for the sequences which were simulated, in data set
+  # order.
+  failed = set(results.failed_indices)
+  columns = sorted(
+      (idx for idx in range(sequences.num_simulated) if idx not in failed),
+      key=lambda idx: sequences.sequence_indices[idx])
+  sequence_ids = [
+      sequences.kept_sequences[sequences.sequence_indices[idx]].id
+      for idx in columns
+  ]
 
-  results_proto = result_pb2.AnalysisResultProto()
-  for method_result in results:
-    results_proto.results.append(method_result)
+  failed_indices = combine_failed_indices(sequences.failures,
+                                          sequences.sequence_indices,
+                                          results.failed_indices)
+  if failed_indices:
+    LOG.info("%s sequences dropped due to errors.", len(failed_indices))
+    if outputs.failed_indices_out:
+      write_failed_indices(failed_indices, outputs.failed_indices_out)
 
+  if outputs.graph_signatures_out:
+    LOG.info("Writing graph signatures.")
+    write_graph_signatures(results.signatures_by_method or dict(), pfe_methods,
+                           outputs.graph_signatures_out)
+
+  LOG.info("Formatting output.")
+  results_proto = result_pb2.AnalysisResultProto()
+  results_proto.results.extend(
+      to_protos(results.totals_by_method, matrix, columns, sequence_ids))
   return results_proto
 
 
+def create_result_cache(font_directories, default_font_id):
+  """Creates the ResultCache of an analysis using the fonts in font_directories."""
+  return result_cache.ResultCache(
+      FLAGS.result_cache, "\n".join([result_cache.code_version()] + [
+          result_cache.font_library_fingerprint(font_directory, default_font_id)
+          for font_directory in sorted(set(font_directories))
+      ] + [FLAGS.result_cache_salt]))
+
+
 def install_flags():
-  global FONT_DIRECTORY, DEFAULT_FONT_ID  # pylint: disable=global-statement
+  """Copies the flags the simulation uses into globals."""
+  global FONT_DIRECTORY, DEFAULT_FONT_ID, FONT_MANIFEST, FONT_PACK  # pylint: disable=global-statement
+  global DISTRIBUTIONS, RECORD_SIGNATURES, NETWORK_MODELS, RESULT_CACHE  # pylint: disable=global-statement
   FONT_DIRECTORY = FLAGS.font_directory
   DEFAULT_FONT_ID = FLAGS.default_font_id
+  DISTRIBUTIONS = aggregation.parse_distributions(FLAGS.distributions)
+  RECORD_SIGNATURES = bool(FLAGS.graph_signatures_out)
+  if FLAGS.network_models_config:
+    NETWORK_MODELS = network_models.load(FLAGS.network_models_config)
+    LOG.info("Loaded %s network models.", len(NETWORK_MODELS))
+  if FLAGS.font_manifest:
+    LOG.info("Loading font manifest ...")
+    FONT_MANIFEST = font_manifest.load(FLAGS.font_manifest)
+  if FLAGS.font_pack:
+    # Mapped before the worker pool is forked so every worker shares it.
+    FONT_PACK = font_pack.FontPack(FLAGS.font_pack)
+  if FLAGS.result_cache and not FLAGS.manifest:
+    # Jobs of a batch analysis each have their own, see create_job.
+    RESULT_CACHE = create_result_cache([FONT_DIRECTORY] + [
+        override.font_directory
+        for override in flag_method_overrides()
+        if override.font_directory
+    ], DEFAULT_FONT_ID)
+
+
+def method_set():
+  """Returns the batch_manifest method set selected by the flags."""
+  if FLAGS.simulate_all_methods:
+    if FLAGS.simulate_range_request or FLAGS.simulate_patch_subset:
+      LOG.error("--simulate_all_methods may not be used with "
+                "--simulate_range_request or --simulate_patch_subset")
+    return batch_manifest.ALL_METHODS
+  if FLAGS.simulate_range_request:
+    if FLAGS.simulate_patch_subset:
+      LOG.error(
+          "--simulate_range_request may not be used with --simulate_patch_subset"
+      )
+    return batch_manifest.RANGE_REQUEST
+  if FLAGS.simulate_patch_subset:
+    return batch_manifest.PATCH_SUBSET
+  return batch_manifest.DEFAULT_METHODS
+
+
+def create_methods(a_method_set, script_category):
+  """Returns the list of PFE methods of a batch_manifest method set."""
+  if a_method_set == batch_manifest.PATCH_SUBSET:
+    # Only do patch subset.
+    return [
+        combined_patch_subset_method.CombinedPatchSubsetMethod(script_category)
+    ]
+
+  methods = []
+  if a_method_set in [
+      batch_manifest.DEFAULT_METHODS, batch_manifest.ALL_METHODS
+  ]:
+    # Do all the non-range-request methods.
+    methods.extend([
+        optimal_pfe_method,
+        optimal_one_font_method,
+        unicode_range_pfe_method,
+        whole_font_pfe_method,
+        combined_patch_subset_method.CombinedPatchSubsetMethod(script_category),
+    ])
+
+  if a_method_set in [batch_manifest.RANGE_REQUEST, batch_manifest.ALL_METHODS]:
+    # RangeRequest requires a modified version of the data set and font
+    # library. Alongside the other methods they're given with
+    # --method_font_directory and --method_input_data.
+    multipart_settings = [False]
+    if FLAGS.range_request_multipart:
+      multipart_settings.append(True)
+    methods.extend([
+        range_request_pfe_method.RangeRequestMethod(
+            estimate_compressed_sizes=FLAGS.range_request_estimate_sizes,
+            compression_model=compression.for_name(model_name),
+            multipart=multipart,
+            max_ranges_per_request=FLAGS.range_request_max_ranges_per_request)
+        for model_name in FLAGS.range_request_compression
+        for multipart in multipart_settings
+    ])
+  return methods
 
 
 def main(argv):
@@ -392,37 +819,24 @@ def main(argv):
   # flag values in globals.
   install_flags()
 
-  if not FLAGS.simulate_range_request:
-    if FLAGS.simulate_patch_subset:
-      # Only do patch subset.
-      PFE_METHODS.extend([
-          combined_patch_subset_method.CombinedPatchSubsetMethod(
-              FLAGS.script_category)
-      ])
-    else:
-      # Do all the non-range-request methods.
-      PFE_METHODS.extend([
-          optimal_pfe_method,
-          optimal_one_font_method,
-          unicode_range_pfe_method,
-          whole_font_pfe_method,
-          combined_patch_subset_method.CombinedPatchSubsetMethod(
-              FLAGS.script_category),
-      ])
+  if FLAGS.manifest:
+    if FLAGS.append_to or FLAGS.progressive_sampling:
+      raise app.UsageError(
+          "--append_to and --progressive_sampling can't be used with "
+          "--manifest.")
+    batch_analysis.run_batch(batch_manifest.load(FLAGS.manifest),
+                             sys.modules[__name__])
+    return
+
+  PFE_METHODS.extend(create_methods(method_set(), FLAGS.script_category))
+
+  if FLAGS.append_to:
+    existing_results = read_results(FLAGS.append_to)
+    results_proto = result_append.append(
+        existing_results,
+        start_analysis(set(result_append.sequence_ids(existing_results))))
   else:
-    # Just do RangeRequest.
-    if FLAGS.simulate_patch_subset:
-      LOG.error(
-          "--simulate_range_request may not be used with --simulate_patch_subset"
-      )
-    # RangeRequest requires a modified version of the data set
-    # and font library. Thus it must be simulated separately from
-    # all of the other methods.
-    PFE_METHODS.extend([
-        range_request_pfe_method,
-    ])
-
-  results_proto = start_analysis()
+    results_proto = start_analysis()
 
   if FLAGS.output_binary:
     sys.stdout.buffer.write(results_proto.SerializeToString())
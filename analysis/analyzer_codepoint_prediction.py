@@ -2,8 +2,18 @@
 
 Prints out the cost for running with codepoint prediction and a comparison
 of the number of bytes transferred.
+
+--max_codepoints and --freq_threshold each accept a list of values, and
+--network_model a list of network models. In that case every combination
+of prediction parameters is simulated in a single analysis, over the same
+sequences, and a csv table with a row for every combination and network
+model is printed:
+
+max_codepoints,freq_threshold,network_model,cost,bytes_ratio
 """
 
+import collections
+import itertools
 import logging
 
 from absl import app
@@ -15,15 +25,108 @@ from patch_subset.py import patch_subset_method
 LOG = logging.getLogger("analyzer")
 
 FLAGS = flags.FLAGS
-flags.DEFINE_integer("max_codepoints", 100,
-                     "Maximum number of codepoints the predictor can return.")
+flags.DEFINE_list(
+    "max_codepoints", ["100"],
+    "Maximum number of codepoints the predictor can return. A list of values "
+    "may be given to sweep over them.")
+
+flags.DEFINE_list(
+    "freq_threshold", ["0.1"],
+    "Minimum frequency for a codepoint to be add to the predicted set. A list "
+    "of values may be given to sweep over them.")
+
+flags.DEFINE_list(
+    "network_model", ["DESKTOP_FASTEST"],
+    "Name of the network model to use in the simulation, or a list of names. "
+    "ALL uses every network model.")
+
+# Codepoint prediction parameters.
+PredictionConfig = collections.namedtuple("PredictionConfig",
+                                          ["max_codepoints", "freq_threshold"])
+
+SweepResult = collections.namedtuple("SweepResult", [
+    "max_codepoints", "freq_threshold", "network_model_name", "cost",
+    "bytes_ratio"
+])
+
+CSV_HEADER = "max_codepoints,freq_threshold,network_model,cost,bytes_ratio"
+
+
+def config_grid(max_codepoints, freq_thresholds):
+  """Returns a PredictionConfig for every combination of the given values."""
+  return [
+      PredictionConfig(int(max_codepoint), float(freq_threshold))
+      for max_codepoint, freq_threshold in itertools.product(
+          max_codepoints, freq_thresholds)
+  ]
 
-flags.DEFINE_float(
-    "freq_threshold", 0.1,
-    "Minimum frequency for a codepoint to be add to the predicted set.")
 
-flags.DEFINE_string("network_model", "DESKTOP_FASTEST",
-                    "Name of the network model to use in the simulation.")
+def select_network_models(names):
+  if "ALL" in names:
+    return list(network_models.ALL_MODELS)
+  return [getattr(network_models, name) for name in names]
+
+
+def prediction_method(config):
+  return patch_subset_method.create_with_codepoint_prediction(
+      config.max_codepoints, config.freq_threshold)
+
+
+def simulate_configs(configs, models):
+  """Simulates every config on models, returns a list of SweepResult's.
+
+  Patch subset without prediction is simulated alongside as the baseline
+  the bytes of each config are compared against.
+  """
+  baseline = patch_subset_method.create_with_codepoint_remapping()
+  methods = {baseline.name(): baseline}
+  method_names = dict()
+  for config in configs:
+    # Configs which don't predict anything are the same as the baseline,
+    # each method must only be simulated once.
+    method = prediction_method(config)
+    methods.setdefault(method.name(), method)
+    method_names[config] = method.name()
+
+  analyzer.PFE_METHODS = list(methods.values())
+  analyzer.NETWORK_MODELS = models
+  return sweep_results(analyzer.start_analysis(), baseline.name(), method_names)
+
+
+def sweep_results(results_proto, baseline_method_name, method_names):
+  """Builds the SweepResult's of an analysis.
+
+  method_names is a dict of PredictionConfig => name of the method that was
+  simulated with it. Results are in the order of method_names, then in the
+  order of the network results.
+  """
+  results_by_method = {
+      method_result.method_name: method_result
+      for method_result in results_proto.results
+  }
+  baseline = results_by_method[baseline_method_name]
+  baseline_bytes = {
+      net_result.network_model_name:
+          net_result.total_request_bytes + net_result.total_response_bytes
+      for net_result in baseline.results_by_network
+  }
+
+  results = []
+  for config, method_name in method_names.items():
+    for net_result in results_by_method[method_name].results_by_network:
+      prediction_bytes = (net_result.total_request_bytes +
+                          net_result.total_response_bytes)
+      bytes_ratio = (prediction_bytes /
+                     baseline_bytes[net_result.network_model_name])
+      results.append(
+          SweepResult(config.max_codepoints, config.freq_threshold,
+                      net_result.network_model_name, net_result.total_cost,
+                      bytes_ratio))
+  return results
+
+
+def to_csv_row(result):
+  return "%s,%s,%s,%s,%s" % result
 
 
 def main(argv):
@@ -32,31 +135,19 @@ def main(argv):
 
   analyzer.install_flags()
 
-  analyzer.PFE_METHODS = [
-      patch_subset_method.create_with_codepoint_remapping(),
-      patch_subset_method.create_with_codepoint_prediction(
-          FLAGS.max_codepoints, FLAGS.freq_threshold),
-  ]
-
-  analyzer.NETWORK_MODELS = [
-      getattr(network_models, FLAGS.network_model),
-  ]
-
-  results_proto = analyzer.start_analysis()
-
-  for method_result in results_proto.results:
-    net_result = method_result.results_by_network[0]
-
-    if "Prediction" not in method_result.method_name:
-      optimal_bytes = (net_result.total_request_bytes +
-                       net_result.total_response_bytes)
-      continue
+  configs = config_grid(FLAGS.max_codepoints, FLAGS.freq_threshold)
+  models = select_network_models(FLAGS.network_model)
+  LOG.info("Simulating %s prediction configs on %s network models.",
+           len(configs), len(models))
+  results = simulate_configs(configs, models)
 
-    prediction_bytes = (net_result.total_request_bytes +
-                        net_result.total_response_bytes)
-    prediction_cost = net_result.total_cost
+  if len(results) == 1:
+    print("%s,%s" % (results[0].cost, results[0].bytes_ratio))
+    return
 
-  print("%s,%s" % (prediction_cost, prediction_bytes / optimal_bytes))
+  print(CSV_HEADER)
+  for result in results:
+    print(to_csv_row(result))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,80 @@
+"""Unit tests for the analyzer_codepoint_prediction module."""
+
+import unittest
+from analysis import analyzer_codepoint_prediction
+from analysis import network_models
+from analysis import result_pb2
+
+PredictionConfig = analyzer_codepoint_prediction.PredictionConfig
+SweepResult = analyzer_codepoint_prediction.SweepResult
+
+
+def method_result(method_name, bytes_by_network):
+  """Returns a MethodResultProto with the given total bytes per network."""
+  proto = result_pb2.MethodResultProto()
+  proto.method_name = method_name
+  for network_model_name, (total_bytes, total_cost) in bytes_by_network:
+    net_result = proto.results_by_network.add()
+    net_result.network_model_name = network_model_name
+    net_result.total_request_bytes = total_bytes // 4
+    net_result.total_response_bytes = total_bytes - total_bytes // 4
+    net_result.total_cost = total_cost
+  return proto
+
+
+class AnalyzerCodepointPredictionTest(unittest.TestCase):
+
+  def test_config_grid(self):
+    self.assertEqual(
+        analyzer_codepoint_prediction.config_grid(["10", "20"],
+                                                  ["0.1", "0.5", "1"]), [
+                                                      PredictionConfig(10, 0.1),
+                                                      PredictionConfig(10, 0.5),
+                                                      PredictionConfig(10, 1.0),
+                                                      PredictionConfig(20, 0.1),
+                                                      PredictionConfig(20, 0.5),
+                                                      PredictionConfig(20, 1.0),
+                                                  ])
+
+  def test_select_network_models(self):
+    self.assertEqual(
+        analyzer_codepoint_prediction.select_network_models(
+            ["DESKTOP_FASTEST", "MOBILE_3G_SLOW"]),
+        [network_models.DESKTOP_FASTEST, network_models.MOBILE_3G_SLOW])
+    self.assertEqual(
+        analyzer_codepoint_prediction.select_network_models(["ALL"]),
+        network_models.ALL_MODELS)
+
+  def test_sweep_results(self):
+    results_proto = result_pb2.AnalysisResultProto()
+    results_proto.results.extend([
+        method_result("Baseline", [("fast", (1000, 50)), ("slow", (2000, 90))]),
+        method_result("Prediction_A", [("fast", (500, 40)),
+                                       ("slow", (3000, 80))]),
+        method_result("Prediction_B", [("fast", (1500, 45)),
+                                       ("slow", (1000, 85))]),
+    ])
+
+    self.assertEqual(
+        analyzer_codepoint_prediction.sweep_results(
+            results_proto, "Baseline", {
+                PredictionConfig(5, 0.5): "Prediction_B",
+                PredictionConfig(10, 0.1): "Prediction_A",
+                PredictionConfig(0, 0.1): "Baseline",
+            }), [
+                SweepResult(5, 0.5, "fast", 45, 1.5),
+                SweepResult(5, 0.5, "slow", 85, 0.5),
+                SweepResult(10, 0.1, "fast", 40, 0.5),
+                SweepResult(10, 0.1, "slow", 80, 1.5),
+                SweepResult(0, 0.1, "fast", 50, 1.0),
+                SweepResult(0, 0.1, "slow", 90, 1.0),
+            ])
+
+  def test_to_csv_row(self):
+    self.assertEqual(
+        analyzer_codepoint_prediction.to_csv_row(
+            SweepResult(5, 0.5, "fast", 45.5, 1.25)), "5,0.5,fast,45.5,1.25")
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,159 +1,79 @@
 """Unit tests for the analyzer module."""
 
 import unittest
+from analysis import aggregation
 from analysis import analyzer
-from analysis import result_pb2
+from analysis import network_models
+from analysis import result_matrix
 from analysis import simulation
 
 
-def mock_cost(total_time_ms):
-  return total_time_ms / 10
+def mock_cost(times_ms):
+  return [time_ms / 10 for time_ms in times_ms]
 
 
-def sr(values, failed_indices=None):  # pylint: disable=invalid-name
+def sr(values, failed_indices=None, signatures=None):  # pylint: disable=invalid-name
   if failed_indices is None:
     failed_indices = []
-  return simulation.SimulationResults(values, failed_indices)
+  return simulation.SimulationResults(values, failed_indices, signatures)
 
 
-def s(values):  # pylint: disable=invalid-name
-  return simulation.SequenceTotals(values, 42)
+def a(*network_names):  # pylint: disable=invalid-name
+  result = aggregation.MethodAggregate()
+  for network_name in network_names:
+    result.networks[network_name] = aggregation.NetworkAggregate()
+  return result
 
 
-def g(time, request, response):  # pylint: disable=invalid-name
-  return simulation.GraphTotal(time, request, response, 0)
+def networks(results):
+  """Returns the networks aggregated for each method of results."""
+  return simulation.SimulationResults(
+      {
+          method_name: sorted(aggregate.networks)
+          for method_name, aggregate in results.totals_by_method.items()
+      }, results.failed_indices)
 
 
 class AnalyzerTest(unittest.TestCase):
 
-  def test_to_network_category_protos(self):
-    cost_function = lambda cost: cost * 2
-    network_totals = {
-        "desktop_slowest": [
-            s([
-                g(100, 200, 300),
-                g(200, 300, 400),
-                g(300, 400, 500),
-            ]),
-            s([
-                g(200, 300, 400),
-                g(300, 400, 500),
-            ]),
-        ],
-        "desktop_median": [
-            s([
-                g(10, 20, 30),
-                g(20, 30, 40),
-            ]),
-            s([
-                g(30, 40, 50),
-            ]),
-        ],
-        "mobile_wifi_slowest": [
-            s([g(1, 2, 3)]),
-            s([g(4, 5, 6)]),
-        ]
+  def test_to_protos(self):
+    # Content of each MethodResultProto is covered in detail by
+    # aggregation_test.test_to_proto, this checks that to_protos picks out
+    # the requested columns for every method.
+    models = [network_models.DESKTOP_MEDIAN]
+    matrix = result_matrix.ResultMatrix(["abc", "def"], models, 3)
+    # Out of order, to_protos sorts by method name.
+    aggregates = {
+        "def": aggregation.MethodAggregate(),
+        "abc": aggregation.MethodAggregate(),
     }
-
-    result = analyzer.to_network_category_protos(network_totals, cost_function)
-
-    self.assertEqual(len(result), 2)
-    self.assertEqual(result[0].network_category, "desktop")
-    self.assertEqual(len(result[0].cost_per_sequence), 2)
-    self.assertEqual(len(result[0].bytes_per_sequence), 2)
-
-    self.assertEqual(result[1].network_category, "wifi")
-    self.assertEqual(len(result[1].cost_per_sequence), 2)
-    self.assertEqual(len(result[1].bytes_per_sequence), 2)
-
-    # s0:
-    #  cost =   0.05 * 2 * (100 + 200 + 300)
-    #         + 0.50 * 2 * (10 + 20)
-    #  bytes =  0.05 * (200 + 300 + 300 + 400 + 400 + 500)
-    #         + 0.50 * (20 + 30 + 30 + 40)
-    self.assertEqual(result[0].cost_per_sequence[0], 90)
-    self.assertEqual(result[0].bytes_per_sequence[0], 165)
-
-    # s1:
-    #  cost =   0.05 * 2 * (200 + 300)
-    #         + 0.50 * 2 * (30)
-    #  bytes =  0.05 * (300 + 400 + 400 + 500)
-    #         + 0.50 * (40 + 50)
-    self.assertEqual(result[0].cost_per_sequence[1], 80)
-    self.assertEqual(result[0].bytes_per_sequence[1], 125)
-
-  def test_result_to_protos(self):
-    self.maxDiff = None  # pylint: disable=invalid-name
-    method_proto = result_pb2.MethodResultProto()
-    method_proto.method_name = "Fake_PFE"
-
-    network_category_proto = result_pb2.NetworkCategoryResultProto()
-    network_category_proto.network_category = "2G"
-    network_category_proto.cost_per_sequence.extend([210.0, 0.0])
-    network_category_proto.bytes_per_sequence.extend([3000.0, 0.0])
-    network_category_proto.sequence_ids.append(42)
-    method_proto.results_by_network_category.append(network_category_proto)
-
-    network_category_proto = result_pb2.NetworkCategoryResultProto()
-    network_category_proto.network_category = "desktop"
-    network_category_proto.cost_per_sequence.extend([10.0, 10.0])
-    network_category_proto.bytes_per_sequence.extend([1500.0, 1500.0])
-    network_category_proto.sequence_ids.extend([42, 43])
-    method_proto.results_by_network_category.append(network_category_proto)
-
-    network_proto = result_pb2.NetworkResultProto()
-    network_proto.network_model_name = "desktop_median"
-    network_proto.total_cost = 40
-    network_proto.total_wait_time_ms = 400
-    network_proto.wait_per_page_view_ms.buckets.add(end=200)
-    network_proto.wait_per_page_view_ms.buckets.add(end=205, count=2)
-    network_proto.cost_per_page_view.buckets.add(end=20)
-    network_proto.cost_per_page_view.buckets.add(end=25, count=2)
-    network_proto.request_bytes_per_page_view.buckets.add(end=1000)
-    network_proto.request_bytes_per_page_view.buckets.add(end=1005, count=2)
-    network_proto.response_bytes_per_page_view.buckets.add(end=2000)
-    network_proto.response_bytes_per_page_view.buckets.add(end=2005, count=2)
-    network_proto.total_request_bytes = 2000
-    network_proto.total_response_bytes = 4000
-    network_proto.total_request_count = 12
-    method_proto.results_by_network.append(network_proto)
-
-    network_proto = result_pb2.NetworkResultProto()
-    network_proto.network_model_name = "mobile_2g_median"
-    network_proto.total_cost = 420
-    network_proto.total_wait_time_ms = 4200
-    network_proto.wait_per_page_view_ms.buckets.add(end=2100)
-    network_proto.wait_per_page_view_ms.buckets.add(end=2105, count=2)
-    network_proto.cost_per_page_view.buckets.add(end=210)
-    network_proto.cost_per_page_view.buckets.add(end=215, count=2)
-    network_proto.request_bytes_per_page_view.buckets.add(end=1000)
-    network_proto.request_bytes_per_page_view.buckets.add(end=1005, count=2)
-    network_proto.response_bytes_per_page_view.buckets.add(end=2000)
-    network_proto.response_bytes_per_page_view.buckets.add(end=2005, count=2)
-    network_proto.total_request_bytes = 2000
-    network_proto.total_response_bytes = 4000
-    network_proto.total_request_count = 12
-    method_proto.results_by_network.append(network_proto)
-
-    self.assertEqual(
-        analyzer.to_protos(
-            {
-                "Fake_PFE": {
-                    "mobile_2g_median": [
-                        simulation.SequenceTotals([
-                            simulation.GraphTotal(2100, 1000, 2000, 5),
-                            simulation.GraphTotal(2100, 1000, 2000, 7)
-                        ], 42),
-                    ],
-                    "desktop_median": [
-                        simulation.SequenceTotals([
-                            simulation.GraphTotal(200, 1000, 2000, 5),
-                        ], 42),
-                        simulation.SequenceTotals(
-                            [simulation.GraphTotal(200, 1000, 2000, 7)], 43),
-                    ]
-                }
-            }, mock_cost), [method_proto])
+    for idx in range(3):
+      for scale, method_name in [(1, "abc"), (2, "def")]:
+        totals = [simulation.GraphTotal(scale * 100 * (idx + 1), 10, 20, 1)]
+        aggregates[method_name].add_sequence(matrix.column(method_name, idx),
+                                             {"desktop_median": totals}, models,
+                                             mock_cost)
+
+    protos = analyzer.to_protos(aggregates, matrix, [2, 0], [42, 40])
+
+    self.assertEqual([proto.method_name for proto in protos], ["abc", "def"])
+    for proto, scale in zip(protos, [1, 2]):
+      category = proto.results_by_network_category[0]
+      self.assertEqual(category.network_category, "desktop")
+      self.assertEqual(category.sequence_ids, [42, 40])
+      # Desktop median has a weight of 0.5.
+      self.assertEqual(category.cost_per_sequence,
+                       [0.5 * scale * 30, 0.5 * scale * 10])
+      self.assertEqual(category.bytes_per_sequence, [15, 15])
+
+      network = proto.results_by_network[0]
+      self.assertEqual(network.network_model_name, "desktop_median")
+      self.assertEqual(network.total_wait_time_ms, scale * 400)
+      self.assertEqual(network.total_cost, scale * 40)
+      self.assertEqual(network.total_request_bytes, 20)
+      self.assertEqual(network.total_response_bytes, 40)
+      self.assertEqual(network.total_request_count, 2)
+    matrix.close()
 
   def test_segment_sequences(self):
     self.assertEqual(([], 1), analyzer.segment_sequences([], 3))
@@ -173,91 +93,62 @@ class AnalyzerTest(unittest.TestCase):
     self.assertEqual(analyzer.merge_results([], 10),
                      simulation.SimulationResults(dict(), []))
     self.assertEqual(
-        analyzer.merge_results([sr({"abc": {
-            "def": [1]
-        }}, [13])], 10),
-        # Expected
-        sr({"abc": {
-            "def": [1]
-        }}, [13]))
+        networks(analyzer.merge_results([sr({"abc": a("n1")}, [13])], 10)),
+        sr({"abc": ["n1"]}, [13]))
 
     self.assertEqual(
-        analyzer.merge_results([
-            sr({"abc": {
-                "def": [1]
-            }}, [11]),
-            sr({}, [13]),
-        ], 10),
-        # Expected
-        sr({"abc": {
-            "def": [1]
-        }}, [11, 23]))
+        networks(
+            analyzer.merge_results([
+                sr({"abc": a("n1")}, [11]),
+                sr({}, [13]),
+            ], 10)), sr({"abc": ["n1"]}, [11, 23]))
 
     self.assertEqual(
-        analyzer.merge_results([
-            sr({"abc": {
-                "jkl": [1]
-            }}),
-            sr({"def": {
-                "ghi": [2]
-            }}),
-        ], 10), sr({
-            "abc": {
-                "jkl": [1]
-            },
-            "def": {
-                "ghi": [2]
-            }
-        }))
+        networks(
+            analyzer.merge_results([
+                sr({"abc": a("n1")}),
+                sr({"def": a("n2")}),
+            ], 10)), sr({
+                "abc": ["n1"],
+                "def": ["n2"],
+            }))
 
     self.assertEqual(
-        analyzer.merge_results([
-            sr({"abc": {
-                "jkl": [1]
-            }}),
-            sr({"abc": {
-                "jkl": [2]
-            }}),
-        ], 10), sr({
-            "abc": {
-                "jkl": [1, 2]
-            },
-        }))
-
-    self.assertEqual(
-        analyzer.merge_results([
-            sr({"abc": {
-                "jkl": [1]
-            }}),
-            sr({"abc": {
-                "jkl": [2]
-            }}),
-            sr({"mno": {
-                "jkl": [3]
-            }}),
-        ], 10), sr({
-            "abc": {
-                "jkl": [1, 2]
-            },
-            "mno": {
-                "jkl": [3]
-            },
-        }))
-
+        networks(
+            analyzer.merge_results([
+                sr({"abc": a("n1")}),
+                sr({"abc": a("n2", "n3")}),
+                sr({"mno": a("n4")}),
+            ], 10)), sr({
+                "abc": ["n1", "n2", "n3"],
+                "mno": ["n4"],
+            }))
+
+  def test_merge_results_signatures(self):
+    merged = analyzer.merge_results([
+        sr({"abc": a("n1")}, [], {"abc": [1, 2]}),
+        sr({}, [0], {}),
+        sr({
+            "abc": a("n1"),
+            "def": a("n1")
+        }, [], {
+            "abc": [3],
+            "def": [4]
+        }),
+    ], 10)
+    self.assertEqual(merged.signatures_by_method, {
+        "abc": [1, 2, 3],
+        "def": [4]
+    })
+    self.assertEqual(merged.failed_indices, [10])
+
+  def test_combine_failed_indices(self):
+    self.assertEqual(analyzer.combine_failed_indices({}, [0, 1, 2], []), [])
     self.assertEqual(
-        analyzer.merge_results([
-            sr({"abc": {
-                "jkl": [1]
-            }}),
-            sr({"abc": {
-                "mno": [2]
-            }}),
-        ], 10), sr({
-            "abc": {
-                "jkl": [1],
-                "mno": [2]
-            },
-        }))
+        analyzer.combine_failed_indices({
+            1: "FONT_NOT_FOUND",
+            4: "MISSING_CMAP"
+        }, [0, 2, 3, 5], [1, 3]), [1, 2, 4, 5])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,253 @@
+"""Runs the jobs of a batch analysis (--manifest) on one worker pool.
+
+Each job (see batch_manifest) has its own data set, fonts and methods. The
+state of every job is set up before the worker pool is created and given to
+the workers by the pool's initializer (init_worker), tasks name the job they
+belong to by its index.
+
+The analyzer is passed in to run_batch rather than imported, as it's usually
+the __main__ module. Only its functions are used, the state of the jobs is
+passed explicitly.
+"""
+
+import collections
+import logging
+
+from absl import flags
+from analysis import cost
+from analysis import font_loader
+from analysis import languages
+from analysis import method_override
+from analysis import preflight_plan
+from analysis import result_matrix
+from analysis import simulation
+from analysis.pfe_methods import logged_pfe_method
+
+LOG = logging.getLogger("analyzer")
+
+FLAGS = flags.FLAGS
+
+# The state of a job: its sequences are simulated with
+# simulation.simulate_segment(segment, pfe_methods, network_models,
+# font_directory, options), options.matrix holds its per sequence results.
+# method_overrides are the method_override.MethodOverride's of its methods.
+Job = collections.namedtuple("Job", [
+    "name", "pfe_methods", "network_models", "font_directory", "options",
+    "method_overrides"
+])
+
+# The jobs of the batch in a worker process, set by 'init_worker'.
+JOBS = []
+
+
+def create_job(job_proto, font_files, analyzer):
+  """Sets up a job of a batch analysis from its AnalysisJobProto.
+
+  Returns a tuple of the Job and the sequences of its data set which are
+  kept. font_files is a method_override.FontFiles shared by every job.
+  """
+  data_set = analyzer.read_input_data(job_proto.input_data,
+                                      job_proto.input_form)
+  methods = analyzer.create_methods(job_proto.method_set,
+                                    job_proto.script_category or None)
+  if data_set.logged_method_name:
+    methods.append(logged_pfe_method.for_name(data_set.logged_method_name))
+  kept_sequences = [
+      sequence for sequence in data_set.sequences
+      if languages.should_keep(sequence.language, job_proto.script_category)
+  ]
+
+  font_library = (job_proto.font_directory,
+                  font_files.manifest(job_proto.font_manifest),
+                  font_files.pack(job_proto.font_pack))
+  method_overrides = method_override.create_method_overrides(
+      job_proto.method_overrides, methods, font_library,
+      lambda path: analyzer.read_input_data(path, job_proto.input_form),
+      font_files)
+
+  default_font_id = job_proto.default_font_id or None
+  a_result_cache = None
+  if FLAGS.result_cache:
+    a_result_cache = analyzer.create_result_cache(
+        [job_proto.font_directory] +
+        [override.font_directory for override in method_overrides],
+        default_font_id)
+
+  # Allocated for every kept sequence since preflight runs after the worker
+  # pool is created, only the columns of sequences which pass are used.
+  matrix = result_matrix.ResultMatrix.shared(
+      [method.name() for method in methods], analyzer.NETWORK_MODELS,
+      len(kept_sequences))
+  font_directory, a_font_manifest, a_font_pack = font_library
+  options = simulation.SimulationOptions(
+      default_font_id, a_font_manifest, a_font_pack,
+      cost.costs, matrix, 0, analyzer.DISTRIBUTIONS,
+      bool(job_proto.graph_signatures_out), a_result_cache,
+      method_override.method_inputs(method_overrides, default_font_id))
+  return Job(job_proto.name, methods, analyzer.NETWORK_MODELS, font_directory,
+             options, method_overrides), kept_sequences
+
+
+def init_worker(jobs):
+  """Sets the jobs a worker process runs the tasks of, the pool initializer."""
+  global JOBS  # pylint: disable=global-statement
+  JOBS = jobs
+
+
+def job_font_loader(job):
+  """Returns a FontLoader for the font library of a job."""
+  return font_loader.FontLoader(job.font_directory, job.options.default_font_id,
+                                job.options.font_manifest,
+                                job.options.font_pack)
+
+
+def check_job_font(task):
+  """Runs preflight_plan.check_font for a job.
+
+  task is a tuple of (job index, preflight task).
+  """
+  job_index, font_task = task
+  job = JOBS[job_index]
+  return preflight_plan.check_font(job.pfe_methods, job_font_loader(job),
+                                   job.method_overrides, font_task)
+
+
+def do_job_analysis(task):
+  """Simulates a segment of a job, task is a tuple of (job index, segment)."""
+  job_index, segment = task
+  job = JOBS[job_index]
+  return simulation.simulate_segment(segment, job.pfe_methods,
+                                     job.network_models, job.font_directory,
+                                     job.options)
+
+
+def select_job(tasks, values, job_index):
+  """Returns the values of the tasks of job_index, tasks are (job index, ...)."""
+  return [value for task, value in zip(tasks, values) if task[0] == job_index]
+
+
+def run_batch(job_protos, analyzer):
+  """Runs every job of a batch analysis on one worker pool.
+
+  analyzer is the analyzer module. Fonts, font manifests and packs, and the
+  caches of the worker processes are shared by all of the jobs. The results
+  of each job are written to its output.
+  """
+  jobs = []
+  try:
+    kept_sequences_by_job = create_jobs(job_protos, analyzer, jobs)
+    with analyzer.worker_pool(init_worker, (jobs,)) as pool:
+      failures_by_job = preflight_batch(analyzer, pool, jobs,
+                                        kept_sequences_by_job)
+      results_by_job, sequence_indices_by_job = dispatch_batch(
+          analyzer, pool, jobs, kept_sequences_by_job, failures_by_job)
+
+    for job_index, job_proto in enumerate(job_protos):
+      sequence_indices = sequence_indices_by_job[job_index]
+      write_job_results(
+          analyzer, jobs[job_index], job_proto, results_by_job[job_index],
+          analyzer.SimulatedSequences(kept_sequences_by_job[job_index],
+                                      sequence_indices,
+                                      failures_by_job[job_index],
+                                      len(sequence_indices)))
+  finally:
+    for job in jobs:
+      job.options.matrix.close()
+    init_worker([])
+
+
+def create_jobs(job_protos, analyzer, jobs):
+  """Sets up the Job of each of job_protos, appending them to jobs.
+
+  Returns the list of kept sequences of each job.
+  """
+  font_files = method_override.FontFiles()
+  kept_sequences_by_job = []
+  for job_proto in job_protos:
+    LOG.info("Preparing job %s.", job_proto.name)
+    job, kept_sequences = create_job(job_proto, font_files, analyzer)
+    jobs.append(job)
+    kept_sequences_by_job.append(kept_sequences)
+  return kept_sequences_by_job
+
+
+def preflight_batch(analyzer, pool, jobs, kept_sequences_by_job):
+  """Finds the sequences of each job that can't be simulated.
+
+  Returns a list with a dict of sequence index => reason code for each job.
+  The fonts of every job are checked together on pool, whose workers must
+  have been initialized with jobs.
+  """
+  failures_by_job = []
+  font_tasks = []
+  for job_index, kept_sequences in enumerate(kept_sequences_by_job):
+    job = jobs[job_index]
+    failures_by_job.append(
+        method_override.missing_sequences(job.method_overrides, kept_sequences))
+    if FLAGS.preflight:
+      font_tasks.extend((job_index, task)
+                        for task in preflight_plan.preflight_tasks(
+                            job.method_overrides, kept_sequences))
+  if not FLAGS.preflight:
+    return failures_by_job
+
+  LOG.info("Preflight checking %s fonts.", len(font_tasks))
+  reasons = analyzer.map_tasks(pool, check_job_font, font_tasks)
+  for job_index, kept_sequences in enumerate(kept_sequences_by_job):
+    job = jobs[job_index]
+    failures = preflight_plan.preflight_failures(
+        job.method_overrides, kept_sequences,
+        [task for _, task in select_job(font_tasks, font_tasks, job_index)],
+        select_job(font_tasks, reasons, job_index))
+    for idx, reason in failures.items():
+      failures_by_job[job_index].setdefault(idx, reason)
+  return failures_by_job
+
+
+def dispatch_batch(analyzer, pool, jobs, kept_sequences_by_job,
+                   failures_by_job):
+  """Simulates the sequences of every job which passed preflight on pool.
+
+  pool's workers must have been initialized with jobs. Returns a tuple of
+  the SimulationResults of each job and the indices into its kept sequences
+  of the sequences which were simulated.
+  """
+  tasks = []
+  sequence_indices_by_job = []
+  segment_sizes = []
+  for job_index, kept_sequences in enumerate(kept_sequences_by_job):
+    sequence_indices = [
+        idx for idx in range(len(kept_sequences))
+        if idx not in failures_by_job[job_index]
+    ]
+    segmented_sequences, segment_size = analyzer.segment_sequences(
+        [kept_sequences[idx].SerializeToString() for idx in sequence_indices],
+        FLAGS.parallelism * 2)
+    tasks.extend((job_index, (segment_no * segment_size, segment))
+                 for segment_no, segment in enumerate(segmented_sequences))
+    sequence_indices_by_job.append(sequence_indices)
+    segment_sizes.append(segment_size)
+
+  LOG.info("Running simulations on %s sequences of %s jobs.",
+           sum(len(indices) for indices in sequence_indices_by_job), len(jobs))
+  segment_results = analyzer.map_tasks(pool, do_job_analysis, tasks)
+  results_by_job = [
+      analyzer.merge_results(select_job(tasks, segment_results, job_index),
+                             segment_size)
+      for job_index, segment_size in enumerate(segment_sizes)
+  ]
+  return results_by_job, sequence_indices_by_job
+
+
+def write_job_results(analyzer, job, job_proto, results, sequences):
+  """Writes the results of a job to the outputs of its AnalysisJobProto.
+
+  results are the job's SimulationResults and sequences the
+  analyzer.SimulatedSequences they're for.
+  """
+  results_proto = analyzer.to_results_proto(
+      results, job.pfe_methods, job.options.matrix, sequences,
+      analyzer.OutputPaths(job_proto.failed_indices_out,
+                           job_proto.graph_signatures_out))
+  analyzer.write_results(results_proto, job_proto.output)
+  LOG.info("Wrote the results of job %s.", job_proto.name)
@@ -0,0 +1,217 @@
+"""Unit tests for the batch_analysis module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from absl import flags
+from absl.testing import flagsaver
+from google.protobuf import text_format
+from analysis import analyzer
+from analysis import batch_analysis
+from analysis import batch_manifest_pb2
+from analysis import cost
+from analysis import fake_pfe_method
+from analysis import graph_signatures_pb2
+from analysis import method_override
+from analysis import network_models
+from analysis import page_view_sequence_pb2
+from analysis import preflight
+from analysis import result_matrix
+from analysis import result_pb2
+from analysis import simulation
+
+MODELS = [network_models.DESKTOP_MEDIAN]
+
+
+def sequence(sequence_id, font_id):
+  """Returns a sequence with one page view of font_id."""
+  result = page_view_sequence_pb2.PageViewSequenceProto(id=sequence_id)
+  result.page_views.add().contents.add(font_name=font_id, codepoints=[0x61])
+  return result
+
+
+def num_requests(job):
+  """Returns the number of requests of each sequence of job."""
+  return list(
+      job.options.matrix.network_values(result_matrix.NUM_REQUESTS, "Fake_PFE",
+                                        MODELS[0].name))
+
+
+def signature_ids(results):
+  """Returns the ids of the sequences Fake_PFE has signatures of in results."""
+  return [
+      signatures.sequence_id
+      for signatures in results.signatures_by_method["Fake_PFE"]
+  ]
+
+
+class BatchAnalysisTest(unittest.TestCase):
+
+  def setUp(self):
+    flags.FLAGS.mark_as_parsed()
+    self.jobs = []
+    self.temp_dir = tempfile.mkdtemp()
+    with open(os.path.join(self.temp_dir, "a.ttf"), "wb") as font:
+      font.write(b"not a font")
+
+  def tearDown(self):
+    batch_analysis.init_worker([])
+    for job in self.jobs:
+      job.options.matrix.close()
+    shutil.rmtree(self.temp_dir)
+
+  def job(self, name, font_directory, num_sequences, method_overrides=()):
+    """Returns a Job which simulates Fake_PFE."""
+    result = batch_analysis.Job(
+        name, [fake_pfe_method], MODELS, font_directory,
+        simulation.SimulationOptions(cost_function=cost.costs,
+                                     matrix=result_matrix.ResultMatrix.shared(
+                                         ["Fake_PFE"], MODELS, num_sequences),
+                                     record_signatures=True),
+        list(method_overrides))
+    self.jobs.append(result)
+    return result
+
+  def test_select_job(self):
+    tasks = [(0, "a"), (1, "b"), (0, "c"), (2, "d")]
+    self.assertEqual(batch_analysis.select_job(tasks, [1, 2, 3, 4], 0), [1, 3])
+    self.assertEqual(batch_analysis.select_job(tasks, [1, 2, 3, 4], 1), [2])
+    self.assertEqual(batch_analysis.select_job(tasks, [1, 2, 3, 4], 3), [])
+
+  def test_do_job_analysis(self):
+    jobs = [self.job("a", "fonts", 2), self.job("b", "fonts", 2)]
+    batch_analysis.init_worker(jobs)
+
+    results = batch_analysis.do_job_analysis(
+        (1, (1, [sequence(42, "a.ttf").SerializeToString()])))
+    self.assertEqual(results.failed_indices, [])
+    self.assertEqual(list(results.totals_by_method), ["Fake_PFE"])
+    self.assertEqual(num_requests(jobs[0]), [0, 0])
+    self.assertEqual(num_requests(jobs[1]), [0, 1])
+
+  def test_check_job_font(self):
+    jobs = [
+        self.job("a", self.temp_dir, 1),
+        self.job("b", os.path.join(self.temp_dir, "missing"), 1),
+    ]
+    batch_analysis.init_worker(jobs)
+
+    self.assertEqual(batch_analysis.check_job_font((0, (None, "a.ttf"))),
+                     preflight.FONT_PARSE_ERROR)
+    self.assertEqual(batch_analysis.check_job_font((1, (None, "a.ttf"))),
+                     preflight.FONT_NOT_FOUND)
+
+  @flagsaver.flagsaver(parallelism=1)
+  def test_preflight_batch(self):
+    overrides = [
+        method_override.MethodOverride(["Other_PFE"], self.temp_dir, None, None,
+                                       {1: sequence(1, "a.ttf")})
+    ]
+    jobs = [
+        self.job("a", self.temp_dir, 2, overrides),
+        self.job("b", os.path.join(self.temp_dir, "missing"), 1),
+    ]
+    kept_sequences_by_job = [
+        [sequence(1, "a.ttf"), sequence(2, "a.ttf")],
+        [sequence(1, "a.ttf")],
+    ]
+
+    with flagsaver.flagsaver(preflight=False):
+      with analyzer.worker_pool(batch_analysis.init_worker, (jobs,)) as pool:
+        failures_by_job = batch_analysis.preflight_batch(
+            analyzer, pool, jobs, kept_sequences_by_job)
+    self.assertEqual(failures_by_job, [{1: preflight.MISSING_SEQUENCE}, {}])
+
+    with flagsaver.flagsaver(preflight=True):
+      with analyzer.worker_pool(batch_analysis.init_worker, (jobs,)) as pool:
+        failures_by_job = batch_analysis.preflight_batch(
+            analyzer, pool, jobs, kept_sequences_by_job)
+    self.assertEqual(failures_by_job, [
+        {
+            0: preflight.FONT_PARSE_ERROR,
+            1: preflight.MISSING_SEQUENCE
+        },
+        {
+            0: preflight.FONT_NOT_FOUND
+        },
+    ])
+
+  def test_dispatch_batch(self):
+    kept_sequences_by_job = [
+        [sequence(1, "a.ttf"),
+         sequence(2, "a.ttf"),
+         sequence(3, "a.ttf")],
+        [sequence(4, "a.ttf"), sequence(5, "a.ttf")],
+    ]
+    failures_by_job = [{1: preflight.FONT_NOT_FOUND}, {}]
+    for parallelism in [1, 2]:
+      jobs = [self.job("a", "fonts", 3), self.job("b", "fonts", 2)]
+      with flagsaver.flagsaver(parallelism=parallelism):
+        with analyzer.worker_pool(batch_analysis.init_worker, (jobs,)) as pool:
+          results_by_job, sequence_indices_by_job = (
+              batch_analysis.dispatch_batch(analyzer, pool, jobs,
+                                            kept_sequences_by_job,
+                                            failures_by_job))
+
+      self.assertEqual(sequence_indices_by_job, [[0, 2], [0, 1]])
+      self.assertEqual([results.failed_indices for results in results_by_job],
+                       [[], []])
+      self.assertEqual([signature_ids(results) for results in results_by_job],
+                       [[1, 3], [4, 5]])
+      # Results are written to the matrix of each job, by the worker
+      # processes if parallelism > 1.
+      self.assertEqual(num_requests(jobs[0]), [1, 1, 0])
+      self.assertEqual(num_requests(jobs[1]), [1, 1])
+
+  @flagsaver.flagsaver(parallelism=1, output_binary=False)
+  def test_write_job_results(self):
+    jobs = [self.job("a", "fonts", 3)]
+    kept_sequences = [
+        sequence(1, "a.ttf"),
+        sequence(2, "a.ttf"),
+        sequence(3, "a.ttf")
+    ]
+    failures = {1: preflight.FONT_NOT_FOUND}
+    with analyzer.worker_pool(batch_analysis.init_worker, (jobs,)) as pool:
+      results_by_job, sequence_indices_by_job = batch_analysis.dispatch_batch(
+          analyzer, pool, jobs, [kept_sequences], [failures])
+
+    job_proto = batch_manifest_pb2.AnalysisJobProto(
+        name="a",
+        output=os.path.join(self.temp_dir, "a.textproto"),
+        failed_indices_out=os.path.join(self.temp_dir, "a.failed"),
+        graph_signatures_out=os.path.join(self.temp_dir, "a.signatures"))
+    batch_analysis.write_job_results(
+        analyzer, jobs[0], job_proto, results_by_job[0],
+        analyzer.SimulatedSequences(kept_sequences, sequence_indices_by_job[0],
+                                    failures, len(sequence_indices_by_job[0])))
+
+    with open(job_proto.output, "r") as output:
+      results_proto = text_format.Parse(output.read(),
+                                        result_pb2.AnalysisResultProto())
+    self.assertEqual(
+        [method_proto.method_name for method_proto in results_proto.results],
+        ["Fake_PFE"])
+    self.assertEqual(
+        list(results_proto.results[0].results_by_network_category[0].
+             sequence_ids), [1, 3])
+
+    with open(job_proto.failed_indices_out, "r") as failed:
+      self.assertEqual(failed.read().split(), ["1"])
+
+    with open(job_proto.graph_signatures_out, "rb") as signatures:
+      signatures_proto = graph_signatures_pb2.GraphSignaturesProto.FromString(
+          signatures.read())
+    self.assertEqual(
+        [method_proto.method_name for method_proto in signatures_proto.methods],
+        ["Fake_PFE"])
+    self.assertEqual([
+        sequence_proto.sequence_id
+        for sequence_proto in signatures_proto.methods[0].sequences
+    ], [1, 3])
+
+
+if __name__ == '__main__':
+  unittest.main()
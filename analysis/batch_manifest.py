@@ -0,0 +1,116 @@
+"""Loads a manifest of analysis jobs for a batch analysis.
+
+A manifest is a textproto BatchManifestProto (see batch_manifest.proto),
+each job is the equivalent of a separate analyzer run. The analyzer runs
+every job of a manifest (--manifest) on one worker pool.
+
+Also parses method overrides (MethodOverrideProto), which give some of the
+methods of an analysis their own font library and data set.
+"""
+
+from google.protobuf import text_format
+from analysis import batch_manifest_pb2
+from analysis import languages
+
+# Method sets.
+DEFAULT_METHODS = "default"
+PATCH_SUBSET = "patch_subset"
+RANGE_REQUEST = "range_request"
+# Default and range request methods together.
+ALL_METHODS = "all"
+METHOD_SETS = [DEFAULT_METHODS, PATCH_SUBSET, RANGE_REQUEST, ALL_METHODS]
+
+INPUT_FORMS = ["text", "binary", "json"]
+
+
+def load(manifest_path):
+  """Loads the list of AnalysisJobProto's of the manifest at manifest_path."""
+  with open(manifest_path, 'r') as manifest_file:
+    manifest = text_format.Parse(manifest_file.read(),
+                                 batch_manifest_pb2.BatchManifestProto())
+  return from_proto(manifest)
+
+
+def from_proto(manifest):
+  """Returns the jobs of a BatchManifestProto with defaults filled in.
+
+  Raises ValueError if a job is invalid.
+  """
+  jobs = []
+  for job_proto in manifest.jobs:
+    job = batch_manifest_pb2.AnalysisJobProto()
+    job.CopyFrom(job_proto)
+    job.name = job.name or job.output
+    job.input_form = job.input_form or "binary"
+    job.method_set = job.method_set or DEFAULT_METHODS
+
+    for field in ["input_data", "font_directory", "output"]:
+      if not getattr(job, field):
+        raise ValueError("Job %s has no %s." % (job.name or len(jobs), field))
+    if job.input_form not in INPUT_FORMS:
+      raise ValueError("Job %s has an unknown input_form: %s" %
+                       (job.name, job.input_form))
+    if job.method_set not in METHOD_SETS:
+      raise ValueError("Job %s has an unknown method_set: %s" %
+                       (job.name, job.method_set))
+    if (job.script_category and
+        job.script_category not in languages.SCRIPT_CATEGORIES):
+      raise ValueError("Job %s has an unknown script_category: %s" %
+                       (job.name, job.script_category))
+    check_overrides(job.method_overrides)
+    jobs.append(job)
+
+  outputs = [job.output for job in jobs]
+  if len(set(outputs)) != len(outputs):
+    raise ValueError("Every job must have a different output.")
+  return jobs
+
+
+def matches(method, method_name):
+  """True if an override for method applies to the method named method_name.
+
+  Variants of a method, <method>[<settings>], are included.
+  """
+  return method_name == method or method_name.startswith(method + "[")
+
+
+def overrides_from_flags(font_directories, font_manifests, font_packs,
+                         input_data):
+  """Returns the list of MethodOverrideProto's given by flags.
+
+  Each argument is a list of "<method>=<path>" strings. Raises ValueError if
+  the overrides are invalid.
+  """
+  overrides = dict()
+  for field, specs in [("font_directory", font_directories),
+                       ("font_manifest", font_manifests),
+                       ("font_pack", font_packs), ("input_data", input_data)]:
+    for spec in specs or []:
+      method, _, path = spec.partition("=")
+      if not method or not path:
+        raise ValueError("Expected <method>=<path>, got: %s" % spec)
+      if method not in overrides:
+        overrides[method] = batch_manifest_pb2.MethodOverrideProto()
+        overrides[method].method = method
+      setattr(overrides[method], field, path)
+
+  result = list(overrides.values())
+  check_overrides(result)
+  return result
+
+
+def check_overrides(overrides):
+  """Raises ValueError if a list of MethodOverrideProto's is invalid."""
+  methods = [override.method for override in overrides]
+  if len(set(methods)) != len(methods):
+    raise ValueError("A method can only be overridden once.")
+  for override in overrides:
+    if not override.method:
+      raise ValueError("A method override has no method.")
+    if not override.font_directory and not override.input_data:
+      raise ValueError("The override for %s needs a font_directory or "
+                       "input_data." % override.method)
+    if (override.font_manifest or
+        override.font_pack) and not override.font_directory:
+      raise ValueError("The override for %s has a font manifest or pack but "
+                       "no font_directory." % override.method)
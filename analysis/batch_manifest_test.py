@@ -0,0 +1,126 @@
+"""Unit tests for the batch_manifest module."""
+
+import os
+import tempfile
+import unittest
+
+from google.protobuf import text_format
+from analysis import batch_manifest
+from analysis import batch_manifest_pb2
+
+
+def parse(manifest_text):
+  return text_format.Parse(manifest_text,
+                           batch_manifest_pb2.BatchManifestProto())
+
+
+class BatchManifestTest(unittest.TestCase):
+
+  def test_defaults(self):
+    jobs = batch_manifest.from_proto(
+        parse("""
+        jobs {
+          input_data: "latin.pb" font_directory: "fonts" output: "latin.out"
+          script_category: "latin"
+        }
+        jobs {
+          name: "range request"
+          input_data: "latin.optimized.pb" input_form: "text"
+          font_directory: "fonts.optimized" method_set: "range_request"
+          output: "latin.optimized.out"
+        }
+        """))
+
+    self.assertEqual([job.name for job in jobs], ["latin.out", "range request"])
+    self.assertEqual([job.input_form for job in jobs], ["binary", "text"])
+    self.assertEqual(
+        [job.method_set for job in jobs],
+        [batch_manifest.DEFAULT_METHODS, batch_manifest.RANGE_REQUEST])
+    self.assertEqual(jobs[0].script_category, "latin")
+
+  def test_invalid(self):
+    for manifest_text in [
+        'jobs { font_directory: "f" output: "o" }',
+        'jobs { input_data: "i" output: "o" }',
+        'jobs { input_data: "i" font_directory: "f" }',
+        'jobs { input_data: "i" font_directory: "f" output: "o" '
+        'input_form: "csv" }',
+        'jobs { input_data: "i" font_directory: "f" output: "o" '
+        'method_set: "optimal" }',
+        'jobs { input_data: "i" font_directory: "f" output: "o" '
+        'script_category: "klingon" }',
+        'jobs { input_data: "i" font_directory: "f" output: "o" } '
+        'jobs { input_data: "j" font_directory: "f" output: "o" }',
+    ]:
+      with self.assertRaises(ValueError, msg=manifest_text):
+        batch_manifest.from_proto(parse(manifest_text))
+
+  def test_method_overrides(self):
+    jobs = batch_manifest.from_proto(
+        parse("""
+        jobs {
+          input_data: "latin.pb" font_directory: "fonts" output: "latin.out"
+          method_set: "all"
+          method_overrides {
+            method: "RangeRequest" font_directory: "fonts.optimized"
+            input_data: "latin.optimized.pb"
+          }
+        }
+        """))
+    self.assertEqual(jobs[0].method_set, batch_manifest.ALL_METHODS)
+    self.assertEqual(jobs[0].method_overrides[0].font_directory,
+                     "fonts.optimized")
+
+    for overrides_text in [
+        'method_overrides { font_directory: "f" }',
+        'method_overrides { method: "RangeRequest" }',
+        'method_overrides { method: "RangeRequest" font_manifest: "m" '
+        'input_data: "i" }',
+        'method_overrides { method: "RangeRequest" font_directory: "f" } '
+        'method_overrides { method: "RangeRequest" input_data: "i" }',
+    ]:
+      manifest_text = ('jobs { input_data: "i" font_directory: "f" '
+                       'output: "o" %s }' % overrides_text)
+      with self.assertRaises(ValueError, msg=manifest_text):
+        batch_manifest.from_proto(parse(manifest_text))
+
+  def test_overrides_from_flags(self):
+    overrides = batch_manifest.overrides_from_flags(
+        ["RangeRequest=fonts.optimized", "WholeFont=fonts.other"], [],
+        ["RangeRequest=fonts.optimized.pack"],
+        ["RangeRequest=latin.optimized.pb"])
+    self.assertEqual([override.method for override in overrides],
+                     ["RangeRequest", "WholeFont"])
+    self.assertEqual(overrides[0].font_directory, "fonts.optimized")
+    self.assertEqual(overrides[0].font_pack, "fonts.optimized.pack")
+    self.assertEqual(overrides[0].input_data, "latin.optimized.pb")
+    self.assertEqual(overrides[1].input_data, "")
+
+    self.assertEqual(batch_manifest.overrides_from_flags([], [], [], []), [])
+    for font_directories in [["RangeRequest"], ["=fonts"]]:
+      with self.assertRaises(ValueError):
+        batch_manifest.overrides_from_flags(font_directories, [], [], [])
+    with self.assertRaises(ValueError):
+      batch_manifest.overrides_from_flags([], ["RangeRequest=manifest"], [], [])
+
+  def test_matches(self):
+    self.assertTrue(batch_manifest.matches("RangeRequest", "RangeRequest"))
+    self.assertTrue(
+        batch_manifest.matches("RangeRequest", "RangeRequest[brotli-11]"))
+    self.assertFalse(
+        batch_manifest.matches("RangeRequest", "RangeRequestMultipart"))
+    self.assertFalse(batch_manifest.matches("RangeRequest", "WholeFont"))
+
+  def test_load(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      path = os.path.join(temp_dir, "manifest.textproto")
+      with open(path, "w") as manifest_file:
+        manifest_file.write(
+            'jobs { input_data: "i" font_directory: "f" output: "o" }')
+      jobs = batch_manifest.load(path)
+    self.assertEqual(len(jobs), 1)
+    self.assertEqual(jobs[0].output, "o")
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,236 @@
+"""Break-even analysis of two methods from recorded graph signatures.
+
+The time a request graph takes on a network model is linear in the round
+trip time and in the inverse of the bandwidths (see
+simulation.time_for_signature):
+
+  time = levels * rtt + request_bytes / bandwidth_up
+         + response_bytes / bandwidth_down
+
+with levels, request_bytes and response_bytes summed over the page views,
+so the difference in time between two methods is too. Writing bandwidth_up
+as ratio * bandwidth_down, a method is faster than a baseline exactly when
+
+  delta_levels * rtt * bandwidth_down
+      + delta_request_bytes / ratio + delta_response_bytes < 0
+
+The frontier between the two is a constant bandwidth delay product
+(rtt * bandwidth_down, in bytes) which is solved for directly, without
+simulating again. Each sequence is reduced to its coefficients once, and
+every network model and group of sequences is evaluated from those.
+"""
+
+import collections
+
+from analysis import languages
+
+# Sums over a set of page views which determine their total time on any
+# network model.
+TimeCoefficients = collections.namedtuple(
+    "TimeCoefficients", ["levels", "request_bytes", "response_bytes"])
+
+# Break-even between a method and a baseline for a group of sequences, at
+# the bandwidth ratio of a network model. The break_even_* fields are None
+# if one of the methods is faster on every network.
+#
+# break_even_bdp: rtt * bandwidth_down (bytes) where the methods are equal.
+# break_even_rtt: rtt (ms) where the methods are equal at the network
+#                 model's bandwidth.
+# break_even_bandwidth_down: bandwidth_down (bytes/ms) where the methods are
+#                            equal at the network model's rtt.
+# time_change: total time of method relative to the baseline on the network
+#              model, minus one.
+# faster_when: one of the FASTER_* values.
+# sequences_faster: fraction of the sequences where the method is faster on
+#                   the network model.
+BreakEven = collections.namedtuple("BreakEven", [
+    "group", "network_model_name", "time_change", "break_even_bdp",
+    "break_even_rtt", "break_even_bandwidth_down", "faster_when",
+    "sequences_faster"
+])
+
+ALL_SEQUENCES = "all"
+
+FASTER_ALWAYS = "always"
+FASTER_NEVER = "never"
+FASTER_ABOVE = "above break-even"
+FASTER_BELOW = "below break-even"
+
+ZERO = TimeCoefficients(0, 0, 0)
+
+
+def coefficients_for(page_views):
+  """Returns the TimeCoefficients of a list of GraphSignatureProto's."""
+  return TimeCoefficients(
+      sum(len(page_view.level_request_bytes) for page_view in page_views),
+      sum(sum(page_view.level_request_bytes) for page_view in page_views),
+      sum(sum(page_view.level_response_bytes) for page_view in page_views))
+
+
+def add(a, b):
+  return TimeCoefficients(*(x + y for x, y in zip(a, b)))
+
+
+def subtract(a, b):
+  return TimeCoefficients(*(x - y for x, y in zip(a, b)))
+
+
+def time_for(coefficients, network_model):
+  return (coefficients.levels * network_model.rtt +
+          coefficients.request_bytes / network_model.bandwidth_up +
+          coefficients.response_bytes / network_model.bandwidth_down)
+
+
+def bytes_term(delta, bandwidth_ratio):
+  return delta.request_bytes / bandwidth_ratio + delta.response_bytes
+
+
+def break_even_bdp(delta, bandwidth_ratio):
+  """Returns the bandwidth delay product at which delta takes no time.
+
+  None if there's no such (positive) product, the sign of delta's time is
+  then the same on every network.
+  """
+  if not delta.levels:
+    return None
+  bdp = -bytes_term(delta, bandwidth_ratio) / delta.levels
+  return bdp if bdp > 0 else None
+
+
+def faster_when(delta, bandwidth_ratio):
+  """Returns when a method is faster, given its delta to the baseline."""
+  if break_even_bdp(delta, bandwidth_ratio) is not None:
+    # Fewer round trips wins once latency dominates.
+    return FASTER_ABOVE if delta.levels < 0 else FASTER_BELOW
+
+  if delta.levels:
+    faster = delta.levels < 0
+  else:
+    faster = bytes_term(delta, bandwidth_ratio) < 0
+  return FASTER_ALWAYS if faster else FASTER_NEVER
+
+
+def sequence_coefficients(method_proto):
+  """Reduces the signatures of a MethodSignaturesProto.
+
+  Returns a dict of sequence id => (language, dict of network model name =>
+  TimeCoefficients).
+  """
+  return {
+      sequence.sequence_id: (sequence.language, {
+          network.network_model_name: coefficients_for(network.page_views)
+          for network in sequence.networks
+      }) for sequence in method_proto.sequences
+  }
+
+
+def for_network(coefficients_by_network, network_model_name):
+  """Returns the coefficients to use for a network model, or None."""
+  if "" in coefficients_by_network:
+    return coefficients_by_network[""]
+  return coefficients_by_network.get(network_model_name)
+
+
+def group_names(language):
+  """Returns the groups a sequence of language is reported in."""
+  names = [ALL_SEQUENCES]
+  for category, category_languages in sorted(
+      languages.SCRIPT_CATEGORIES.items()):
+    if language in category_languages:
+      names.append(category)
+  if language:
+    names.append(language)
+  return names
+
+
+def groups_for(sequences):
+  """Returns a list of (group name, sequence ids) in report order.
+
+  sequences is a dict of sequence id => (language, ...).
+  """
+  groups = collections.defaultdict(list)
+  for sequence_id, (language, _) in sequences.items():
+    for name in group_names(language):
+      groups[name].append(sequence_id)
+
+  categories = set(languages.SCRIPT_CATEGORIES)
+
+  def order(item):
+    name = item[0]
+    return (name != ALL_SEQUENCES, name not in categories, name)
+
+  return sorted(groups.items(), key=order)
+
+
+def analyze(method_proto, baseline_proto, network_models):
+  """Computes the break-even of a method against a baseline.
+
+  Both are MethodSignaturesProto's, only sequences recorded for both are
+  used. Network models which either method has no signatures for are
+  skipped. Returns a list of BreakEven's, for each group of sequences and
+  then each network model.
+  """
+  method = sequence_coefficients(method_proto)
+  baseline = sequence_coefficients(baseline_proto)
+  common = {
+      sequence_id: values
+      for sequence_id, values in method.items()
+      if sequence_id in baseline
+  }
+
+  # (method, baseline) coefficients of each sequence for each network model.
+  pairs_by_network = dict()
+  for network_model in network_models:
+    pairs = dict()
+    for sequence_id, (_, coefficients_by_network) in common.items():
+      pair = (for_network(coefficients_by_network, network_model.name),
+              for_network(baseline[sequence_id][1], network_model.name))
+      if None in pair:
+        break
+      pairs[sequence_id] = pair
+    else:
+      pairs_by_network[network_model.name] = pairs
+
+  results = []
+  for group, sequence_ids in groups_for(common):
+    for network_model in network_models:
+      if network_model.name not in pairs_by_network:
+        continue
+      pairs = pairs_by_network[network_model.name]
+      results.append(
+          break_even(group, network_model,
+                     [pairs[sequence_id] for sequence_id in sequence_ids]))
+  return results
+
+
+def break_even(group, network_model, pairs):
+  """Computes the BreakEven of a group of sequences.
+
+  pairs is a list of the (method, baseline) coefficients of each sequence.
+  """
+  method_total = ZERO
+  baseline_total = ZERO
+  sequences_faster = 0
+  for method, baseline in pairs:
+    method_total = add(method_total, method)
+    baseline_total = add(baseline_total, baseline)
+    if time_for(subtract(method, baseline), network_model) < 0:
+      sequences_faster += 1
+
+  ratio = network_model.bandwidth_up / network_model.bandwidth_down
+  delta = subtract(method_total, baseline_total)
+  bdp = break_even_bdp(delta, ratio)
+  rtt = None
+  bandwidth_down = None
+  if bdp is not None:
+    rtt = bdp / network_model.bandwidth_down
+    bandwidth_down = bdp / network_model.rtt
+
+  time_change = 0
+  baseline_time = time_for(baseline_total, network_model)
+  if baseline_time:
+    time_change = time_for(method_total, network_model) / baseline_time - 1
+
+  return BreakEven(group, network_model.name, time_change, bdp, rtt,
+                   bandwidth_down, faster_when(delta, ratio),
+                   sequences_faster / len(pairs) if pairs else 0)
@@ -0,0 +1,159 @@
+"""Unit tests for the break_even module."""
+
+import unittest
+from analysis import break_even
+from analysis import graph_signatures_pb2
+from analysis import simulation
+
+TimeCoefficients = break_even.TimeCoefficients
+
+FAST = simulation.NetworkModel("fast", 10, 100, 200, "c", 0.5)
+SLOW = simulation.NetworkModel("slow", 1000, 10, 10, "c", 0.5)
+
+
+def s(level_request_bytes, level_response_bytes):  # pylint: disable=invalid-name
+  return simulation.GraphSignature(level_request_bytes, level_response_bytes,
+                                   len(level_request_bytes))
+
+
+def method_proto(method_name, sequences, network_sensitive=False):
+  """Builds a MethodSignaturesProto.
+
+  sequences is a list of (sequence id, language, dict of network model name
+  => list of GraphSignature's).
+  """
+  proto = graph_signatures_pb2.MethodSignaturesProto()
+  proto.method_name = method_name
+  proto.network_sensitive = network_sensitive
+  for sequence_id, language, signatures_by_network in sequences:
+    proto.sequences.append(
+        simulation.to_sequence_signatures_proto(sequence_id,
+                                                signatures_by_network,
+                                                language))
+  return proto
+
+
+class BreakEvenTest(unittest.TestCase):
+
+  def test_coefficients_for(self):
+    proto = simulation.to_sequence_signatures_proto(
+        1, {"": [s([10, 20], [100, 200]), s([5], [50])]})
+    self.assertEqual(break_even.coefficients_for(proto.networks[0].page_views),
+                     TimeCoefficients(3, 35, 350))
+
+  def test_time_for(self):
+    signature = s([10, 20], [100, 200])
+    proto = simulation.to_sequence_signatures_proto(1, {"": [signature]})
+    for model in [FAST, SLOW]:
+      self.assertAlmostEqual(
+          break_even.time_for(
+              break_even.coefficients_for(proto.networks[0].page_views), model),
+          simulation.time_for_signature(signature, model))
+
+  def test_break_even_bdp(self):
+    # One less round trip for 1000 more response bytes.
+    delta = TimeCoefficients(-1, 0, 1000)
+    self.assertEqual(break_even.break_even_bdp(delta, 1), 1000)
+    self.assertEqual(break_even.faster_when(delta, 1), break_even.FASTER_ABOVE)
+    self.assertEqual(break_even.faster_when(TimeCoefficients(1, 0, -1000), 1),
+                     break_even.FASTER_BELOW)
+
+    # Request bytes are sent at bandwidth_up = 0.5 * bandwidth_down.
+    self.assertEqual(
+        break_even.break_even_bdp(TimeCoefficients(-2, 100, 1000), 0.5), 600)
+
+    for delta, faster_when in [
+        (TimeCoefficients(-1, -10, -10), break_even.FASTER_ALWAYS),
+        (TimeCoefficients(1, 10, 10), break_even.FASTER_NEVER),
+        (TimeCoefficients(0, 10, -20), break_even.FASTER_ALWAYS),
+        (TimeCoefficients(0, 0, 0), break_even.FASTER_NEVER),
+    ]:
+      self.assertIsNone(break_even.break_even_bdp(delta, 1))
+      self.assertEqual(break_even.faster_when(delta, 1), faster_when)
+
+  def test_analyze(self):
+    # method needs one less round trip per page view, but 1000 more
+    # response bytes per page view.
+    method = method_proto("Method", [
+        (1, "en", {
+            "": [s([10], [1100])]
+        }),
+        (2, "ja", {
+            "": [s([10], [1100]), s([10], [1100])]
+        }),
+        (3, "xx", {
+            "": [s([10], [5000])]
+        }),
+    ])
+    baseline = method_proto("Baseline", [
+        (1, "en", {
+            "": [s([5, 5], [50, 50])]
+        }),
+        (2, "ja", {
+            "": [s([5, 5], [50, 50]), s([5, 5], [50, 50])]
+        }),
+        (3, "xx", {
+            "": [s([5, 5], [50, 50])]
+        }),
+        (4, "en", {
+            "": [s([5, 5], [50, 50])]
+        }),
+    ])
+
+    results = break_even.analyze(method, baseline, [FAST, SLOW])
+    self.assertEqual(
+        [(result.group, result.network_model_name) for result in results], [
+            ("all", "fast"),
+            ("all", "slow"),
+            ("cjk", "fast"),
+            ("cjk", "slow"),
+            ("latin", "fast"),
+            ("latin", "slow"),
+            ("en", "fast"),
+            ("en", "slow"),
+            ("ja", "fast"),
+            ("ja", "slow"),
+            ("xx", "fast"),
+            ("xx", "slow"),
+        ])
+
+    all_fast = results[0]
+    # 4 fewer levels, 3 * 1000 + 4900 more response bytes.
+    self.assertEqual(all_fast.break_even_bdp, 7900 / 4)
+    self.assertEqual(all_fast.break_even_rtt, 7900 / 4 / 200)
+    self.assertEqual(all_fast.break_even_bandwidth_down, 7900 / 4 / 10)
+    self.assertEqual(all_fast.faster_when, break_even.FASTER_ABOVE)
+    # On fast (bdp 2000) sequences 1 and 2 are faster (break-even 1000),
+    # sequence 3 isn't (break-even 4900).
+    self.assertAlmostEqual(all_fast.sequences_faster, 2 / 3)
+    self.assertLess(all_fast.time_change, 0)
+
+    ja_fast = results[8]
+    self.assertEqual(ja_fast.break_even_bdp, 1000)
+    self.assertEqual(ja_fast.sequences_faster, 1)
+
+    xx_slow = results[11]
+    self.assertEqual(xx_slow.break_even_bdp, 4900)
+    self.assertEqual(xx_slow.sequences_faster, 1)
+    self.assertAlmostEqual(
+        xx_slow.time_change,
+        simulation.time_for_signature(s([10], [5000]), SLOW) /
+        simulation.time_for_signature(s([5, 5], [50, 50]), SLOW) - 1)
+
+  def test_analyze_network_sensitive(self):
+    method = method_proto("Method", [
+        (1, "", {
+            "fast": [s([10], [100])],
+        }),
+    ], True)
+    baseline = method_proto("Baseline", [(1, "", {"": [s([10], [100])]})])
+
+    results = break_even.analyze(method, baseline, [FAST, SLOW])
+    self.assertEqual(len(results), 1)
+    self.assertEqual(results[0].network_model_name, "fast")
+    self.assertEqual(results[0].faster_when, break_even.FASTER_NEVER)
+    self.assertEqual(results[0].time_change, 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
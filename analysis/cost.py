@@ -1,5 +1,6 @@
 """Cost function which assigns a cost to a font enrichment latency."""
 
+import functools
 import math
 
 NO_COST_THRESHOLD_S = 0.4
@@ -34,3 +35,39 @@ def cost(time_ms):
   value = scale * (time_s - 0.5 * width - NO_COST_THRESHOLD_S)
 
   return MAX_COST * (1 / (1 + math.exp(-value)))
+
+
+def costs(times_ms,
+          no_cost_threshold_s=None,
+          timeout_threshold_s=None,
+          sigmoid_width=None):
+  """Batch form of cost(), returns a list with the cost of each time in times_ms.
+
+  Gives exactly the same results as calling cost() on each time. The
+  optional parameters replace the corresponding module constants.
+  """
+  if no_cost_threshold_s is None:
+    no_cost_threshold_s = NO_COST_THRESHOLD_S
+  if timeout_threshold_s is None:
+    timeout_threshold_s = TIMEOUT_THRESHOLD_S
+  if sigmoid_width is None:
+    sigmoid_width = SIGMOID_WIDTH
+
+  width = timeout_threshold_s - no_cost_threshold_s
+  scale = sigmoid_width / width
+  half_width = 0.5 * width
+  exp = math.exp
+  return [
+      MAX_COST *
+      (1 / (1 + exp(-(scale *
+                      (time_ms / 1000 - half_width - no_cost_threshold_s)))))
+      for time_ms in times_ms
+  ]
+
+
+def cost_function(no_cost_threshold_s, timeout_threshold_s, sigmoid_width):
+  """Returns a batch cost function, like costs(), which uses the given constants."""
+  return functools.partial(costs,
+                           no_cost_threshold_s=no_cost_threshold_s,
+                           timeout_threshold_s=timeout_threshold_s,
+                           sigmoid_width=sigmoid_width)
@@ -44,6 +44,24 @@ class CostTest(unittest.TestCase):
     self.assertAlmostEqual(cost.cost(30000 * cost.TIMEOUT_THRESHOLD_S),
                            cost.MAX_COST)
 
+  def test_costs(self):
+    times = [-5000, 0, 399, 1000, 1950, 2500.5, 3500, 10000]
+    self.assertEqual(cost.costs(times), [cost.cost(time) for time in times])
+    self.assertEqual(cost.costs([]), [])
+
+  def test_cost_function(self):
+    times = [0, 399, 1000, 1950, 2500.5, 3500, 10000]
+    self.assertEqual(
+        cost.cost_function(cost.NO_COST_THRESHOLD_S, cost.TIMEOUT_THRESHOLD_S,
+                           cost.SIGMOID_WIDTH)(times), cost.costs(times))
+
+    later = cost.cost_function(1.0, 5.0, cost.SIGMOID_WIDTH)(times)
+    for default_cost, later_cost in zip(cost.costs(times), later):
+      self.assertLess(later_cost, default_cost)
+    # Cost is half the max midway between the thresholds.
+    self.assertAlmostEqual(
+        cost.cost_function(1.0, 5.0, 5)([3000])[0], cost.MAX_COST / 2)
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -1,4 +1,18 @@
-"""Classes and methods for handling distributions of values."""
+"""Classes and methods for handling distributions of values.
+
+Three kinds of distributions are available, see for_name():
+  linear-<width>: counts in buckets of a fixed width.
+  exponential-<sub_buckets>: counts in buckets whose width grows with the
+    value, each power of two is split into sub_buckets buckets.
+  ddsketch-<relative_accuracy>: a DDSketch, quantiles have a bounded
+    relative error.
+
+All of them can be merged exactly with another distribution of the same
+kind and parameters.
+"""
+
+import copy
+import math
 
 from analysis import result_pb2
 
@@ -18,6 +32,19 @@ class Distribution:
     current_count = self.buckets.get(bucket, 0)
     self.buckets[bucket] = current_count + 1
 
+  def add_values(self, values):
+    """Adds every value in values, same as calling add_value() on each."""
+    buckets = self.buckets
+    for bucket in self.bucketer.buckets_for(values):
+      buckets[bucket] = buckets.get(bucket, 0) + 1
+
+  def merge(self, other):
+    """Adds the counts of other, which must use the same bucketer, to this distribution."""
+    if not isinstance(other, Distribution) or self.bucketer != other.bucketer:
+      raise ValueError("Can't merge distributions with different bucketers.")
+    for bucket, count in other.buckets.items():
+      self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+
   def to_proto(self):
     """Convert this distribution to a DistributionProto."""
     previous_end = 0
@@ -45,10 +72,216 @@ class LinearBucketer:
   def __init__(self, width):
     self.width = int(width)
 
+  def __eq__(self, other):
+    return isinstance(other, LinearBucketer) and self.width == other.width
+
   def bucket_for(self, value):
     return (int(value / self.width) + 1) * self.width
 
+  def buckets_for(self, values):
+    width = self.width
+    return [(int(value / width) + 1) * width for value in values]
+
   def bucket_before(self, value):
     if value >= self.width:
       return self.bucket_for(value - self.width)
     return 0
+
+
+class ExponentialBucketer:
+  """Creates buckets whose width is proportional to the values in them.
+
+  Values below sub_buckets get buckets of width one, after that each
+  range [2^n, 2^(n+1)) is split into sub_buckets buckets of equal width. So
+  a bucket is never wider than 1 / sub_buckets of the values it holds.
+  """
+
+  def __init__(self, sub_buckets):
+    """sub_buckets is the number of buckets per power of two."""
+    sub_buckets = int(sub_buckets)
+    if sub_buckets < 1 or sub_buckets & (sub_buckets - 1):
+      raise ValueError("sub_buckets must be a power of two: %s" % sub_buckets)
+    self.sub_buckets = sub_buckets
+    self.sub_bucket_bits = sub_buckets.bit_length() - 1
+
+  def __eq__(self, other):
+    return (isinstance(other, ExponentialBucketer) and
+            self.sub_buckets == other.sub_buckets)
+
+  def bucket_for(self, value):
+    """Returns the (exclusive) end of the bucket which holds value."""
+    value = int(value)
+    if value < self.sub_buckets:
+      return value + 1
+    shift = value.bit_length() - 1 - self.sub_bucket_bits
+    return ((value >> shift) + 1) << shift
+
+  def buckets_for(self, values):
+    bucket_for = self.bucket_for
+    return [bucket_for(value) for value in values]
+
+  def bucket_before(self, value):
+    """Returns the end of the bucket before the one which holds value."""
+    value = int(value)
+    if value < self.sub_buckets:
+      return value
+    shift = value.bit_length() - 1 - self.sub_bucket_bits
+    return (value >> shift) << shift
+
+
+class DDSketch:
+  """Quantile sketch with a bounded relative error (Masson et al, 2019).
+
+  Positive values are counted in logarithmically sized bins, bin i
+  holds the values in (gamma^(i-1), gamma^i]. Any quantile returned is
+  within relative_accuracy of the true value. Values <= 0 are counted
+  together as zeros. The number of bins grows with the logarithm of the
+  range of values, not the number of values.
+  """
+
+  def __init__(self, relative_accuracy):
+    """Creates an empty sketch, relative_accuracy must be in (0, 1)."""
+    relative_accuracy = float(relative_accuracy)
+    if not 0 < relative_accuracy < 1:
+      raise ValueError("relative_accuracy must be in (0, 1): %s" %
+                       relative_accuracy)
+    self.relative_accuracy = relative_accuracy
+    self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    self.log_gamma = math.log(self.gamma)
+    self.zero_count = 0
+    self.bins = dict()
+
+  def index_for(self, value):
+    return math.ceil(math.log(value) / self.log_gamma)
+
+  def add_value(self, value):
+    """Adds one value to the sketch."""
+    if value <= 0:
+      self.zero_count += 1
+      return
+    index = self.index_for(value)
+    self.bins[index] = self.bins.get(index, 0) + 1
+
+  def add_values(self, values):
+    """Adds every value in values, same as calling add_value() on each."""
+    bins = self.bins
+    log = math.log
+    log_gamma = self.log_gamma
+    for value in values:
+      if value <= 0:
+        self.zero_count += 1
+        continue
+      index = math.ceil(log(value) / log_gamma)
+      bins[index] = bins.get(index, 0) + 1
+
+  def merge(self, other):
+    """Adds the counts of other, which must have the same accuracy, to this sketch."""
+    if (not isinstance(other, DDSketch) or
+        self.relative_accuracy != other.relative_accuracy):
+      raise ValueError("Can't merge sketches with different accuracies.")
+    self.zero_count += other.zero_count
+    for index, count in other.bins.items():
+      self.bins[index] = self.bins.get(index, 0) + count
+
+  def count(self):
+    return self.zero_count + sum(self.bins.values())
+
+  def quantile(self, quantile):
+    """Returns an estimate of the value at quantile (in [0, 1]).
+
+    Returns None if the sketch is empty.
+    """
+    total = self.count()
+    if not total:
+      return None
+    rank = quantile * (total - 1)
+    seen = self.zero_count
+    if seen > rank:
+      return 0.0
+    for index, count in sorted(self.bins.items()):
+      seen += count
+      if seen > rank:
+        return 2 * self.gamma**index / (self.gamma + 1)
+    return 2 * self.gamma**max(self.bins) / (self.gamma + 1)
+
+  def to_proto(self):
+    """Convert this sketch to a DistributionProto.
+
+    The sketch is stored in full, plus equivalent integer buckets for
+    readers which only understand buckets. Bins that round to the same
+    integer bucket are combined.
+    """
+    distribution = result_pb2.DistributionProto()
+    distribution.sketch.relative_accuracy = self.relative_accuracy
+    distribution.sketch.zero_count = self.zero_count
+
+    previous_end = 0
+    if self.zero_count:
+      distribution.buckets.add(end=1, count=self.zero_count)
+      previous_end = 1
+    for index, count in sorted(self.bins.items()):
+      distribution.sketch.bin_indices.append(index)
+      distribution.sketch.bin_counts.append(count)
+
+      end = int(self.gamma**index) + 1
+      if end == previous_end:
+        distribution.buckets[-1].count += count
+        continue
+      start = int(self.gamma**(index - 1)) + 1
+      if previous_end < start < end:
+        distribution.buckets.add(end=start, count=0)
+      distribution.buckets.add(end=end, count=count)
+      previous_end = end
+    return distribution
+
+  @staticmethod
+  def from_proto(distribution):
+    """Recreates a sketch from a DistributionProto produced by to_proto()."""
+    sketch = DDSketch(distribution.sketch.relative_accuracy)
+    sketch.zero_count = distribution.sketch.zero_count
+    sketch.bins = dict(
+        zip(distribution.sketch.bin_indices, distribution.sketch.bin_counts))
+    return sketch
+
+
+def for_name(name):
+  """Returns a new, empty, distribution for name (see module docstring).
+
+  Raises ValueError if name isn't a valid distribution.
+  """
+  kind, _, parameter = name.partition("-")
+  try:
+    if kind == "linear" and int(parameter) > 0:
+      return Distribution(LinearBucketer(int(parameter)))
+    if kind == "exponential":
+      return Distribution(ExponentialBucketer(int(parameter)))
+    if kind == "ddsketch":
+      return DDSketch(float(parameter))
+  except ValueError:
+    pass
+  raise ValueError("Invalid distribution: %s" % name)
+
+
+def merge_protos(distribution, other):
+  """Merges two DistributionProto's recorded with the same kind of distribution.
+
+  Returns a new DistributionProto. Sketches are merged through DDSketch,
+  otherwise bucket counts are summed by bucket end. This is exact since
+  distributions with the same bucketer share bucket boundaries.
+  """
+  if not distribution.buckets and not distribution.HasField("sketch"):
+    return copy.deepcopy(other)
+  if not other.buckets and not other.HasField("sketch"):
+    return copy.deepcopy(distribution)
+  if distribution.HasField("sketch") or other.HasField("sketch"):
+    sketch = DDSketch.from_proto(distribution)
+    sketch.merge(DDSketch.from_proto(other))
+    return sketch.to_proto()
+
+  counts = dict()
+  for bucket in list(distribution.buckets) + list(other.buckets):
+    counts[bucket.end] = counts.get(bucket.end, 0) + bucket.count
+  result = result_pb2.DistributionProto()
+  for end, count in sorted(counts.items()):
+    result.buckets.add(end=end, count=count)
+  return result
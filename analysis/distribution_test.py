@@ -51,6 +51,29 @@ class DistributionTest(unittest.TestCase):
 
     self.assertEqual(dist.buckets, {10: 3, 20: 1, 110: 1})
 
+  def test_add_values(self):
+    dist = distribution.Distribution(distribution.LinearBucketer(10))
+    dist.add_value(5)
+    dist.add_values([0, 1, 9, 10, 101])
+    dist.add_values([])
+
+    self.assertEqual(dist.buckets, {10: 4, 20: 1, 110: 1})
+
+  def test_merge(self):
+    dist = distribution.Distribution(distribution.LinearBucketer(10))
+    dist.add_value(1)
+    dist.add_value(15)
+
+    other = distribution.Distribution(distribution.LinearBucketer(10))
+    other.add_value(12)
+    other.add_value(101)
+
+    dist.merge(other)
+    dist.merge(distribution.Distribution(distribution.LinearBucketer(10)))
+
+    self.assertEqual(dist.buckets, {10: 1, 20: 2, 110: 1})
+    self.assertEqual(other.buckets, {20: 1, 110: 1})
+
   def test_to_proto_one_wide(self):
     dist = distribution.Distribution(distribution.LinearBucketer(1))
     dist.add_value(0)
@@ -125,6 +148,147 @@ class DistributionTest(unittest.TestCase):
 
     self.assertEqual(dist.to_proto(), dist_proto)
 
+  def test_merge_different_bucketers(self):
+    dist = distribution.Distribution(distribution.LinearBucketer(10))
+    with self.assertRaises(ValueError):
+      dist.merge(distribution.Distribution(distribution.LinearBucketer(5)))
+    with self.assertRaises(ValueError):
+      dist.merge(distribution.Distribution(distribution.ExponentialBucketer(8)))
+
+  def test_exponential_bucketer(self):
+    bucketer = distribution.ExponentialBucketer(4)
+    self.assertEqual(bucketer.bucket_for(0), 1)
+    self.assertEqual(bucketer.bucket_for(3), 4)
+    self.assertEqual(bucketer.bucket_for(4), 5)
+    self.assertEqual(bucketer.bucket_for(7.5), 8)
+    self.assertEqual(bucketer.bucket_for(8), 10)
+    self.assertEqual(bucketer.bucket_for(9), 10)
+    self.assertEqual(bucketer.bucket_for(15), 16)
+    self.assertEqual(bucketer.bucket_for(16), 20)
+    self.assertEqual(bucketer.bucket_for(1000000), 1048576)
+    self.assertEqual(bucketer.buckets_for([0, 9, 16]), [1, 10, 20])
+
+    with self.assertRaises(ValueError):
+      distribution.ExponentialBucketer(3)
+
+  def test_exponential_bucketer_bucket_before(self):
+    bucketer = distribution.ExponentialBucketer(4)
+    self.assertEqual(bucketer.bucket_before(0), 0)
+    self.assertEqual(bucketer.bucket_before(3), 3)
+    self.assertEqual(bucketer.bucket_before(9), 8)
+    self.assertEqual(bucketer.bucket_before(10), 10)
+    self.assertEqual(bucketer.bucket_before(19), 16)
+
+  def test_exponential_to_proto(self):
+    dist = distribution.Distribution(distribution.ExponentialBucketer(4))
+    dist.add_values([1, 9, 9, 40])
+
+    dist_proto = result_pb2.DistributionProto()
+    dist_proto.buckets.add(end=1, count=0)
+    dist_proto.buckets.add(end=2, count=1)
+    dist_proto.buckets.add(end=8, count=0)
+    dist_proto.buckets.add(end=10, count=2)
+    dist_proto.buckets.add(end=40, count=0)
+    dist_proto.buckets.add(end=48, count=1)
+
+    self.assertEqual(dist.to_proto(), dist_proto)
+
+  def test_ddsketch_quantile(self):
+    sketch = distribution.DDSketch(0.01)
+    self.assertIsNone(sketch.quantile(0.5))
+
+    values = [value * 37 for value in range(1, 10001)]
+    sketch.add_values(values)
+    self.assertEqual(sketch.count(), 10000)
+    for quantile in [0, 0.1, 0.5, 0.9, 0.99, 1]:
+      expected = values[int(quantile * 9999)]
+      self.assertLessEqual(abs(sketch.quantile(quantile) - expected),
+                           expected * 0.01)
+
+  def test_ddsketch_zeros(self):
+    sketch = distribution.DDSketch(0.05)
+    sketch.add_value(0)
+    sketch.add_values([0, 0, 100])
+    self.assertEqual(sketch.zero_count, 3)
+    self.assertEqual(sketch.quantile(0.5), 0)
+    self.assertAlmostEqual(sketch.quantile(1), 100, delta=5)
+
+  def test_ddsketch_merge(self):
+    values = [1.5**power for power in range(40)]
+    expected = distribution.DDSketch(0.02)
+    expected.add_values(values)
+
+    sketch = distribution.DDSketch(0.02)
+    other = distribution.DDSketch(0.02)
+    for value in values[:15]:
+      sketch.add_value(value)
+    other.add_values(values[15:])
+    sketch.merge(other)
+
+    self.assertEqual(sketch.bins, expected.bins)
+    self.assertEqual(sketch.to_proto(), expected.to_proto())
+
+    with self.assertRaises(ValueError):
+      sketch.merge(distribution.DDSketch(0.01))
+
+  def test_ddsketch_to_proto(self):
+    sketch = distribution.DDSketch(0.1)
+    sketch.add_values([0, 1, 2, 2, 100, 0.5])
+
+    dist_proto = sketch.to_proto()
+    self.assertEqual(
+        [(bucket.end, bucket.count) for bucket in dist_proto.buckets], [
+            (1, 2),
+            (2, 1),
+            (3, 2),
+            (83, 0),
+            (102, 1),
+        ])
+    self.assertEqual(dist_proto.sketch.zero_count, 1)
+
+    copy = distribution.DDSketch.from_proto(dist_proto)
+    self.assertEqual(copy.bins, sketch.bins)
+    self.assertEqual(copy.zero_count, 1)
+    self.assertEqual(copy.quantile(0.5), sketch.quantile(0.5))
+
+  def test_for_name(self):
+    dist = distribution.for_name("linear-5")
+    self.assertEqual(dist.bucketer, distribution.LinearBucketer(5))
+    dist = distribution.for_name("exponential-16")
+    self.assertEqual(dist.bucketer, distribution.ExponentialBucketer(16))
+    self.assertEqual(
+        distribution.for_name("ddsketch-0.01").relative_accuracy, 0.01)
+
+    for name in [
+        "linear", "linear-0", "linear-abc", "exponential-6", "ddsketch-2",
+        "ddsketch", "log-4"
+    ]:
+      with self.assertRaises(ValueError):
+        distribution.for_name(name)
+
+  def test_merge_protos(self):
+    for name in ["linear-10", "exponential-4", "ddsketch-0.05"]:
+      values = [0, 3, 5, 17, 17, 120, 1000, 4000]
+      expected = distribution.for_name(name)
+      expected.add_values(values)
+      one = distribution.for_name(name)
+      one.add_values(values[::2])
+      two = distribution.for_name(name)
+      two.add_values(values[1::2])
+
+      merged = distribution.merge_protos(one.to_proto(), two.to_proto())
+      self.assertEqual([(bucket.end, bucket.count)
+                        for bucket in merged.buckets
+                        if bucket.count],
+                       [(bucket.end, bucket.count)
+                        for bucket in expected.to_proto().buckets
+                        if bucket.count], name)
+      self.assertEqual(merged.sketch, expected.to_proto().sketch)
+
+      self.assertEqual(
+          distribution.merge_protos(result_pb2.DistributionProto(),
+                                    one.to_proto()), one.to_proto())
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -1,22 +1,104 @@
 """Loads fonts from disk and caches the results."""
 
 import functools
+import hashlib
+import io
 import os
 import re
 
+# Cache of font content hashes. Keyed by (font directory, font id).
+FONT_HASH_CACHE = dict()
+
+# Matches variable font filenames, for example: fontname[axis].ttf
+VARIABLE_FONT_PATTERN = re.compile("(.+)\\[(.+)\\](.+)")
+
+
+def alternate_font_id(font_id):
+  """Returns the alternate file name for a variable font id, or None.
+
+  Variable fonts named fontname[axis].ttf may be stored as fontnameBaxisB.ttf.
+  """
+  match = VARIABLE_FONT_PATTERN.match(font_id) if font_id else None
+  if not match:
+    return None
+  return "%sB%sB%s" % (match.group(1), match.group(2), match.group(3))
+
+
+def font_file(font_bytes):
+  """Returns a read only file object over font_bytes.
+
+  font_bytes may be bytes or any other buffer (such as a memoryview into a
+  font pack). Buffers are read in place instead of being copied.
+  """
+  if isinstance(font_bytes, bytes):
+    return io.BytesIO(font_bytes)
+  return BufferFile(font_bytes)
+
+
+class BufferFile(io.RawIOBase):
+  """A seekable read only file backed by a buffer, without copying it."""
+
+  def __init__(self, buffer):
+    super().__init__()
+    self.buffer = memoryview(buffer)
+    self.position = 0
+
+  def readable(self):
+    return True
+
+  def seekable(self):
+    return True
+
+  def tell(self):
+    return self.position
+
+  def seek(self, offset, whence=io.SEEK_SET):
+    if whence == io.SEEK_CUR:
+      offset += self.position
+    elif whence == io.SEEK_END:
+      offset += len(self.buffer)
+    self.position = max(offset, 0)
+    return self.position
+
+  def readinto(self, b):
+    data = self.buffer[self.position:self.position + len(b)]
+    b[:len(data)] = data
+    self.position += len(data)
+    return len(data)
+
+  def read(self, size=-1):
+    end = len(self.buffer) if size is None or size < 0 else self.position + size
+    data = bytes(self.buffer[self.position:end])
+    self.position += len(data)
+    return data
+
+  def getvalue(self):
+    return self.buffer
+
 
 class FontLoader:
   """Loads fonts from disk.
 
-  Results are cached.
+  Results are cached. If a font pack (see analysis/font_pack.py) is provided
+  fonts are served from it as zero copy buffers instead of being read from
+  font_directory.
   """
 
-  def __init__(self, font_directory, default_font_id=None):
+  def __init__(self,
+               font_directory,
+               default_font_id=None,
+               font_manifest=None,
+               font_pack=None):
+    """Creates a loader for fonts in font_directory.
+
+    font_manifest (analysis/font_manifest.py) and font_pack
+    (analysis/font_pack.py) are optional precomputed sources which are used
+    in place of reading and parsing the font files when present.
+    """
     self.font_directory = font_directory
     self.default_font_id = default_font_id
-
-  # Matches variable font filenames, for example: fontname[axis].ttf
-  VARIABLE_FONT_PATTERN = re.compile("(.+)\\[(.+)\\](.+)")
+    self.font_manifest = font_manifest
+    self.font_pack = font_pack
 
   def directory(self):
     return self.font_directory
@@ -32,17 +114,59 @@ class FontLoader:
     if os.path.exists(path):
       return path  # Found the expected file.
     # Is this a variable font?
-    match = self.VARIABLE_FONT_PATTERN.match(font_id)
-    if not match:
+    alt_font_id = alternate_font_id(font_id)
+    if not alt_font_id:
       return path  # Not variable. Give up.
     # Try alternative name.
-    alt_font_id = "%sB%sB%s" % (match.group(1), match.group(2), match.group(3))
     alt_path = os.path.join(self.font_directory, alt_font_id)
     if os.path.exists(alt_path):
       return alt_path  # Found the alternately named version.
     return path  # No alternate. Give up.
 
-  @functools.lru_cache(maxsize=256)
+  def manifest_entry(self, font_id):
+    """Returns the precomputed manifest entry for font_id, or None."""
+    if not self.font_manifest:
+      return None
+    return self.font_manifest.entry(
+        os.path.basename(self.path_for_font(font_id)))
+
+  def manifest_cmap(self, font_id):
+    """Returns the precomputed codepoint => glyph id map for font_id, or None."""
+    if not self.font_manifest:
+      return None
+    return self.font_manifest.cmap(os.path.basename(
+        self.path_for_font(font_id)))
+
+  def font_hash(self, font_id):
+    """Returns a hash of the contents of font_id.
+
+    Per font caches should be keyed by this hash so that byte identical
+    fonts stored under different names share cached work. Computed once
+    per font, or taken from the font manifest if there is one.
+    """
+    if font_id is None or font_id == "":
+      font_id = self.default_font_id
+    key = (self.font_directory, font_id)
+    if key in FONT_HASH_CACHE:
+      return FONT_HASH_CACHE[key]
+
+    entry = self.manifest_entry(font_id)
+    if entry is not None and entry.content_hash:
+      font_hash = entry.content_hash
+    else:
+      font_hash = hashlib.sha256(self.load_font(font_id)).hexdigest()
+    FONT_HASH_CACHE[key] = font_hash
+    return font_hash
+
   def load_font(self, font_id):
-    with open(self.path_for_font(font_id), 'rb') as font_file:
-      return font_file.read()
+    """Returns the contents of font_id as bytes or a read only buffer."""
+    if self.font_pack is not None:
+      if font_id is None or font_id == "":
+        font_id = self.default_font_id
+      return self.font_pack.font(font_id)
+    return self.read_font(font_id)
+
+  @functools.lru_cache(maxsize=256)
+  def read_font(self, font_id):
+    with open(self.path_for_font(font_id), 'rb') as the_file:
+      return the_file.read()
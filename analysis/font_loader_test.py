@@ -3,6 +3,8 @@
 import tempfile
 import unittest
 from analysis import font_loader
+from analysis import font_manifest
+from analysis import font_manifest_pb2
 
 
 class FontLoaderTest(unittest.TestCase):
@@ -41,6 +43,50 @@ class FontLoaderTest(unittest.TestCase):
 
       self.assertEqual(str(the_bytes, encoding='UTF-8'), font_contents)
 
+  def test_font_hash(self):
+    with tempfile.TemporaryDirectory() as the_dir:
+      for font_id, contents in [('a.ttf', 'same'), ('b.ttf', 'same'),
+                                ('c.ttf', 'other')]:
+        with open(the_dir + '/' + font_id, 'w') as tmp_file:
+          tmp_file.write(contents)
+
+      loader = font_loader.FontLoader(the_dir)
+      self.assertEqual(loader.font_hash('a.ttf'), loader.font_hash('b.ttf'))
+      self.assertNotEqual(loader.font_hash('a.ttf'), loader.font_hash('c.ttf'))
+
+  def test_font_hash_from_manifest(self):
+    manifest_proto = font_manifest_pb2.FontManifestProto()
+    manifest_proto.fonts.add(font_id='missing.ttf', content_hash='abcd')
+
+    loader = font_loader.FontLoader(
+        '/does/not/exist',
+        font_manifest=font_manifest.FontManifest(manifest_proto))
+    self.assertEqual(loader.font_hash('missing.ttf'), 'abcd')
+
+  def test_manifest_entry(self):
+    manifest_proto = font_manifest_pb2.FontManifestProto()
+    entry = manifest_proto.fonts.add()
+    entry.font_id = 'testBaxisB.ttf'
+    entry.woff2_size = 1234
+    entry.codepoints.extend([0x61, 0x62])
+    entry.glyph_ids.extend([3, 4])
+
+    with tempfile.TemporaryDirectory() as the_dir:
+      with open(the_dir + '/testBaxisB.ttf', 'w') as tmp_file:
+        tmp_file.write('font-bytes-go-here')
+
+      loader = font_loader.FontLoader(
+          the_dir, font_manifest=font_manifest.FontManifest(manifest_proto))
+
+      self.assertEqual(loader.manifest_entry('test[axis].ttf').woff2_size, 1234)
+      self.assertEqual(loader.manifest_cmap('test[axis].ttf'), {
+          0x61: 3,
+          0x62: 4
+      })
+      self.assertIsNone(loader.manifest_entry('other.ttf'))
+      self.assertIsNone(
+          font_loader.FontLoader(the_dir).manifest_entry('test[axis].ttf'))
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,39 @@
+"""Precomputed per font facts for a font library.
+
+A manifest is produced ahead of time by tools/build_font_manifest.py and
+allows the PFE methods to skip expensive per process work (woff2 encoding,
+cmap parsing, slicing strategy selection, glyph data splitting).
+"""
+
+from analysis import font_manifest_pb2
+
+
+def load(manifest_path):
+  """Loads the binary FontManifestProto at manifest_path."""
+  with open(manifest_path, 'rb') as manifest_file:
+    return FontManifest(
+        font_manifest_pb2.FontManifestProto.FromString(manifest_file.read()))
+
+
+class FontManifest:
+  """Lookup of manifest entries by font file name."""
+
+  def __init__(self, manifest_proto):
+    self.entries = {entry.font_id: entry for entry in manifest_proto.fonts}
+    # Keyed by content hash, so duplicate fonts share a single map.
+    self.cmaps = dict()
+
+  def entry(self, font_file_name):
+    """Returns the FontManifestEntryProto for a font, or None."""
+    return self.entries.get(font_file_name)
+
+  def cmap(self, font_file_name):
+    """Returns a dict of codepoint => glyph id for a font, or None."""
+    entry = self.entry(font_file_name)
+    if entry is None:
+      return None
+
+    key = entry.content_hash or font_file_name
+    if key not in self.cmaps:
+      self.cmaps[key] = dict(zip(entry.codepoints, entry.glyph_ids))
+    return self.cmaps[key]
@@ -0,0 +1,118 @@
+"""A single file containing an entire font library.
+
+A font pack is memory mapped by the analyzer so that all of the worker
+processes share the same page cache pages for the font data instead of
+each holding a private copy of every font.
+
+Layout of a pack file:
+  - 8 byte magic number (MAGIC).
+  - Little endian uint64 length of the index.
+  - Serialized FontPackIndexProto.
+  - Font data, referenced by the offsets in the index.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+
+from analysis import font_loader
+from analysis import font_pack_pb2
+
+MAGIC = b"PFEFPACK"
+HEADER = struct.Struct("<8sQ")
+
+
+class FontNotInPackError(IOError):
+  """The requested font is not present in the font pack."""
+
+
+class InvalidFontPackError(Exception):
+  """The file is not a valid font pack."""
+
+
+def write(font_directory, output_path):
+  """Packs every font file in font_directory into a pack at output_path.
+
+  Byte identical fonts are only stored once, all of their ids point at
+  the same data.
+  """
+  font_ids = sorted(f for f in os.listdir(font_directory)
+                    if os.path.isfile(os.path.join(font_directory, f)))
+
+  index = font_pack_pb2.FontPackIndexProto()
+  offsets_by_hash = dict()
+  unique_font_ids = []
+  offset = 0
+  for font_id in font_ids:
+    path = os.path.join(font_directory, font_id)
+    with open(path, 'rb') as font:
+      font_hash = hashlib.sha256(font.read()).digest()
+    length = os.path.getsize(path)
+    if font_hash not in offsets_by_hash:
+      offsets_by_hash[font_hash] = offset
+      unique_font_ids.append(font_id)
+      offset += length
+    index.fonts.add(font_id=font_id,
+                    offset=offsets_by_hash[font_hash],
+                    length=length)
+
+  index_bytes = index.SerializeToString()
+  with open(output_path, 'wb') as out:
+    out.write(HEADER.pack(MAGIC, len(index_bytes)))
+    out.write(index_bytes)
+    for font_id in unique_font_ids:
+      with open(os.path.join(font_directory, font_id), 'rb') as font:
+        out.write(font.read())
+
+  return index
+
+
+class FontPack:
+  """Memory mapped, read only view of a font pack file."""
+
+  def __init__(self, pack_path):
+    """Maps the pack at pack_path and reads its index."""
+    with open(pack_path, 'rb') as pack_file:
+      # A read only mapping: pages are shared with the page cache (and all
+      # other processes), and buffers over the fonts can't be written to.
+      self.data = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+    self.buffer = memoryview(self.data)
+
+    if len(self.buffer) < HEADER.size:
+      raise InvalidFontPackError("%s is too short to be a font pack." %
+                                 pack_path)
+    magic, index_length = HEADER.unpack_from(self.buffer)
+    if magic != MAGIC:
+      raise InvalidFontPackError("%s is not a font pack." % pack_path)
+
+    data_start = HEADER.size + index_length
+    index = font_pack_pb2.FontPackIndexProto.FromString(
+        self.buffer[HEADER.size:data_start].tobytes())
+    self.entries = {
+        entry.font_id: (data_start + entry.offset, entry.length)
+        for entry in index.fonts
+    }
+
+  def font_ids(self):
+    """Returns the sorted ids of all fonts stored in the pack."""
+    return sorted(self.entries)
+
+  def has_font(self, font_id):
+    return font_id in self.entries or (font_loader.alternate_font_id(font_id)
+                                       in self.entries)
+
+  def font(self, font_id):
+    """Returns a read only buffer over the bytes of font_id.
+
+    Variable fonts requested as name[axis].ttf resolve to nameBaxisB.ttf
+    when only the latter is in the pack.
+    """
+    entry = self.entries.get(font_id)
+    if entry is None:
+      entry = self.entries.get(font_loader.alternate_font_id(font_id))
+    if entry is None:
+      raise FontNotInPackError("%s is not in the font pack." % font_id)
+
+    start, length = entry
+    return self.buffer[start:start + length]
@@ -0,0 +1,110 @@
+'''Unit tests for font_pack.'''
+
+import os
+import tempfile
+import unittest
+from analysis import font_loader
+from analysis import font_pack
+
+
+class FontPackTest(unittest.TestCase):
+  '''Tests for font_pack.py'''
+
+  def write_pack(self, the_dir, fonts):
+    '''Writes fonts (font_id => bytes) to a pack in the_dir and opens it.'''
+    font_dir = the_dir + '/fonts'
+    pack_path = the_dir + '/fonts.pack'
+    os.mkdir(font_dir)
+    for font_id, contents in fonts.items():
+      with open(font_dir + '/' + font_id, 'wb') as tmp_file:
+        tmp_file.write(contents)
+    font_pack.write(font_dir, pack_path)
+    return font_pack.FontPack(pack_path)
+
+  def test_read_fonts(self):
+    with tempfile.TemporaryDirectory() as the_dir:
+      pack = self.write_pack(the_dir, {
+          'a.ttf': b'font-a',
+          'b.ttf': b'font-bb',
+          'empty.ttf': b'',
+      })
+
+      self.assertEqual(pack.font_ids(), ['a.ttf', 'b.ttf', 'empty.ttf'])
+      self.assertEqual(bytes(pack.font('a.ttf')), b'font-a')
+      self.assertEqual(bytes(pack.font('b.ttf')), b'font-bb')
+      self.assertEqual(bytes(pack.font('empty.ttf')), b'')
+
+  def test_duplicate_fonts_stored_once(self):
+    with tempfile.TemporaryDirectory() as the_dir:
+      pack = self.write_pack(the_dir, {
+          'a.ttf': b'same-font',
+          'b.ttf': b'other-font',
+          'c.ttf': b'same-font',
+      })
+
+      self.assertEqual(bytes(pack.font('c.ttf')), b'same-font')
+      self.assertEqual(pack.entries['a.ttf'], pack.entries['c.ttf'])
+      self.assertNotEqual(pack.entries['a.ttf'], pack.entries['b.ttf'])
+
+  def test_read_variable_renamed_font(self):
+    with tempfile.TemporaryDirectory() as the_dir:
+      pack = self.write_pack(the_dir, {'testBaxisB.ttf': b'font-bytes'})
+
+      self.assertTrue(pack.has_font('test[axis].ttf'))
+      self.assertEqual(bytes(pack.font('test[axis].ttf')), b'font-bytes')
+
+  def test_font_not_found(self):
+    with tempfile.TemporaryDirectory() as the_dir:
+      pack = self.write_pack(the_dir, {'a.ttf': b'font-a'})
+
+      self.assertFalse(pack.has_font('b.ttf'))
+      with self.assertRaises(IOError):
+        pack.font('b.ttf')
+
+  def test_invalid_pack(self):
+    with tempfile.TemporaryDirectory() as the_dir:
+      with open(the_dir + '/not.pack', 'wb') as tmp_file:
+        tmp_file.write(b'this is not a font pack')
+
+      with self.assertRaises(font_pack.InvalidFontPackError):
+        font_pack.FontPack(the_dir + '/not.pack')
+
+  def test_font_loader_uses_pack(self):
+    with tempfile.TemporaryDirectory() as the_dir:
+      pack = self.write_pack(the_dir, {
+          'a.ttf': b'font-a',
+          'default.ttf': b'font-default',
+      })
+      loader = font_loader.FontLoader('/does/not/exist',
+                                      default_font_id='default.ttf',
+                                      font_pack=pack)
+
+      self.assertEqual(bytes(loader.load_font('a.ttf')), b'font-a')
+      self.assertEqual(bytes(loader.load_font('')), b'font-default')
+
+  def test_fonts_are_read_only(self):
+    with tempfile.TemporaryDirectory() as the_dir:
+      pack = self.write_pack(the_dir, {'a.ttf': b'font-a'})
+      loader = font_loader.FontLoader('/does/not/exist', font_pack=pack)
+
+      for font in [pack.font('a.ttf'), loader.load_font('a.ttf')]:
+        self.assertTrue(memoryview(font).readonly)
+        with self.assertRaises(TypeError):
+          font[0] = ord('F')
+      self.assertEqual(bytes(pack.font('a.ttf')), b'font-a')
+
+  def test_font_file_reads_buffer(self):
+    with tempfile.TemporaryDirectory() as the_dir:
+      pack = self.write_pack(the_dir, {'a.ttf': b'0123456789'})
+
+      font_file = font_loader.font_file(pack.font('a.ttf'))
+      self.assertEqual(font_file.read(3), b'012')
+      font_file.seek(-2, 2)
+      self.assertEqual(font_file.read(), b'89')
+      font_file.seek(4)
+      self.assertEqual(font_file.tell(), 4)
+      self.assertEqual(font_file.read(100), b'456789')
+
+
+if __name__ == '__main__':
+  unittest.main()
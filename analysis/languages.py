@@ -60,19 +60,22 @@ SCRIPT_CATEGORIES = {
 }
 
 
-def should_keep(lang):
-  return not language_filter() or lang in language_filter()
+def should_keep(lang, script_category=None):
+  a_filter = language_filter(script_category)
+  return not a_filter or lang in a_filter
 
 
-def language_filter():
+def language_filter(script_category=None):
   """Returns the set of languages to filter sequences against.
 
   The filter set is based on the 'script_category' and 'filter_languages'
-  flags. If 'script_category' is set it takes precedence.
+  flags. If 'script_category' is set it takes precedence. script_category
+  overrides the flag of the same name.
   """
-  if FLAGS.script_category:
-    if FLAGS.script_category in SCRIPT_CATEGORIES:
-      return SCRIPT_CATEGORIES[FLAGS.script_category]
+  script_category = script_category or FLAGS.script_category
+  if script_category:
+    if script_category in SCRIPT_CATEGORIES:
+      return SCRIPT_CATEGORIES[script_category]
     return set()
 
   if FLAGS.filter_languages:
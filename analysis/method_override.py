@@ -0,0 +1,152 @@
+"""Method overrides of an analysis.
+
+An override gives some of the methods of an analysis their own font library
+and data set, in place of the analysis' font directory and sequences. For
+example RangeRequest simulates glyph order optimized fonts with a version of
+the data set which references them (see batch_manifest.MethodOverrideProto).
+"""
+
+import collections
+import logging
+
+from analysis import batch_manifest
+from analysis import font_loader
+from analysis import font_manifest
+from analysis import font_pack
+from analysis import preflight
+from analysis import simulation
+
+LOG = logging.getLogger("analyzer")
+
+# A font library and data set used by some of the methods. sequences_by_id is
+# a dict of sequence id => the version of each sequence the methods simulate,
+# or None if they use the analysis' sequences.
+MethodOverride = collections.namedtuple("MethodOverride", [
+    "method_names", "font_directory", "font_manifest", "font_pack",
+    "sequences_by_id"
+])
+
+
+class FontFiles:
+  """Font manifests and packs, each is loaded once and shared by every font
+  library that uses it."""
+
+  def __init__(self):
+    self.manifests = dict()
+    self.packs = dict()
+
+  def manifest(self, path):
+    """Returns the font manifest at path, or None if path isn't set."""
+    if path and path not in self.manifests:
+      LOG.info("Loading font manifest %s ...", path)
+      self.manifests[path] = font_manifest.load(path)
+    return self.manifests.get(path)
+
+  def pack(self, path):
+    """Returns the font pack at path, or None if path isn't set."""
+    if path and path not in self.packs:
+      self.packs[path] = font_pack.FontPack(path)
+    return self.packs.get(path)
+
+
+def create_method_overrides(override_protos, methods, font_library,
+                            read_data_set, font_files):
+  """Sets up the MethodOverride's of a list of MethodOverrideProto's.
+
+  font_library is the analysis' (font directory, font manifest, font pack),
+  used by overrides which don't set their own. read_data_set reads the
+  DataSetProto at a path and font_files is a FontFiles.
+  """
+  overrides = []
+  data_sets = dict()
+  for override_proto in override_protos:
+    method_names = [
+        method.name()
+        for method in methods
+        if batch_manifest.matches(override_proto.method, method.name())
+    ]
+    if not method_names:
+      LOG.warning("No method matches the override of %s.",
+                  override_proto.method)
+      continue
+
+    a_sequences_by_id = None
+    if override_proto.input_data:
+      if override_proto.input_data not in data_sets:
+        data_sets[override_proto.input_data] = sequences_by_id(
+            read_data_set(override_proto.input_data))
+      a_sequences_by_id = data_sets[override_proto.input_data]
+
+    library = font_library
+    if override_proto.font_directory:
+      library = (override_proto.font_directory,
+                 font_files.manifest(override_proto.font_manifest),
+                 font_files.pack(override_proto.font_pack))
+    overrides.append(MethodOverride(method_names, *library, a_sequences_by_id))
+  return overrides
+
+
+def sequences_by_id(data_set):
+  """Returns a dict of sequence id => PageViewSequenceProto of a data set."""
+  result = dict()
+  for sequence in data_set.sequences:
+    if sequence.id in result:
+      raise ValueError("Sequence id %s isn't unique." % sequence.id)
+    result[sequence.id] = sequence
+  return result
+
+
+def override_font_loader(override, default_font_id):
+  """Returns a FontLoader for the font library of an override."""
+  return font_loader.FontLoader(override.font_directory, default_font_id,
+                                override.font_manifest, override.font_pack)
+
+
+def method_inputs(overrides, default_font_id):
+  """Returns a dict of method name => simulation.MethodInputs for the methods
+  of overrides."""
+  result = dict()
+  for override in overrides:
+    inputs = simulation.MethodInputs(
+        override_font_loader(override, default_font_id),
+        override.sequences_by_id)
+    for method_name in override.method_names:
+      result[method_name] = inputs
+  return result
+
+
+def sequence_for(overrides, override_index, sequence):
+  """Returns the version of sequence simulated by the methods of an override.
+
+  override_index indexes overrides, None is the analysis' own methods.
+  Returns None if the override has no version of sequence.
+  """
+  if override_index is None:
+    return sequence
+  versions = overrides[override_index].sequences_by_id
+  if versions is None:
+    return sequence
+  return versions.get(sequence.id)
+
+
+def missing_sequences(overrides, sequences):
+  """Returns a dict of sequence index => reason code for each sequence that
+  one of overrides has no version of.
+
+  Raises ValueError if sequences are matched by id but their ids aren't
+  unique.
+  """
+  failures = dict()
+  for override in overrides:
+    if override.sequences_by_id is None:
+      continue
+    if len({sequence.id for sequence in sequences}) != len(sequences):
+      raise ValueError(
+          "Sequence ids must be unique to use --method_input_data.")
+    for idx, sequence in enumerate(sequences):
+      if sequence.id not in override.sequences_by_id:
+        failures[idx] = preflight.MISSING_SEQUENCE
+  if failures:
+    LOG.info("%s sequences dropped, they're missing from a method's data set.",
+             len(failures))
+  return failures
@@ -0,0 +1,105 @@
+"""Unit tests for the method_override module."""
+
+import unittest
+from analysis import batch_manifest_pb2
+from analysis import method_override
+from analysis import page_view_sequence_pb2
+from analysis import preflight
+
+
+class FakeMethod:
+  """A PFE method which only has a name."""
+
+  def __init__(self, name):
+    self.method_name = name
+
+  def name(self):
+    return self.method_name
+
+
+def data_set(*sequence_ids):
+  """Returns a DataSetProto with an empty sequence for each of sequence_ids."""
+  result = page_view_sequence_pb2.DataSetProto()
+  for sequence_id in sequence_ids:
+    result.sequences.add().id = sequence_id
+  return result
+
+
+class MethodOverrideTest(unittest.TestCase):
+
+  def test_create_method_overrides(self):
+    override_protos = [
+        batch_manifest_pb2.MethodOverrideProto(method="RangeRequest",
+                                               font_directory="fonts.optimized",
+                                               input_data="optimized.pb"),
+        batch_manifest_pb2.MethodOverrideProto(method="Optimal",
+                                               input_data="optimized.pb"),
+    ]
+    methods = [
+        FakeMethod("RangeRequest"),
+        FakeMethod("RangeRequest[brotli-11]"),
+        FakeMethod("WholeFont"),
+    ]
+    read_paths = []
+
+    def read_data_set(path):
+      read_paths.append(path)
+      return data_set(1, 2)
+
+    overrides = method_override.create_method_overrides(
+        override_protos, methods, ("fonts", None, None), read_data_set,
+        method_override.FontFiles())
+    self.assertEqual(len(overrides), 1)
+    self.assertEqual(overrides[0].method_names,
+                     ["RangeRequest", "RangeRequest[brotli-11]"])
+    self.assertEqual(overrides[0].font_directory, "fonts.optimized")
+    self.assertEqual(sorted(overrides[0].sequences_by_id), [1, 2])
+    self.assertEqual(read_paths, ["optimized.pb"])
+
+  def test_missing_sequences(self):
+    sequences = data_set(1, 2, 3).sequences
+    optimized = method_override.sequences_by_id(data_set(3, 1))
+    overrides = [
+        method_override.MethodOverride(["RangeRequest"], "fonts", None, None,
+                                       optimized),
+        method_override.MethodOverride(["WholeFont"], "fonts", None, None,
+                                       None),
+    ]
+    self.assertEqual(method_override.missing_sequences(overrides, sequences),
+                     {1: preflight.MISSING_SEQUENCE})
+    self.assertEqual(method_override.missing_sequences([], sequences), {})
+    self.assertEqual(method_override.sequence_for(overrides, 0, sequences[2]),
+                     optimized[3])
+    self.assertIsNone(method_override.sequence_for(overrides, 0, sequences[1]))
+    for override_index in [None, 1]:
+      self.assertEqual(
+          method_override.sequence_for(overrides, override_index, sequences[1]),
+          sequences[1])
+
+    with self.assertRaises(ValueError):
+      method_override.missing_sequences(overrides,
+                                        list(sequences) + [sequences[0]])
+
+  def test_method_inputs(self):
+    optimized = method_override.sequences_by_id(data_set(1))
+    overrides = [
+        method_override.MethodOverride(["RangeRequest", "RangeRequest[gzip]"],
+                                       "fonts.optimized", None, None,
+                                       optimized),
+    ]
+    inputs = method_override.method_inputs(overrides, "default.ttf")
+    self.assertEqual(sorted(inputs), ["RangeRequest", "RangeRequest[gzip]"])
+    self.assertIs(inputs["RangeRequest"], inputs["RangeRequest[gzip]"])
+    self.assertEqual(inputs["RangeRequest"].font_loader.directory(),
+                     "fonts.optimized")
+    self.assertEqual(inputs["RangeRequest"].font_loader.default_font(),
+                     "default.ttf")
+    self.assertIs(inputs["RangeRequest"].sequences_by_id, optimized)
+
+  def test_sequences_by_id(self):
+    with self.assertRaises(ValueError):
+      method_override.sequences_by_id(data_set(1, 2, 1))
+
+
+if __name__ == '__main__':
+  unittest.main()
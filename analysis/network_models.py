@@ -3,8 +3,14 @@
 A network model is defined as the estimated round trip time, upstream bandwidth,
 and downstream bandwidth. This module defines several different models that
 attempt to estimate the behaviour of networks in use by users.
+
+Alternatively a set of network models can be loaded from a
+NetworkModelsProto config (see load()), which can describe dense grids of
+network conditions or empirical distributions of them.
 """
 
+from google.protobuf import text_format
+from analysis import network_models_pb2
 from analysis import simulation
 
 # Estimated size of a http request header in bytes for a HTTP2 request using HPACK.
@@ -19,6 +25,18 @@ ESTIMATED_HTTP_REQUEST_HEADER_SIZE = 35
 # Estimated size of a http response header in bytes for a HTTP2 response using HPACK.
 ESTIMATED_HTTP_RESPONSE_HEADER_SIZE = 35
 
+# Estimated size of the framing of each part of a multipart/byteranges
+# response: a boundary line followed by the Content-Type and Content-Range
+# part headers. These are in the response body so aren't HPACK compressed.
+ESTIMATED_MULTIPART_PART_HEADER_SIZE = 80
+
+# Estimated size of the closing boundary line of a multipart/byteranges response.
+ESTIMATED_MULTIPART_CLOSE_DELIMITER_SIZE = 24
+
+# Estimated size of each additional range in a Range request header
+# (for example ", 123456-234567").
+ESTIMATED_RANGE_SPEC_SIZE = 15
+
 # The following network models were derived from browser reported connection speeds (from Chrome)
 # across a variety of connection types. For each connection type 5 different speeds are provided
 # ranging from the slowest observed speeds to the fastest for that connection type.
@@ -209,3 +227,138 @@ DESKTOP_FASTEST = simulation.NetworkModel("desktop_fastest",
                                           bandwidth_down=7500,
                                           category="desktop",
                                           weight=0.05)
+
+# Every model above, the analyzer simulates all of them by default.
+ALL_MODELS = [
+    MOBILE_2G_SLOWEST,
+    MOBILE_2G_SLOW,
+    MOBILE_2G_MEDIAN,
+    MOBILE_2G_FAST,
+    MOBILE_2G_FASTEST,
+    MOBILE_3G_SLOWEST,
+    MOBILE_3G_SLOW,
+    MOBILE_3G_MEDIAN,
+    MOBILE_3G_FAST,
+    MOBILE_3G_FASTEST,
+    MOBILE_4G_SLOWEST,
+    MOBILE_4G_SLOW,
+    MOBILE_4G_MEDIAN,
+    MOBILE_4G_FAST,
+    MOBILE_4G_FASTEST,
+    MOBILE_WIFI_SLOWEST,
+    MOBILE_WIFI_SLOW,
+    MOBILE_WIFI_MEDIAN,
+    MOBILE_WIFI_FAST,
+    MOBILE_WIFI_FASTEST,
+    DESKTOP_SLOWEST,
+    DESKTOP_SLOW,
+    DESKTOP_MEDIAN,
+    DESKTOP_FAST,
+    DESKTOP_FASTEST,
+]
+
+
+def load(config_path):
+  """Loads the network models described by the textproto NetworkModelsProto at config_path."""
+  with open(config_path, 'r') as config_file:
+    config = text_format.Parse(config_file.read(),
+                               network_models_pb2.NetworkModelsProto())
+  return from_proto(config)
+
+
+def from_proto(config):
+  """Returns the list of network models described by a NetworkModelsProto.
+
+  Raises ValueError if the config is invalid.
+  """
+  result = []
+  for category in config.categories:
+    if category.points and category.HasField("grid"):
+      raise ValueError("Category %s has both points and a grid." %
+                       category.category)
+    if category.points:
+      models = point_models(category.category, category.points)
+    elif category.HasField("grid"):
+      models = grid_models(category.category, category.grid)
+    else:
+      raise ValueError("Category %s has no network models." % category.category)
+    result.extend(models)
+
+  names = [model.name for model in result]
+  if len(set(names)) != len(names):
+    raise ValueError("Network model names must be unique.")
+  return result
+
+
+def point_models(category, points):
+  """Network models for a list of NetworkPointProto's."""
+  weights = [point.weight for point in points]
+  if not any(weights):
+    weights = [1] * len(points)
+  return [
+      simulation.NetworkModel(point.name or "%s_%s" % (category, idx),
+                              rtt=point.rtt,
+                              bandwidth_up=point.bandwidth_up,
+                              bandwidth_down=point.bandwidth_down,
+                              category=category,
+                              weight=weight)
+      for idx, (point, weight) in enumerate(zip(points, normalize(weights)))
+  ]
+
+
+def grid_models(category, grid):
+  """Network models for every point of a NetworkGridProto."""
+  rtt_weights = axis_weights(grid.rtt, grid.rtt_density, "rtt")
+  bandwidth_weights = axis_weights(grid.bandwidth_down,
+                                   grid.bandwidth_down_density,
+                                   "bandwidth_down")
+  up_ratio = grid.bandwidth_up_ratio or 1
+  weights = normalize([
+      rtt_weight * bandwidth_weight
+      for rtt_weight in rtt_weights
+      for bandwidth_weight in bandwidth_weights
+  ])
+
+  result = []
+  for rtt in grid.rtt:
+    for bandwidth in grid.bandwidth_down:
+      result.append(
+          simulation.NetworkModel("%s_rtt_%g_down_%g" %
+                                  (category, rtt, bandwidth),
+                                  rtt=rtt,
+                                  bandwidth_up=bandwidth * up_ratio,
+                                  bandwidth_down=bandwidth,
+                                  category=category,
+                                  weight=weights[len(result)]))
+  return result
+
+
+def axis_weights(values, densities, axis_name):
+  """Trapezoidal rule weights of each value of a grid axis.
+
+  Each value is weighted by its density times the width of its cell, which
+  extends half way to the neighbouring values.
+  """
+  if not values:
+    raise ValueError("Grid axis %s has no values." % axis_name)
+  if any(values[idx] >= values[idx + 1] for idx in range(len(values) - 1)):
+    raise ValueError("Grid axis %s must be increasing." % axis_name)
+  if densities and len(densities) != len(values):
+    raise ValueError("Grid axis %s needs a density for each value." % axis_name)
+  if len(values) == 1:
+    return [1]
+
+  widths = [(values[min(idx + 1,
+                        len(values) - 1)] - values[max(idx - 1, 0)]) / 2
+            for idx in range(len(values))]
+  if not densities:
+    return widths
+  return [width * density for width, density in zip(widths, densities)]
+
+
+def normalize(weights):
+  """Scales weights so they sum to one."""
+  total = sum(weights)
+  if total <= 0:
+    raise ValueError("Network model weights must sum to more than zero.")
+  return [weight / total for weight in weights]
@@ -0,0 +1,122 @@
+"""Unit tests for the network_models module."""
+
+import os
+import tempfile
+import unittest
+
+from google.protobuf import text_format
+from analysis import network_models
+from analysis import network_models_pb2
+from analysis import simulation
+
+
+def parse(config_text):
+  return text_format.Parse(config_text, network_models_pb2.NetworkModelsProto())
+
+
+class NetworkModelsTest(unittest.TestCase):
+
+  def test_all_models_weights(self):
+    weights = dict()
+    for model in network_models.ALL_MODELS:
+      weights[model.category] = weights.get(model.category, 0) + model.weight
+    for weight in weights.values():
+      self.assertAlmostEqual(weight, 1)
+
+  def test_points(self):
+    models = network_models.from_proto(
+        parse("""
+        categories {
+          category: "measured"
+          points { rtt: 100 bandwidth_up: 10 bandwidth_down: 20 weight: 1 }
+          points {
+            name: "fast" rtt: 10 bandwidth_up: 100 bandwidth_down: 200
+            weight: 3
+          }
+        }
+        categories {
+          category: "other"
+          points { rtt: 50 bandwidth_up: 5 bandwidth_down: 5 }
+          points { rtt: 60 bandwidth_up: 5 bandwidth_down: 5 }
+        }
+        """))
+
+    self.assertEqual(models, [
+        simulation.NetworkModel("measured_0", 100, 10, 20, "measured", 0.25),
+        simulation.NetworkModel("fast", 10, 100, 200, "measured", 0.75),
+        simulation.NetworkModel("other_0", 50, 5, 5, "other", 0.5),
+        simulation.NetworkModel("other_1", 60, 5, 5, "other", 0.5),
+    ])
+
+  def test_grid(self):
+    models = network_models.from_proto(
+        parse("""
+        categories {
+          category: "grid"
+          grid {
+            rtt: [10, 20, 40]
+            bandwidth_down: [100, 300]
+            bandwidth_up_ratio: 0.5
+          }
+        }
+        """))
+
+    self.assertEqual([model.name for model in models], [
+        "grid_rtt_10_down_100",
+        "grid_rtt_10_down_300",
+        "grid_rtt_20_down_100",
+        "grid_rtt_20_down_300",
+        "grid_rtt_40_down_100",
+        "grid_rtt_40_down_300",
+    ])
+    self.assertEqual(models[1].bandwidth_up, 150)
+    self.assertEqual(models[1].bandwidth_down, 300)
+    # rtt cells are 5, 15 and 10 wide, bandwidth cells are equal.
+    self.assertEqual([model.weight for model in models],
+                     [5 / 60, 5 / 60, 15 / 60, 15 / 60, 10 / 60, 10 / 60])
+
+  def test_grid_density(self):
+    models = network_models.from_proto(
+        parse("""
+        categories {
+          category: "grid"
+          grid {
+            rtt: [10, 20, 30]
+            rtt_density: [0, 1, 3]
+            bandwidth_down: [100]
+          }
+        }
+        """))
+
+    self.assertEqual([model.weight for model in models], [0, 0.4, 0.6])
+    self.assertEqual(models[0].bandwidth_up, 100)
+
+  def test_invalid(self):
+    for config in [
+        'categories { category: "empty" }',
+        'categories { category: "c" grid { rtt: 1 } }',
+        'categories { category: "c" grid { rtt: [2, 1] bandwidth_down: 1 } }',
+        'categories { category: "c" '
+        'grid { rtt: [1, 2] rtt_density: 1 bandwidth_down: 1 } }',
+        'categories { category: "c" grid { rtt: 1 bandwidth_down: 1 } '
+        'points { rtt: 1 bandwidth_up: 1 bandwidth_down: 1 } }',
+        'categories { category: "c" '
+        'points { name: "a" rtt: 1 bandwidth_up: 1 bandwidth_down: 1 } '
+        'points { name: "a" rtt: 2 bandwidth_up: 1 bandwidth_down: 1 } }',
+    ]:
+      with self.assertRaises(ValueError, msg=config):
+        network_models.from_proto(parse(config))
+
+  def test_load(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      path = os.path.join(temp_dir, "models.textproto")
+      with open(path, "w") as config_file:
+        config_file.write('categories { category: "c" '
+                          'points { rtt: 1 bandwidth_up: 2 bandwidth_down: 3 }'
+                          ' }')
+      self.assertEqual(network_models.load(path),
+                       [simulation.NetworkModel("c_0", 1, 2, 3, "c", 1)])
+
+
+if __name__ == '__main__':
+  unittest.main()
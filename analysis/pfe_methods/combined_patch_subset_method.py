@@ -4,12 +4,29 @@ Simulates the patch subset PFE method but picks the optimal codepoint prediction
 parameters based on the network conditions.
 """
 
-import sys
+import functools
+import hashlib
+import io
+import logging
+
 from absl import flags
+from google.protobuf import text_format
+from analysis.pfe_methods import codepoint_prediction_settings_pb2
 from patch_subset.py import patch_subset_method
 
+LOG = logging.getLogger("analyzer")
+
 FLAGS = flags.FLAGS
 
+# Version of the prediction settings format which can be loaded.
+SETTINGS_VERSION = 1
+
+DEFAULT_SETTINGS_PATH = (
+    "analysis/pfe_methods/codepoint_prediction_settings.textproto")
+
+# Warnings which have already been logged.
+WARNED = set()
+
 flags.DEFINE_bool(
     "auto_settings", False, "Should the max codepoints and frequency "
     "threshold be auto-chosen using optimized values.")
@@ -18,6 +35,11 @@ flags.DEFINE_bool(
     "no_opt", False, "No optimizations, sets max codepoints and frequency "
     "threshold to 0.")
 
+flags.DEFINE_string(
+    "prediction_settings", DEFAULT_SETTINGS_PATH,
+    "Path to a CodepointPredictionSettingsProto textproto with the codepoint "
+    "prediction parameters used by --auto_settings.")
+
 
 class CombinedPatchSubsetMethod:
   """Patch subset with automatic codepoint prediction based on network."""
@@ -33,20 +55,28 @@ class CombinedPatchSubsetMethod:
   def start_session(self, network_model, font_loader):
     return CombinedPatchSubsetSession(self.script, network_model, font_loader)
 
+  def cache_key(self):
+    """Identifies the configuration of this method for the result cache."""
+    settings = ""
+    if FLAGS.auto_settings and not FLAGS.no_opt:
+      settings = settings_hash(FLAGS.prediction_settings)
+    return "%s(%s,auto_settings=%s,no_opt=%s,%s)" % (
+        self.name(), self.script, FLAGS.auto_settings, FLAGS.no_opt, settings)
+
   def network_sensitive(self):  # pylint: disable=no-self-use
     return True
 
 
-def pick_method(network_model, script_category):  # pylint: disable=too-many-return-statements
+def pick_method(network_model, script_category):
   """Select best method based on the clients rtt and the script.
 
   Picks the best set of codepoint prediction parameters for patch subset
-  based on the script being simulated and the clients round trip time.
+  based on the script being simulated and the clients network model.
   """
 
-  # These settings were determined by testing various combinations of values to
-  # find the best performing values for different RTT classes. This can likely be
-  # further improved with more fine grained tuning based on RTT.
+  # The settings are determined by analysis:tune_codepoint_prediction, which
+  # searches for the best performing values for each script category and
+  # network model.
   #
   # TODO(garretrieger): should use the font being extended to determine the script category.
   if FLAGS.no_opt:
@@ -54,98 +84,66 @@ def pick_method(network_model, script_category):  # pylint: disable=too-many-ret
     return patch_subset_method.create_with_codepoint_remapping()
   if FLAGS.auto_settings:
     if not network_model:
-      sys.stderr.write("MISSING NETWORK MODEL\n")
+      warn_once("Missing network model, codepoint prediction is not used.")
     elif not script_category:
-      sys.stderr.write("MISSING SCRIPT CATEGORY\n")
+      warn_once("Missing script category, codepoint prediction is not used.")
     else:
       vals = optimal_settings(network_model, script_category)
       if vals[0] is not None and vals[1] is not None:
         return patch_subset_method.create_with_codepoint_prediction(
             vals[0], vals[1])
-      # Should not happen. Fall through to non-auto behavior.
-      sys.stderr.write("MISSING KEY FOR " + network_model.name + " " +
-                       script_category)
+      warn_once(
+          "No codepoint prediction settings for %s on %s in %s, codepoint "
+          "prediction is not used." %
+          (script_category, network_model.name, FLAGS.prediction_settings))
   return patch_subset_method.create_with_codepoint_remapping()
 
 
+def warn_once(message):
+  """Logs message the first time it's seen, sessions are started often."""
+  if message in WARNED:
+    return
+  WARNED.add(message)
+  LOG.warning(message)
+
+
+def read_settings(path):
+  """Reads a CodepointPredictionSettingsProto textproto."""
+  with io.open(path, "r", encoding="utf8") as settings_file:
+    settings_proto = text_format.Parse(
+        settings_file.read(),
+        codepoint_prediction_settings_pb2.CodepointPredictionSettingsProto())
+
+  if settings_proto.version != SETTINGS_VERSION:
+    raise ValueError("%s has settings version %s, expected version %s." %
+                     (path, settings_proto.version, SETTINGS_VERSION))
+  return settings_proto
+
+
+@functools.lru_cache(maxsize=None)
+def load_settings(path):
+  """Loads the prediction settings in path.
+
+  Returns a dict of (script category, network model name) =>
+  (max codepoints, frequency threshold).
+  """
+  return {
+      (setting.script_category, setting.network_model_name):
+          (setting.max_codepoints, setting.freq_threshold)
+      for setting in read_settings(path).settings
+  }
+
+
+@functools.lru_cache(maxsize=None)
+def settings_hash(path):
+  with open(path, "rb") as settings_file:
+    return hashlib.sha256(settings_file.read()).hexdigest()
+
+
 def optimal_settings(network_model, script_category):
   "Given the type of font and network situation, pick optimal settings."
-  max_cp_map = {
-      "arabic_indic_mobile_2g_fast": 265,
-      "arabic_indic_mobile_2g_fastest": 19,
-      "arabic_indic_mobile_2g_median": 50,
-      "arabic_indic_mobile_2g_slow": 46,
-      "arabic_indic_mobile_2g_slowest": 48,
-      "arabic_indic_mobile_3g_fast": 23,
-      "arabic_indic_mobile_3g_fastest": 199,
-      "arabic_indic_mobile_3g_median": 48,
-      "arabic_indic_mobile_3g_slow": 1,
-      "arabic_indic_mobile_3g_slowest": 44,
-      "latin_mobile_2g_fast": 42,
-      "latin_mobile_2g_fastest": 25,
-      "latin_mobile_2g_median": 40,
-      "latin_mobile_2g_slow": 40,
-      "latin_mobile_2g_slowest": 44,
-      "latin_mobile_3g_fast": 40,
-      "latin_mobile_3g_fastest": 55,
-      "latin_mobile_3g_median": 34,
-      "latin_mobile_3g_slow": 40,
-      "latin_mobile_3g_slowest": 42,
-      "latin_mobile_4g_fast": 41,
-      "latin_mobile_4g_fastest": 42,
-      "latin_mobile_4g_median": 41,
-      "latin_mobile_4g_slow": 40,
-      "latin_mobile_4g_slowest": 29,
-      "latin_desktop_fast": 53,
-      "latin_desktop_fastest": 57,
-      "latin_desktop_median": 43,
-      "latin_desktop_slow": 43,
-      "latin_desktop_slowest": 20,
-      "latin_mobile_wifi_fast": 41,
-      "latin_mobile_wifi_fastest": 40,
-      "latin_mobile_wifi_median": 40,
-      "latin_mobile_wifi_slow": 39,
-      "latin_mobile_wifi_slowest": 16,
-  }
-  freq_thresh_map = {
-      "arabic_indic_mobile_2g_fast": 0.012801,
-      "arabic_indic_mobile_2g_fastest": 0.008294,
-      "arabic_indic_mobile_2g_median": 0.006363,
-      "arabic_indic_mobile_2g_slow": 0.005000,
-      "arabic_indic_mobile_2g_slowest": 0.011558,
-      "arabic_indic_mobile_3g_fast": 0.017334,
-      "arabic_indic_mobile_3g_fastest": 0.013233,
-      "arabic_indic_mobile_3g_median": 0.005000,
-      "arabic_indic_mobile_3g_slow": 0.005000,
-      "arabic_indic_mobile_3g_slowest": 0.005000,
-      "latin_mobile_2g_fast": 0.402695,
-      "latin_mobile_2g_fastest": 0.185896,
-      "latin_mobile_2g_median": 0.308890,
-      "latin_mobile_2g_slow": 0.243782,
-      "latin_mobile_2g_slowest": 0.302098,
-      "latin_mobile_3g_fast": 0.162563,
-      "latin_mobile_3g_fastest": 0.309488,
-      "latin_mobile_3g_median": 0.175873,
-      "latin_mobile_3g_slow": 0.214612,
-      "latin_mobile_3g_slowest": 0.357855,
-      "latin_mobile_4g_fast": 0.287330,
-      "latin_mobile_4g_fastest": 0.298577,
-      "latin_mobile_4g_median": 0.184813,
-      "latin_mobile_4g_slow": 0.185443,
-      "latin_mobile_4g_slowest": 0.271678,
-      "latin_desktop_fast": 0.235539,
-      "latin_desktop_fastest": 0.234036,
-      "latin_desktop_median": 0.295643,
-      "latin_desktop_slow": 0.184798,
-      "latin_desktop_slowest": 0.145719,
-      "latin_mobile_wifi_fast": 0.348847,
-      "latin_mobile_wifi_fastest": 0.270440,
-      "latin_mobile_wifi_median": 0.146268,
-      "latin_mobile_wifi_slow": 0.302356,
-      "latin_mobile_wifi_slowest": 0.185502,
-  }
-  key = script_category + "_" + network_model.name
-  return max_cp_map.get(key), freq_thresh_map.get(key)
+  return load_settings(FLAGS.prediction_settings).get(
+      (script_category, network_model.name), (None, None))
 
 
 class CombinedPatchSubsetSession:
@@ -1,5 +1,7 @@
 """Unit tests for the CombinedPatchSubsetMethod module."""
 from collections import namedtuple
+import os
+import tempfile
 import unittest
 
 from absl import flags
@@ -106,6 +108,25 @@ class CombinedPatchSubsetMethodTest(unittest.TestCase):
         desktop_session_normal.get_request_graphs()[0].total_response_bytes(),
         desktop_session_auto.get_request_graphs()[0].total_response_bytes())
 
+  def test_default_settings(self):
+    settings = combined_patch_subset_method.load_settings(
+        combined_patch_subset_method.DEFAULT_SETTINGS_PATH)
+    self.assertEqual(settings[("latin", "desktop_median")], (43, 0.295643))
+    self.assertEqual(
+        combined_patch_subset_method.optimal_settings(
+            network_models.MOBILE_3G_SLOW, "arabic_indic"), (1, 0.005))
+    self.assertEqual(
+        combined_patch_subset_method.optimal_settings(
+            network_models.MOBILE_3G_SLOW, "cjk"), (None, None))
+
+  def test_settings_version(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      path = os.path.join(temp_dir, "settings.textproto")
+      with open(path, "w") as settings_file:
+        settings_file.write("version: 2")
+      with self.assertRaises(ValueError):
+        combined_patch_subset_method.read_settings(path)
+
 
 if __name__ == '__main__':
   unittest.main()
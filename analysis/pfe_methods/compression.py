@@ -0,0 +1,81 @@
+"""Models of the content encoding applied to HTTP responses.
+
+A compression model maps a payload to the number of bytes sent over the
+wire. Models are named, for example: "none", "zlib", "gzip-9", "brotli-5".
+If no level is given the encoder's default level is used.
+"""
+
+import gzip
+import zlib
+from collections import namedtuple
+
+CompressionModel = namedtuple("CompressionModel", ["name", "compress"])
+
+# Level used when a model name has no level.
+DEFAULT_LEVELS = {
+    "zlib": 6,
+    "gzip": 6,
+    "brotli": 11,
+}
+
+MAX_LEVELS = {
+    "zlib": 9,
+    "gzip": 9,
+    "brotli": 11,
+}
+
+
+def no_compression(data):
+  return bytes(data)
+
+
+def zlib_compressor(level):
+  return lambda data: zlib.compress(data, level)
+
+
+def gzip_compressor(level):
+  return lambda data: gzip.compress(bytes(data), compresslevel=level, mtime=0)
+
+
+def brotli_compressor(level):
+  # Only loaded if needed, brotli_py depends on a native library.
+  from brotli_py import brotli  # pylint: disable=import-outside-toplevel
+  return lambda data: brotli.compress(data, level)
+
+
+COMPRESSORS = {
+    "zlib": zlib_compressor,
+    "gzip": gzip_compressor,
+    "brotli": brotli_compressor,
+}
+
+NONE = CompressionModel("none", no_compression)
+ZLIB = CompressionModel("zlib", zlib.compress)
+
+
+def for_name(model_name):
+  """Returns the CompressionModel for model_name.
+
+  Raises ValueError if model_name isn't a known model.
+  """
+  if model_name == NONE.name:
+    return NONE
+  if model_name == ZLIB.name:
+    return ZLIB
+
+  encoding, separator, level = model_name.partition("-")
+  if encoding not in COMPRESSORS:
+    raise ValueError("Unknown compression model: %s" % model_name)
+  if not separator:
+    level = DEFAULT_LEVELS[encoding]
+  elif level.isdigit() and int(level) <= MAX_LEVELS[encoding]:
+    level = int(level)
+  else:
+    raise ValueError("Invalid level for compression model: %s" % model_name)
+
+  return CompressionModel(model_name, COMPRESSORS[encoding](level))
+
+
+def overhead(model):
+  """Number of bytes model adds to every payload (such as headers and checksums)."""
+  return len(model.compress(b""))
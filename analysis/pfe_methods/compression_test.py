@@ -0,0 +1,42 @@
+"""Unit tests for the compression module."""
+
+import gzip
+import unittest
+import zlib
+from analysis.pfe_methods import compression
+
+DATA = b"abcdefghij" * 100
+
+
+class CompressionTest(unittest.TestCase):
+
+  def test_none(self):
+    model = compression.for_name("none")
+    self.assertEqual(model.name, "none")
+    self.assertEqual(model.compress(DATA), DATA)
+    self.assertEqual(compression.overhead(model), 0)
+
+  def test_zlib(self):
+    self.assertEqual(
+        compression.for_name("zlib").compress(DATA), zlib.compress(DATA))
+    self.assertEqual(
+        compression.for_name("zlib-1").compress(DATA), zlib.compress(DATA, 1))
+
+  def test_gzip(self):
+    model = compression.for_name("gzip-9")
+    self.assertEqual(model.name, "gzip-9")
+    self.assertEqual(gzip.decompress(model.compress(DATA)), DATA)
+    # Output doesn't depend on the time.
+    self.assertEqual(model.compress(DATA), model.compress(DATA))
+    self.assertGreater(len(model.compress(DATA)), len(zlib.compress(DATA, 9)))
+
+  def test_invalid(self):
+    for name in [
+        "lzma", "gzip-10", "brotli-12", "zlib-", "zlib-x", "brotli-1.5"
+    ]:
+      with self.assertRaises(ValueError):
+        compression.for_name(name)
+
+
+if __name__ == '__main__':
+  unittest.main()
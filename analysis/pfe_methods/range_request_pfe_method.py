@@ -5,16 +5,37 @@ runs shaping on the client to determine which glyphs are necessary,
 and then uses range requests to download the specific glyphs which are necessary.
 """
 
-import io
-import zlib
+import array
+import collections
+import itertools
 
+from analysis import font_loader
 from analysis import network_models
 from analysis import request_graph
+from analysis.pfe_methods import compression
 from collections import defaultdict
 from collections import namedtuple
 from fontTools import ttLib
 
+# Caches of per font glyph data, glyph sizes and cmap tables. Keyed by font
+# content hash.
 GLYPH_DATA_CACHE = dict()
+GLYPH_SIZES_CACHE = dict()
+GLYPH_LAYOUT_CACHE = dict()
+CMAP_TABLE_CACHE = dict()
+SIZE_ESTIMATOR_CACHE = dict()
+
+# Value in a cmap table for codepoints that aren't mapped by the font.
+MISSING_GLYPH = -1
+
+# Maximum number of entries in COMPRESSED_SIZE_CACHE.
+COMPRESSED_SIZE_CACHE_SIZE = 100000
+
+DEFAULT_NETWORK_STARTUP_COST_IN_BYTES = network_models.ESTIMATED_HTTP_REQUEST_HEADER_SIZE + network_models.ESTIMATED_HTTP_RESPONSE_HEADER_SIZE
+
+# With multipart requests fetching an additional range costs a range in the
+# request header and a part header in the response, instead of a whole request.
+MULTIPART_NETWORK_STARTUP_COST_IN_BYTES = network_models.ESTIMATED_RANGE_SPEC_SIZE + network_models.ESTIMATED_MULTIPART_PART_HEADER_SIZE
 
 def name():
   return "RangeRequest"
@@ -23,59 +44,281 @@ def name():
 # network_model.rtt * network_model.bandwidth_down
 # network_models.ESTIMATED_HTTP_REQUEST_HEADER_SIZE + network_models.ESTIMATED_HTTP_RESPONSE_HEADER_SIZE
 # Whatever it has to be such that (network_model.rtt * network_model.bandwidth_down) / len(requests) == network_startup_cost_in_bytes
-def start_session(network_model, font_loader, network_startup_cost_in_bytes=network_models.ESTIMATED_HTTP_REQUEST_HEADER_SIZE + network_models.ESTIMATED_HTTP_RESPONSE_HEADER_SIZE):
+def start_session(network_model, font_loader, network_startup_cost_in_bytes=DEFAULT_NETWORK_STARTUP_COST_IN_BYTES):
   return RangeRequestPfeSession(network_model, font_loader, network_startup_cost_in_bytes)
 
-def codepoints_to_glyphs(font_bytes, codepoints):
-  font = ttLib.TTFont(io.BytesIO(font_bytes))
+def is_range_request_method(method):
+  return method.name().startswith(name())
+
+class RangeRequestMethod:
+  """RangeRequest with non default settings.
+
+  compression_model (see compression.py) is the content encoding applied to
+  responses. If estimate_compressed_sizes is set the compressed size of each
+  request is estimated from per glyph compressed sizes instead of compressing
+  the data sent by each request. If multipart is set all of the glyph ranges
+  needed by a page view are fetched with multipart/byteranges requests, at
+  most max_ranges_per_request ranges per request (no limit if 0). Non default
+  settings are listed in the method name, for example:
+  RangeRequest[brotli-11,multipart-4,estimated]
+  """
+
+  def __init__(self, estimate_compressed_sizes=False, compression_model=compression.ZLIB,
+               multipart=False, max_ranges_per_request=0):
+    self.estimate_compressed_sizes = estimate_compressed_sizes
+    self.compression_model = compression_model
+    self.multipart = multipart
+    self.max_ranges_per_request = max_ranges_per_request
+
+  def name(self):
+    settings = []
+    if self.compression_model.name != compression.ZLIB.name:
+      settings.append(self.compression_model.name)
+    if self.multipart:
+      settings.append("multipart-%s" % self.max_ranges_per_request
+                      if self.max_ranges_per_request else "multipart")
+    if self.estimate_compressed_sizes:
+      settings.append("estimated")
+    if not settings:
+      return name()
+    return "%s[%s]" % (name(), ",".join(settings))
+
+  def start_session(self, network_model, font_loader, network_startup_cost_in_bytes=None):
+    if network_startup_cost_in_bytes is None:
+      network_startup_cost_in_bytes = (MULTIPART_NETWORK_STARTUP_COST_IN_BYTES if self.multipart
+                                       else DEFAULT_NETWORK_STARTUP_COST_IN_BYTES)
+    return RangeRequestPfeSession(network_model, font_loader, network_startup_cost_in_bytes,
+                                  estimate_compressed_sizes=self.estimate_compressed_sizes,
+                                  compression_model=self.compression_model,
+                                  multipart=self.multipart,
+                                  max_ranges_per_request=self.max_ranges_per_request)
+
+def font_cmap(font_bytes):
+  """Returns a dict of codepoint => glyph id for the best cmap in the font."""
+  font = ttLib.TTFont(font_loader.font_file(font_bytes))
   cmap = font["cmap"].getBestCmap()
-  return set([font.getGlyphID(cmap[codepoint]) for codepoint in codepoints if codepoint in cmap])
+  return {codepoint: font.getGlyphID(glyph_name) for codepoint, glyph_name in cmap.items()}
+
+def cmap_table(cmap):
+  """Converts a codepoint => glyph id dict into a dense lookup table.
+
+  The table is indexed by codepoint, unmapped codepoints hold MISSING_GLYPH.
+  """
+  table = array.array("l", [MISSING_GLYPH]) * ((max(cmap) + 1) if cmap else 0)
+  for codepoint, glyph_id in cmap.items():
+    table[codepoint] = glyph_id
+  return table
+
+def lookup_glyphs(table, codepoints):
+  """Returns the set of glyph ids which codepoints map to in a cmap table."""
+  size = len(table)
+  glyphs = {table[codepoint] for codepoint in codepoints if codepoint < size}
+  glyphs.discard(MISSING_GLYPH)
+  return glyphs
+
+def codepoints_to_glyphs(font_bytes, codepoints):
+  return lookup_glyphs(cmap_table(font_cmap(font_bytes)), codepoints)
 
 class RangeRequestError(Exception):
   """We couldn't figure out the range requests to send."""
 
+def compute_glyph_data(font_bytes):
+  """Splits an optimized font into its bytes and the outline data of each glyph."""
+  font = ttLib.TTFont(font_loader.font_file(font_bytes))
+  font.recalcBBoxes = False
+
+  if "glyf" in font:
+    glyf = font["glyf"]
+    glyph_data = []
+    for glyph in glyf.glyphs.values():
+      if glyph.isComposite():
+        raise RangeRequestError("Optimized fonts should not contain any composite glyphs.")
+      if hasattr(glyph, "data"):
+        glyph_data.append(glyph.data)
+      else:
+        glyph_data.append(b"")
+  elif "CFF " in font:
+    cff = font["CFF "]
+    font_name = cff.cff.fontNames[0]
+    top_dict = cff.cff[font_name]
+    glyph_data = []
+    for glyph_id in range(len(font.getGlyphOrder())):
+      char_string = top_dict.CharStrings.charStringsIndex[glyph_id]
+      char_string.decompile()
+      for item in char_string.program:
+        if item in ('callsubr', 'callgsubr'):
+          raise RangeRequestError("Optimized fonts should not contain any subroutine calls.")
+      char_string.compile()
+      glyph_data.append(char_string.bytecode)
+  else:
+    raise RangeRequestError("Could not determine data for each glyph.")
+
+  return font_bytes, glyph_data
+
+class LruCache:
+  """A dict like cache which evicts the least recently used entry once full."""
+
+  def __init__(self, max_size):
+    self.max_size = max_size
+    self.entries = collections.OrderedDict()
+
+  def __contains__(self, key):
+    return key in self.entries
+
+  def __len__(self):
+    return len(self.entries)
+
+  def get(self, key):
+    """Returns the value for key, or None."""
+    if key not in self.entries:
+      return None
+    self.entries.move_to_end(key)
+    return self.entries[key]
+
+  def put(self, key, value):
+    self.entries[key] = value
+    self.entries.move_to_end(key)
+    if len(self.entries) > self.max_size:
+      self.entries.popitem(last=False)
+
+  def clear(self):
+    self.entries.clear()
+
+# Compressed size of request payloads. Keyed by (compression model name,
+# font content hash, includes base, begin glyph, end glyph).
+COMPRESSED_SIZE_CACHE = LruCache(COMPRESSED_SIZE_CACHE_SIZE)
+
+def compressed_glyph_sizes(font_bytes, glyph_data, compression_model=compression.ZLIB):
+  """Returns the compressed size of the font base and the estimated compressed size of each glyph.
+
+  A glyph's estimate is its compressed size without the fixed overhead of the
+  compression model, so that the estimate for a run of glyphs is the sum of its
+  glyphs.
+  """
+  overhead = compression.overhead(compression_model)
+  base_size = len(font_bytes) - sum(len(data) for data in glyph_data)
+  return (len(compression_model.compress(font_bytes[:base_size])),
+          [max(len(compression_model.compress(data)) - overhead, 0) if data else 0 for data in glyph_data])
+
+class CompressedSizeEstimator:
+  """Estimates compressed request sizes from per glyph compressed sizes using prefix sums."""
+
+  def __init__(self, compressed_base_size, compressed_glyph_sizes, overhead=compression.overhead(compression.ZLIB)):
+    self.compressed_base_size = compressed_base_size
+    self.overhead = overhead
+    self.offsets = array.array("q", itertools.accumulate(compressed_glyph_sizes, initial=0))
+
+  def estimate(self, with_base, begin_glyph, end_glyph):
+    glyphs_size = self.offsets[end_glyph] - self.offsets[begin_glyph]
+    if with_base:
+      return self.compressed_base_size + glyphs_size
+    return self.overhead + glyphs_size
+
+class GlyphLayout:
+  """Per font tables used to plan range requests without visiting every glyph."""
+
+  def __init__(self, glyph_sizes):
+    self.glyph_sizes = glyph_sizes
+    # offsets[g] is the number of glyph data bytes before glyph g.
+    self.offsets = array.array("q", itertools.accumulate(glyph_sizes, initial=0))
+    # next_glyph_with_data[g] is the first glyph >= g with a non zero size,
+    # or len(glyph_sizes) if there is none.
+    self.next_glyph_with_data = array.array("l", [len(glyph_sizes)]) * (len(glyph_sizes) + 1)
+    for glyph_id in range(len(glyph_sizes) - 1, -1, -1):
+      self.next_glyph_with_data[glyph_id] = (glyph_id if glyph_sizes[glyph_id] > 0
+                                             else self.next_glyph_with_data[glyph_id + 1])
+
+  def byte_length(self, begin_glyph, end_glyph):
+    return self.offsets[end_glyph] - self.offsets[begin_glyph]
+
 class RangeRequestPfeSession:
 
-  def __init__(self, network_model, font_loader, network_startup_cost_in_bytes):
+  def __init__(self, network_model, font_loader, network_startup_cost_in_bytes, estimate_compressed_sizes=False,
+               compression_model=compression.ZLIB, multipart=False, max_ranges_per_request=0):
     # FIXME: network_startup_cost_in_bytes should be gathered from the actual network models.
     self.network_model = network_model
     self.font_loader = font_loader
     self.network_startup_cost_in_bytes = network_startup_cost_in_bytes
+    self.estimate_compressed_sizes = estimate_compressed_sizes
+    self.compression_model = compression_model
+    self.multipart = multipart
+    self.max_ranges_per_request = max_ranges_per_request
     self.request_graphs = []
     self.loaded_glyphs = defaultdict(set)
 
   def compute_glyph_data(self, font_id):
-    bytes = io.BytesIO(self.font_loader.load_font(font_id))
-    font = ttLib.TTFont(bytes)
-    font.recalcBBoxes = False
-
-    if "glyf" in font:
-      glyf = font["glyf"]
-      glyph_data = []
-      for glyph in glyf.glyphs.values():
-        if glyph.isComposite():
-          raise RangeRequestError("Optimized fonts should not contain any composite glyphs.")
-        if hasattr(glyph, "data"):
-          glyph_data.append(glyph.data)
-        else:
-          glyph_data.append(b"")
-    elif "CFF " in font:
-      cff = font["CFF "]
-      font_name = cff.cff.fontNames[0]
-      top_dict = cff.cff[font_name]
-      glyph_data = []
-      for glyph_id in range(len(font.getGlyphOrder())):
-        char_string = top_dict.CharStrings.charStringsIndex[glyph_id]
-        char_string.decompile()
-        for item in char_string.program:
-          if item in ('callsubr', 'callgsubr'):
-            raise RangeRequestError("Optimized fonts should not contain any subroutine calls.")
-        char_string.compile()
-        glyph_data.append(char_string.bytecode)
-    else:
-      raise RangeRequestError("Could not determine data for each glyph.")
-
-    return bytes.getvalue(), glyph_data
+    return compute_glyph_data(self.font_loader.load_font(font_id))
+
+  def glyph_data(self, font_id):
+    font_hash = self.font_loader.font_hash(font_id)
+    if font_hash not in GLYPH_DATA_CACHE:
+      GLYPH_DATA_CACHE[font_hash] = self.compute_glyph_data(font_id)
+    return GLYPH_DATA_CACHE[font_hash]
+
+  def glyph_sizes(self, font_id):
+    # Prefer the precomputed sizes from the font manifest, these avoid
+    # having to split the glyph data out of the font.
+    font_hash = self.font_loader.font_hash(font_id)
+    if font_hash not in GLYPH_SIZES_CACHE:
+      entry = self.font_loader.manifest_entry(font_id)
+      if entry is not None and len(entry.glyph_sizes) > 0:
+        GLYPH_SIZES_CACHE[font_hash] = list(entry.glyph_sizes)
+      else:
+        GLYPH_SIZES_CACHE[font_hash] = [len(data) for data in self.glyph_data(font_id)[1]]
+    return GLYPH_SIZES_CACHE[font_hash]
+
+  def cmap_table(self, font_id):
+    # Built once per font, from the font manifest if possible so the font
+    # never has to be parsed.
+    font_hash = self.font_loader.font_hash(font_id)
+    if font_hash not in CMAP_TABLE_CACHE:
+      cmap = self.font_loader.manifest_cmap(font_id)
+      if cmap is None:
+        cmap = font_cmap(self.font_loader.load_font(font_id))
+      CMAP_TABLE_CACHE[font_hash] = cmap_table(cmap)
+    return CMAP_TABLE_CACHE[font_hash]
+
+  def glyph_layout(self, font_id):
+    font_hash = self.font_loader.font_hash(font_id)
+    if font_hash not in GLYPH_LAYOUT_CACHE:
+      GLYPH_LAYOUT_CACHE[font_hash] = GlyphLayout(self.glyph_sizes(font_id))
+    return GLYPH_LAYOUT_CACHE[font_hash]
+
+  def size_estimator(self, font_id):
+    key = (self.compression_model.name, self.font_loader.font_hash(font_id))
+    if key not in SIZE_ESTIMATOR_CACHE:
+      overhead = compression.overhead(self.compression_model)
+      # The font manifest has precomputed sizes for zlib.
+      entry = self.font_loader.manifest_entry(font_id)
+      if (self.compression_model.name == compression.ZLIB.name
+          and entry is not None and len(entry.compressed_glyph_sizes) > 0):
+        SIZE_ESTIMATOR_CACHE[key] = CompressedSizeEstimator(entry.compressed_base_size, entry.compressed_glyph_sizes, overhead)
+      else:
+        font_data, glyph_data = self.glyph_data(font_id)
+        SIZE_ESTIMATOR_CACHE[key] = CompressedSizeEstimator(
+            *compressed_glyph_sizes(font_data, glyph_data, self.compression_model), overhead)
+    return SIZE_ESTIMATOR_CACHE[key]
+
+  def compressed_size(self, font_id, with_base, begin_glyph, end_glyph):
+    """Size of the compressed payload holding glyphs [begin_glyph, end_glyph), and the base of the font if with_base."""
+    if self.estimate_compressed_sizes:
+      return self.size_estimator(font_id).estimate(with_base, begin_glyph, end_glyph)
+
+    key = (self.compression_model.name, self.font_loader.font_hash(font_id), with_base, begin_glyph, end_glyph)
+    size = COMPRESSED_SIZE_CACHE.get(key)
+    if size is None:
+      font_data, glyph_data = self.glyph_data(font_id)
+      parts = glyph_data[begin_glyph : end_glyph]
+      if with_base:
+        # Assume the font has been optimized correctly, and glyph data is placed at the end
+        base_size = len(font_data) - self.glyph_layout(font_id).offsets[-1]
+        parts = [font_data[: base_size]] + parts
+      size = len(self.compression_model.compress(b"".join(parts)))
+      COMPRESSED_SIZE_CACHE.put(key, size)
+    return size
+
+  def codepoints_to_glyphs(self, font_id, codepoints):
+    return lookup_glyphs(self.cmap_table(font_id), codepoints)
 
   class GlyphRange:
     def __init__(self, byte_length, begin_glyph, end_glyph):
@@ -93,50 +336,76 @@ class RangeRequestPfeSession:
       return not self.__eq__(other)
 
   def compute_range_parallel_arrays(self, glyph_sizes, glyphs_to_download):
+    return self.plan_ranges(GlyphLayout(glyph_sizes), glyphs_to_download)
+
+  def plan_ranges(self, layout, glyphs_to_download):
+    """Splits the glyphs of a font into alternating runs of necessary and unnecessary glyphs.
+
+    Glyphs with no data never start a run. Only the needed glyphs are visited, the
+    glyphs between them are skipped over using the layout's precomputed tables.
+    """
+    num_glyphs = len(layout.glyph_sizes)
+    needed = sorted(glyph_id for glyph_id in glyphs_to_download
+                    if 0 <= glyph_id < num_glyphs and layout.glyph_sizes[glyph_id] > 0)
     necessary_glyph_ranges = []
     unnecessary_glyph_ranges = []
-    run_length = 0
     start_glyph_id = 0
-    state = True # Whether or not the previous glyph was necessary
-    for glyph_id in range(len(glyph_sizes)):
-      glyph_size = glyph_sizes[glyph_id]
-      if glyph_size == 0:
-        continue
-      glyph_is_necessary = glyph_id in glyphs_to_download
-      if glyph_is_necessary:
-        if not state:
-          unnecessary_glyph_ranges.append(self.GlyphRange(run_length, start_glyph_id, glyph_id))
-          run_length = 0
-          start_glyph_id = glyph_id
-      elif state:
-        necessary_glyph_ranges.append(self.GlyphRange(run_length, start_glyph_id, glyph_id))
-        run_length = 0
-        start_glyph_id = glyph_id
-      state = glyph_is_necessary
-      run_length += glyph_size
+    state = True # Whether or not the current run is necessary
+    position = 0
+    i = 0
+    while True:
+      if state:
+        # Skip over the run of needed glyphs to the next glyph with data that isn't needed.
+        glyph_id = layout.next_glyph_with_data[position]
+        while i < len(needed) and needed[i] == glyph_id:
+          i += 1
+          glyph_id = layout.next_glyph_with_data[glyph_id + 1]
+        if glyph_id >= num_glyphs:
+          break
+        necessary_glyph_ranges.append(self.GlyphRange(layout.byte_length(start_glyph_id, glyph_id), start_glyph_id, glyph_id))
+      else:
+        if i >= len(needed):
+          break
+        glyph_id = needed[i]
+        unnecessary_glyph_ranges.append(self.GlyphRange(layout.byte_length(start_glyph_id, glyph_id), start_glyph_id, glyph_id))
+      start_glyph_id = glyph_id
+      position = glyph_id
+      state = not state
+    run_length = layout.byte_length(start_glyph_id, num_glyphs)
     if run_length > 0:
       if state:
-        necessary_glyph_ranges.append(self.GlyphRange(run_length, start_glyph_id, len(glyph_sizes)))
+        necessary_glyph_ranges.append(self.GlyphRange(run_length, start_glyph_id, num_glyphs))
       else:
-        unnecessary_glyph_ranges.append(self.GlyphRange(run_length, start_glyph_id, len(glyph_sizes)))
+        unnecessary_glyph_ranges.append(self.GlyphRange(run_length, start_glyph_id, num_glyphs))
     if len(necessary_glyph_ranges) > len(unnecessary_glyph_ranges):
-      unnecessary_glyph_ranges.append(self.GlyphRange(0, necessary_glyph_ranges[-1].end_glyph, len(glyph_sizes)))
+      unnecessary_glyph_ranges.append(self.GlyphRange(0, necessary_glyph_ranges[-1].end_glyph, num_glyphs))
     # Now they should have the same lengths
     return necessary_glyph_ranges, unnecessary_glyph_ranges
 
   def coalesce_runs(self, necessary_glyph_ranges, unnecessary_glyph_ranges):
+    """Merges necessary runs separated by gaps cheaper than a request, in place."""
     extra_glyphs_to_download = set()
-    i = 0
-    while i < len(unnecessary_glyph_ranges):
-      if unnecessary_glyph_ranges[i].byte_length < self.network_startup_cost_in_bytes and i + 1 < len(necessary_glyph_ranges):
+    if not necessary_glyph_ranges:
+      return extra_glyphs_to_download
+
+    current = necessary_glyph_ranges[0]
+    merged_necessary = [current]
+    merged_unnecessary = []
+    for i, gap in enumerate(unnecessary_glyph_ranges):
+      if gap.byte_length < self.network_startup_cost_in_bytes and i + 1 < len(necessary_glyph_ranges):
         # It's cheaper to merge these two requests
-        extra_glyphs_to_download.update(range(unnecessary_glyph_ranges[i].begin_glyph, unnecessary_glyph_ranges[i].end_glyph))
-        necessary_glyph_ranges[i].byte_length += unnecessary_glyph_ranges[i].byte_length + necessary_glyph_ranges[i + 1].byte_length
-        necessary_glyph_ranges[i].end_glyph = necessary_glyph_ranges[i + 1].end_glyph
-        del unnecessary_glyph_ranges[i]
-        del necessary_glyph_ranges[i + 1]
+        extra_glyphs_to_download.update(range(gap.begin_glyph, gap.end_glyph))
+        current.byte_length += gap.byte_length + necessary_glyph_ranges[i + 1].byte_length
+        current.end_glyph = necessary_glyph_ranges[i + 1].end_glyph
       else:
-        i += 1
+        merged_unnecessary.append(gap)
+        if i + 1 < len(necessary_glyph_ranges):
+          current = necessary_glyph_ranges[i + 1]
+          merged_necessary.append(current)
+    merged_necessary.extend(necessary_glyph_ranges[len(unnecessary_glyph_ranges) + 1:])
+
+    necessary_glyph_ranges[:] = merged_necessary
+    unnecessary_glyph_ranges[:] = merged_unnecessary
     return extra_glyphs_to_download
 
   def compute_initial_state(self, necessary_glyph_ranges, unnecessary_glyph_ranges):
@@ -172,12 +441,10 @@ class RangeRequestPfeSession:
     base_requests = dict()
     necessary_glyphs = defaultdict(set)
     for font_id, usage in usage_by_font.items():
-      if font_id not in GLYPH_DATA_CACHE:
-        GLYPH_DATA_CACHE[font_id] = self.compute_glyph_data(font_id)
-      font_data, glyph_data = GLYPH_DATA_CACHE[font_id]
+      layout = self.glyph_layout(font_id)
 
       needs_base_request = font_id not in self.loaded_glyphs
-      glyphs = codepoints_to_glyphs(self.font_loader.load_font(font_id), usage.codepoints)
+      glyphs = self.codepoints_to_glyphs(font_id, usage.codepoints)
       present_glyphs = self.loaded_glyphs[font_id]
       glyphs_to_download = set([glyph for glyph in glyphs if glyph not in present_glyphs])
 
@@ -186,7 +453,7 @@ class RangeRequestPfeSession:
 
       self.loaded_glyphs[font_id].update(glyphs_to_download)
 
-      necessary_glyph_ranges, unnecessary_glyph_ranges = self.compute_range_parallel_arrays([len(data) for data in glyph_data], glyphs_to_download)
+      necessary_glyph_ranges, unnecessary_glyph_ranges = self.plan_ranges(layout, glyphs_to_download)
       extra_glyphs_to_download = self.coalesce_runs(necessary_glyph_ranges, unnecessary_glyph_ranges)
       self.loaded_glyphs[font_id].update(extra_glyphs_to_download)
 
@@ -197,28 +464,43 @@ class RangeRequestPfeSession:
       if needs_base_request:
         payload_start, payload_end, extra_start, extra_end, starting_index = self.compute_initial_state(necessary_glyph_ranges, unnecessary_glyph_ranges)
 
-        # Assume the font has been optimized correctly, and glyph data is placed at the end
-        base_size = len(font_data) - sum([len(data) for data in glyph_data])
-        payload = font_data[: base_size] + b"".join(glyph_data[payload_start : payload_end])
-
-        compressed_payload = zlib.compress(payload)
+        compressed_size = self.compressed_size(font_id, True, payload_start, payload_end)
         self.loaded_glyphs[font_id].update(range(extra_start, extra_end))
-        base_request = request_graph.Request(network_models.ESTIMATED_HTTP_REQUEST_HEADER_SIZE, network_models.ESTIMATED_HTTP_RESPONSE_HEADER_SIZE + len(compressed_payload))
+        base_request = request_graph.Request(network_models.ESTIMATED_HTTP_REQUEST_HEADER_SIZE, network_models.ESTIMATED_HTTP_RESPONSE_HEADER_SIZE + compressed_size)
         requests.add(base_request)
 
       happens_after = None
       if needs_base_request:
         happens_after = {base_request}
-      for i in range(starting_index, len(necessary_glyph_ranges)):
-        if necessary_glyph_ranges[i].byte_length == 0:
-          continue
-        payload = b"".join(glyph_data[necessary_glyph_ranges[i].begin_glyph : necessary_glyph_ranges[i].end_glyph])
-        compressed_payload = zlib.compress(payload)
-        request = request_graph.Request(network_models.ESTIMATED_HTTP_REQUEST_HEADER_SIZE, network_models.ESTIMATED_HTTP_RESPONSE_HEADER_SIZE + len(compressed_payload), happens_after=happens_after)
-        requests.add(request)
+      glyph_ranges = [glyph_range for glyph_range in necessary_glyph_ranges[starting_index:] if glyph_range.byte_length > 0]
+      if self.multipart:
+        requests.update(self.multipart_requests(font_id, glyph_ranges, happens_after))
+      else:
+        for glyph_range in glyph_ranges:
+          compressed_size = self.compressed_size(font_id, False, glyph_range.begin_glyph, glyph_range.end_glyph)
+          request = request_graph.Request(network_models.ESTIMATED_HTTP_REQUEST_HEADER_SIZE, network_models.ESTIMATED_HTTP_RESPONSE_HEADER_SIZE + compressed_size, happens_after=happens_after)
+          requests.add(request)
 
     graph = request_graph.RequestGraph(requests)
     self.request_graphs.append(graph)
 
+  def multipart_requests(self, font_id, glyph_ranges, happens_after):
+    """Fetches glyph_ranges with as few multipart/byteranges requests as allowed.
+
+    A request for a single range is an ordinary range request.
+    """
+    requests = []
+    batch_size = self.max_ranges_per_request or max(len(glyph_ranges), 1)
+    for start in range(0, len(glyph_ranges), batch_size):
+      batch = glyph_ranges[start : start + batch_size]
+      request_size = network_models.ESTIMATED_HTTP_REQUEST_HEADER_SIZE + network_models.ESTIMATED_RANGE_SPEC_SIZE * (len(batch) - 1)
+      response_size = network_models.ESTIMATED_HTTP_RESPONSE_HEADER_SIZE + sum(
+          self.compressed_size(font_id, False, glyph_range.begin_glyph, glyph_range.end_glyph) for glyph_range in batch)
+      if len(batch) > 1:
+        response_size += (network_models.ESTIMATED_MULTIPART_PART_HEADER_SIZE * len(batch)
+                          + network_models.ESTIMATED_MULTIPART_CLOSE_DELIMITER_SIZE)
+      requests.append(request_graph.Request(request_size, response_size, happens_after=happens_after))
+    return requests
+
   def get_request_graphs(self):
     return self.request_graphs
@@ -2,7 +2,9 @@
 
 import unittest
 from analysis import font_loader
+from analysis import network_models
 from analysis import request_graph
+from analysis.pfe_methods import compression
 from analysis.pfe_methods import range_request_pfe_method
 from collections import namedtuple
 
@@ -72,6 +74,12 @@ class RangeRequestPfeMethodTest(unittest.TestCase):
     self.assertEqual(necessary_glyph_ranges, [GlyphRange(12, 0, 3)])
     self.assertEqual(unnecessary_glyph_ranges, [GlyphRange(0, 3, 3)])
 
+  def test_compute_range_parallel_arrays_empty_glyphs(self):
+    # Glyphs without data don't split runs.
+    necessary_glyph_ranges, unnecessary_glyph_ranges = self.session.compute_range_parallel_arrays([0, 3, 0, 4, 0, 5, 0], [1, 2, 5])
+    self.assertEqual(necessary_glyph_ranges, [GlyphRange(3, 0, 3), GlyphRange(5, 5, 7)])
+    self.assertEqual(unnecessary_glyph_ranges, [GlyphRange(4, 3, 5), GlyphRange(0, 7, 7)])
+
   def test_coalesce_runs_empty(self):
     necessary_glyph_ranges = []
     unnecessary_glyph_ranges = []
@@ -137,6 +145,17 @@ class RangeRequestPfeMethodTest(unittest.TestCase):
     self.assertGreater(result[0], 0)
     self.assertGreater(result[1], 0)
 
+  def test_cmap_table(self):
+    table = range_request_pfe_method.cmap_table({0x41: 3, 0x43: 5})
+    missing = range_request_pfe_method.MISSING_GLYPH
+    self.assertEqual(list(table), [missing] * 0x41 + [3, missing, 5])
+    self.assertEqual(
+        range_request_pfe_method.lookup_glyphs(table, [0x41, 0x42, 0x43, 0x10FFFF]),
+        {3, 5})
+    self.assertEqual(
+        range_request_pfe_method.lookup_glyphs(range_request_pfe_method.cmap_table({}), [0x41]),
+        set())
+
   def test_compute_initial_state(self):
     necessary_glyph_ranges = []
     unnecessary_glyph_ranges = []
@@ -255,6 +274,33 @@ class RangeRequestPfeMethodTest(unittest.TestCase):
     self.assertEqual(base_count, 1)
     self.assertEqual(happens_after_count, 2)
 
+  def test_page_view_disparate_multipart(self):
+    session = range_request_pfe_method.RangeRequestMethod(multipart=True).start_session(
+        None, font_loader.FontLoader("./external/patch_subset/patch_subset/testdata/"), 10)
+    session.page_view({"Ahem.optimized.ttf": u([0x61, 0x7A])})
+    graphs = session.get_request_graphs()
+    self.assertEqual(len(graphs), 1)
+    # The two glyph ranges are fetched by a single request after the base.
+    self.assertEqual(len(graphs[0].requests), 2)
+    self.assertEqual(sorted(len(r.happens_after) for r in graphs[0].requests), [0, 1])
+
+  def test_multipart_requests(self):
+    session = range_request_pfe_method.RangeRequestMethod(multipart=True, max_ranges_per_request=2).start_session(
+        None, None)
+    session.compressed_size = lambda font_id, with_base, begin, end: 10 * (end - begin)
+    requests = session.multipart_requests("font.ttf", [GlyphRange(5, 0, 1), GlyphRange(5, 3, 5), GlyphRange(5, 9, 10)], None)
+    self.assertEqual(len(requests), 2)
+    self.assertEqual(requests[0].request_size,
+                     network_models.ESTIMATED_HTTP_REQUEST_HEADER_SIZE + network_models.ESTIMATED_RANGE_SPEC_SIZE)
+    self.assertEqual(requests[0].response_size,
+                     network_models.ESTIMATED_HTTP_RESPONSE_HEADER_SIZE + 30
+                     + 2 * network_models.ESTIMATED_MULTIPART_PART_HEADER_SIZE
+                     + network_models.ESTIMATED_MULTIPART_CLOSE_DELIMITER_SIZE)
+    # A single range is an ordinary range request.
+    self.assertEqual(requests[1].request_size, network_models.ESTIMATED_HTTP_REQUEST_HEADER_SIZE)
+    self.assertEqual(requests[1].response_size, network_models.ESTIMATED_HTTP_RESPONSE_HEADER_SIZE + 10)
+    self.assertEqual(session.multipart_requests("font.ttf", [], None), [])
+
   def test_page_view_multiple(self):
     self.session.page_view({"Ahem.optimized.ttf": u([0x61])})
     self.session.page_view({"Ahem.optimized.ttf": u([0x7A])})
@@ -290,5 +336,63 @@ class RangeRequestPfeMethodTest(unittest.TestCase):
     self.assertEqual(len(graphs), 1)
     self.assertEqual(len(graphs[0].requests), 0)
 
+  def test_page_view_estimated(self):
+    session = range_request_pfe_method.RangeRequestMethod(
+        estimate_compressed_sizes=True).start_session(
+            None,
+            font_loader.FontLoader(
+                "./external/patch_subset/patch_subset/testdata/"))
+    session.page_view({"Ahem.optimized.ttf": u([0x61, 0x7A])})
+    self.session.page_view({"Ahem.optimized.ttf": u([0x61, 0x7A])})
+    estimated = sorted(r.response_size for r in session.get_request_graphs()[0].requests)
+    exact = sorted(r.response_size for r in self.session.get_request_graphs()[0].requests)
+    self.assertEqual(len(estimated), len(exact))
+    for estimated_size, exact_size in zip(estimated, exact):
+      self.assertAlmostEqual(estimated_size, exact_size, delta=exact_size * 0.2)
+
+  def test_page_view_no_compression(self):
+    session = range_request_pfe_method.RangeRequestMethod(compression_model=compression.NONE).start_session(
+        None, font_loader.FontLoader("./external/patch_subset/patch_subset/testdata/"))
+    session.page_view({"Ahem.optimized.ttf": u([0x61, 0x7A])})
+    self.session.page_view({"Ahem.optimized.ttf": u([0x61, 0x7A])})
+    uncompressed = sum(r.response_size for r in session.get_request_graphs()[0].requests)
+    compressed = sum(r.response_size for r in self.session.get_request_graphs()[0].requests)
+    self.assertGreater(uncompressed, compressed)
+
+  def test_compressed_size_estimator(self):
+    estimator = range_request_pfe_method.CompressedSizeEstimator(100, [1, 2, 0, 4])
+    self.assertEqual(estimator.estimate(True, 0, 0), 100)
+    self.assertEqual(estimator.estimate(True, 1, 4), 106)
+    self.assertEqual(estimator.estimate(False, 1, 3), compression.overhead(compression.ZLIB) + 2)
+
+  def test_lru_cache(self):
+    cache = range_request_pfe_method.LruCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    self.assertEqual(cache.get("a"), 1)
+    cache.put("c", 3)
+    # b was the least recently used.
+    self.assertNotIn("b", cache)
+    self.assertEqual(cache.get("a"), 1)
+    self.assertEqual(cache.get("c"), 3)
+    self.assertIsNone(cache.get("b"))
+    self.assertEqual(len(cache), 2)
+
+  def test_method_name(self):
+    self.assertEqual(range_request_pfe_method.RangeRequestMethod().name(), "RangeRequest")
+    self.assertEqual(range_request_pfe_method.RangeRequestMethod(True).name(), "RangeRequest[estimated]")
+    self.assertEqual(
+        range_request_pfe_method.RangeRequestMethod(compression_model=compression.for_name("gzip-9")).name(),
+        "RangeRequest[gzip-9]")
+    self.assertEqual(
+        range_request_pfe_method.RangeRequestMethod(True, compression.NONE).name(),
+        "RangeRequest[none,estimated]")
+    self.assertEqual(range_request_pfe_method.RangeRequestMethod(multipart=True).name(), "RangeRequest[multipart]")
+    self.assertEqual(
+        range_request_pfe_method.RangeRequestMethod(True, compression.for_name("brotli-5"), True, 4).name(),
+        "RangeRequest[brotli-5,multipart-4,estimated]")
+    self.assertTrue(range_request_pfe_method.is_range_request_method(range_request_pfe_method))
+    self.assertTrue(range_request_pfe_method.is_range_request_method(range_request_pfe_method.RangeRequestMethod(True)))
+
 if __name__ == '__main__':
   unittest.main()
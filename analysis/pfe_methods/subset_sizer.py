@@ -4,6 +4,7 @@ import io
 import logging
 
 from fontTools import subset
+from analysis import font_loader
 from woff2_py import woff2
 
 # Cache of cut and woff2 encoded subset sizes.
@@ -35,7 +36,7 @@ class SubsetSizer:
     """Computes a subset of font_bytes to the given codepoints."""
     options = subset.Options()
     subsetter = subset.Subsetter(options=options)
-    with io.BytesIO(font_bytes) as font_io, \
+    with font_loader.font_file(font_bytes) as font_io, \
          subset.load_font(font_io, options) as font:
       subsetter.populate(unicodes=codepoints)
       subsetter.subset(font)
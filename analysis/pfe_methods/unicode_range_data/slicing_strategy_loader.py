@@ -6,6 +6,7 @@ import os
 
 from fontTools import ttLib
 from google.protobuf import text_format
+from analysis import font_loader
 from analysis.pfe_methods.unicode_range_data import slicing_strategy_pb2
 
 SLICING_STRATEGY_DIR = "analysis/pfe_methods/unicode_range_data"
@@ -62,7 +63,7 @@ def subset_to_set(subset_proto):
 
 def codepoints_in_font(font_bytes):  # pylint: disable=unused-argument
   """Returns the set of codepoints that the font can render."""
-  font = ttLib.TTFont(io.BytesIO(font_bytes))
+  font = ttLib.TTFont(font_loader.font_file(font_bytes))
 
   result = set()
   for sub_table in font["cmap"].tables:
@@ -17,7 +17,7 @@ from analysis import request_graph
 from analysis.pfe_methods import subset_sizer
 from analysis.pfe_methods.unicode_range_data import slicing_strategy_loader
 
-# Cache of which slicing strategy to use per font. Keyed by font name.
+# Cache of which slicing strategy to use per font. Keyed by font content hash.
 FONT_SLICING_STRATEGY_CACHE = dict()
 
 
@@ -30,14 +30,20 @@ def start_session(network_model, font_loader, a_subset_sizer=None):
   return UnicodeRangePfeSession(font_loader, a_subset_sizer)
 
 
-def slicing_strategy_for_font(font_id, font_bytes):
-  """Returns the slicing strategy that should be used to segment font_bytes."""
-  if font_id not in FONT_SLICING_STRATEGY_CACHE:
-    strategy_name = slicing_strategy_loader.slicing_strategy_for_font(
-        font_bytes)
-    FONT_SLICING_STRATEGY_CACHE[font_id] = strategy_name
+def slicing_strategy_for_font(font_hash, font_bytes, manifest_entry=None):
+  """Returns the slicing strategy that should be used to segment font_bytes.
 
-  strategy_name = FONT_SLICING_STRATEGY_CACHE[font_id]
+  If a font manifest entry is provided the precomputed strategy is used.
+  """
+  if font_hash not in FONT_SLICING_STRATEGY_CACHE:
+    if manifest_entry is not None and manifest_entry.slicing_strategy:
+      strategy_name = manifest_entry.slicing_strategy
+    else:
+      strategy_name = slicing_strategy_loader.slicing_strategy_for_font(
+          font_bytes)
+    FONT_SLICING_STRATEGY_CACHE[font_hash] = strategy_name
+
+  strategy_name = FONT_SLICING_STRATEGY_CACHE[font_hash]
   return (strategy_name,
           slicing_strategy_loader.load_slicing_strategy(strategy_name))
 
@@ -66,17 +72,31 @@ class UnicodeRangePfeSession:
     Returns the set of requests needed to load all unicode range subsets for
     the given codepoints.
     """
-    font_bytes = self.font_loader.load_font(font_id)
-
-    strategy_name, strategy = slicing_strategy_for_font(font_id, font_bytes)
-
-    subset_sizes = {
-        "%s:%s:%s" % (font_id, strategy_name, index):
-        self.subset_sizer.subset_size(
-            "%s:%s:%s" % (font_id, strategy_name, index), subset, font_bytes)
-        for index, subset in enumerate(strategy)
-        if subset.intersection(codepoints)
-    }
+    entry = self.font_loader.manifest_entry(font_id)
+    precomputed_sizes = (entry.unicode_range_subset_sizes
+                         if entry is not None else None)
+    if precomputed_sizes:
+      # All sizes are known ahead of time, so the font is never needed.
+      font_bytes = None
+    else:
+      font_bytes = self.font_loader.load_font(font_id)
+
+    font_hash = self.font_loader.font_hash(font_id)
+    strategy_name, strategy = slicing_strategy_for_font(font_hash, font_bytes,
+                                                        entry)
+
+    subset_sizes = dict()
+    for index, subset in enumerate(strategy):
+      if not subset.intersection(codepoints):
+        continue
+      # Loaded subsets are tracked by font name, but sizes are shared by
+      # all fonts with the same contents.
+      key = "%s:%s:%s" % (font_id, strategy_name, index)
+      if precomputed_sizes:
+        subset_sizes[key] = precomputed_sizes[index]
+      else:
+        subset_sizes[key] = self.subset_sizer.subset_size(
+            "%s:%s:%s" % (font_hash, strategy_name, index), subset, font_bytes)
 
     # Unicode range requests can happen in parallel, so there's
     # no deps between individual requests.
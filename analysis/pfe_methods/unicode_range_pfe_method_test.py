@@ -5,6 +5,8 @@ from collections import namedtuple
 
 from analysis.pfe_methods import unicode_range_pfe_method
 from analysis import font_loader
+from analysis import font_manifest
+from analysis import font_manifest_pb2
 from analysis import request_graph
 
 
@@ -119,6 +121,31 @@ class UnicodeRangePfeMethodTest(unittest.TestCase):
         ]))
     self.assertTrue(request_graph.graph_has_independent_requests(graphs[2], []))
 
+  def test_precomputed_subset_sizes(self):
+    manifest_proto = font_manifest_pb2.FontManifestProto()
+    entry = manifest_proto.fonts.add()
+    entry.font_id = "NotInTheDirectory.ttf"
+    entry.content_hash = "abcdef"
+    entry.slicing_strategy = "non_cjk_slices"
+    entry.unicode_range_subset_sizes.extend(range(100, 128))
+    session = unicode_range_pfe_method.start_session(
+        None,
+        font_loader.FontLoader(
+            "./external/patch_subset/patch_subset/testdata/",
+            font_manifest=font_manifest.FontManifest(manifest_proto)),
+        MockSubsetSizer())
+
+    session.page_view({"NotInTheDirectory.ttf": u([0x61, 0x62])})
+
+    graphs = session.get_request_graphs()
+    self.assertEqual(len(graphs), 1)
+    # Latin is subset 18 of non_cjk_slices, size comes from the manifest
+    # instead of the subset sizer.
+    self.assertTrue(
+        request_graph.graph_has_independent_requests(graphs[0], [
+            (35, 35 + 118),
+        ]))
+
 
 if __name__ == '__main__':
   unittest.main()
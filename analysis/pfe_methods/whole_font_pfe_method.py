@@ -10,6 +10,7 @@ from analysis import network_models
 from analysis import request_graph
 from woff2_py import woff2
 
+# Cache of woff2 encoded font sizes. Keyed by font content hash.
 SIZE_CACHE = dict()
 
 
@@ -22,6 +23,11 @@ def start_session(network_model, font_loader):
   return WholeFontPfeSession(font_loader)
 
 
+def compute_font_size(font_bytes):
+  """The size of font_bytes compressed as a woff2."""
+  return len(woff2.ttf_to_woff2(font_bytes))
+
+
 class WholeFontPfeSession:
   """Progressive font enrichment session."""
 
@@ -55,13 +61,15 @@ class WholeFontPfeSession:
 
   def get_font_size(self, font_id):
     """The size of the font compressed as a woff2."""
-    if font_id in SIZE_CACHE:
-      return SIZE_CACHE[font_id]
-
-    ttf_bytes = self.font_loader.load_font(font_id)
-    woff2_bytes = woff2.ttf_to_woff2(ttf_bytes)
-    SIZE_CACHE[font_id] = len(woff2_bytes)
-    return SIZE_CACHE[font_id]
+    entry = self.font_loader.manifest_entry(font_id)
+    if entry is not None:
+      return entry.woff2_size
+
+    font_hash = self.font_loader.font_hash(font_id)
+    if font_hash not in SIZE_CACHE:
+      SIZE_CACHE[font_hash] = compute_font_size(
+          self.font_loader.load_font(font_id))
+    return SIZE_CACHE[font_hash]
 
   def get_request_graphs(self):
     return self.request_graphs
@@ -4,6 +4,8 @@ import unittest
 from collections import namedtuple
 
 from analysis import font_loader
+from analysis import font_manifest
+from analysis import font_manifest_pb2
 from analysis import request_graph
 from analysis.pfe_methods import whole_font_pfe_method
 
@@ -98,6 +100,23 @@ class WholeFontPfeMethodTest(unittest.TestCase):
         ]))
     self.assertTrue(request_graph.graph_has_independent_requests(graphs[1], []))
 
+  def test_size_from_manifest(self):
+    manifest_proto = font_manifest_pb2.FontManifestProto()
+    manifest_proto.fonts.add(font_id="Roboto-Italic.ttf", woff2_size=1234)
+    session = whole_font_pfe_method.start_session(
+        None,
+        font_loader.FontLoader(
+            "./external/patch_subset/patch_subset/testdata/",
+            font_manifest=font_manifest.FontManifest(manifest_proto)))
+    session.page_view({"Roboto-Italic.ttf": u([0x61, 0x62])})
+
+    graphs = session.get_request_graphs()
+    self.assertEqual(len(graphs), 1)
+    self.assertTrue(
+        request_graph.graph_has_independent_requests(graphs[0], [
+            (35, 35 + 1234),
+        ]))
+
   def test_ignores_no_codepoint_font(self):
     self.session.page_view({"Roboto-Regular.ttf": u([])})
 
@@ -0,0 +1,112 @@
+"""Validation of a data set before it is simulated.
+
+Checks every font referenced by the data set once, up front, so that
+sequences which can't be simulated are dropped before any PFE method has
+spent time on them. Each dropped sequence is assigned a reason code.
+"""
+
+import collections
+
+from fontTools import ttLib
+from analysis import font_loader
+from analysis.pfe_methods import range_request_pfe_method
+
+# Reason codes.
+FONT_NOT_FOUND = "FONT_NOT_FOUND"
+FONT_PARSE_ERROR = "FONT_PARSE_ERROR"
+MISSING_CMAP = "MISSING_CMAP"
+RANGE_REQUEST_UNSUPPORTED_FONT = "RANGE_REQUEST_UNSUPPORTED_FONT"
+# The data set of a method override has no version of the sequence.
+MISSING_SEQUENCE = "MISSING_SEQUENCE"
+
+
+def font_ids_in_sequence(sequence):
+  """Returns the set of font ids referenced by a PageViewSequenceProto.
+
+  The empty font id stands for the default font.
+  """
+  return {
+      content.font_name
+      for page_view in sequence.page_views
+      for content in page_view.contents
+  }
+
+
+def font_ids_in_sequences(sequences):
+  result = set()
+  for sequence in sequences:
+    result.update(font_ids_in_sequence(sequence))
+  return sorted(result)
+
+
+def check_font(a_font_loader, font_id, check_range_request):
+  """Checks that font_id can be used in the simulation.
+
+  Returns None if the font is usable, otherwise a reason code.
+  """
+  try:
+    entry = a_font_loader.manifest_entry(font_id)
+    if entry is not None:
+      return check_manifest_entry(entry, check_range_request)
+
+    font_bytes = a_font_loader.load_font(font_id)
+  except (IOError, TypeError):
+    # TypeError: no font id and no default font.
+    return FONT_NOT_FOUND
+
+  return check_font_bytes(font_bytes, check_range_request)
+
+
+def check_manifest_entry(entry, check_range_request):
+  """Checks a font using its precomputed font manifest entry.
+
+  The manifest only contains fonts which parsed and have a cmap, so only
+  range request support needs to be checked.
+  """
+  if check_range_request and not entry.glyph_sizes:
+    return RANGE_REQUEST_UNSUPPORTED_FONT
+  return None
+
+
+def check_font_bytes(font_bytes, check_range_request):
+  """Checks a font by parsing font_bytes.
+
+  Returns None if the font is usable, otherwise a reason code.
+  """
+  try:
+    font = ttLib.TTFont(font_loader.font_file(font_bytes))
+    if "cmap" not in font or font["cmap"].getBestCmap() is None:
+      return MISSING_CMAP
+  except Exception:  # pylint: disable=broad-except
+    return FONT_PARSE_ERROR
+
+  if check_range_request:
+    try:
+      range_request_pfe_method.compute_glyph_data(font_bytes)
+    except range_request_pfe_method.RangeRequestError:
+      return RANGE_REQUEST_UNSUPPORTED_FONT
+    except Exception:  # pylint: disable=broad-except
+      return FONT_PARSE_ERROR
+
+  return None
+
+
+def failed_sequences(sequences, reasons_by_font):
+  """Returns a dict of sequence index => reason code for unusable sequences.
+
+  reasons_by_font is a dict of font id => reason code (or None), as
+  produced by check_font.
+  """
+  result = dict()
+  for idx, sequence in enumerate(sequences):
+    for font_id in sorted(font_ids_in_sequence(sequence)):
+      reason = reasons_by_font.get(font_id)
+      if reason:
+        result[idx] = reason
+        break
+  return result
+
+
+def count_reasons(failures):
+  """Returns a dict of reason code => number of sequences with that reason."""
+  return dict(collections.Counter(failures.values()))
@@ -0,0 +1,103 @@
+"""Splits the preflight check of an analysis into one task per font.
+
+Each font library of the analysis, its own and those of the method overrides
+(see method_override), is checked with the versions of the sequences its
+methods simulate. The tasks can be run in parallel, their reason codes are
+then combined into the sequences which can't be simulated.
+
+overrides are the method_override.MethodOverride's of the analysis.
+"""
+
+import logging
+
+from analysis import method_override
+from analysis import preflight
+from analysis.pfe_methods import range_request_pfe_method
+
+LOG = logging.getLogger("analyzer")
+
+
+def override_indices(overrides):
+  """Returns the index of each font library, None is the analysis' own."""
+  return [None] + list(range(len(overrides)))
+
+
+def preflight_tasks(overrides, sequences):
+  """Returns the (override index, font id) of every font used by sequences."""
+  tasks = []
+  for override_index in override_indices(overrides):
+    versions = [
+        method_override.sequence_for(overrides, override_index, sequence)
+        for sequence in sequences
+    ]
+    tasks.extend((override_index, font_id)
+                 for font_id in preflight.font_ids_in_sequences(
+                     version for version in versions if version is not None))
+  return tasks
+
+
+def check_font(pfe_methods, a_font_loader, overrides, task):
+  """Runs the preflight checks of a task. Returns a reason code or None.
+
+  task is an (override index, font id), see preflight_tasks. The font is
+  loaded from the font library of the override, or with a_font_loader (the
+  analysis' own) if the index is None, and checked for the methods of
+  pfe_methods which use it.
+  """
+  override_index, font_id = task
+  if override_index is None:
+    overridden = {
+        method_name for override in overrides
+        for method_name in override.method_names
+    }
+    methods = [
+        method for method in pfe_methods if method.name() not in overridden
+    ]
+  else:
+    override = overrides[override_index]
+    methods = [
+        method for method in pfe_methods
+        if method.name() in override.method_names
+    ]
+    a_font_loader = method_override.override_font_loader(
+        override, a_font_loader.default_font())
+
+  check_range_request = any(
+      range_request_pfe_method.is_range_request_method(method)
+      for method in methods)
+  return preflight.check_font(a_font_loader, font_id, check_range_request)
+
+
+def preflight_failures(overrides, sequences, tasks, reasons):
+  """Returns a dict of sequence index => reason code for each failed sequence.
+
+  tasks are the (override index, font id) of the fonts that were checked,
+  see preflight_tasks, and reasons their reason codes (or None).
+  """
+  failures = dict()
+  for override_index in override_indices(overrides):
+    reasons_by_font = {
+        font_id: reason
+        for (task_override_index, font_id), reason in zip(tasks, reasons)
+        if task_override_index == override_index
+    }
+    for font_id, reason in sorted(reasons_by_font.items()):
+      if reason:
+        LOG.debug("Font '%s' failed preflight: %s", font_id, reason)
+
+    indices = [
+        idx for idx, sequence in enumerate(sequences)
+        if method_override.sequence_for(overrides, override_index, sequence)
+        is not None
+    ]
+    versions = [
+        method_override.sequence_for(overrides, override_index, sequences[idx])
+        for idx in indices
+    ]
+    for idx, reason in sorted(
+        preflight.failed_sequences(versions, reasons_by_font).items()):
+      failures.setdefault(indices[idx], reason)
+
+  for reason, count in sorted(preflight.count_reasons(failures).items()):
+    LOG.info("%s sequences dropped by preflight: %s", count, reason)
+  return failures
@@ -0,0 +1,72 @@
+"""Unit tests for the preflight_plan module."""
+
+import os
+import tempfile
+import unittest
+from analysis import fake_pfe_method
+from analysis import font_loader
+from analysis import method_override
+from analysis import page_view_sequence_pb2
+from analysis import preflight
+from analysis import preflight_plan
+
+
+def sequence(sequence_id, font_id):
+  """Returns a sequence with one page view of font_id."""
+  result = page_view_sequence_pb2.PageViewSequenceProto(id=sequence_id)
+  result.page_views.add().contents.add(font_name=font_id, codepoints=[0x61])
+  return result
+
+
+class PreflightPlanTest(unittest.TestCase):
+
+  def setUp(self):
+    optimized = [sequence(1, "a.optimized.ttf"), sequence(2, "b.optimized.ttf")]
+    self.overrides = [
+        method_override.MethodOverride(["RangeRequest"], "fonts.optimized",
+                                       None, None,
+                                       {seq.id: seq for seq in optimized})
+    ]
+    self.sequences = [sequence(1, "a.ttf"), sequence(2, "b.ttf")]
+
+  def test_preflight_tasks(self):
+    self.assertEqual(
+        preflight_plan.preflight_tasks(self.overrides, self.sequences),
+        [(None, "a.ttf"), (None, "b.ttf"), (0, "a.optimized.ttf"),
+         (0, "b.optimized.ttf")])
+
+  def test_preflight_failures(self):
+    tasks = preflight_plan.preflight_tasks(self.overrides, self.sequences)
+    reasons = [None, None, None, preflight.MISSING_CMAP]
+    self.assertEqual(
+        preflight_plan.preflight_failures(self.overrides, self.sequences, tasks,
+                                          reasons), {1: preflight.MISSING_CMAP})
+    reasons = [preflight.FONT_NOT_FOUND, None, None, None]
+    self.assertEqual(
+        preflight_plan.preflight_failures(self.overrides, self.sequences, tasks,
+                                          reasons),
+        {0: preflight.FONT_NOT_FOUND})
+
+  def test_check_font(self):
+    with tempfile.TemporaryDirectory() as font_directory:
+      with open(os.path.join(font_directory, "a.optimized.ttf"), "wb") as font:
+        font.write(b"not a font")
+      overrides = [
+          method_override.MethodOverride(["Fake_PFE"], font_directory, None,
+                                         None, None)
+      ]
+      a_font_loader = font_loader.FontLoader(
+          os.path.join(font_directory, "missing"))
+
+      self.assertEqual(
+          preflight_plan.check_font([fake_pfe_method], a_font_loader, overrides,
+                                    (None, "a.optimized.ttf")),
+          preflight.FONT_NOT_FOUND)
+      self.assertEqual(
+          preflight_plan.check_font([fake_pfe_method], a_font_loader, overrides,
+                                    (0, "a.optimized.ttf")),
+          preflight.FONT_PARSE_ERROR)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,91 @@
+"""Unit tests for preflight."""
+
+import tempfile
+import unittest
+from analysis import font_loader
+from analysis import font_manifest
+from analysis import font_manifest_pb2
+from analysis import page_view_sequence_pb2
+from analysis import preflight
+
+TEST_DATA = "./external/patch_subset/patch_subset/testdata/"
+
+
+def sequence(*font_ids):
+  """Returns a sequence with one page view for each of font_ids."""
+  result = page_view_sequence_pb2.PageViewSequenceProto()
+  for font_id in font_ids:
+    page_view = result.page_views.add()
+    page_view.contents.add(font_name=font_id, codepoints=[0x61])
+  return result
+
+
+class PreflightTest(unittest.TestCase):
+
+  def test_font_ids_in_sequences(self):
+    self.assertEqual(
+        preflight.font_ids_in_sequences(
+            [sequence("b.ttf", "a.ttf"),
+             sequence("a.ttf", "")]), ["", "a.ttf", "b.ttf"])
+
+  def test_check_font(self):
+    loader = font_loader.FontLoader(TEST_DATA)
+    self.assertIsNone(preflight.check_font(loader, "Roboto-Regular.ttf", False))
+    self.assertIsNone(preflight.check_font(loader, "Roboto-Regular.ttf", True))
+
+  def test_check_font_not_found(self):
+    with tempfile.TemporaryDirectory() as the_dir:
+      loader = font_loader.FontLoader(the_dir)
+      self.assertEqual(preflight.check_font(loader, "missing.ttf", False),
+                       preflight.FONT_NOT_FOUND)
+      # No default font.
+      self.assertEqual(preflight.check_font(loader, "", False),
+                       preflight.FONT_NOT_FOUND)
+
+  def test_check_font_parse_error(self):
+    with tempfile.TemporaryDirectory() as the_dir:
+      with open(the_dir + "/bad.ttf", "wb") as bad_font:
+        bad_font.write(b"not-a-font")
+      loader = font_loader.FontLoader(the_dir)
+      self.assertEqual(preflight.check_font(loader, "bad.ttf", False),
+                       preflight.FONT_PARSE_ERROR)
+
+  def test_check_font_from_manifest(self):
+    manifest_proto = font_manifest_pb2.FontManifestProto()
+    manifest_proto.fonts.add(font_id="simple.ttf", glyph_sizes=[10, 20])
+    manifest_proto.fonts.add(font_id="composite.ttf")
+    loader = font_loader.FontLoader(
+        "/not/a/dir", font_manifest=font_manifest.FontManifest(manifest_proto))
+
+    self.assertIsNone(preflight.check_font(loader, "simple.ttf", True))
+    self.assertIsNone(preflight.check_font(loader, "composite.ttf", False))
+    self.assertEqual(preflight.check_font(loader, "composite.ttf", True),
+                     preflight.RANGE_REQUEST_UNSUPPORTED_FONT)
+
+  def test_failed_sequences(self):
+    sequences = [
+        sequence("a.ttf"),
+        sequence("a.ttf", "b.ttf"),
+        sequence("c.ttf"),
+        sequence("b.ttf", "c.ttf"),
+    ]
+    reasons = {
+        "a.ttf": None,
+        "b.ttf": preflight.MISSING_CMAP,
+        "c.ttf": preflight.FONT_NOT_FOUND,
+    }
+    failures = preflight.failed_sequences(sequences, reasons)
+    self.assertEqual(
+        failures, {
+            1: preflight.MISSING_CMAP,
+            2: preflight.FONT_NOT_FOUND,
+            3: preflight.MISSING_CMAP,
+        })
+    self.assertEqual(preflight.count_reasons(failures), {
+        preflight.MISSING_CMAP: 2,
+        preflight.FONT_NOT_FOUND: 1,
+    })
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,172 @@
+"""Running estimates of relative cost for progressive sampling.
+
+With --progressive_sampling the analyzer simulates sequences in a random
+order, in batches. After each batch the total cost of every method
+relative to a baseline method, sum(cost) / sum(baseline cost) over the
+simulated sequences of a network category, is estimated along with a
+confidence interval for its value over all of the sequences. Sampling
+stops once every interval is narrow enough.
+
+Intervals are either from the central limit theorem, using the delta
+method variance of a ratio estimator:
+
+  var(ratio) ~= var(cost - ratio * baseline cost) / (n * mean(baseline)^2)
+
+or from a percentile bootstrap, which is slower but makes no assumption
+about the shape of the distribution.
+"""
+
+import collections
+import math
+import random
+import statistics
+
+from analysis import aggregation
+from analysis import result_matrix
+from analysis import result_pb2
+
+CLT = "clt"
+BOOTSTRAP = "bootstrap"
+INTERVALS = [CLT, BOOTSTRAP]
+
+# Intervals aren't computed from fewer sequences than this.
+MIN_SEQUENCES = 30
+
+BOOTSTRAP_RESAMPLES = 200
+
+STOP_CONVERGED = "converged"
+STOP_TIME_BUDGET = "time budget"
+STOP_EXHAUSTED = "all sequences simulated"
+
+# Total cost of a method relative to the baseline in a network category.
+# lower and upper bound its confidence interval, they're None if it
+# couldn't be computed yet. ratio is None if the baseline has no cost.
+RelativeCost = collections.namedtuple(
+    "RelativeCost",
+    ["method_name", "network_category", "ratio", "lower", "upper"])
+
+# How relative costs are estimated: the method costs are relative to, the
+# confidence level of the intervals, how they're computed (one of
+# INTERVALS) and the seed used by the bootstrap.
+SamplingOptions = collections.namedtuple(
+    "SamplingOptions",
+    ["baseline_method_name", "confidence", "interval", "seed"],
+    defaults=[CLT, 0])
+
+
+def z_score(confidence):
+  return statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def ratio_of(costs, baseline_costs):
+  total_baseline = math.fsum(baseline_costs)
+  if not total_baseline:
+    return None
+  return math.fsum(costs) / total_baseline
+
+
+def clt_interval(costs, baseline_costs, confidence):
+  """Returns the (lower, upper) interval of the ratio from the CLT."""
+  ratio = ratio_of(costs, baseline_costs)
+  if ratio is None or len(costs) < MIN_SEQUENCES:
+    return None, None
+  residuals = [
+      cost - ratio * baseline_cost
+      for cost, baseline_cost in zip(costs, baseline_costs)
+  ]
+  mean_baseline = math.fsum(baseline_costs) / len(baseline_costs)
+  half_width = (z_score(confidence) *
+                math.sqrt(statistics.variance(residuals) / len(costs)) /
+                mean_baseline)
+  return ratio - half_width, ratio + half_width
+
+
+def bootstrap_interval(costs,
+                       baseline_costs,
+                       confidence,
+                       seed=0,
+                       resamples=BOOTSTRAP_RESAMPLES):
+  """Returns the (lower, upper) percentile bootstrap interval of the ratio."""
+  if ratio_of(costs, baseline_costs) is None or len(costs) < MIN_SEQUENCES:
+    return None, None
+  rng = random.Random(seed)
+  population = range(len(costs))
+  ratios = []
+  for _ in range(resamples):
+    sample = rng.choices(population, k=len(costs))
+    ratio = ratio_of([costs[idx] for idx in sample],
+                     [baseline_costs[idx] for idx in sample])
+    if ratio is not None:
+      ratios.append(ratio)
+  if not ratios:
+    return None, None
+
+  ratios.sort()
+  tail = (1 - confidence) / 2
+  return (ratios[int(tail * (len(ratios) - 1))],
+          ratios[int(math.ceil((1 - tail) * (len(ratios) - 1)))])
+
+
+def relative_costs(matrix, method_names, columns, options):
+  """Estimates the cost of each method relative to the baseline.
+
+  Uses the category costs of the sequences in columns of a
+  result_matrix.ResultMatrix, options is a SamplingOptions. Returns a list
+  of RelativeCost's for every network category and method other than the
+  baseline.
+  """
+  estimates = []
+  for category in matrix.categories:
+    baseline_costs = aggregation.select(
+        matrix.category_values(result_matrix.CATEGORY_COST,
+                               options.baseline_method_name, category), columns)
+    for method_name in sorted(method_names):
+      if method_name == options.baseline_method_name:
+        continue
+      costs = aggregation.select(
+          matrix.category_values(result_matrix.CATEGORY_COST, method_name,
+                                 category), columns)
+      if options.interval == BOOTSTRAP:
+        lower, upper = bootstrap_interval(costs, baseline_costs,
+                                          options.confidence, options.seed)
+      else:
+        lower, upper = clt_interval(costs, baseline_costs, options.confidence)
+      estimates.append(
+          RelativeCost(method_name, category, ratio_of(costs, baseline_costs),
+                       lower, upper))
+  return estimates
+
+
+def widest_interval(estimates):
+  """Returns the width of the widest interval, inf if one isn't known."""
+  widths = [
+      math.inf if estimate.lower is None else estimate.upper - estimate.lower
+      for estimate in estimates
+  ]
+  return max(widths, default=0.0)
+
+
+def converged(estimates, target_width):
+  """True if every interval is at most target_width wide."""
+  return widest_interval(estimates) <= target_width
+
+
+def to_proto(estimates, options, sequences_simulated, sequences_total,
+             stop_reason):
+  """Returns a SamplingProto describing the precision of the estimates."""
+  sampling_proto = result_pb2.SamplingProto()
+  sampling_proto.sequences_simulated = sequences_simulated
+  sampling_proto.sequences_total = sequences_total
+  sampling_proto.stop_reason = stop_reason
+  sampling_proto.baseline_method_name = options.baseline_method_name
+  sampling_proto.confidence = options.confidence
+  for estimate in estimates:
+    cost_proto = sampling_proto.relative_costs.add()
+    cost_proto.method_name = estimate.method_name
+    cost_proto.network_category = estimate.network_category
+    if estimate.ratio is not None:
+      cost_proto.ratio = estimate.ratio
+    if estimate.lower is not None:
+      cost_proto.lower = estimate.lower
+      cost_proto.upper = estimate.upper
+  return sampling_proto
@@ -0,0 +1,145 @@
+"""Unit tests for the progressive_sampling module."""
+
+import math
+import random
+import unittest
+
+from analysis import progressive_sampling
+from analysis import result_matrix
+from analysis import simulation
+
+RelativeCost = progressive_sampling.RelativeCost
+
+NETWORK_MODELS = [
+    simulation.NetworkModel("slow", 0, 10, 10, "mobile", 1),
+    simulation.NetworkModel("fast", 0, 20, 20, "desktop", 1),
+]
+
+
+def random_costs(count, seed=0):
+  """Returns (costs, baseline costs), costs are about half the baseline."""
+  rng = random.Random(seed)
+  baseline_costs = [rng.uniform(50, 150) for _ in range(count)]
+  costs = [cost * rng.uniform(0.4, 0.6) for cost in baseline_costs]
+  return costs, baseline_costs
+
+
+class ProgressiveSamplingTest(unittest.TestCase):
+
+  def test_ratio_of(self):
+    self.assertEqual(progressive_sampling.ratio_of([1, 2, 3], [2, 4, 6]), 0.5)
+    self.assertIsNone(progressive_sampling.ratio_of([1], [0]))
+
+  def test_clt_interval(self):
+    costs, baseline_costs = random_costs(1000)
+    ratio = progressive_sampling.ratio_of(costs, baseline_costs)
+    lower, upper = progressive_sampling.clt_interval(costs, baseline_costs,
+                                                     0.95)
+    self.assertLess(lower, ratio)
+    self.assertGreater(upper, ratio)
+    self.assertLess(lower, 0.5)
+    self.assertGreater(upper, 0.5)
+
+    # Four times the sequences halves the width.
+    more_lower, more_upper = progressive_sampling.clt_interval(
+        *random_costs(4000), 0.95)
+    self.assertAlmostEqual((more_upper - more_lower) / (upper - lower),
+                           0.5,
+                           delta=0.05)
+
+    # Higher confidence, wider interval.
+    wide_lower, wide_upper = progressive_sampling.clt_interval(
+        costs, baseline_costs, 0.99)
+    self.assertGreater(wide_upper - wide_lower, upper - lower)
+
+  def test_clt_interval_exact(self):
+    costs = [1, 3] * 20
+    baseline_costs = [2] * 40
+    lower, upper = progressive_sampling.clt_interval(costs, baseline_costs,
+                                                     0.95)
+    # ratio = 1, residuals are +/- 1.
+    z_score = progressive_sampling.z_score(0.95)
+    half_width = z_score * math.sqrt(40 / 39 / 40) / 2
+    self.assertAlmostEqual(lower, 1 - half_width)
+    self.assertAlmostEqual(upper, 1 + half_width)
+
+  def test_too_few_sequences(self):
+    costs, baseline_costs = random_costs(progressive_sampling.MIN_SEQUENCES - 1)
+    self.assertEqual(
+        progressive_sampling.clt_interval(costs, baseline_costs, 0.95),
+        (None, None))
+    self.assertEqual(
+        progressive_sampling.bootstrap_interval(costs, baseline_costs, 0.95),
+        (None, None))
+
+  def test_bootstrap_interval(self):
+    costs, baseline_costs = random_costs(1000)
+    lower, upper = progressive_sampling.bootstrap_interval(
+        costs, baseline_costs, 0.95)
+    clt_lower, clt_upper = progressive_sampling.clt_interval(
+        costs, baseline_costs, 0.95)
+    self.assertAlmostEqual(lower, clt_lower, delta=0.002)
+    self.assertAlmostEqual(upper, clt_upper, delta=0.002)
+    self.assertEqual(
+        progressive_sampling.bootstrap_interval(costs, baseline_costs, 0.95),
+        (lower, upper))
+
+  def test_relative_costs(self):
+    costs, baseline_costs = random_costs(100)
+    matrix = result_matrix.ResultMatrix(["Base", "A"], NETWORK_MODELS, 100)
+    for idx in range(100):
+      matrix.set_category_value(result_matrix.CATEGORY_COST, "Base", "mobile",
+                                idx, baseline_costs[idx])
+      matrix.set_category_value(result_matrix.CATEGORY_COST, "A", "mobile", idx,
+                                costs[idx])
+      matrix.set_category_value(result_matrix.CATEGORY_COST, "Base", "desktop",
+                                idx, 2)
+      matrix.set_category_value(result_matrix.CATEGORY_COST, "A", "desktop",
+                                idx, 1)
+
+    columns = list(range(0, 100, 2))
+    estimates = progressive_sampling.relative_costs(
+        matrix, ["Base", "A"], columns,
+        progressive_sampling.SamplingOptions("Base", 0.95))
+    self.assertEqual([(e.method_name, e.network_category) for e in estimates],
+                     [("A", "desktop"), ("A", "mobile")])
+    self.assertEqual(estimates[0], RelativeCost("A", "desktop", 0.5, 0.5, 0.5))
+    self.assertEqual(
+        estimates[1].ratio,
+        progressive_sampling.ratio_of([costs[idx] for idx in columns],
+                                      [baseline_costs[idx] for idx in columns]))
+    self.assertLess(estimates[1].lower, estimates[1].upper)
+
+  def test_converged(self):
+    estimates = [
+        RelativeCost("A", "mobile", 0.5, 0.49, 0.51),
+        RelativeCost("A", "desktop", 0.5, 0.495, 0.5),
+    ]
+    self.assertAlmostEqual(progressive_sampling.widest_interval(estimates),
+                           0.02)
+    self.assertTrue(progressive_sampling.converged(estimates, 0.021))
+    self.assertFalse(progressive_sampling.converged(estimates, 0.019))
+
+    estimates.append(RelativeCost("B", "mobile", 0.5, None, None))
+    self.assertFalse(progressive_sampling.converged(estimates, 1))
+
+  def test_to_proto(self):
+    estimates = [
+        RelativeCost("A", "mobile", 0.5, 0.49, 0.51),
+        RelativeCost("B", "mobile", None, None, None),
+    ]
+    options = progressive_sampling.SamplingOptions("Base", 0.95)
+    sampling_proto = progressive_sampling.to_proto(
+        estimates, options, 100, 1000, progressive_sampling.STOP_CONVERGED)
+
+    self.assertEqual(sampling_proto.sequences_simulated, 100)
+    self.assertEqual(sampling_proto.sequences_total, 1000)
+    self.assertEqual(sampling_proto.stop_reason, "converged")
+    self.assertEqual(sampling_proto.baseline_method_name, "Base")
+    self.assertEqual(sampling_proto.relative_costs[0].upper, 0.51)
+    self.assertEqual(sampling_proto.relative_costs[1].method_name, "B")
+    self.assertEqual(sampling_proto.relative_costs[1].ratio, 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
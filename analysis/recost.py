@@ -0,0 +1,249 @@
+"""Recomputes analysis results from recorded graph signatures.
+
+The analyzer can record the signature of every request graph it simulates
+(see --graph_signatures_out). A signature is sufficient to compute the
+time a graph takes on any network model, so this rebuilds the full
+AnalysisResultProto under a different cost function, set of network
+models or network model weights without simulating again.
+
+Each of the cost function constants can be given a list of values, in
+which case results are computed for every combination of them and written
+to --output_directory.
+
+Usage:
+recost --graph_signatures=<path> [--no_cost_threshold_s=0.2,0.4,0.6 ...]
+"""
+
+import itertools
+import logging
+import os
+import sys
+
+from google.protobuf import text_format
+from absl import app
+from absl import flags
+from analysis import aggregation
+from analysis import cost
+from analysis import graph_signatures_pb2
+from analysis import network_models as models
+from analysis import result_matrix
+from analysis import result_pb2
+from analysis import simulation
+
+LOG = logging.getLogger("recost")
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("graph_signatures", None,
+                    "Path to a GraphSignaturesProto written by the analyzer.")
+flags.mark_flag_as_required("graph_signatures")
+
+flags.DEFINE_list(
+    "network_models", [],
+    "Names of the network models to compute results for. Defaults to all "
+    "of the models the analyzer simulates.")
+
+flags.DEFINE_string(
+    "network_models_config", None,
+    "Optional path to a textproto NetworkModelsProto, if set --network_models "
+    "selects from the models it describes instead of the built in ones.")
+
+flags.DEFINE_list(
+    "network_weights", [],
+    "Overrides the weight of network models, as a list of <name>=<weight>.")
+
+flags.DEFINE_list("no_cost_threshold_s", [str(cost.NO_COST_THRESHOLD_S)],
+                  "Values of cost.NO_COST_THRESHOLD_S to compute results for.")
+
+flags.DEFINE_list("timeout_threshold_s", [str(cost.TIMEOUT_THRESHOLD_S)],
+                  "Values of cost.TIMEOUT_THRESHOLD_S to compute results for.")
+
+flags.DEFINE_list("sigmoid_width", [str(cost.SIGMOID_WIDTH)],
+                  "Values of cost.SIGMOID_WIDTH to compute results for.")
+
+flags.DEFINE_list(
+    "distributions", [],
+    "Distributions to record per page view metrics with, see the analyzer "
+    "flag of the same name.")
+
+flags.DEFINE_string(
+    "output_directory", None,
+    "Directory to write results to, one file per combination of cost "
+    "constants. Required if more than one combination is given, otherwise "
+    "results are written to stdout.")
+
+flags.DEFINE_bool("output_binary", False,
+                  "If true outputs the results in binary proto format.")
+
+
+def select_network_models(names, weights, available=None):
+  """Returns the network models of available named by names (or all if empty).
+
+  available defaults to network_models.ALL_MODELS. weights is a dict of
+  network model name => weight to override.
+  """
+  if available is None:
+    available = models.ALL_MODELS
+  by_name = {model.name: model for model in available}
+  for name in list(names) + list(weights):
+    if name not in by_name:
+      raise ValueError("Unknown network model: %s" % name)
+  selected = [by_name[name] for name in names] if names else available
+  return [
+      model._replace(weight=weights.get(model.name, model.weight))
+      for model in selected
+  ]
+
+
+def parse_weights(specs):
+  """Parses a list of "<name>=<weight>" strings into a dict."""
+  result = dict()
+  for spec in specs:
+    name, _, weight = spec.partition("=")
+    result[name] = float(weight)
+  return result
+
+
+def totals_by_network(method_proto, sequence_proto, network_models):
+  """Computes the GraphTotal's of one sequence for each network model."""
+  signatures_by_network = {
+      network_proto.network_model_name: [
+          simulation.from_graph_signature_proto(page_view)
+          for page_view in network_proto.page_views
+      ] for network_proto in sequence_proto.networks
+  }
+
+  if not method_proto.network_sensitive:
+    return {
+        network_model.name: totals for network_model, totals in zip(
+            network_models,
+            simulation.totals_for_models(signatures_by_network[""],
+                                         network_models))
+    }
+
+  result = dict()
+  for network_model in network_models:
+    if network_model.name not in signatures_by_network:
+      raise ValueError(
+          "%s is network sensitive and wasn't simulated with network model %s" %
+          (method_proto.method_name, network_model.name))
+    result[network_model.name] = simulation.totals_for_signatures(
+        signatures_by_network[network_model.name], network_model)
+  return result
+
+
+def sequence_ids(methods):
+  """Returns the ids of the sequences of methods, in order.
+
+  Every method must have the same sequences, raises ValueError otherwise.
+  """
+  ids = None
+  for method_proto in methods:
+    method_ids = [
+        sequence_proto.sequence_id for sequence_proto in method_proto.sequences
+    ]
+    if ids is None:
+      ids = method_ids
+    elif ids != method_ids:
+      raise ValueError("%s has different sequences than the other methods." %
+                       method_proto.method_name)
+  return ids or []
+
+
+def recost(signatures_proto, network_models, cost_function, distributions=None):
+  """Computes an AnalysisResultProto from a GraphSignaturesProto.
+
+  Produces the same results the analyzer would have if it had been run
+  with network_models and cost_function.
+  """
+  methods = [
+      method_proto for method_proto in signatures_proto.methods
+      if method_proto.sequences
+  ]
+  methods.sort(key=lambda method_proto: method_proto.method_name)
+  ids = sequence_ids(methods)
+
+  matrix = result_matrix.ResultMatrix(
+      [method_proto.method_name for method_proto in methods], network_models,
+      len(ids))
+  try:
+    results_proto = result_pb2.AnalysisResultProto()
+    for method_proto in methods:
+      aggregate = aggregation.MethodAggregate(distributions)
+      for idx, sequence_proto in enumerate(method_proto.sequences):
+        aggregate.add_sequence(
+            matrix.column(method_proto.method_name, idx),
+            totals_by_network(method_proto, sequence_proto, network_models),
+            network_models, cost_function)
+      results_proto.results.append(
+          aggregate.to_proto(method_proto.method_name, matrix, range(len(ids)),
+                             ids))
+    return results_proto
+  finally:
+    matrix.close()
+
+
+def cost_grid():
+  """Returns every combination of the cost constant flags."""
+  return list(
+      itertools.product([float(value) for value in FLAGS.no_cost_threshold_s],
+                        [float(value) for value in FLAGS.timeout_threshold_s],
+                        [float(value) for value in FLAGS.sigmoid_width]))
+
+
+def output_path(no_cost_threshold_s, timeout_threshold_s, sigmoid_width):
+  return os.path.join(
+      FLAGS.output_directory,
+      "results.no_cost_threshold_%s.timeout_threshold_%s.sigmoid_width_%s.%s" %
+      (no_cost_threshold_s, timeout_threshold_s, sigmoid_width,
+       "pb" if FLAGS.output_binary else "textproto"))
+
+
+def write_results(results_proto, path=None):
+  """Writes results_proto to path, or stdout if path isn't set."""
+  if FLAGS.output_binary:
+    data = results_proto.SerializeToString()
+  else:
+    data = text_format.MessageToString(results_proto)
+  if not path:
+    if FLAGS.output_binary:
+      sys.stdout.buffer.write(data)
+    else:
+      print(data)
+    return
+  with open(path, "wb" if FLAGS.output_binary else "w") as out:
+    out.write(data)
+
+
+def main(argv):
+  """Runs the recosting."""
+  del argv  # Unused.
+
+  grid = cost_grid()
+  if len(grid) > 1 and not FLAGS.output_directory:
+    raise app.UsageError(
+        "--output_directory is required when sweeping cost constants.")
+
+  available = None
+  if FLAGS.network_models_config:
+    available = models.load(FLAGS.network_models_config)
+  network_models = select_network_models(FLAGS.network_models,
+                                         parse_weights(FLAGS.network_weights),
+                                         available)
+  distributions = aggregation.parse_distributions(FLAGS.distributions)
+
+  with open(FLAGS.graph_signatures, "rb") as signatures_file:
+    signatures_proto = graph_signatures_pb2.GraphSignaturesProto.FromString(
+        signatures_file.read())
+
+  for constants in grid:
+    LOG.info(
+        "Computing results for no_cost_threshold_s=%s "
+        "timeout_threshold_s=%s sigmoid_width=%s", *constants)
+    results_proto = recost(signatures_proto, network_models,
+                           cost.cost_function(*constants), distributions)
+    write_results(results_proto,
+                  output_path(*constants) if FLAGS.output_directory else None)
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,154 @@
+"""Unit tests for the recost module."""
+
+import unittest
+from analysis import aggregation
+from analysis import cost
+from analysis import graph_signatures_pb2
+from analysis import network_models
+from analysis import recost
+from analysis import result_matrix
+from analysis import simulation
+
+MODELS = [network_models.MOBILE_2G_MEDIAN, network_models.DESKTOP_MEDIAN]
+
+
+def s(level_request_bytes, level_response_bytes, num_requests):  # pylint: disable=invalid-name
+  return simulation.GraphSignature(level_request_bytes, level_response_bytes,
+                                   num_requests)
+
+
+def signatures_proto(method_name, sequences, network_sensitive=False):
+  """Builds a GraphSignaturesProto for a single method.
+
+  sequences is a list of (sequence id, dict of network model name => list
+  of GraphSignature's).
+  """
+  proto = graph_signatures_pb2.GraphSignaturesProto()
+  method_proto = proto.methods.add()
+  method_proto.method_name = method_name
+  method_proto.network_sensitive = network_sensitive
+  for sequence_id, signatures_by_network in sequences:
+    method_proto.sequences.append(
+        simulation.to_sequence_signatures_proto(sequence_id,
+                                                signatures_by_network))
+  return proto
+
+
+class RecostTest(unittest.TestCase):
+
+  def test_recost(self):
+    sequences = [
+        (42, {
+            "": [s([100], [2000], 1),
+                 s([100, 200], [2000, 5000], 3)]
+        }),
+        (43, {
+            "": [s([300], [40000], 2)]
+        }),
+    ]
+
+    # Simulating the same graphs directly should give the same results.
+    matrix = result_matrix.ResultMatrix(["Fake_PFE"], MODELS, 2)
+    aggregate = aggregation.MethodAggregate()
+    for idx, (_, signatures_by_network) in enumerate(sequences):
+      signatures = signatures_by_network[""]
+      aggregate.add_sequence(
+          matrix.column("Fake_PFE", idx), {
+              model.name: simulation.totals_for_signatures(signatures, model)
+              for model in MODELS
+          }, MODELS, cost.costs)
+    expected = aggregate.to_proto("Fake_PFE", matrix, [0, 1], [42, 43])
+
+    results = recost.recost(signatures_proto("Fake_PFE", sequences), MODELS,
+                            cost.costs)
+    self.assertEqual(len(results.results), 1)
+    self.assertEqual(results.results[0], expected)
+
+  def test_recost_cost_function(self):
+    proto = signatures_proto("Fake_PFE", [(42, {"": [s([100], [20000], 1)]})])
+
+    default = recost.recost(proto, MODELS, cost.costs).results[0]
+    later = recost.recost(proto, MODELS,
+                          cost.cost_function(1.0, 5.0,
+                                             cost.SIGMOID_WIDTH)).results[0]
+
+    for default_network, later_network in zip(default.results_by_network,
+                                              later.results_by_network):
+      self.assertEqual(default_network.total_wait_time_ms,
+                       later_network.total_wait_time_ms)
+      self.assertLess(later_network.total_cost, default_network.total_cost)
+
+  def test_recost_network_sensitive(self):
+    proto = signatures_proto("Sensitive_PFE", [(42, {
+        "mobile_2g_median": [s([100], [2000], 1)],
+        "desktop_median": [s([100, 100], [2000, 2000], 2)],
+    })], True)
+
+    results = recost.recost(proto, MODELS, cost.costs).results[0]
+    self.assertEqual([(network.network_model_name, network.total_request_count)
+                      for network in results.results_by_network],
+                     [("desktop_median", 2), ("mobile_2g_median", 1)])
+
+    with self.assertRaises(ValueError):
+      recost.recost(proto, [network_models.DESKTOP_FAST], cost.costs)
+
+  def test_recost_skips_methods_without_sequences(self):
+    proto = signatures_proto("Fake_PFE", [])
+    self.assertEqual(len(recost.recost(proto, MODELS, cost.costs).results), 0)
+
+  def test_recost_different_sequences(self):
+    proto = signatures_proto("Fake_PFE", [(42, {
+        "": [s([100], [2000], 1)]
+    }), (43, {
+        "": [s([300], [40000], 2)]
+    })])
+    proto.methods.extend(
+        signatures_proto("Other_PFE", [(43, {
+            "": [s([300], [40000], 2)]
+        }), (42, {
+            "": [s([100], [2000], 1)]
+        })]).methods)
+
+    with self.assertRaises(ValueError):
+      recost.recost(proto, MODELS, cost.costs)
+
+    del proto.methods[1].sequences[0]
+    with self.assertRaises(ValueError):
+      recost.recost(proto, MODELS, cost.costs)
+
+  def test_select_network_models(self):
+    self.assertEqual(recost.select_network_models([], {}),
+                     network_models.ALL_MODELS)
+
+    selected = recost.select_network_models(
+        ["desktop_median", "mobile_2g_median"], {"desktop_median": 0.25})
+    self.assertEqual([model.name for model in selected],
+                     ["desktop_median", "mobile_2g_median"])
+    self.assertEqual([model.weight for model in selected],
+                     [0.25, network_models.MOBILE_2G_MEDIAN.weight])
+
+    available = [
+        simulation.NetworkModel("a", 10, 10, 10, "c", 0.5),
+        simulation.NetworkModel("b", 20, 10, 10, "c", 0.5),
+    ]
+    self.assertEqual(recost.select_network_models([], {}, available), available)
+    self.assertEqual(recost.select_network_models(["b"], {}, available),
+                     available[1:])
+    with self.assertRaises(ValueError):
+      recost.select_network_models(["desktop_median"], {}, available)
+
+    with self.assertRaises(ValueError):
+      recost.select_network_models(["dial_up"], {})
+    with self.assertRaises(ValueError):
+      recost.select_network_models([], {"dial_up": 1})
+
+  def test_parse_weights(self):
+    self.assertEqual(
+        recost.parse_weights(["desktop_median=0.25", "desktop_fast=1"]), {
+            "desktop_median": 0.25,
+            "desktop_fast": 1.0
+        })
+
+
+if __name__ == '__main__':
+  unittest.main()
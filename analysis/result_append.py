@@ -0,0 +1,129 @@
+"""Appends the results of new sequences to an existing AnalysisResultProto.
+
+Used by the analyzer's --append_to mode: sequences already present in a
+result set (by id) are skipped, and the results of the new sequences are
+folded in. Per sequence vectors are extended, totals are summed and per page
+view distributions are merged (see distribution.merge_protos), so the
+results must have been recorded with the same methods, network models and
+--distributions.
+"""
+
+import copy
+
+from analysis import distribution
+
+
+class IncompatibleResultsError(Exception):
+  """Results can't be appended to each other."""
+
+
+def sequence_ids(results_proto):
+  """Returns the ids of the sequences in results_proto, in order.
+
+  Every method and network category must have the same sequences.
+  """
+  ids = None
+  for method_proto in results_proto.results:
+    for category_proto in method_proto.results_by_network_category:
+      if len(category_proto.sequence_ids) != len(
+          category_proto.cost_per_sequence):
+        raise IncompatibleResultsError(
+            "%s (%s) doesn't record the id of every sequence." %
+            (method_proto.method_name, category_proto.network_category))
+      if ids is None:
+        ids = list(category_proto.sequence_ids)
+      elif ids != list(category_proto.sequence_ids):
+        raise IncompatibleResultsError(
+            "%s (%s) has different sequences than the other results." %
+            (method_proto.method_name, category_proto.network_category))
+  return ids or []
+
+
+def append(results_proto, new_results_proto):
+  """Returns results_proto with the results of new_results_proto appended.
+
+  The sequences of new_results_proto must not already be in results_proto.
+  """
+  if not new_results_proto.results:
+    return copy.deepcopy(results_proto)
+  if not results_proto.results:
+    return copy.deepcopy(new_results_proto)
+
+  duplicates = set(sequence_ids(results_proto)) & set(
+      sequence_ids(new_results_proto))
+  if duplicates:
+    raise IncompatibleResultsError("Sequences %s are already in the results." %
+                                   sorted(duplicates))
+
+  new_methods = by_name(new_results_proto.results, "method_name")
+  existing_methods = {
+      method_proto.method_name for method_proto in results_proto.results
+  }
+  if set(new_methods) != existing_methods:
+    raise IncompatibleResultsError(
+        "The same methods must be simulated, have %s but got %s." % (sorted(
+            method_proto.method_name
+            for method_proto in results_proto.results), sorted(new_methods)))
+
+  appended = copy.deepcopy(results_proto)
+  # Sampling estimates don't describe the appended results.
+  appended.ClearField("sampling")
+  for method_proto in appended.results:
+    append_method(method_proto, new_methods[method_proto.method_name])
+  return appended
+
+
+def by_name(protos, field):
+  return {getattr(proto, field): proto for proto in protos}
+
+
+def check_same_names(method_name, kind, names, new_names):
+  if set(names) != set(new_names):
+    raise IncompatibleResultsError(
+        "%s has %s %s but the new results have %s." %
+        (method_name, kind, sorted(names), sorted(new_names)))
+
+
+def append_method(method_proto, new_method_proto):
+  """Appends new_method_proto's results to method_proto, in place."""
+  new_categories = by_name(new_method_proto.results_by_network_category,
+                           "network_category")
+  check_same_names(
+      method_proto.method_name, "network categories",
+      [c.network_category for c in method_proto.results_by_network_category],
+      new_categories)
+  for category_proto in method_proto.results_by_network_category:
+    new_category_proto = new_categories[category_proto.network_category]
+    category_proto.cost_per_sequence.extend(
+        new_category_proto.cost_per_sequence)
+    category_proto.bytes_per_sequence.extend(
+        new_category_proto.bytes_per_sequence)
+    category_proto.sequence_ids.extend(new_category_proto.sequence_ids)
+
+  new_networks = by_name(new_method_proto.results_by_network,
+                         "network_model_name")
+  check_same_names(
+      method_proto.method_name, "network models",
+      [n.network_model_name for n in method_proto.results_by_network],
+      new_networks)
+  for network_proto in method_proto.results_by_network:
+    append_network(network_proto,
+                   new_networks[network_proto.network_model_name])
+
+
+def append_network(network_proto, new_network_proto):
+  """Appends new_network_proto's results to network_proto, in place."""
+  network_proto.total_cost += new_network_proto.total_cost
+  network_proto.total_wait_time_ms += new_network_proto.total_wait_time_ms
+  network_proto.total_request_count += new_network_proto.total_request_count
+  network_proto.total_request_bytes += new_network_proto.total_request_bytes
+  network_proto.total_response_bytes += new_network_proto.total_response_bytes
+  for field in [
+      "wait_per_page_view_ms", "cost_per_page_view",
+      "request_bytes_per_page_view", "response_bytes_per_page_view"
+  ]:
+    if not (network_proto.HasField(field) or new_network_proto.HasField(field)):
+      continue
+    getattr(network_proto, field).CopyFrom(
+        distribution.merge_protos(getattr(network_proto, field),
+                                  getattr(new_network_proto, field)))
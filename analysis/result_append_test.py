@@ -0,0 +1,100 @@
+"""Unit tests for the result_append module."""
+
+import unittest
+from analysis import distribution
+from analysis import result_append
+from analysis import result_pb2
+
+
+def method_result(method_name, sequences, networks=("fast", "slow")):
+  """Builds a MethodResultProto.
+
+  sequences is a list of (sequence id, cost, bytes). Each network gets the
+  sum of the sequences as totals, and a distribution of their costs.
+  """
+  proto = result_pb2.MethodResultProto()
+  proto.method_name = method_name
+  category = proto.results_by_network_category.add()
+  category.network_category = "c"
+  for sequence_id, cost, total_bytes in sequences:
+    category.sequence_ids.append(sequence_id)
+    category.cost_per_sequence.append(cost)
+    category.bytes_per_sequence.append(total_bytes)
+
+  for network_model_name in networks:
+    network = proto.results_by_network.add()
+    network.network_model_name = network_model_name
+    network.total_cost = sum(cost for _, cost, _ in sequences)
+    network.total_response_bytes = sum(b for _, _, b in sequences)
+    network.total_request_count = len(sequences)
+    costs = distribution.Distribution(distribution.LinearBucketer(5))
+    costs.add_values([int(cost) for _, cost, _ in sequences])
+    network.cost_per_page_view.CopyFrom(costs.to_proto())
+  return proto
+
+
+def results(*method_results):
+  proto = result_pb2.AnalysisResultProto()
+  proto.results.extend(method_results)
+  return proto
+
+
+class ResultAppendTest(unittest.TestCase):
+
+  def test_sequence_ids(self):
+    self.assertEqual(
+        result_append.sequence_ids(
+            results(method_result("A", [(3, 1, 10), (1, 2, 20)]),
+                    method_result("B", [(3, 1, 10), (1, 2, 20)]))), [3, 1])
+    self.assertEqual(result_append.sequence_ids(results()), [])
+
+    with self.assertRaises(result_append.IncompatibleResultsError):
+      result_append.sequence_ids(
+          results(method_result("A", [(3, 1, 10)]),
+                  method_result("B", [(4, 1, 10)])))
+
+    no_ids = method_result("A", [(3, 1, 10)])
+    del no_ids.results_by_network_category[0].sequence_ids[:]
+    with self.assertRaises(result_append.IncompatibleResultsError):
+      result_append.sequence_ids(results(no_ids))
+
+  def test_append(self):
+    existing = results(
+        method_result("A", [(1, 1, 10), (2, 2, 20)]),
+        method_result("B", [(1, 3, 30), (2, 4, 40)]),
+    )
+    existing.sampling.sequences_simulated = 2
+    new = results(
+        method_result("B", [(5, 12, 50)]),
+        method_result("A", [(5, 6, 60)]),
+    )
+    expected = results(
+        method_result("A", [(1, 1, 10), (2, 2, 20), (5, 6, 60)]),
+        method_result("B", [(1, 3, 30), (2, 4, 40), (5, 12, 50)]),
+    )
+
+    self.assertEqual(result_append.append(existing, new), expected)
+    # The inputs aren't modified.
+    self.assertEqual(
+        len(existing.results[0].results_by_network_category[0].sequence_ids), 2)
+
+  def test_append_empty(self):
+    existing = results(method_result("A", [(1, 1, 10)]))
+    self.assertEqual(result_append.append(existing, results()), existing)
+    self.assertEqual(result_append.append(results(), existing), existing)
+
+  def test_append_incompatible(self):
+    existing = results(method_result("A", [(1, 1, 10)]))
+    for new in [
+        results(method_result("A", [(1, 1, 10)])),
+        results(method_result("B", [(2, 1, 10)])),
+        results(method_result("A", [(2, 1, 10)]),
+                method_result("B", [(2, 1, 10)])),
+        results(method_result("A", [(2, 1, 10)], ["fast"])),
+    ]:
+      with self.assertRaises(result_append.IncompatibleResultsError):
+        result_append.append(existing, new)
+
+
+if __name__ == '__main__':
+  unittest.main()
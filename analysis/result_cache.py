@@ -0,0 +1,170 @@
+"""A local cache of simulation results.
+
+The graph signatures of a method on a sequence (see
+simulation.graph_signature) are all that's needed to compute every result
+of that cell of the analysis, so they're cached per (method configuration,
+sequence contents, network model for network sensitive methods). Only
+cells missing from the cache are simulated, so adding a method to an
+analysis costs only that method's runtime.
+
+Every key is salted with a fingerprint of the simulation code and the font
+library, so results from other code versions or fonts are never used.
+
+Each entry is a NetworkSignaturesProto in its own file, written atomically,
+so worker processes can share a cache directory.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from analysis import graph_signatures_pb2
+from analysis import simulation
+
+# Bump when the format of the cache entries changes.
+CACHE_VERSION = 1
+
+# Directories (relative to the working directory) with code or data that
+# affect simulation results.
+CODE_DIRECTORIES = [
+    "analysis",
+    "brotli_py",
+    "patch_subset/py",
+    "woff2_py",
+]
+
+CODE_EXTENSIONS = (".py", ".so", ".textproto")
+
+
+def code_version(directories=None):
+  """Returns a hash of the code and data files in directories.
+
+  Tests don't affect results and are skipped.
+  """
+  digest = hashlib.sha256()
+  for directory in directories or CODE_DIRECTORIES:
+    for root, dirs, files in os.walk(directory):
+      dirs.sort()
+      for file_name in sorted(files):
+        if not file_name.endswith(CODE_EXTENSIONS) or file_name.endswith(
+            "_test.py"):
+          continue
+        path = os.path.join(root, file_name)
+        digest.update(path.encode("utf-8"))
+        with open(path, "rb") as code_file:
+          digest.update(hashlib.sha256(code_file.read()).digest())
+  return digest.hexdigest()
+
+
+def font_library_fingerprint(font_directory, default_font_id=None):
+  """Returns a fingerprint of the fonts in font_directory.
+
+  Uses the name, size and modification time of each font, rather than
+  reading the whole library.
+  """
+  digest = hashlib.sha256()
+  digest.update(repr(default_font_id).encode("utf-8"))
+  for font_id in sorted(os.listdir(font_directory)):
+    path = os.path.join(font_directory, font_id)
+    if not os.path.isfile(path):
+      continue
+    stat = os.stat(path)
+    line = "%s %s %s\n" % (font_id, stat.st_size, stat.st_mtime_ns)
+    digest.update(line.encode("utf-8"))
+  return digest.hexdigest()
+
+
+def sequence_hash(sequence):
+  """Returns a hash of the page views of a PageViewSequenceProto.
+
+  The sequence id and language don't affect its results so aren't
+  included.
+  """
+  digest = hashlib.sha256()
+  for page_view in sequence.page_views:
+    serialized = page_view.SerializeToString(deterministic=True)
+    digest.update(len(serialized).to_bytes(8, "little"))
+    digest.update(serialized)
+  return digest.hexdigest()
+
+
+def method_key(method):
+  """Returns a string identifying the configuration of a method.
+
+  The name of a method is used, unless it has a cache_key() function for
+  configuration that isn't reflected in its name.
+  """
+  if hasattr(method, "cache_key") and callable(method.cache_key):
+    return method.cache_key()
+  return method.name()
+
+
+class ResultCache:
+  """Graph signatures stored in a directory, one file per entry."""
+
+  def __init__(self, directory, salt):
+    """Entries are stored in directory, and are only valid for the same salt."""
+    self.directory = directory
+    self.salt = "%s\n%s" % (CACHE_VERSION, salt)
+    # Number of lookups which were found, and which had to be simulated.
+    self.hits = 0
+    self.misses = 0
+
+  def hash_sequence(self, sequence):  # pylint: disable=no-self-use
+    return sequence_hash(sequence)
+
+  def signatures(self, method, a_sequence_hash, network_model, simulate):
+    """Returns the list of GraphSignature's of method on a sequence.
+
+    If they aren't cached simulate() is called to compute them, and the
+    result is stored.
+    """
+    key = self.key(method, a_sequence_hash, network_model)
+    signatures = self.get(key)
+    if signatures is not None:
+      self.hits += 1
+      return signatures
+
+    self.misses += 1
+    signatures = simulate()
+    self.put(key, signatures)
+    return signatures
+
+  def key(self, method, a_sequence_hash, network_model=None):
+    """Returns the key of the results of method on a sequence.
+
+    network_model must be set for network sensitive methods.
+    """
+    parts = [self.salt, method_key(method), a_sequence_hash]
+    if network_model is not None:
+      parts.append(repr(tuple(network_model[:4])))
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+  def path(self, key):
+    return os.path.join(self.directory, key[:2], key + ".pb")
+
+  def get(self, key):
+    """Returns the cached list of GraphSignature's for key, or None."""
+    try:
+      with open(self.path(key), "rb") as entry_file:
+        proto = graph_signatures_pb2.NetworkSignaturesProto.FromString(
+            entry_file.read())
+    except FileNotFoundError:
+      return None
+    return [
+        simulation.from_graph_signature_proto(page_view)
+        for page_view in proto.page_views
+    ]
+
+  def put(self, key, signatures):
+    """Stores a list of GraphSignature's under key."""
+    proto = simulation.to_sequence_signatures_proto(0, {
+        "": signatures
+    }).networks[0]
+
+    path = self.path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path),
+                                     delete=False) as entry_file:
+      entry_file.write(proto.SerializeToString())
+    os.replace(entry_file.name, path)
@@ -0,0 +1,151 @@
+"""Unit tests for the result_cache module."""
+
+import os
+import tempfile
+import unittest
+
+from analysis import page_view_sequence_pb2
+from analysis import result_cache
+from analysis import simulation
+
+SLOW = simulation.NetworkModel("slow", 100, 10, 10, "c", 0.5)
+FAST = simulation.NetworkModel("fast", 10, 100, 100, "c", 0.5)
+
+
+class FakeMethod:  # pylint: disable=missing-class-docstring
+
+  def __init__(self, name, cache_key=None):
+    self.method_name = name
+    if cache_key:
+      self.cache_key = lambda: cache_key
+
+  def name(self):
+    return self.method_name
+
+
+def sequence(sequence_id, language, codepoints_per_view):
+  """Returns a sequence with one page view (of roboto) per codepoint list."""
+  proto = page_view_sequence_pb2.PageViewSequenceProto()
+  proto.id = sequence_id
+  proto.language = language
+  for codepoints in codepoints_per_view:
+    page_view = proto.page_views.add()
+    content = page_view.contents.add()
+    content.font_name = "roboto"
+    content.codepoints.extend(codepoints)
+  return proto
+
+
+class ResultCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.cache = result_cache.ResultCache(self.temp_dir.name, "salt")
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+
+  def test_sequence_hash(self):
+    a_hash = result_cache.sequence_hash(sequence(1, "en", [[1, 2], [3]]))
+    self.assertEqual(
+        result_cache.sequence_hash(sequence(2, "ja", [[1, 2], [3]])), a_hash)
+    self.assertNotEqual(
+        result_cache.sequence_hash(sequence(1, "en", [[1], [2, 3]])), a_hash)
+    self.assertNotEqual(
+        result_cache.sequence_hash(sequence(1, "en", [[1, 2], [3], [3]])),
+        a_hash)
+
+  def test_method_key(self):
+    self.assertEqual(result_cache.method_key(FakeMethod("WholeFont")),
+                     "WholeFont")
+    self.assertEqual(
+        result_cache.method_key(FakeMethod("Combined", "Combined(latin)")),
+        "Combined(latin)")
+
+  def test_key(self):
+    method = FakeMethod("WholeFont")
+    key = self.cache.key(method, "abc")
+    self.assertEqual(key, self.cache.key(method, "abc"))
+
+    other_keys = [
+        self.cache.key(FakeMethod("Other"), "abc"),
+        self.cache.key(method, "abd"),
+        self.cache.key(method, "abc", SLOW),
+        self.cache.key(method, "abc", FAST),
+        self.cache.key(method, "abc", SLOW._replace(rtt=101)),
+        result_cache.ResultCache(self.temp_dir.name,
+                                 "pepper").key(method, "abc"),
+    ]
+    self.assertEqual(len(set(other_keys + [key])), len(other_keys) + 1)
+
+    # Category and weight don't affect simulation.
+    self.assertEqual(self.cache.key(method, "abc", SLOW),
+                     self.cache.key(method, "abc", SLOW._replace(weight=1)))
+
+  def test_get_put(self):
+    signatures = [
+        simulation.GraphSignature([10, 20], [100, 200], 3),
+        simulation.GraphSignature([], [], 0),
+    ]
+    self.assertIsNone(self.cache.get("abcd"))
+    self.cache.put("abcd", signatures)
+    self.assertEqual(self.cache.get("abcd"), signatures)
+    self.assertEqual(os.listdir(os.path.join(self.temp_dir.name, "ab")),
+                     ["abcd.pb"])
+
+    self.cache.put("abcd", [])
+    self.assertEqual(self.cache.get("abcd"), [])
+
+  def test_signatures(self):
+    calls = []
+
+    def simulate():
+      calls.append(1)
+      return [simulation.GraphSignature([10], [100], 1)]
+
+    method = FakeMethod("WholeFont")
+    for _ in range(3):
+      self.assertEqual(self.cache.signatures(method, "abc", None, simulate),
+                       [simulation.GraphSignature([10], [100], 1)])
+    self.assertEqual(len(calls), 1)
+    self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+  def test_code_version(self):
+    code_dir = os.path.join(self.temp_dir.name, "code")
+    os.makedirs(os.path.join(code_dir, "sub"))
+
+    def write(file_name, contents):
+      with open(os.path.join(code_dir, file_name), "w") as code_file:
+        code_file.write(contents)
+
+    write("a.py", "a = 1")
+    write("sub/b.textproto", "b: 1")
+    version = result_cache.code_version([code_dir])
+
+    write("a_test.py", "test = 1")
+    write("notes.md", "notes")
+    self.assertEqual(result_cache.code_version([code_dir]), version)
+
+    write("sub/b.textproto", "b: 2")
+    self.assertNotEqual(result_cache.code_version([code_dir]), version)
+
+  def test_font_library_fingerprint(self):
+    font_dir = os.path.join(self.temp_dir.name, "fonts")
+    os.makedirs(font_dir)
+    with open(os.path.join(font_dir, "Roboto.ttf"), "wb") as font_file:
+      font_file.write(b"font")
+    fingerprint = result_cache.font_library_fingerprint(font_dir)
+    self.assertEqual(result_cache.font_library_fingerprint(font_dir),
+                     fingerprint)
+    self.assertNotEqual(
+        result_cache.font_library_fingerprint(font_dir, "Roboto.ttf"),
+        fingerprint)
+
+    with open(os.path.join(font_dir, "Roboto.ttf"), "ab") as font_file:
+      font_file.write(b"more")
+    self.assertNotEqual(result_cache.font_library_fingerprint(font_dir),
+                        fingerprint)
+
+
+if __name__ == '__main__':
+  unittest.main()
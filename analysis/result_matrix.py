@@ -0,0 +1,153 @@
+"""Per sequence simulation results stored in a flat matrix of doubles.
+
+The matrix is indexed by [field, method, network, sequence] for the per
+network values of each sequence, and by [field, method, category,
+sequence] for the values combined across the networks of a network
+category. Values for one method and network (or category) are
+contiguous so each can be viewed as an array over all sequences.
+
+A matrix can be allocated in shared memory before the worker pool is
+forked, each worker then writes the results of its sequences directly
+into the matrix instead of sending them back to the parent.
+"""
+
+from multiprocessing import shared_memory
+
+# Per network fields, each is a sum over the page views of a sequence.
+COST = "cost"
+TOTAL_TIME = "total_time"
+REQUEST_BYTES = "request_bytes"
+RESPONSE_BYTES = "response_bytes"
+NUM_REQUESTS = "num_requests"
+NETWORK_FIELDS = [COST, TOTAL_TIME, REQUEST_BYTES, RESPONSE_BYTES, NUM_REQUESTS]
+
+# Per category fields, a weighted sum over the networks in the category.
+CATEGORY_COST = "category_cost"
+CATEGORY_BYTES = "category_bytes"
+CATEGORY_FIELDS = [CATEGORY_COST, CATEGORY_BYTES]
+
+DOUBLE_SIZE = 8
+
+
+def matrix_size(num_methods, network_models, num_sequences):
+  """Number of values in a matrix for the given dimensions."""
+  num_categories = len({model.category for model in network_models})
+  return (len(NETWORK_FIELDS) * len(network_models) +
+          len(CATEGORY_FIELDS) * num_categories) * num_methods * num_sequences
+
+
+class ResultMatrix:
+  """Matrix of per sequence results for a set of methods and network models."""
+
+  def __init__(self,
+               method_names,
+               network_models,
+               num_sequences,
+               a_shared_memory=None):
+    """Creates a matrix for num_sequences sequences.
+
+    The values are stored in a_shared_memory if it's given (see shared()),
+    otherwise in a private buffer. All values start at zero.
+    """
+    self.method_index = {name: idx for idx, name in enumerate(method_names)}
+    self.network_index = {
+        model.name: idx for idx, model in enumerate(network_models)
+    }
+    self.categories = sorted({model.category for model in network_models})
+    self.num_sequences = num_sequences
+
+    size = matrix_size(len(method_names), network_models,
+                       num_sequences) * DOUBLE_SIZE
+    self.shared_memory = a_shared_memory
+    if self.shared_memory:
+      self.buffer = self.shared_memory.buf[:size]
+    else:
+      self.buffer = memoryview(bytearray(size))
+    self.values = self.buffer.cast("d")
+
+  @staticmethod
+  def shared(method_names, network_models, num_sequences):
+    """Allocates a ResultMatrix in shared memory, must be released with close()."""
+    size = matrix_size(len(method_names), network_models,
+                       num_sequences) * DOUBLE_SIZE
+    return ResultMatrix(
+        method_names, network_models, num_sequences,
+        shared_memory.SharedMemory(create=True, size=max(size, 1)))
+
+  def network_offset(self, field, method_name, network_name):
+    row = ((NETWORK_FIELDS.index(field) * len(self.method_index) +
+            self.method_index[method_name]) * len(self.network_index) +
+           self.network_index[network_name])
+    return row * self.num_sequences
+
+  def num_network_values(self):
+    """Number of per network values, the per category values follow them."""
+    return (len(NETWORK_FIELDS) * len(self.method_index) *
+            len(self.network_index) * self.num_sequences)
+
+  def category_offset(self, field, method_name, category):
+    row = ((CATEGORY_FIELDS.index(field) * len(self.method_index) +
+            self.method_index[method_name]) * len(self.categories) +
+           self.categories.index(category))
+    return self.num_network_values() + row * self.num_sequences
+
+  def column(self, method_name, sequence_index):
+    """Returns a SequenceColumn for writing the values of one sequence."""
+    return SequenceColumn(self, method_name, sequence_index)
+
+  def set_network_value(self, field, method_name, network_name, sequence_index,
+                        value):
+    self.values[self.network_offset(field, method_name, network_name) +
+                sequence_index] = value
+
+  def set_network_values(self, method_name, network_name, sequence_index,
+                         values):
+    """Sets every field, values are given in NETWORK_FIELDS order."""
+    offset = self.network_offset(NETWORK_FIELDS[0], method_name,
+                                 network_name) + sequence_index
+    stride = (len(self.method_index) * len(self.network_index) *
+              self.num_sequences)
+    for value in values:
+      self.values[offset] = value
+      offset += stride
+
+  def set_category_value(self, field, method_name, category, sequence_index,
+                         value):
+    self.values[self.category_offset(field, method_name, category) +
+                sequence_index] = value
+
+  def network_values(self, field, method_name, network_name):
+    """Returns a view of field for every sequence."""
+    offset = self.network_offset(field, method_name, network_name)
+    return self.values[offset:offset + self.num_sequences]
+
+  def category_values(self, field, method_name, category):
+    """Returns a view of field for every sequence."""
+    offset = self.category_offset(field, method_name, category)
+    return self.values[offset:offset + self.num_sequences]
+
+  def close(self):
+    """Releases the matrix. If it's in shared memory the memory is freed."""
+    self.values.release()
+    self.buffer.release()
+    if self.shared_memory:
+      self.shared_memory.close()
+      self.shared_memory.unlink()
+
+
+class SequenceColumn:
+  """The values of one sequence for one method in a ResultMatrix."""
+
+  def __init__(self, matrix, method_name, sequence_index):
+    self.matrix = matrix
+    self.method_name = method_name
+    self.sequence_index = sequence_index
+
+  def set_network_values(self, network_name, values):
+    """Sets every field, values are given in NETWORK_FIELDS order."""
+    self.matrix.set_network_values(self.method_name, network_name,
+                                   self.sequence_index, values)
+
+  def set_category_value(self, field, category, value):
+    self.matrix.set_category_value(field, self.method_name, category,
+                                   self.sequence_index, value)
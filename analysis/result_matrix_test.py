@@ -0,0 +1,99 @@
+"""Unit tests for the result_matrix module."""
+
+from multiprocessing import Pool
+import unittest
+
+from analysis import result_matrix
+from analysis import simulation
+
+NETWORK_MODELS = [
+    simulation.NetworkModel("slow", 0, 10, 10, "mobile", 1),
+    simulation.NetworkModel("fast", 0, 20, 20, "desktop", 1),
+    simulation.NetworkModel("faster", 0, 30, 30, "desktop", 1),
+]
+
+SHARED_MATRIX = None
+
+
+def write_sequence(sequence_index):
+  SHARED_MATRIX.set_network_value(result_matrix.REQUEST_BYTES, "b", "fast",
+                                  sequence_index, sequence_index * 10)
+
+
+class ResultMatrixTest(unittest.TestCase):
+
+  def test_values(self):
+    matrix = result_matrix.ResultMatrix(["a", "b"], NETWORK_MODELS, 3)
+    self.assertEqual(matrix.categories, ["desktop", "mobile"])
+
+    matrix.set_network_value(result_matrix.COST, "a", "slow", 0, 1.5)
+    matrix.set_network_value(result_matrix.COST, "a", "fast", 1, 2.5)
+    matrix.set_network_value(result_matrix.NUM_REQUESTS, "b", "faster", 2, 7)
+    matrix.set_category_value(result_matrix.CATEGORY_BYTES, "b", "mobile", 1, 9)
+
+    self.assertEqual(
+        list(matrix.network_values(result_matrix.COST, "a", "slow")),
+        [1.5, 0, 0])
+    self.assertEqual(
+        list(matrix.network_values(result_matrix.COST, "a", "fast")),
+        [0, 2.5, 0])
+    self.assertEqual(
+        list(matrix.network_values(result_matrix.COST, "b", "fast")), [0, 0, 0])
+    self.assertEqual(
+        list(matrix.network_values(result_matrix.NUM_REQUESTS, "b", "faster")),
+        [0, 0, 7])
+    self.assertEqual(
+        list(matrix.category_values(result_matrix.CATEGORY_BYTES, "b",
+                                    "mobile")), [0, 9, 0])
+    self.assertEqual(
+        list(matrix.category_values(result_matrix.CATEGORY_COST, "b",
+                                    "mobile")), [0, 0, 0])
+    self.assertEqual(len(matrix.values),
+                     result_matrix.matrix_size(2, NETWORK_MODELS, 3))
+    matrix.close()
+
+  def test_set_network_values(self):
+    matrix = result_matrix.ResultMatrix(["a", "b"], NETWORK_MODELS, 3)
+    matrix.set_network_values("b", "fast", 1, [1, 2, 3, 4, 5])
+
+    self.assertEqual([
+        matrix.network_values(field, "b", "fast")[1]
+        for field in result_matrix.NETWORK_FIELDS
+    ], [1, 2, 3, 4, 5])
+    self.assertEqual(sum(matrix.values), 15)
+    matrix.close()
+
+  def test_column(self):
+    matrix = result_matrix.ResultMatrix(["a", "b"], NETWORK_MODELS, 3)
+    column = matrix.column("b", 2)
+    column.set_network_values("faster", [1, 2, 3, 4, 5])
+    column.set_category_value(result_matrix.CATEGORY_COST, "desktop", 6)
+
+    self.assertEqual(
+        list(matrix.network_values(result_matrix.NUM_REQUESTS, "b", "faster")),
+        [0, 0, 5])
+    self.assertEqual(
+        list(matrix.category_values(result_matrix.CATEGORY_COST, "b",
+                                    "desktop")), [0, 0, 6])
+    self.assertEqual(sum(matrix.values), 21)
+    matrix.close()
+
+  def test_shared(self):
+    global SHARED_MATRIX  # pylint: disable=global-statement
+    SHARED_MATRIX = result_matrix.ResultMatrix.shared(["a", "b"],
+                                                      NETWORK_MODELS, 4)
+    try:
+      with Pool(2) as pool:
+        pool.map(write_sequence, range(4))
+
+      self.assertEqual(
+          list(
+              SHARED_MATRIX.network_values(result_matrix.REQUEST_BYTES, "b",
+                                           "fast")), [0, 10, 20, 30])
+    finally:
+      SHARED_MATRIX.close()
+      SHARED_MATRIX = None
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -4,7 +4,10 @@ import collections
 from collections import namedtuple
 import logging
 
+from analysis import aggregation
 from analysis import font_loader
+from analysis import graph_signatures_pb2
+from analysis import page_view_sequence_pb2
 
 LOG = logging.getLogger("analyzer")
 
@@ -20,8 +23,39 @@ NetworkModel = collections.namedtuple(
     "NetworkModel",
     ["name", "rtt", "bandwidth_up", "bandwidth_down", "category", "weight"])
 
+# The request and response bytes of each level of a request graph (see
+# graph_signature()).
+GraphSignature = collections.namedtuple(
+    "GraphSignature",
+    ["level_request_bytes", "level_response_bytes", "num_requests"])
+
+# signatures_by_method is only set if signatures were recorded, it's a dict
+# of method name => list of SequenceSignaturesProto's.
 SimulationResults = collections.namedtuple(
-    "SimulationResults", ["totals_by_method", "failed_indices"])
+    "SimulationResults",
+    ["totals_by_method", "failed_indices", "signatures_by_method"],
+    defaults=[None])
+
+# Inputs of a method which differ from those of the other methods (see
+# simulate_all): the font loader to use and, unless it's None, a dict of
+# sequence id => the version of each sequence to simulate the method on.
+MethodInputs = collections.namedtuple("MethodInputs",
+                                      ["font_loader", "sequences_by_id"])
+
+# Optional settings of simulate_all, see its docstring.
+SimulationOptions = collections.namedtuple(
+    "SimulationOptions", [
+        "default_font_id", "font_manifest", "font_pack", "cost_function",
+        "matrix", "first_index", "distributions", "record_signatures",
+        "result_cache", "method_inputs"
+    ],
+    defaults=[None, None, None, None, None, 0, None, False, None, None])
+
+# What a method is simulated with for one sequence: the version of the
+# sequence, the font loader and the sequence's result cache key (or None),
+# see cell_inputs().
+CellInputs = collections.namedtuple("CellInputs",
+                                    ["sequence", "font_loader", "sequence_key"])
 
 
 class GraphHasCyclesError(Exception):
@@ -29,63 +63,177 @@ class GraphHasCyclesError(Exception):
   it contains cycles."""
 
 
-def network_time_for(requests, network_model):
-  """Returns the time needed to execute a set of requests in parallel."""
-  request_bytes = sum(request.request_size for request in requests)
-  response_bytes = sum(response.response_size for response in requests)
-  time = (network_model.rtt + request_bytes / network_model.bandwidth_up +
-          response_bytes / network_model.bandwidth_down)
-  return time
-
-
 def simulate_all(sequences,
                  pfe_methods,
                  network_models,
                  font_directory,
-                 default_font_id=None):
+                 options=SimulationOptions()):
   """Simulate the matrix of {sequences} x {pfe_methods} x {network_models}.
 
   For each element compute a set of summary metrics, total time, total
-  request bytes sent, and total response bytes sent.
-  """
+  request bytes sent, and total response bytes sent. options is a
+  SimulationOptions.
 
-  a_font_loader = font_loader.FontLoader(font_directory, default_font_id)
-  failed_indices = []
-  results_by_method = collections.defaultdict(
-      lambda: collections.defaultdict(list))
+  Fonts are loaded from font_directory, using the options' default font
+  id, font manifest and font pack.
 
-  idx = 0
-  for sequence in sequences:
+  If matrix (a result_matrix.ResultMatrix) is set, results aren't
+  returned individually. Instead as soon as a sequence completes its per
+  sequence values are written to column first_index + i of matrix and
+  its page views are added to an aggregation.MethodAggregate per method,
+  using cost_function to assign costs. distributions optionally selects the
+  distribution used for each per page view metric (see aggregation).
 
-    sequence_results = collections.defaultdict(
-        lambda: collections.defaultdict(list))
+  If record_signatures is set the graph signatures of every sequence which
+  completes are also returned, see SimulationResults.
 
-    try:
-      for method in pfe_methods:
+  If result_cache (a result_cache.ResultCache) is set, the graph signatures
+  of each method on a sequence are read from it when present, only missing
+  ones are simulated.
 
-        if not is_network_sensitive(method):
-          graphs = simulate_sequence(sequence.page_views, method, None,
-                                     a_font_loader)
+  method_inputs is an optional dict of method name => MethodInputs for
+  methods which use their own font library or data set. A sequence fails
+  for every method if it fails for one of them.
+  """
 
-        network_results = sequence_results[method.name()]
-        for network_model in network_models:
-          if is_network_sensitive(method):
-            graphs = simulate_sequence(sequence.page_views, method,
-                                       network_model, a_font_loader)
+  a_font_loader = font_loader.FontLoader(font_directory,
+                                         options.default_font_id,
+                                         options.font_manifest,
+                                         options.font_pack)
+  failed_indices = []
+  if options.matrix:
+    totals_by_method = dict()
+  else:
+    totals_by_method = collections.defaultdict(
+        lambda: collections.defaultdict(list))
+  signatures_by_method = collections.defaultdict(list)
 
-          network_results[network_model.name].append(
-              SequenceTotals(totals_for_network(graphs, network_model),
-                             sequence.id))
+  for idx, sequence in enumerate(sequences):
+    try:
+      sequence_results, sequence_signatures = simulate_methods(
+          sequence, pfe_methods, network_models, a_font_loader, options)
+      for method_name, proto in sequence_signatures.items():
+        signatures_by_method[method_name].append(proto)
 
-      merge_results_by_method(sequence_results, results_by_method)
+      if options.matrix:
+        aggregate_sequence(options.first_index + idx, sequence_results,
+                           network_models, options, totals_by_method)
+      else:
+        merge_results_by_method(sequence_results, totals_by_method)
 
     except Exception:  # pylint: disable=broad-except
       LOG.exception(
           "Failure during sequence simulation. Dropping sequence from results.")
       failed_indices.append(idx)
-    idx += 1
 
-  return SimulationResults(dict(results_by_method), failed_indices)
+  return SimulationResults(
+      dict(totals_by_method), failed_indices,
+      dict(signatures_by_method) if options.record_signatures else None)
+
+
+def simulate_segment(segment, pfe_methods, network_models, font_directory,
+                     options):
+  """Runs simulate_all on a segment of sequences serialized to binary.
+
+  segment is a tuple of the index of the first sequence, which replaces
+  options.first_index, and the list of sequences. Takes the sequences
+  serialized, so that they may be passed down to another process.
+  """
+  first_index, serialized_sequences = segment
+  sequences = [
+      page_view_sequence_pb2.PageViewSequenceProto.FromString(s)
+      for s in serialized_sequences
+  ]
+  cache_counts = None
+  if options.result_cache is not None:
+    cache_counts = (options.result_cache.hits, options.result_cache.misses)
+  results = simulate_all(sequences, pfe_methods, network_models, font_directory,
+                         options._replace(first_index=first_index))
+  if cache_counts is not None:
+    LOG.info("Sequences %s to %s: %s results from the cache, %s simulated.",
+             first_index, first_index + len(sequences) - 1,
+             options.result_cache.hits - cache_counts[0],
+             options.result_cache.misses - cache_counts[1])
+  return results
+
+
+def simulate_methods(sequence, pfe_methods, network_models, a_font_loader,
+                     options):
+  """Simulates every method on one sequence.
+
+  Returns a tuple of the results, a dict of method name => network model
+  name => list of SequenceTotals, and a dict of method name =>
+  SequenceSignaturesProto which is only filled if options.record_signatures
+  is set.
+  """
+  sequence_results = collections.defaultdict(
+      lambda: collections.defaultdict(list))
+  sequence_signatures = dict()
+  sequence_key = (options.result_cache.hash_sequence(sequence)
+                  if options.result_cache is not None else None)
+
+  for method in pfe_methods:
+    inputs = cell_inputs(method, sequence, sequence_key, a_font_loader, options)
+    totals_by_network, signatures_by_network = simulate_cell(
+        method, inputs, network_models, options.result_cache)
+    for network_name, totals in totals_by_network.items():
+      sequence_results[method.name()][network_name].append(
+          SequenceTotals(totals, sequence.id))
+
+    if options.record_signatures:
+      sequence_signatures[method.name()] = to_sequence_signatures_proto(
+          sequence.id, signatures_by_network, sequence.language)
+  return sequence_results, sequence_signatures
+
+
+def cell_inputs(method, sequence, sequence_key, a_font_loader, options):
+  """Returns the CellInputs of method on sequence.
+
+  sequence_key and a_font_loader are used unless options.method_inputs
+  gives the method its own.
+  """
+  inputs = (options.method_inputs or dict()).get(method.name())
+  if inputs is None:
+    return CellInputs(sequence, a_font_loader, sequence_key)
+  if inputs.sequences_by_id is None:
+    return CellInputs(sequence, inputs.font_loader, sequence_key)
+
+  method_sequence = inputs.sequences_by_id[sequence.id]
+  if options.result_cache is not None:
+    sequence_key = options.result_cache.hash_sequence(method_sequence)
+  return CellInputs(method_sequence, inputs.font_loader, sequence_key)
+
+
+def simulate_cell(method, inputs, network_models, result_cache):
+  """Simulates method on one sequence with every network model.
+
+  inputs are the CellInputs of the method. Returns a tuple of a dict of
+  network model name => list of GraphTotal's, one per page view, and a dict
+  of network model name => list of GraphSignature's. Signatures of methods
+  which aren't network sensitive are under the name "".
+  """
+  # Graphs are reduced to signatures once, and then evaluated against
+  # each network model.
+  if not is_network_sensitive(method):
+    signatures = cell_signatures(inputs.sequence, method, None,
+                                 inputs.font_loader, result_cache,
+                                 inputs.sequence_key)
+    totals_by_network = {
+        network_model.name: totals for network_model, totals in zip(
+            network_models, totals_for_models(signatures, network_models))
+    }
+    return totals_by_network, {"": signatures}
+
+  totals_by_network = dict()
+  signatures_by_network = dict()
+  for network_model in network_models:
+    signatures = cell_signatures(inputs.sequence, method, network_model,
+                                 inputs.font_loader, result_cache,
+                                 inputs.sequence_key)
+    signatures_by_network[network_model.name] = signatures
+    totals_by_network[network_model.name] = totals_for_signatures(
+        signatures, network_model)
+  return totals_by_network, signatures_by_network
 
 
 def merge_results_by_method(source, dest):
@@ -95,6 +243,23 @@ def merge_results_by_method(source, dest):
       dest_network_results[network].extend(totals)
 
 
+def aggregate_sequence(sequence_index, sequence_results, network_models,
+                       options, dest):
+  """Adds the results of one sequence to a dict of method name => MethodAggregate.
+
+  Per sequence values are written to options.matrix, page views are
+  aggregated using options.cost_function and options.distributions.
+  """
+  for method, network_results in sequence_results.items():
+    if method not in dest:
+      dest[method] = aggregation.MethodAggregate(options.distributions)
+    dest[method].add_sequence(
+        options.matrix.column(method, sequence_index), {
+            network: sequence_totals[0].totals
+            for network, sequence_totals in network_results.items()
+        }, network_models, options.cost_function)
+
+
 def is_network_sensitive(method):
   return hasattr(method, "network_sensitive") and callable(
       method.network_sensitive) and method.network_sensitive()
@@ -102,13 +267,38 @@ def is_network_sensitive(method):
 
 def totals_for_network(graphs, network_model):
   """For a set of graphs computes the network time required for each network model."""
+  return totals_for_signatures(signatures_for(graphs), network_model)
+
+
+def totals_for_signatures(signatures, network_model):
+  """Computes the GraphTotal of each graph signature under network_model."""
   return [
-      GraphTotal(total_time_for_request_graph(graph, network_model),
-                 graph.total_request_bytes(), graph.total_response_bytes(),
-                 graph.length()) for graph in graphs
+      GraphTotal(time_for_signature(signature, network_model),
+                 sum(signature.level_request_bytes),
+                 sum(signature.level_response_bytes), signature.num_requests)
+      for signature in signatures
   ]
 
 
+def cell_signatures(  # pylint: disable=too-many-arguments
+    sequence, pfe_method, network_model, a_font_loader, result_cache,
+    sequence_key):
+  """Returns the graph signatures of pfe_method on sequence.
+
+  Uses result_cache if it's set, see simulate_all().
+  """
+
+  def simulate():
+    return signatures_for(
+        simulate_sequence(sequence.page_views, pfe_method, network_model,
+                          a_font_loader))
+
+  if result_cache is None:
+    return simulate()
+  return result_cache.signatures(pfe_method, sequence_key, network_model,
+                                 simulate)
+
+
 def simulate_sequence(sequence, pfe_method, network_model, a_font_loader):
   """Simulate page view sequence with pfe_method using network_model.
 
@@ -128,20 +318,105 @@ def simulate_sequence(sequence, pfe_method, network_model, a_font_loader):
 
 def total_time_for_request_graph(graph, network_model):
   """Calculate the total time and number of bytes need to execute a given request graph."""
-  total_time = 0
+  return time_for_signature(graph_signature(graph), network_model)
+
+
+def totals_for_models(signatures, network_models):
+  """Computes the GraphTotal of each graph signature under every network model.
+
+  Evaluates all network models together, each signature is read once
+  regardless of the number of models. Returns a list with the totals for
+  each network model, same as calling totals_for_signatures() on each.
+  """
+  parameters = [(model.rtt, model.bandwidth_up, model.bandwidth_down)
+                for model in network_models]
+  results = [[] for _ in network_models]
+  for signature in signatures:
+    times = [0] * len(parameters)
+    for request_bytes, response_bytes in zip(signature.level_request_bytes,
+                                             signature.level_response_bytes):
+      times = [
+          time + (rtt + request_bytes / up + response_bytes / down)
+          for time, (rtt, up, down) in zip(times, parameters)
+      ]
+    request_bytes = sum(signature.level_request_bytes)
+    response_bytes = sum(signature.level_response_bytes)
+    for result, time in zip(results, times):
+      result.append(
+          GraphTotal(time, request_bytes, response_bytes,
+                     signature.num_requests))
+  return results
+
+
+def graph_signature(graph):
+  """Reduces a request graph to a GraphSignature.
+
+  The graph is executed level by level, all requests which can run are
+  sent in parallel. Only the total bytes of each level are needed to
+  compute the time the graph takes on any network model.
+  """
+  level_request_bytes = []
+  level_response_bytes = []
   completed_requests = set()
   while not graph.all_requests_completed(completed_requests):
     next_requests = graph.requests_that_can_run(completed_requests)
     if not next_requests:
       raise GraphHasCyclesError("Cannot execute graph, it contains cycles.")
 
-    total_time += network_time_for(next_requests, network_model)
+    level_request_bytes.append(
+        sum(request.request_size for request in next_requests))
+    level_response_bytes.append(
+        sum(request.response_size for request in next_requests))
 
     completed_requests = completed_requests.union(next_requests)
 
+  return GraphSignature(level_request_bytes, level_response_bytes,
+                        graph.length())
+
+
+def signatures_for(graphs):
+  return [graph_signature(graph) for graph in graphs]
+
+
+def time_for_signature(signature, network_model):
+  """Returns the time needed to execute a graph, given its signature."""
+  total_time = 0
+  for request_bytes, response_bytes in zip(signature.level_request_bytes,
+                                           signature.level_response_bytes):
+    total_time += (network_model.rtt +
+                   request_bytes / network_model.bandwidth_up +
+                   response_bytes / network_model.bandwidth_down)
   return total_time
 
 
+def to_sequence_signatures_proto(sequence_id,
+                                 signatures_by_network,
+                                 language=""):
+  """Converts signatures into a SequenceSignaturesProto.
+
+  signatures_by_network is a dict of network model name => list of
+  GraphSignature's.
+  """
+  proto = graph_signatures_pb2.SequenceSignaturesProto()
+  proto.sequence_id = sequence_id
+  proto.language = language
+  for network_model_name, signatures in signatures_by_network.items():
+    network_proto = proto.networks.add()
+    network_proto.network_model_name = network_model_name
+    for signature in signatures:
+      page_view_proto = network_proto.page_views.add()
+      page_view_proto.level_request_bytes.extend(signature.level_request_bytes)
+      page_view_proto.level_response_bytes.extend(
+          signature.level_response_bytes)
+      page_view_proto.num_requests = signature.num_requests
+  return proto
+
+
+def from_graph_signature_proto(proto):
+  return GraphSignature(list(proto.level_request_bytes),
+                        list(proto.level_response_bytes), proto.num_requests)
+
+
 def usage_by_font(page_view):
   """For a page view computes a map from font name => (codepoints, glyphs)."""
   result = dict()
@@ -1,5 +1,6 @@
 """Unit tests for the simulation module."""
 
+import tempfile
 import unittest
 from collections import namedtuple
 
@@ -7,6 +8,8 @@ from unittest import mock
 from analysis import font_loader
 from analysis import page_view_sequence_pb2
 from analysis import request_graph
+from analysis import result_cache
+from analysis import result_matrix
 from analysis import simulation
 
 
@@ -93,6 +96,7 @@ class SimulationTest(unittest.TestCase):
     self.mock_pfe_method_2 = MockPfeMethod()
     self.mock_pfe_session_2 = MockPfeSession()
     self.mock_pfe_method_2.name = mock.MagicMock(return_value="Mock_PFE_2")
+    self.mock_pfe_method_2.network_sensitive = mock.MagicMock(return_value=True)
     self.mock_pfe_method_2.start_session = mock.MagicMock(
         return_value=self.mock_pfe_session_2)
     self.mock_pfe_session_2.page_view = mock.MagicMock()
@@ -132,6 +136,65 @@ class SimulationTest(unittest.TestCase):
     self.assertEqual(
         simulation.total_time_for_request_graph(graph, self.net_model), 175)
 
+  def test_graph_signature(self):
+    r_1 = request_graph.Request(100, 200)
+    r_2 = request_graph.Request(200, 300)
+    r_3 = request_graph.Request(300, 400, {r_2})
+    r_4 = request_graph.Request(400, 500, {r_1, r_2})
+    r_5 = request_graph.Request(500, 600, {r_3, r_4})
+    graph = request_graph.RequestGraph({r_1, r_2, r_3, r_4, r_5})
+
+    signature = simulation.graph_signature(graph)
+    self.assertEqual(
+        signature, simulation.GraphSignature([300, 700, 500], [500, 900, 600],
+                                             5))
+    self.assertEqual(simulation.time_for_signature(signature, self.net_model),
+                     175)
+    self.assertEqual(
+        simulation.totals_for_signatures([signature], self.net_model),
+        [simulation.GraphTotal(175, 1500, 2000, 5)])
+
+    self.assertEqual(
+        simulation.graph_signature(request_graph.RequestGraph(set())),
+        simulation.GraphSignature([], [], 0))
+
+  def test_totals_for_models(self):
+    signatures = [
+        simulation.GraphSignature([300, 700, 500], [500, 900, 600], 5),
+        simulation.GraphSignature([10], [20], 1),
+        simulation.GraphSignature([], [], 0),
+    ]
+    network_models = [
+        self.net_model,
+        simulation.NetworkModel("slow", 33.3, 7, 13, "slow", 1),
+        simulation.NetworkModel("fast", 0, 1000, 3000, "fast", 1),
+    ]
+
+    self.assertEqual(simulation.totals_for_models(signatures, network_models), [
+        simulation.totals_for_signatures(signatures, network_model)
+        for network_model in network_models
+    ])
+    self.assertEqual(simulation.totals_for_models(signatures, []), [])
+
+  def test_sequence_signatures_proto(self):
+    signatures = [
+        simulation.GraphSignature([300, 700], [500, 900], 3),
+        simulation.GraphSignature([10], [20], 1),
+    ]
+    proto = simulation.to_sequence_signatures_proto(42, {"": signatures})
+
+    self.assertEqual(proto.sequence_id, 42)
+    self.assertEqual(len(proto.networks), 1)
+    self.assertEqual(proto.networks[0].network_model_name, "")
+    self.assertEqual([
+        simulation.from_graph_signature_proto(page_view)
+        for page_view in proto.networks[0].page_views
+    ], signatures)
+    self.assertEqual(proto.language, "")
+
+    proto = simulation.to_sequence_signatures_proto(42, {"": signatures}, "en")
+    self.assertEqual(proto.language, "en")
+
   def test_detects_cylces(self):
     r_1 = request_graph.Request(100, 200)
     r_2 = request_graph.Request(200, 300, {r_1})
@@ -255,6 +318,209 @@ class SimulationTest(unittest.TestCase):
                 },
             }, [1]))
 
+  def test_simulate_all_method_inputs(self):
+    network_models = [simulation.NetworkModel("slow", 0, 10, 10, "slow", 1)]
+    sequences = [
+        pv_sequence(sequence([{
+            "roboto": [1]
+        }])),
+        pv_sequence(sequence([{
+            "roboto": [2]
+        }])),
+    ]
+    sequences[1].id = 43
+    method_sequences = {
+        42: pv_sequence(sequence([{
+            "roboto.optimized": [1]
+        }])),
+        43: pv_sequence(sequence([{
+            "does_not_exist": [2]
+        }])),
+    }
+    method_font_loader = font_loader.FontLoader("fonts/optimized")
+
+    results = simulation.simulate_all(
+        sequences, [self.mock_pfe_method, self.mock_pfe_method_2],
+        network_models, "fonts/are/here",
+        simulation.SimulationOptions(
+            method_inputs={
+                "Mock_PFE_1":
+                    simulation.MethodInputs(method_font_loader, method_sequences
+                                           )
+            }))
+
+    # Sequence 43 fails for Mock_PFE_1, so it's dropped for both methods.
+    self.assertEqual(results.failed_indices, [1])
+    for method_name in ["Mock_PFE_1", "Mock_PFE_2"]:
+      self.assertEqual([
+          totals.sequence_id
+          for totals in results.totals_by_method[method_name]["slow"]
+      ], [42])
+
+    self.mock_pfe_method.start_session.assert_called_with(
+        None, method_font_loader)
+    self.assertEqual(self.mock_pfe_session.page_view.call_args_list[0],
+                     mock.call({"roboto.optimized": mock.ANY}))
+    self.assertEqual(self.mock_pfe_session_2.page_view.call_args_list[0],
+                     mock.call({"roboto": mock.ANY}))
+
+  def test_simulate_all_records_signatures(self):
+    network_models = [
+        simulation.NetworkModel("slow", 0, 10, 10, "slow", 1),
+        simulation.NetworkModel("fast", 0, 20, 20, "fast", 1),
+    ]
+    sequences = [
+        pv_sequence(sequence([{
+            "roboto": [1]
+        }])),
+        pv_sequence(sequence([{
+            "does_not_exist": [1]
+        }])),
+    ]
+    results = simulation.simulate_all(
+        sequences, [self.mock_pfe_method, self.mock_pfe_method_2],
+        network_models, "fonts/are/here",
+        simulation.SimulationOptions(record_signatures=True))
+
+    self.assertEqual(results.failed_indices, [1])
+    self.assertEqual(sorted(results.signatures_by_method),
+                     ["Mock_PFE_1", "Mock_PFE_2"])
+
+    signatures = results.signatures_by_method["Mock_PFE_1"]
+    self.assertEqual(len(signatures), 1)
+    self.assertEqual(signatures[0].sequence_id, 42)
+    self.assertEqual(
+        [network.network_model_name for network in signatures[0].networks],
+        [""])
+    self.assertEqual(
+        list(signatures[0].networks[0].page_views[0].level_response_bytes),
+        [1000])
+
+    signatures = results.signatures_by_method["Mock_PFE_2"]
+    self.assertEqual(
+        [network.network_model_name for network in signatures[0].networks],
+        ["slow", "fast"])
+    self.assertEqual(len(signatures[0].networks[0].page_views), 2)
+
+    self.assertIsNone(
+        simulation.simulate_all([], [self.mock_pfe_method], network_models,
+                                "fonts/are/here").signatures_by_method)
+
+  def test_simulate_all_result_cache(self):
+    network_models = [
+        simulation.NetworkModel("slow", 0, 10, 10, "slow", 1),
+        simulation.NetworkModel("fast", 0, 20, 20, "fast", 1),
+    ]
+    sequences = [
+        pv_sequence(sequence([{
+            "roboto": [1]
+        }, {
+            "roboto": [2]
+        }])),
+    ]
+    expected = simulation.simulate_all(
+        sequences, [self.mock_pfe_method, self.mock_pfe_method_2],
+        network_models, "fonts/are/here")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+      cache = result_cache.ResultCache(temp_dir, "salt")
+      for _ in range(2):
+        self.mock_pfe_method.start_session.reset_mock()
+        self.mock_pfe_method_2.start_session.reset_mock()
+        self.assertEqual(
+            simulation.simulate_all(
+                sequences, [self.mock_pfe_method, self.mock_pfe_method_2],
+                network_models, "fonts/are/here",
+                simulation.SimulationOptions(result_cache=cache)), expected)
+
+      # The second time everything comes from the cache.
+      self.assertEqual((cache.hits, cache.misses), (3, 3))
+      self.mock_pfe_method.start_session.assert_not_called()
+      self.mock_pfe_method_2.start_session.assert_not_called()
+
+  def test_simulate_all_aggregated(self):
+    network_models = [
+        simulation.NetworkModel("slow", 0, 10, 10, "slow", 1),
+        simulation.NetworkModel("fast", 0, 20, 20, "fast", 1),
+    ]
+    matrix = result_matrix.ResultMatrix(["Mock_PFE_1", "Mock_PFE_2"],
+                                        network_models, 4)
+    results = simulation.simulate_all(
+        [
+            pv_sequence(sequence([{
+                "roboto": [1]
+            }, {
+                "roboto": [2]
+            }])),
+            pv_sequence(sequence([
+                {
+                    "does_not_exist": [1]
+                },
+            ])),
+        ], [
+            self.mock_pfe_method,
+            self.mock_pfe_method_2,
+        ], network_models, "fonts/are/here",
+        simulation.SimulationOptions(
+            cost_function=lambda times: [time / 10 for time in times],
+            matrix=matrix,
+            first_index=2))
+
+    self.assertEqual(results.failed_indices, [1])
+    self.assertEqual(sorted(results.totals_by_method),
+                     ["Mock_PFE_1", "Mock_PFE_2"])
+    self.assertEqual(
+        results.totals_by_method["Mock_PFE_1"].networks["slow"].
+        wait_per_page_view_ms.buckets, {205: 1})
+
+    self.assertEqual(
+        list(
+            matrix.network_values(result_matrix.TOTAL_TIME, "Mock_PFE_1",
+                                  "slow")), [0, 0, 200, 0])
+    self.assertEqual(
+        list(matrix.network_values(result_matrix.COST, "Mock_PFE_1", "fast")),
+        [0, 0, 10, 0])
+    self.assertEqual(
+        list(
+            matrix.network_values(result_matrix.NUM_REQUESTS, "Mock_PFE_2",
+                                  "slow")), [0, 0, 2, 0])
+    self.assertEqual(
+        list(
+            matrix.category_values(result_matrix.CATEGORY_COST, "Mock_PFE_2",
+                                   "slow")), [0, 0, 40, 0])
+    self.assertEqual(
+        list(
+            matrix.category_values(result_matrix.CATEGORY_BYTES, "Mock_PFE_1",
+                                   "fast")), [0, 0, 2000, 0])
+
+  def test_simulate_segment(self):
+    network_models = [
+        simulation.NetworkModel("slow", 0, 10, 10, "slow", 1),
+    ]
+    matrix = result_matrix.ResultMatrix(["Mock_PFE_1"], network_models, 3)
+    results = simulation.simulate_segment(
+        (1, [
+            pv_sequence(sequence([{
+                "roboto": [1]
+            }])).SerializeToString(),
+            pv_sequence(sequence([{
+                "roboto": [1]
+            }, {
+                "roboto": [2]
+            }])).SerializeToString(),
+        ]), [self.mock_pfe_method], network_models, "fonts/are/here",
+        simulation.SimulationOptions(
+            cost_function=lambda times: [time / 10 for time in times],
+            matrix=matrix,
+            first_index=7))
+
+    self.assertEqual(results.failed_indices, [])
+    self.assertEqual(sorted(results.totals_by_method), ["Mock_PFE_1"])
+    self.assertEqual(
+        list(
+            matrix.network_values(result_matrix.NUM_REQUESTS, "Mock_PFE_1",
+                                  "slow")), [0, 1, 1])
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,222 @@
+"""Tunes the codepoint prediction parameters used by CombinedPatchSubset.
+
+For one script category searches for the max codepoints and frequency
+threshold with the lowest cost on each network model. A coarse grid of
+parameters is simulated first, then the grid is refined around the best
+parameters of each network model for a number of rounds. Patch subset isn't
+network sensitive, so each round simulates every config once, in a single
+analysis, and evaluates it against all of the network models.
+
+The best parameters are written to a CodepointPredictionSettingsProto
+textproto, which CombinedPatchSubset loads for --auto_settings (see
+--prediction_settings).
+"""
+
+import itertools
+import logging
+
+from absl import app
+from absl import flags
+from google.protobuf import text_format
+from analysis import analyzer
+from analysis import analyzer_codepoint_prediction
+from analysis.pfe_methods import codepoint_prediction_settings_pb2
+from analysis.pfe_methods import combined_patch_subset_method
+
+LOG = logging.getLogger("analyzer")
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_list(
+    "coarse_max_codepoints", ["10", "25", "50", "100", "200", "400"],
+    "Max codepoints values of the coarse grid which is simulated first.")
+
+flags.DEFINE_list(
+    "coarse_freq_threshold", ["0.005", "0.01", "0.05", "0.1", "0.2", "0.4"],
+    "Frequency threshold values of the coarse grid which is simulated first.")
+
+flags.DEFINE_integer(
+    "refinement_rounds", 2,
+    "Number of times the grid is refined around the best parameters of "
+    "each network model.")
+
+flags.DEFINE_string(
+    "base_settings", None,
+    "Optional existing settings file. Settings for other script categories "
+    "are copied from it to the output.")
+
+flags.DEFINE_string("settings_out", None,
+                    "Path to write the tuned settings textproto to.")
+flags.mark_flag_as_required("settings_out")
+
+PredictionConfig = analyzer_codepoint_prediction.PredictionConfig
+
+NO_PREDICTION = PredictionConfig(0, 0.0)
+
+SETTINGS_HEADER = """# Codepoint prediction settings for --auto_settings, see
+# codepoint_prediction_settings.proto. Regenerate with
+# analysis:tune_codepoint_prediction.
+"""
+
+
+def config_of(result):
+  return PredictionConfig(result.max_codepoints, result.freq_threshold)
+
+
+def best_results(results):
+  """Returns a dict of network model name => the SweepResult with the lowest cost.
+
+  Ties are broken in favour of fewer predicted codepoints.
+  """
+  best = dict()
+  for result in results:
+    current = best.get(result.network_model_name)
+    if current is None or ((result.cost, config_of(result))
+                           < (current.cost, config_of(current))):
+      best[result.network_model_name] = result
+  return best
+
+
+def refine_axis(values, value, integer, upper_bound=None):
+  """Returns the values to try next on one axis of the grid.
+
+  These are value and the midpoints between value and its neighbours in
+  values. If value is at an edge of the axis the search is extended past
+  it by a factor of two.
+  """
+  values = sorted(values)
+  idx = values.index(value)
+  lower = (values[idx - 1] + value) / 2 if idx > 0 else value / 2
+  upper = (values[idx + 1] + value) / 2 if idx + 1 < len(values) else value * 2
+  if upper_bound is not None:
+    upper = min(upper, upper_bound)
+
+  candidates = [lower, value, upper]
+  if integer:
+    candidates = [int(round(candidate)) for candidate in candidates]
+  return sorted(set(candidate for candidate in candidates if candidate > 0))
+
+
+def refine(best_by_network, evaluated):
+  """Returns the configs to simulate in the next round, in a stable order.
+
+  For every network model the grid is refined around its best config.
+  Configs in evaluated have already been simulated and are skipped.
+  """
+  predicting = [config for config in evaluated if config.max_codepoints]
+  max_codepoints = {config.max_codepoints for config in predicting}
+  freq_thresholds = {config.freq_threshold for config in predicting}
+
+  configs = []
+  for result in best_by_network.values():
+    if not result.max_codepoints:
+      # No prediction is best, there's nothing to refine.
+      continue
+    for config in itertools.product(
+        refine_axis(max_codepoints, result.max_codepoints, True),
+        refine_axis(freq_thresholds, result.freq_threshold, False, 1.0)):
+      config = PredictionConfig(*config)
+      if config not in evaluated and config not in configs:
+        configs.append(config)
+  return configs
+
+
+def tune(coarse_configs,
+         models,
+         refinement_rounds,
+         simulate=analyzer_codepoint_prediction.simulate_configs):
+  """Searches for the best config for each network model.
+
+  simulate(configs, models) must return the SweepResult's of configs on
+  every network model. Returns a tuple of dicts of network model name =>
+  SweepResult, the best result and the result without prediction.
+  """
+  results = []
+  evaluated = set()
+  configs = [NO_PREDICTION] + [
+      config for config in coarse_configs if config != NO_PREDICTION
+  ]
+  for round_no in range(refinement_rounds + 1):
+    if not configs:
+      break
+    LOG.info("Tuning round %s: simulating %s configs.", round_no, len(configs))
+    results.extend(simulate(configs, models))
+    evaluated.update(configs)
+    configs = refine(best_results(results), evaluated)
+
+  no_prediction = {
+      result.network_model_name: result
+      for result in results
+      if config_of(result) == NO_PREDICTION
+  }
+  return best_results(results), no_prediction
+
+
+def to_settings_proto(script_category,
+                      models,
+                      best_by_network,
+                      no_prediction_by_network,
+                      base_settings=None):
+  """Builds a CodepointPredictionSettingsProto from the tuning results.
+
+  Settings for other script categories are copied from base_settings.
+  """
+  settings_proto = (
+      codepoint_prediction_settings_pb2.CodepointPredictionSettingsProto())
+  settings_proto.version = combined_patch_subset_method.SETTINGS_VERSION
+  if base_settings:
+    settings_proto.settings.extend(
+        setting for setting in base_settings.settings
+        if setting.script_category != script_category)
+
+  for model in models:
+    best = best_by_network[model.name]
+    setting = settings_proto.settings.add()
+    setting.script_category = script_category
+    setting.network_model_name = model.name
+    setting.max_codepoints = best.max_codepoints
+    setting.freq_threshold = best.freq_threshold
+    setting.cost = best.cost
+    setting.no_prediction_cost = no_prediction_by_network[model.name].cost
+  return settings_proto
+
+
+def write_settings(settings_proto, path):
+  with open(path, "w") as settings_file:
+    settings_file.write(SETTINGS_HEADER)
+    settings_file.write(text_format.MessageToString(settings_proto))
+
+
+def main(argv):
+  """Runs the tuning."""
+  del argv  # Unused.
+
+  if not FLAGS.script_category:
+    raise app.UsageError("--script_category is required.")
+
+  analyzer.install_flags()
+  base_settings = None
+  if FLAGS.base_settings:
+    base_settings = combined_patch_subset_method.read_settings(
+        FLAGS.base_settings)
+
+  models = list(analyzer.NETWORK_MODELS)
+  best_by_network, no_prediction_by_network = tune(
+      analyzer_codepoint_prediction.config_grid(FLAGS.coarse_max_codepoints,
+                                                FLAGS.coarse_freq_threshold),
+      models, FLAGS.refinement_rounds)
+  for model in models:
+    best = best_by_network[model.name]
+    LOG.info(
+        "%s: max_codepoints=%s freq_threshold=%s cost=%s (%s without "
+        "prediction)", model.name, best.max_codepoints, best.freq_threshold,
+        best.cost, no_prediction_by_network[model.name].cost)
+
+  write_settings(
+      to_settings_proto(FLAGS.script_category, models, best_by_network,
+                        no_prediction_by_network, base_settings),
+      FLAGS.settings_out)
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,166 @@
+"""Unit tests for the tune_codepoint_prediction module."""
+
+import os
+import tempfile
+import unittest
+
+from analysis import analyzer_codepoint_prediction
+from analysis import network_models
+from analysis import tune_codepoint_prediction
+from analysis.pfe_methods import codepoint_prediction_settings_pb2
+from analysis.pfe_methods import combined_patch_subset_method
+
+PredictionConfig = analyzer_codepoint_prediction.PredictionConfig
+SweepResult = analyzer_codepoint_prediction.SweepResult
+
+MODELS = [network_models.MOBILE_2G_MEDIAN, network_models.DESKTOP_MEDIAN]
+
+# Best parameters of the fake cost function for each network model.
+OPTIMUM = {
+    "mobile_2g_median": PredictionConfig(130, 0.3),
+    "desktop_median": PredictionConfig(40, 0.1),
+}
+
+
+def fake_simulate(configs, models):
+  """Simulation with a cost function that's minimal at OPTIMUM."""
+  results = []
+  for config in configs:
+    for model in models:
+      optimum = OPTIMUM[model.name]
+      cost = 100
+      if config.max_codepoints:
+        cost = (abs(config.max_codepoints - optimum.max_codepoints) +
+                100 * abs(config.freq_threshold - optimum.freq_threshold))
+      results.append(
+          SweepResult(config.max_codepoints, config.freq_threshold, model.name,
+                      cost, 1.0))
+  return results
+
+
+class TuneCodepointPredictionTest(unittest.TestCase):
+
+  def test_best_results(self):
+    results = [
+        SweepResult(10, 0.1, "a", 5, 1),
+        SweepResult(20, 0.1, "a", 3, 1),
+        SweepResult(15, 0.1, "a", 3, 1),
+        SweepResult(10, 0.1, "b", 1, 1),
+        SweepResult(20, 0.1, "b", 2, 1),
+    ]
+    self.assertEqual(tune_codepoint_prediction.best_results(results), {
+        "a": results[2],
+        "b": results[3],
+    })
+
+  def test_refine_axis(self):
+    self.assertEqual(
+        tune_codepoint_prediction.refine_axis([10, 20, 40], 20, True),
+        [15, 20, 30])
+    self.assertEqual(
+        tune_codepoint_prediction.refine_axis([10, 20, 40], 40, True),
+        [30, 40, 80])
+    self.assertEqual(
+        tune_codepoint_prediction.refine_axis([10, 20, 40], 10, True),
+        [5, 10, 15])
+    self.assertEqual(tune_codepoint_prediction.refine_axis([1, 2], 1, True),
+                     [1, 2])
+    self.assertEqual(
+        tune_codepoint_prediction.refine_axis([0.2, 0.8], 0.8, False, 1.0),
+        [0.5, 0.8, 1.0])
+
+  def test_refine(self):
+    evaluated = {
+        PredictionConfig(0, 0.0),
+        PredictionConfig(10, 0.1),
+        PredictionConfig(10, 0.2),
+        PredictionConfig(20, 0.1),
+        PredictionConfig(20, 0.2),
+    }
+    self.assertEqual(
+        tune_codepoint_prediction.refine(
+            {
+                "a": SweepResult(20, 0.1, "a", 1, 1),
+                "b": SweepResult(0, 0.0, "b", 1, 1),
+            }, evaluated), [
+                PredictionConfig(15, 0.05),
+                PredictionConfig(15, 0.1),
+                PredictionConfig(15, 0.15000000000000002),
+                PredictionConfig(20, 0.05),
+                PredictionConfig(20, 0.15000000000000002),
+                PredictionConfig(40, 0.05),
+                PredictionConfig(40, 0.1),
+                PredictionConfig(40, 0.15000000000000002),
+            ])
+
+  def test_tune(self):
+    coarse = analyzer_codepoint_prediction.config_grid(["25", "50", "100"],
+                                                       ["0.05", "0.2"])
+    coarse_best, _ = tune_codepoint_prediction.tune(coarse, MODELS, 0,
+                                                    fake_simulate)
+    best, no_prediction = tune_codepoint_prediction.tune(
+        coarse, MODELS, 4, fake_simulate)
+
+    for model in MODELS:
+      self.assertLess(best[model.name].cost, coarse_best[model.name].cost)
+      self.assertEqual(no_prediction[model.name].cost, 100)
+    self.assertEqual(best["desktop_median"].max_codepoints,
+                     OPTIMUM["desktop_median"].max_codepoints)
+    self.assertAlmostEqual(best["desktop_median"].freq_threshold,
+                           OPTIMUM["desktop_median"].freq_threshold,
+                           delta=0.01)
+
+  def test_tune_no_prediction(self):
+    rounds = []
+
+    def simulate(configs, models):
+      rounds.append(configs)
+      # Cost grows with the number of predicted codepoints.
+      return [
+          SweepResult(config.max_codepoints, config.freq_threshold, model.name,
+                      config.max_codepoints, 1.0)
+          for config in configs
+          for model in models
+      ]
+
+    best, _ = tune_codepoint_prediction.tune([PredictionConfig(10, 0.1)],
+                                             MODELS, 3, simulate)
+    self.assertEqual(len(rounds), 1)
+    self.assertEqual([result.max_codepoints for result in best.values()],
+                     [0, 0])
+
+  def test_settings(self):
+    base = codepoint_prediction_settings_pb2.CodepointPredictionSettingsProto()
+    base.version = combined_patch_subset_method.SETTINGS_VERSION
+    for script_category in ["latin", "cjk"]:
+      setting = base.settings.add()
+      setting.script_category = script_category
+      setting.network_model_name = "desktop_median"
+      setting.max_codepoints = 5
+
+    best = {
+        "mobile_2g_median": SweepResult(130, 0.25, "mobile_2g_median", 7, 1),
+        "desktop_median": SweepResult(0, 0.0, "desktop_median", 3, 1),
+    }
+    no_prediction = {
+        "mobile_2g_median": SweepResult(0, 0.0, "mobile_2g_median", 9, 1),
+        "desktop_median": SweepResult(0, 0.0, "desktop_median", 3, 1),
+    }
+    settings_proto = tune_codepoint_prediction.to_settings_proto(
+        "cjk", MODELS, best, no_prediction, base)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+      path = os.path.join(temp_dir, "settings.textproto")
+      tune_codepoint_prediction.write_settings(settings_proto, path)
+      self.assertEqual(combined_patch_subset_method.read_settings(path),
+                       settings_proto)
+      self.assertEqual(
+          combined_patch_subset_method.load_settings(path), {
+              ("latin", "desktop_median"): (5, 0.0),
+              ("cjk", "mobile_2g_median"): (130, 0.25),
+              ("cjk", "desktop_median"): (0, 0.0),
+          })
+
+
+if __name__ == '__main__':
+  unittest.main()
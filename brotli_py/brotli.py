@@ -0,0 +1,47 @@
+"""Brotli Encoder
+
+Compresses data with brotli.
+"""
+
+from ctypes import byref
+from ctypes import c_bool
+from ctypes import c_char_p
+from ctypes import c_int
+from ctypes import c_size_t
+from ctypes import cdll
+from ctypes import create_string_buffer
+
+brotli = cdll.LoadLibrary('./brotli_py/brotli_py.so')  # pylint: disable=invalid-name
+
+_max_brotli_compressed_size = brotli.MaxBrotliCompressedSize  # pylint: disable=invalid-name
+_max_brotli_compressed_size.restype = c_size_t
+
+_brotli_compress = brotli.BrotliCompress  # pylint: disable=invalid-name
+_brotli_compress.restype = c_bool
+
+# Smallest output buffer to use. BrotliEncoderMaxCompressedSize doesn't
+# account for the stream header of very small inputs.
+_MIN_OUTPUT_BUFFER_SIZE = 16
+
+
+class BrotliEncodeError(Exception):
+  """Brotli encoding failed."""
+
+
+def compress(data, quality=11):
+  """Compress the provided bytes with brotli at the given quality (0-11)."""
+
+  data = bytes(data)
+  output_buffer_size = max(_max_brotli_compressed_size(c_size_t(len(data))),
+                           _MIN_OUTPUT_BUFFER_SIZE)
+  output_buffer_size_c = c_size_t(output_buffer_size)
+  output_buffer_c = create_string_buffer(output_buffer_size)
+
+  success = _brotli_compress(c_int(quality), c_char_p(data),
+                             c_size_t(len(data)), output_buffer_c,
+                             byref(output_buffer_size_c))
+  if not success:
+    raise BrotliEncodeError("Brotli encoding failed.")
+
+  output_buffer_size = int(output_buffer_size_c.value)
+  return bytes(output_buffer_c[0:output_buffer_size])
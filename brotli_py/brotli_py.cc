@@ -0,0 +1,19 @@
+/*
+ * Python interface to the brotli encoder.
+ */
+
+#include "brotli/encode.h"
+
+extern "C" {
+
+size_t MaxBrotliCompressedSize(size_t length) {
+  return BrotliEncoderMaxCompressedSize(length);
+}
+
+bool BrotliCompress(int quality, const uint8_t *data, size_t length,
+                    uint8_t *result, size_t *result_length) {
+  return BrotliEncoderCompress(quality, BROTLI_DEFAULT_WINDOW,
+                               BROTLI_MODE_GENERIC, length, data,
+                               result_length, result);
+}
+}
@@ -0,0 +1,31 @@
+"""Unit tests for the brotli python module."""
+
+import unittest
+from brotli_py import brotli
+
+
+class BrotliTest(unittest.TestCase):
+
+  def test_compress(self):
+    data = b"abcdefghij" * 1000
+
+    compressed = brotli.compress(data)
+
+    self.assertGreater(len(compressed), 0)
+    self.assertLess(len(compressed), len(data))
+
+  def test_compress_quality(self):
+    with open(
+        "./external/patch_subset/patch_subset/testdata/Roboto-Regular.ttf",
+        "rb") as roboto:
+      roboto_bytes = roboto.read()
+
+    self.assertLess(len(brotli.compress(roboto_bytes, 11)),
+                    len(brotli.compress(roboto_bytes, 1)))
+
+  def test_compress_empty(self):
+    self.assertGreater(len(brotli.compress(b"")), 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,221 @@
+"""Builds a font manifest for a font library.
+
+For every font in --font_directory precomputes the facts that the PFE methods
+would otherwise recompute in each analyzer worker process: woff2 size, cmap,
+unicode range slicing strategy, per glyph sizes and a content hash. Fonts are
+processed in parallel. Byte identical fonts are only processed once.
+
+With --unicode_range_subset_sizes the woff2 size of every unicode range subset
+of every font is also computed, so that the UnicodeRange method only needs to
+do lookups during the simulation.
+
+Usage:
+
+bazel run tools:build_font_manifest -- --font_directory=<font dir> \
+   --output=<manifest path> --parallelism=12 --unicode_range_subset_sizes
+"""
+
+import collections
+import contextlib
+import hashlib
+import logging
+from multiprocessing import Pool
+import os
+
+from absl import app
+from absl import flags
+from analysis import font_loader
+from analysis import font_manifest_pb2
+from analysis.pfe_methods import range_request_pfe_method
+from analysis.pfe_methods import subset_sizer
+from analysis.pfe_methods import whole_font_pfe_method
+from analysis.pfe_methods.unicode_range_data import slicing_strategy_loader
+
+LOG = logging.getLogger("build_font_manifest")
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string("font_directory", None,
+                    "Directory which contains all fonts to be processed.")
+flags.mark_flag_as_required("font_directory")
+
+flags.DEFINE_string("output", None, "Path to write the binary manifest to.")
+flags.mark_flag_as_required("output")
+
+flags.DEFINE_integer("parallelism", 12,
+                     "Number of processes to use to build the manifest.")
+
+flags.DEFINE_bool(
+    "unicode_range_subset_sizes", False,
+    "If set, also precompute the woff2 size of every unicode range subset "
+    "of every font.")
+
+# The FontLoader of a worker process, set by 'init_worker'.
+FONT_LOADER = None
+
+
+def init_worker(a_font_loader):
+  """Pool initializer, sets the font loader of a worker process."""
+  global FONT_LOADER  # pylint: disable=global-statement
+  FONT_LOADER = a_font_loader
+
+
+def font_ids_in(font_directory):
+  """Returns the file names of all fonts in font_directory."""
+  return sorted(f for f in os.listdir(font_directory)
+                if os.path.isfile(os.path.join(font_directory, f)))
+
+
+def hash_font(font_id):
+  """Returns the content hash of font_id, or None if it can't be read."""
+  try:
+    return hashlib.sha256(FONT_LOADER.load_font(font_id)).hexdigest()
+  except IOError:
+    LOG.exception("Failed to read %s, skipping.", font_id)
+    return None
+
+
+def compute_entry(font_id):
+  """Computes the serialized FontManifestEntryProto for font_id.
+
+  Returns None if the font could not be processed.
+  """
+  try:
+    font_bytes = FONT_LOADER.load_font(font_id)
+
+    entry = font_manifest_pb2.FontManifestEntryProto()
+    entry.font_id = font_id
+    entry.content_hash = hashlib.sha256(font_bytes).hexdigest()
+    entry.woff2_size = whole_font_pfe_method.compute_font_size(font_bytes)
+
+    cmap = range_request_pfe_method.font_cmap(font_bytes)
+    for codepoint in sorted(cmap):
+      entry.codepoints.append(codepoint)
+      entry.glyph_ids.append(cmap[codepoint])
+
+    entry.slicing_strategy = slicing_strategy_loader.slicing_strategy_for_font(
+        font_bytes)
+  except Exception:  # pylint: disable=broad-except
+    LOG.exception("Failed to process %s, skipping.", font_id)
+    return None
+
+  try:
+    _, glyph_data = range_request_pfe_method.compute_glyph_data(font_bytes)
+    entry.glyph_sizes.extend(len(data) for data in glyph_data)
+    base_size, glyph_sizes = range_request_pfe_method.compressed_glyph_sizes(
+        font_bytes, glyph_data)
+    entry.compressed_base_size = base_size
+    entry.compressed_glyph_sizes.extend(glyph_sizes)
+  except range_request_pfe_method.RangeRequestError:
+    # Not an optimized font, so it can't be used for range requests.
+    pass
+
+  return entry.SerializeToString()
+
+
+def compute_subset_size(task):
+  """Computes the woff2 size of one unicode range subset.
+
+  task is a tuple of (font_id, strategy_name, subset index).
+  """
+  font_id, strategy_name, index = task
+  subset = slicing_strategy_loader.load_slicing_strategy(strategy_name)[index]
+  return subset_sizer.SubsetSizer(cache=dict()).subset_size(
+      "%s:%s:%s" % task, subset, FONT_LOADER.load_font(font_id))
+
+
+def subset_size_tasks(manifest):
+  """Enumerates every (font, strategy, subset index) in manifest."""
+  return [(entry.font_id, entry.slicing_strategy, index)
+          for entry in manifest.fonts
+          for index in range(
+              len(
+                  slicing_strategy_loader.load_slicing_strategy(
+                      entry.slicing_strategy)))]
+
+
+def add_subset_sizes(manifest, tasks, sizes):
+  """Records the computed subset sizes on the matching manifest entries."""
+  entries = {entry.font_id: entry for entry in manifest.fonts}
+  for (font_id, _, _), size in zip(tasks, sizes):
+    entries[font_id].unicode_range_subset_sizes.append(size)
+
+
+@contextlib.contextmanager
+def worker_pool(a_font_loader, parallelism):
+  """Yields a Pool of parallelism workers which load fonts with a_font_loader.
+
+  Yields None if running serially, fonts are then loaded in this process.
+  """
+  if parallelism > 1:
+    with Pool(parallelism, init_worker, (a_font_loader,)) as pool:
+      yield pool
+  else:
+    init_worker(a_font_loader)
+    yield None
+
+
+def run_all(pool, function, items):
+  if pool is None:
+    return [function(item) for item in items]
+  return pool.map(function, items)
+
+
+def build_manifest(a_font_loader, font_ids, parallelism, with_subset_sizes):
+  """Computes the manifest entries for font_ids using parallelism processes.
+
+  Fonts are loaded with a_font_loader.
+  """
+  with worker_pool(a_font_loader, parallelism) as pool:
+    return build_manifest_on(pool, font_ids, with_subset_sizes)
+
+
+def build_manifest_on(pool, font_ids, with_subset_sizes):
+  """Computes the manifest entries for font_ids on pool, see build_manifest."""
+  font_ids_by_hash = collections.defaultdict(list)
+  for font_id, font_hash in zip(font_ids, run_all(pool, hash_font, font_ids)):
+    if font_hash is not None:
+      font_ids_by_hash[font_hash].append(font_id)
+
+  # Only the first font with a given hash is processed, duplicates copy
+  # its entry.
+  unique_font_ids = [ids[0] for ids in font_ids_by_hash.values()]
+  LOG.info("Processing %s unique fonts.", len(unique_font_ids))
+  manifest = font_manifest_pb2.FontManifestProto()
+  for entry in run_all(pool, compute_entry, unique_font_ids):
+    if entry is not None:
+      manifest.fonts.add().ParseFromString(entry)
+
+  if with_subset_sizes:
+    # Subsets are the unit of work (rather than fonts) so that large
+    # fonts with many subsets are spread across all of the processes.
+    tasks = subset_size_tasks(manifest)
+    LOG.info("Computing %s unicode range subset sizes.", len(tasks))
+    add_subset_sizes(manifest, tasks, run_all(pool, compute_subset_size, tasks))
+
+  for entry in list(manifest.fonts):
+    for duplicate_font_id in font_ids_by_hash[entry.content_hash][1:]:
+      duplicate = manifest.fonts.add()
+      duplicate.CopyFrom(entry)
+      duplicate.font_id = duplicate_font_id
+
+  return manifest
+
+
+def main(argv):
+  """Builds the manifest."""
+  del argv  # Unused.
+
+  font_ids = font_ids_in(FLAGS.font_directory)
+  LOG.info("Building manifest for %s fonts.", len(font_ids))
+  manifest = build_manifest(font_loader.FontLoader(FLAGS.font_directory),
+                            font_ids, FLAGS.parallelism,
+                            FLAGS.unicode_range_subset_sizes)
+
+  with open(FLAGS.output, 'wb') as out:
+    out.write(manifest.SerializeToString())
+  LOG.info("Wrote %s entries to %s", len(manifest.fonts), FLAGS.output)
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,155 @@
+"""Unit tests for the build_font_manifest tool."""
+
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from absl.testing import absltest
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+from analysis import font_loader
+from analysis import font_manifest_pb2
+from analysis.pfe_methods.unicode_range_data import slicing_strategy_loader
+from tools import build_font_manifest
+
+
+def build_font(num_glyphs):
+  """Builds a TrueType font where glyph i is mapped from codepoint 0x40 + i."""
+  names = [".notdef"] + ["glyph%s" % i for i in range(1, num_glyphs)]
+  builder = FontBuilder(1000, isTTF=True)
+  builder.setupGlyphOrder(names)
+  builder.setupCharacterMap(
+      {0x40 + i: "glyph%s" % i for i in range(1, num_glyphs)})
+  glyphs = dict()
+  for i, name in enumerate(names):
+    pen = TTGlyphPen(None)
+    pen.moveTo((0, 0))
+    pen.lineTo((10 * i, 0))
+    pen.lineTo((0, 10 * i + 10))
+    pen.closePath()
+    glyphs[name] = pen.glyph()
+  builder.setupGlyf(glyphs)
+  builder.setupHorizontalMetrics({
+      name: (500 + i, 0) for i, name in enumerate(names)
+  })
+  builder.setupHorizontalHeader(ascent=800, descent=-200)
+  builder.setupNameTable({"familyName": "Test", "styleName": "Regular"})
+  builder.setupOS2()
+  builder.setupPost()
+  output = io.BytesIO()
+  builder.save(output)
+  return output.getvalue()
+
+
+def entries_by_id(manifest):
+  return {entry.font_id: entry for entry in manifest.fonts}
+
+
+class BuildFontManifestTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.font_directory = tempfile.mkdtemp()
+    fonts = {
+        "a.ttf": build_font(5),
+        "b.ttf": build_font(5),
+        "bad.ttf": b"not a font",
+        "c.ttf": build_font(7),
+    }
+    for font_id, font_bytes in fonts.items():
+      with open(os.path.join(self.font_directory, font_id), "wb") as font:
+        font.write(font_bytes)
+    # Fonts which aren't in the directory are skipped too.
+    self.font_ids = build_font_manifest.font_ids_in(
+        self.font_directory) + ["missing.ttf"]
+    # Workers must get the font loader from the pool initializer.
+    build_font_manifest.init_worker(None)
+
+  def tearDown(self):
+    build_font_manifest.init_worker(None)
+    shutil.rmtree(self.font_directory)
+    super().tearDown()
+
+  def build_manifest(self, parallelism=1, with_subset_sizes=False):
+    return build_font_manifest.build_manifest(
+        font_loader.FontLoader(self.font_directory), self.font_ids, parallelism,
+        with_subset_sizes)
+
+  def test_font_ids_in(self):
+    self.assertEqual(build_font_manifest.font_ids_in(self.font_directory),
+                     ["a.ttf", "b.ttf", "bad.ttf", "c.ttf"])
+
+  def test_build_manifest(self):
+    with mock.patch.object(build_font_manifest,
+                           "compute_entry",
+                           wraps=build_font_manifest.compute_entry) as compute:
+      manifest = self.build_manifest()
+
+    # Byte identical fonts are only processed once, unreadable fonts and
+    # fonts which fail to parse are skipped.
+    self.assertEqual([call.args[0] for call in compute.call_args_list],
+                     ["a.ttf", "bad.ttf", "c.ttf"])
+    self.assertEqual([entry.font_id for entry in manifest.fonts],
+                     ["a.ttf", "c.ttf", "b.ttf"])
+
+    entries = entries_by_id(manifest)
+    self.assertEqual(list(entries["a.ttf"].codepoints),
+                     [0x41, 0x42, 0x43, 0x44])
+    self.assertEqual(list(entries["a.ttf"].glyph_ids), [1, 2, 3, 4])
+    self.assertIn(entries["a.ttf"].slicing_strategy,
+                  slicing_strategy_loader.get_available_strategies())
+    self.assertNotEqual(entries["a.ttf"].content_hash,
+                        entries["c.ttf"].content_hash)
+
+    duplicate = font_manifest_pb2.FontManifestEntryProto()
+    duplicate.CopyFrom(entries["b.ttf"])
+    duplicate.font_id = "a.ttf"
+    self.assertEqual(duplicate, entries["a.ttf"])
+
+  def test_build_manifest_in_parallel(self):
+    self.assertEqual(self.build_manifest(parallelism=2, with_subset_sizes=True),
+                     self.build_manifest(with_subset_sizes=True))
+
+  def test_build_manifest_subset_sizes(self):
+    entries = entries_by_id(self.build_manifest(with_subset_sizes=True))
+
+    for entry in entries.values():
+      self.assertLen(
+          entry.unicode_range_subset_sizes,
+          len(
+              slicing_strategy_loader.load_slicing_strategy(
+                  entry.slicing_strategy)))
+      for size in entry.unicode_range_subset_sizes:
+        self.assertGreater(size, 0)
+    self.assertEqual(entries["b.ttf"].unicode_range_subset_sizes,
+                     entries["a.ttf"].unicode_range_subset_sizes)
+    self.assertEmpty(
+        entries_by_id(
+            self.build_manifest())["a.ttf"].unicode_range_subset_sizes)
+
+  def test_subset_size_tasks(self):
+    manifest = font_manifest_pb2.FontManifestProto()
+    manifest.fonts.add(font_id="a.ttf", slicing_strategy="non_cjk_slices")
+    manifest.fonts.add(font_id="b.ttf", slicing_strategy="korean_slices")
+    num_non_cjk = len(
+        slicing_strategy_loader.load_slicing_strategy("non_cjk_slices"))
+    num_korean = len(
+        slicing_strategy_loader.load_slicing_strategy("korean_slices"))
+
+    tasks = build_font_manifest.subset_size_tasks(manifest)
+    self.assertEqual(
+        tasks,
+        [("a.ttf", "non_cjk_slices", index) for index in range(num_non_cjk)] +
+        [("b.ttf", "korean_slices", index) for index in range(num_korean)])
+
+    build_font_manifest.add_subset_sizes(manifest, tasks, range(len(tasks)))
+    self.assertEqual(list(manifest.fonts[0].unicode_range_subset_sizes),
+                     list(range(num_non_cjk)))
+    self.assertEqual(list(manifest.fonts[1].unicode_range_subset_sizes),
+                     list(range(num_non_cjk, num_non_cjk + num_korean)))
+
+
+if __name__ == '__main__':
+  absltest.main()
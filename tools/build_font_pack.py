@@ -0,0 +1,34 @@
+"""Packs a font library into a single memory mappable font pack file.
+
+Usage:
+
+bazel run tools:build_font_pack -- --font_directory=<font dir> \
+   --output=<pack path>
+
+Then pass --font_pack=<pack path> to the analyzer.
+"""
+
+from absl import app
+from absl import flags
+from analysis import font_pack
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string("font_directory", None,
+                    "Directory which contains all fonts to be packed.")
+flags.mark_flag_as_required("font_directory")
+
+flags.DEFINE_string("output", None, "Path to write the font pack to.")
+flags.mark_flag_as_required("output")
+
+
+def main(argv):
+  """Builds the font pack."""
+  del argv  # Unused.
+
+  index = font_pack.write(FLAGS.font_directory, FLAGS.output)
+  print("Packed %s fonts into %s" % (len(index.fonts), FLAGS.output))
+
+
+if __name__ == '__main__':
+  app.run(main)
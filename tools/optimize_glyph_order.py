@@ -0,0 +1,398 @@
+"""Reorders the glyphs of range request optimized fonts to reduce range counts.
+
+RangeRequest fetches the outlines of the glyphs needed by each page view, one
+range per run of adjacent glyphs. This tool learns which glyphs are used
+together from a data set and rewrites each font so they are adjacent:
+
+1. Glyphs are grouped into tiers by usage frequency (log2 of the number of
+   page views that need them), most frequent tier first.
+2. Within a tier glyphs are chained greedily: each glyph is followed by the
+   unplaced glyph whose usage is most similar. Similarity is estimated from
+   MinHash signatures of the set of page views which need each glyph, and
+   candidates are found through glyphs sharing a signature value, so the
+   whole co-occurrence matrix is never built.
+
+Glyphs which are never used are moved to the end in their original order.
+Only glyphs newly needed by a page view (not already loaded earlier in the
+sequence) are counted, since those are what RangeRequest fetches.
+
+Frequencies and signatures are computed for chunks of the data set in
+parallel and then merged, so a single large CJK font is spread over all of
+the processes. The mean number of glyph ranges per page view before and
+after reordering is reported for each font.
+
+Input fonts must already be range request optimized (no composite glyphs or
+subroutines). Outlines are written as the last table, so the output can be
+used by RangeRequest in place of the input directory. Glyph ids stored in
+the data set are not rewritten; RangeRequest only uses codepoints.
+
+Usage:
+
+bazel run tools:optimize_glyph_order -- --input_data=<data set path> \
+   --font_directory=<optimized font dir> --output_directory=<output dir> \
+   --parallelism=12
+"""
+
+import collections
+import functools
+import io
+import logging
+from multiprocessing import Pool
+import os
+import random
+import shutil
+
+from absl import app
+from absl import flags
+from fontTools import ttLib
+from fontTools.ttLib import sfnt
+from analysis import font_loader
+from analysis import page_view_sequence_pb2
+from analysis.pfe_methods import range_request_pfe_method
+
+LOG = logging.getLogger("optimize_glyph_order")
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string(
+    "input_data", None,
+    "Path to the binary DataSetProto to learn glyph usage from.")
+flags.mark_flag_as_required("input_data")
+
+flags.DEFINE_string(
+    "font_directory", None,
+    "Directory which contains the range request optimized fonts.")
+flags.mark_flag_as_required("font_directory")
+
+flags.DEFINE_string(
+    "output_directory", None,
+    "Directory to write the reordered fonts to. Fonts not used by the data "
+    "set are copied unchanged.")
+flags.mark_flag_as_required("output_directory")
+
+flags.DEFINE_string(
+    "default_font_id", None,
+    "Font name to use for page views that don't have an associated font.")
+
+flags.DEFINE_integer("parallelism", 12, "Number of processes to use.")
+
+flags.DEFINE_integer("chunk_size", 1000,
+                     "Number of page views processed by each task.")
+
+flags.DEFINE_integer(
+    "num_hashes", 8,
+    "Number of MinHash functions in each glyph's usage signature.")
+
+# Tables which hold glyph outlines. These are placed at the end of the font.
+OUTLINE_TABLES = {"glyf", "CFF "}
+
+MINHASH_PRIME = (1 << 61) - 1
+
+# Signature values shared by more glyphs than this carry little information
+# about co-occurrence and are ignored when looking for similar glyphs.
+MAX_BUCKET_SIZE = 500
+
+FONT_LOADER = None
+OUTPUT_DIRECTORY = None
+
+# Usage of glyphs in part of a data set. frequencies is a dict of glyph id =>
+# number of page views, signatures is a dict of glyph id => MinHash signature.
+GlyphUsage = collections.namedtuple("GlyphUsage", ["frequencies", "signatures"])
+
+
+def read_binary_input(input_data_path):
+  with open(input_data_path, 'rb') as input_data_file:
+    return page_view_sequence_pb2.DataSetProto.FromString(
+        input_data_file.read())
+
+
+def page_view_usage(data_set, default_font_id):
+  """Returns a dict of font id => list of codepoints newly needed by each page view."""
+  usage = collections.defaultdict(list)
+  for sequence in data_set.sequences:
+    loaded = collections.defaultdict(set)
+    for page_view in sequence.page_views:
+      for content in page_view.contents:
+        font_id = content.font_name or default_font_id
+        if not font_id:
+          continue
+        codepoints = set(content.codepoints) - loaded[font_id]
+        if not codepoints:
+          continue
+        loaded[font_id].update(codepoints)
+        usage[font_id].append(tuple(sorted(codepoints)))
+  return usage
+
+
+def minhash_coefficients(num_hashes):
+  rand = random.Random(0)
+  return [(rand.randrange(1, MINHASH_PRIME), rand.randrange(MINHASH_PRIME))
+          for _ in range(num_hashes)]
+
+
+@functools.lru_cache(maxsize=64)
+def font_cmap(font_id):
+  return range_request_pfe_method.font_cmap(FONT_LOADER.load_font(font_id))
+
+
+def glyphs_for(cmap, codepoints):
+  return [cmap[codepoint] for codepoint in codepoints if codepoint in cmap]
+
+
+def glyph_usage(cmap, first_page_view, page_views, coefficients):
+  """Computes the GlyphUsage of a list of page views (codepoint lists).
+
+  Page views are numbered from first_page_view, which seeds their hashes.
+  """
+  frequencies = collections.Counter()
+  signatures = dict()
+  for page_view_id, codepoints in enumerate(page_views, first_page_view):
+    hashes = [(a * page_view_id + b) % MINHASH_PRIME for a, b in coefficients]
+    for glyph_id in glyphs_for(cmap, codepoints):
+      frequencies[glyph_id] += 1
+      signature = signatures.get(glyph_id)
+      signatures[glyph_id] = (hashes if signature is None else list(
+          map(min, signature, hashes)))
+  return GlyphUsage(frequencies, signatures)
+
+
+def merge_glyph_usage(usage, other):
+  """Merges other into usage. Merging is associative and commutative."""
+  usage.frequencies.update(other.frequencies)
+  for glyph_id, signature in other.signatures.items():
+    existing = usage.signatures.get(glyph_id)
+    usage.signatures[glyph_id] = (signature if existing is None else list(
+        map(min, existing, signature)))
+  return usage
+
+
+def glyph_usage_task(task):
+  font_id, first_page_view, page_views, num_hashes = task
+  return font_id, glyph_usage(font_cmap(font_id), first_page_view, page_views,
+                              minhash_coefficients(num_hashes))
+
+
+def chunk_tasks(usage_by_font, chunk_size, extra):
+  """Splits the page views of each font into (font id, first index, page views, extra) tasks."""
+  return [(font_id, start, page_views[start:start + chunk_size], extra)
+          for font_id, page_views in sorted(usage_by_font.items())
+          for start in range(0, len(page_views), chunk_size)]
+
+
+def chain_glyphs(glyph_ids, usage):
+  """Orders glyph_ids so that each glyph is followed by the most similar remaining glyph."""
+  buckets = collections.defaultdict(set)
+  for glyph_id in glyph_ids:
+    for bucket in enumerate(usage.signatures[glyph_id]):
+      buckets[bucket].add(glyph_id)
+
+  # Used when the current glyph has no similar glyphs left.
+  by_frequency = sorted(glyph_ids,
+                        key=lambda glyph_id:
+                        (-usage.frequencies[glyph_id], glyph_id))
+  next_by_frequency = 0
+  placed = set()
+  order = []
+  current = None
+  while len(order) < len(glyph_ids):
+    similarity = collections.Counter()
+    if current is not None:
+      for bucket in enumerate(usage.signatures[current]):
+        if len(buckets[bucket]) <= MAX_BUCKET_SIZE:
+          similarity.update(buckets[bucket])
+    if similarity:
+      current = max(
+          similarity,
+          key=lambda glyph_id:
+          (similarity[glyph_id], usage.frequencies[glyph_id], -glyph_id))
+    else:
+      while by_frequency[next_by_frequency] in placed:
+        next_by_frequency += 1
+      current = by_frequency[next_by_frequency]
+
+    placed.add(current)
+    order.append(current)
+    for bucket in enumerate(usage.signatures[current]):
+      buckets[bucket].discard(current)
+  return order
+
+
+def glyph_order(num_glyphs, usage):
+  """Returns the glyph ids of a font in their optimized order.
+
+  .notdef stays at glyph id 0.
+  """
+  tiers = collections.defaultdict(list)
+  unused = []
+  for glyph_id in range(1, num_glyphs):
+    frequency = usage.frequencies.get(glyph_id)
+    if frequency:
+      tiers[frequency.bit_length()].append(glyph_id)
+    else:
+      unused.append(glyph_id)
+
+  order = [0]
+  for tier in sorted(tiers, reverse=True):
+    order.extend(chain_glyphs(tiers[tier], usage))
+  return order + unused
+
+
+def count_ranges(glyph_ids):
+  """Number of runs of consecutive glyph ids in glyph_ids."""
+  glyph_ids = sorted(set(glyph_ids))
+  return sum(1 for i, glyph_id in enumerate(glyph_ids)
+             if i == 0 or glyph_id != glyph_ids[i - 1] + 1)
+
+
+def range_count_task(task):
+  """Returns (ranges before, ranges after) summed over the page views of a task."""
+  font_id, _, page_views, order = task
+  cmap = font_cmap(font_id)
+  new_glyph_ids = {old: new for new, old in enumerate(order)}
+  before = 0
+  after = 0
+  for codepoints in page_views:
+    glyph_ids = glyphs_for(cmap, codepoints)
+    before += count_ranges(glyph_ids)
+    after += count_ranges(new_glyph_ids[glyph_id] for glyph_id in glyph_ids)
+  return font_id, before, after
+
+
+def outlines_last(font_bytes):
+  """Rewrites a font so that its outline table is stored at the end of the file."""
+  reader = sfnt.SFNTReader(io.BytesIO(font_bytes))
+  tags = sorted(reader.keys(), key=lambda tag: (tag in OUTLINE_TABLES, tag))
+  output = io.BytesIO()
+  writer = sfnt.SFNTWriter(output, len(tags), reader.sfntVersion)
+  for tag in tags:
+    writer[tag] = reader[tag]
+  writer.close()
+  return output.getvalue()
+
+
+def reorder_font(font_bytes, order):
+  """Returns font_bytes with glyphs reordered so that old glyph id order[i] becomes glyph id i."""
+  font = ttLib.TTFont(font_loader.font_file(font_bytes))
+  old_names = font.getGlyphOrder()
+  new_names = [old_names[glyph_id] for glyph_id in order]
+  # Decompile everything while the old glyph order is still in effect, tables
+  # refer to glyphs by name once decompiled. TTFont has no items(), get()
+  # decompiles the table as a side effect.
+  for tag in font.keys():
+    if tag != "GlyphOrder":
+      font.get(tag)
+  font.setGlyphOrder(new_names)
+  if "glyf" in font:
+    font["glyf"].glyphOrder = new_names
+  if "CFF " in font:
+    top_dict = font["CFF "].cff.topDictIndex[0]
+    # CharStrings are loaded lazily using the charset, so load them first.
+    top_dict.CharStrings  # pylint: disable=pointless-statement
+    top_dict.charset = new_names
+
+  output = io.BytesIO()
+  font.save(output, reorderTables=False)
+  return outlines_last(output.getvalue())
+
+
+def output_path(font_id):
+  return os.path.join(OUTPUT_DIRECTORY,
+                      os.path.basename(FONT_LOADER.path_for_font(font_id)))
+
+
+def reorder_font_task(task):
+  """Reorders and writes one font. Returns (font id, glyph order)."""
+  font_id, usage = task
+  font_bytes = FONT_LOADER.load_font(font_id)
+  num_glyphs = len(
+      ttLib.TTFont(font_loader.font_file(font_bytes)).getGlyphOrder())
+  order = glyph_order(num_glyphs, usage)
+  with open(output_path(font_id), 'wb') as output:
+    output.write(reorder_font(font_bytes, order))
+  return font_id, order
+
+
+def run_all(function, items, pool):
+  """Maps function over items, on pool if there is one."""
+  if pool is not None:
+    return pool.map(function, items)
+  return [function(item) for item in items]
+
+
+def optimize(usage_by_font, chunk_size, num_hashes, pool):
+  """Reorders the fonts in usage_by_font. Returns a dict of font id => [ranges before, after]."""
+  usage = dict()
+  for font_id, partial in run_all(
+      glyph_usage_task, chunk_tasks(usage_by_font, chunk_size, num_hashes),
+      pool):
+    if font_id in usage:
+      merge_glyph_usage(usage[font_id], partial)
+    else:
+      usage[font_id] = partial
+
+  LOG.info("Reordering %s fonts.", len(usage))
+  orders = dict(run_all(reorder_font_task, sorted(usage.items()), pool))
+
+  range_counts = collections.defaultdict(lambda: [0, 0])
+  for font_id, before, after in run_all(
+      range_count_task, [(font_id, start, page_views, orders[font_id])
+                         for font_id, start, page_views, _ in chunk_tasks(
+                             usage_by_font, chunk_size, None)], pool):
+    range_counts[font_id][0] += before
+    range_counts[font_id][1] += after
+  return range_counts
+
+
+def report(usage_by_font, range_counts):
+  """Prints how many ranges each font needed before and after reordering."""
+  total_before = 0
+  total_after = 0
+  for font_id, (before, after) in sorted(range_counts.items()):
+    num_page_views = len(usage_by_font[font_id])
+    print("%s: %.2f -> %.2f ranges per page view (%.1f%% fewer)" %
+          (font_id, before / num_page_views, after / num_page_views, 100.0 *
+           (before - after) / max(before, 1)))
+    total_before += before
+    total_after += after
+  print("Total: %s -> %s ranges (%.1f%% fewer)" %
+        (total_before, total_after, 100.0 *
+         (total_before - total_after) / max(total_before, 1)))
+
+
+def main(argv):
+  """Reorders the fonts."""
+  del argv  # Unused.
+
+  global FONT_LOADER, OUTPUT_DIRECTORY  # pylint: disable=global-statement
+  FONT_LOADER = font_loader.FontLoader(FLAGS.font_directory,
+                                       FLAGS.default_font_id)
+  OUTPUT_DIRECTORY = FLAGS.output_directory
+  os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
+
+  usage_by_font = page_view_usage(read_binary_input(FLAGS.input_data),
+                                  FLAGS.default_font_id)
+  for font_id in list(usage_by_font):
+    if not os.path.exists(FONT_LOADER.path_for_font(font_id)):
+      LOG.warning("Font %s not found, skipping.", font_id)
+      del usage_by_font[font_id]
+
+  if FLAGS.parallelism > 1:
+    with Pool(FLAGS.parallelism) as pool:
+      range_counts = optimize(usage_by_font, FLAGS.chunk_size, FLAGS.num_hashes,
+                              pool)
+  else:
+    range_counts = optimize(usage_by_font, FLAGS.chunk_size, FLAGS.num_hashes,
+                            None)
+
+  reordered = {output_path(font_id) for font_id in usage_by_font}
+  for file_name in os.listdir(FLAGS.font_directory):
+    path = os.path.join(FLAGS.font_directory, file_name)
+    output = os.path.join(FLAGS.output_directory, file_name)
+    if os.path.isfile(path) and output not in reordered:
+      shutil.copyfile(path, output)
+
+  report(usage_by_font, range_counts)
+
+
+if __name__ == '__main__':
+  app.run(main)
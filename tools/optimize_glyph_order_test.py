@@ -0,0 +1,148 @@
+"""Unit tests for the optimize_glyph_order tool."""
+
+import collections
+import io
+
+from absl.testing import absltest
+from fontTools import ttLib
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+from analysis import page_view_sequence_pb2
+from analysis.pfe_methods import range_request_pfe_method
+from tools import optimize_glyph_order
+
+
+def build_font(num_glyphs):
+  """Builds a TrueType font where glyph i is mapped from codepoint 0x40 + i."""
+  names = [".notdef"] + ["glyph%s" % i for i in range(1, num_glyphs)]
+  builder = FontBuilder(1000, isTTF=True)
+  builder.setupGlyphOrder(names)
+  builder.setupCharacterMap(
+      {0x40 + i: "glyph%s" % i for i in range(1, num_glyphs)})
+  glyphs = dict()
+  for i, name in enumerate(names):
+    pen = TTGlyphPen(None)
+    pen.moveTo((0, 0))
+    pen.lineTo((10 * i, 0))
+    pen.lineTo((0, 10 * i + 10))
+    pen.closePath()
+    glyphs[name] = pen.glyph()
+  builder.setupGlyf(glyphs)
+  builder.setupHorizontalMetrics({
+      name: (500 + i, 0) for i, name in enumerate(names)
+  })
+  builder.setupHorizontalHeader(ascent=800, descent=-200)
+  builder.setupNameTable({"familyName": "Test", "styleName": "Regular"})
+  builder.setupOS2()
+  builder.setupPost()
+  output = io.BytesIO()
+  builder.save(output)
+  return output.getvalue()
+
+
+def usage(frequencies, signatures):
+  return optimize_glyph_order.GlyphUsage(collections.Counter(frequencies),
+                                         signatures)
+
+
+class OptimizeGlyphOrderTest(absltest.TestCase):
+
+  def test_page_view_usage(self):
+    data_set = page_view_sequence_pb2.DataSetProto()
+    sequence = data_set.sequences.add()
+    sequence.page_views.add().contents.add(font_name="a.ttf", codepoints=[1, 2])
+    sequence.page_views.add().contents.add(font_name="a.ttf",
+                                           codepoints=[1, 2, 3])
+    sequence.page_views.add().contents.add(codepoints=[1])
+    data_set.sequences.add().page_views.add().contents.add(font_name="a.ttf",
+                                                           codepoints=[2])
+
+    self.assertEqual(optimize_glyph_order.page_view_usage(data_set, "b.ttf"), {
+        "a.ttf": [(1, 2), (3,), (2,)],
+        "b.ttf": [(1,)],
+    })
+
+  def test_merge_glyph_usage(self):
+    coefficients = optimize_glyph_order.minhash_coefficients(4)
+    cmap = {0x41: 1, 0x42: 2, 0x43: 3}
+    page_views = [(0x41, 0x42), (0x42,), (0x41, 0x43), (0x43, 0x44)]
+
+    whole = optimize_glyph_order.glyph_usage(cmap, 0, page_views, coefficients)
+    merged = optimize_glyph_order.merge_glyph_usage(
+        optimize_glyph_order.glyph_usage(cmap, 2, page_views[2:], coefficients),
+        optimize_glyph_order.glyph_usage(cmap, 0, page_views[:2], coefficients))
+
+    self.assertEqual(whole.frequencies, {1: 2, 2: 2, 3: 2})
+    self.assertEqual(merged.frequencies, whole.frequencies)
+    self.assertEqual(merged.signatures, whole.signatures)
+
+  def test_glyph_order(self):
+    order = optimize_glyph_order.glyph_order(
+        8,
+        usage({
+            2: 1,
+            4: 8,
+            5: 1,
+            6: 9
+        }, {
+            2: [1, 1],
+            4: [5, 6],
+            5: [3, 4],
+            6: [5, 7],
+        }))
+    # Most frequent tier first, unused glyphs last in their original order.
+    self.assertEqual(order[0], 0)
+    self.assertEqual(set(order[1:3]), {4, 6})
+    self.assertEqual(set(order[3:5]), {2, 5})
+    self.assertEqual(order[5:], [1, 3, 7])
+
+  def test_chain_glyphs(self):
+    the_usage = usage({
+        1: 1,
+        2: 1,
+        3: 1,
+        4: 1
+    }, {
+        1: [1, 2, 3],
+        2: [9, 8, 7],
+        3: [1, 2, 4],
+        4: [9, 8, 6],
+    })
+    self.assertEqual(optimize_glyph_order.chain_glyphs([1, 2, 3, 4], the_usage),
+                     [1, 3, 2, 4])
+
+  def test_count_ranges(self):
+    self.assertEqual(optimize_glyph_order.count_ranges([]), 0)
+    self.assertEqual(optimize_glyph_order.count_ranges([5]), 1)
+    self.assertEqual(optimize_glyph_order.count_ranges([7, 1, 2, 3, 9, 8]), 2)
+
+  def test_reorder_font(self):
+    font_bytes = build_font(6)
+    order = [0, 4, 2, 5, 1, 3]
+
+    reordered = optimize_glyph_order.reorder_font(font_bytes, order)
+
+    old_cmap = range_request_pfe_method.font_cmap(font_bytes)
+    new_cmap = range_request_pfe_method.font_cmap(reordered)
+    self.assertEqual(
+        new_cmap, {
+            0x40 + old_glyph_id: new_glyph_id
+            for new_glyph_id, old_glyph_id in enumerate(order)
+            if old_glyph_id
+        })
+
+    _, old_glyph_data = range_request_pfe_method.compute_glyph_data(font_bytes)
+    _, new_glyph_data = range_request_pfe_method.compute_glyph_data(reordered)
+    for codepoint, old_glyph_id in old_cmap.items():
+      self.assertEqual(new_glyph_data[new_cmap[codepoint]],
+                       old_glyph_data[old_glyph_id])
+
+    font = ttLib.TTFont(io.BytesIO(reordered))
+    self.assertEqual(font["hmtx"]["glyph4"], (504, 0))
+    # Outlines are stored last.
+    tables = font.reader.tables
+    self.assertEqual(max(tables, key=lambda tag: tables[tag].offset), "glyf")
+
+
+if __name__ == '__main__':
+  absltest.main()
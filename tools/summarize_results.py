@@ -10,6 +10,9 @@ import sys
 from google.protobuf import text_format
 from absl import app
 from absl import flags
+from analysis import break_even
+from analysis import graph_signatures_pb2
+from analysis import network_models
 from analysis import result_pb2
 
 USAGE = """Usage:
@@ -24,6 +27,9 @@ Available modes:
   response_bytes_per_page_view <method> - print out the distribution of response bytes sent per page view.
   wait_per_page_view <method> <network> - print out the distribution of the time waiting for fonts to load per page view.
   cost_per_page_view <method> <network> - print out the distribution of costs per page view.
+  break_even <method 1> [<method 2> ...] - For each language, script category and network model find the
+      network conditions where each method stops being faster than the baseline method. The input file
+      must be a binary graph signatures proto (see analyzer --graph_signatures_out).
 """
 
 FLAGS = flags.FLAGS
@@ -77,6 +83,13 @@ MODE_FUNCTIONS = {
             argv, result_proto, "response_bytes_per_page_view")),
 }
 
+# Modes which take a GraphSignaturesProto as input.
+SIGNATURE_MODE_FUNCTIONS = {
+    "break_even":
+        lambda argv, signatures_proto: print_break_even_report(  # pylint: disable=unnecessary-lambda
+            argv, signatures_proto),
+}
+
 
 def main(argv):  # pylint: disable=missing-function-docstring
   if len(argv) < 2:
@@ -84,6 +97,9 @@ def main(argv):  # pylint: disable=missing-function-docstring
 
   mode = argv[1]
   argv = argv[2:]
+  if mode in SIGNATURE_MODE_FUNCTIONS:
+    return SIGNATURE_MODE_FUNCTIONS[mode](argv,
+                                          read_signatures(FLAGS.input_file))
   if mode not in MODE_FUNCTIONS:
     return print_usage()
 
@@ -234,6 +250,48 @@ def print_comparison_report(methods, result_proto):
   write_lines(lines)
 
 
+def find_method_signatures(method, signatures_proto):
+  """Returns the MethodSignaturesProto of method in signatures_proto."""
+  for method_proto in signatures_proto.methods:
+    if method_proto.method_name == method:
+      return method_proto
+
+  raise MethodResultNotFound("No signatures found for method %s" % method)
+
+
+def format_optional(value):
+  return "" if value is None else "{:.2f}".format(value)
+
+
+def print_break_even_report(methods, signatures_proto):
+  """Converts the break-even of each method against the baseline into CSV.
+
+  See analysis/break_even.py for how the break-even is computed.
+  """
+  baseline_proto = find_method_signatures(FLAGS.baseline_method,
+                                          signatures_proto)
+  lines = []
+  lines.append("method name, group, network model, time change, "
+               "break-even rtt * bandwidth (bytes), break-even rtt (ms), "
+               "break-even bandwidth (bytes/ms), faster when, sequences faster")
+  for method in sorted(methods):
+    method_proto = find_method_signatures(method, signatures_proto)
+    for result in break_even.analyze(method_proto, baseline_proto,
+                                     network_models.ALL_MODELS):
+      lines.append("%s,%s,%s,%.4f,%s,%s,%s,%s,%.4f" % (
+          method,
+          result.group,
+          result.network_model_name,
+          result.time_change,
+          format_optional(result.break_even_bdp),
+          format_optional(result.break_even_rtt),
+          format_optional(result.break_even_bandwidth_down),
+          result.faster_when,
+          result.sequences_faster,
+      ))
+  write_lines(lines)
+
+
 def normalize_list(baseline_values, values):
   """Normalize values against baseline."""
   if len(baseline_values) != len(values):
@@ -285,6 +343,18 @@ def read_input(input_file_path):
     return input_data_file.read()
 
 
+def read_signatures(input_file_path):
+  """Reads a binary GraphSignaturesProto."""
+  if input_file_path == "-":
+    print("Reading from stdin...")
+  else:
+    print("Reading %s..." % input_file_path)
+  signatures_proto = graph_signatures_pb2.GraphSignaturesProto.FromString(
+      read_binary_input(input_file_path))
+  print("Done.")
+  return signatures_proto
+
+
 def read_binary_input(input_file_path):
   """Read the contents of input_file_path and return them."""
   if input_file_path == "-":
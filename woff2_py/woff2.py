@@ -5,6 +5,7 @@ Encodes TTF files into the WOFF2 format.
 
 from ctypes import byref
 from ctypes import c_bool
+from ctypes import c_char
 from ctypes import c_char_p
 from ctypes import c_size_t
 from ctypes import cdll
@@ -23,15 +24,31 @@ class Woff2EncodeError(Exception):
   """WOFF2 Encoding failed."""
 
 
+def _input_buffer(data):
+  """Returns a ctypes pointer to data.
+
+  bytes and writable buffers are passed to the C code without copying
+  them. Read only buffers (such as memoryviews into a font pack) are copied,
+  ctypes can only reference writable ones.
+  """
+  if isinstance(data, bytes):
+    return c_char_p(data)
+  view = memoryview(data)
+  if view.readonly:
+    return c_char_p(view.tobytes())
+  return (c_char * len(view)).from_buffer(view)
+
+
 def ttf_to_woff2(ttf_bytes):
-  """Convert the provided ttf bytes into a woff2 encoding."""
+  """Convert the provided ttf bytes (or buffer) into a woff2 encoding."""
 
-  output_buffer_size = _max_woff2_compressed_size(c_char_p(ttf_bytes),
+  ttf_bytes_c = _input_buffer(ttf_bytes)
+  output_buffer_size = _max_woff2_compressed_size(ttf_bytes_c,
                                                   c_size_t(len(ttf_bytes)))
   output_buffer_size_c = c_size_t(output_buffer_size)
   output_buffer_c = create_string_buffer(output_buffer_size)
 
-  success = _ttf_to_woff2(c_char_p(ttf_bytes), c_size_t(len(ttf_bytes)),
+  success = _ttf_to_woff2(ttf_bytes_c, c_size_t(len(ttf_bytes)),
                           output_buffer_c, byref(output_buffer_size_c))
   if not success:
     raise Woff2EncodeError("WOFF2 encoding failed.")
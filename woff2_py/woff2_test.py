@@ -19,6 +19,15 @@ class Woff2Test(unittest.TestCase):
     self.assertLess(len(roboto_woff2_bytes), len(roboto_bytes))
     self.assertEqual(roboto_woff2_bytes[0:4], b'wOF2')
 
+  def test_encode_read_only_buffer(self):
+    with open(
+        "./external/patch_subset/patch_subset/testdata/Roboto-Regular.ttf",
+        "rb") as roboto:
+      roboto_bytes = roboto.read()
+
+    self.assertEqual(woff2.ttf_to_woff2(memoryview(roboto_bytes)),
+                     woff2.ttf_to_woff2(roboto_bytes))
+
   def test_encode_failure(self):
     invalid_bytes = b'aaaaaaaaa'
     with self.assertRaises(woff2.Woff2EncodeError):